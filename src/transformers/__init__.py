@@ -67,6 +67,7 @@ _import_structure = {
         "SquadV1Processor",
         "SquadV2Processor",
         "glue_compute_metrics",
+        "glue_convert_examples_to_arrays",
         "glue_convert_examples_to_features",
         "glue_output_modes",
         "glue_processors",
@@ -85,6 +86,7 @@ _import_structure = {
         "DataCollatorForSOP",
         "DataCollatorForTokenClassification",
         "DataCollatorForWholeWordMask",
+        "DataCollatorWithPacking",
         "DataCollatorWithPadding",
         "DefaultDataCollator",
         "default_data_collator",
@@ -341,11 +343,13 @@ _import_structure = {
         "Conversation",
         "ConversationalPipeline",
         "CsvPipelineDataFormat",
+        "DynamicBatchingExecutor",
         "FeatureExtractionPipeline",
         "FillMaskPipeline",
         "ImageClassificationPipeline",
         "ImageSegmentationPipeline",
         "JsonPipelineDataFormat",
+        "MultiTaskPipeline",
         "NerPipeline",
         "ObjectDetectionPipeline",
         "PipedPipelineDataFormat",
@@ -376,12 +380,13 @@ _import_structure = {
         "DefaultFlowCallback",
         "EarlyStoppingCallback",
         "PrinterCallback",
+        "ProfilerCallback",
         "ProgressCallback",
         "TrainerCallback",
         "TrainerControl",
         "TrainerState",
     ],
-    "trainer_utils": ["EvalPrediction", "IntervalStrategy", "SchedulerType", "set_seed"],
+    "trainer_utils": ["EvalPrediction", "IntervalStrategy", "SchedulerType", "StreamingMetric", "set_seed"],
     "training_args": ["TrainingArguments"],
     "training_args_seq2seq": ["Seq2SeqTrainingArguments"],
     "training_args_tf": ["TFTrainingArguments"],
@@ -599,6 +604,8 @@ if is_torch_available():
         "LineByLineTextDataset",
         "LineByLineWithRefDataset",
         "LineByLineWithSOPTextDataset",
+        "MemoryMappedTextDataset",
+        "MemoryMappedTextDatasetForNextSentencePrediction",
         "SquadDataset",
         "SquadDataTrainingArguments",
         "TextDataset",
@@ -630,6 +637,7 @@ if is_torch_available():
         "StoppingCriteriaList",
     ]
     _import_structure["generation_utils"] = ["top_k_top_p_filtering"]
+    _import_structure["gradient_checkpointing_utils"] = ["GradientCheckpointingPolicy"]
     _import_structure["modeling_outputs"] = []
     _import_structure["modeling_utils"] = ["Conv1D", "PreTrainedModel", "apply_chunking_to_forward", "prune_layer"]
 
@@ -1527,6 +1535,7 @@ if is_torch_available():
     _import_structure["optimization"] = [
         "Adafactor",
         "AdamW",
+        "AdamW8bit",
         "get_constant_schedule",
         "get_constant_schedule_with_warmup",
         "get_cosine_schedule_with_warmup",
@@ -2228,6 +2237,7 @@ if TYPE_CHECKING:
         SquadV1Processor,
         SquadV2Processor,
         glue_compute_metrics,
+        glue_convert_examples_to_arrays,
         glue_convert_examples_to_features,
         glue_output_modes,
         glue_processors,
@@ -2246,6 +2256,7 @@ if TYPE_CHECKING:
         DataCollatorForSOP,
         DataCollatorForTokenClassification,
         DataCollatorForWholeWordMask,
+        DataCollatorWithPacking,
         DataCollatorWithPadding,
         DefaultDataCollator,
         default_data_collator,
@@ -2477,11 +2488,13 @@ if TYPE_CHECKING:
         Conversation,
         ConversationalPipeline,
         CsvPipelineDataFormat,
+        DynamicBatchingExecutor,
         FeatureExtractionPipeline,
         FillMaskPipeline,
         ImageClassificationPipeline,
         ImageSegmentationPipeline,
         JsonPipelineDataFormat,
+        MultiTaskPipeline,
         NerPipeline,
         ObjectDetectionPipeline,
         PipedPipelineDataFormat,
@@ -2515,12 +2528,13 @@ if TYPE_CHECKING:
         DefaultFlowCallback,
         EarlyStoppingCallback,
         PrinterCallback,
+        ProfilerCallback,
         ProgressCallback,
         TrainerCallback,
         TrainerControl,
         TrainerState,
     )
-    from .trainer_utils import EvalPrediction, IntervalStrategy, SchedulerType, set_seed
+    from .trainer_utils import EvalPrediction, IntervalStrategy, SchedulerType, StreamingMetric, set_seed
     from .training_args import TrainingArguments
     from .training_args_seq2seq import Seq2SeqTrainingArguments
     from .training_args_tf import TFTrainingArguments
@@ -2683,6 +2697,8 @@ if TYPE_CHECKING:
             LineByLineTextDataset,
             LineByLineWithRefDataset,
             LineByLineWithSOPTextDataset,
+            MemoryMappedTextDataset,
+            MemoryMappedTextDatasetForNextSentencePrediction,
             SquadDataset,
             SquadDataTrainingArguments,
             TextDataset,
@@ -2713,6 +2729,7 @@ if TYPE_CHECKING:
             StoppingCriteriaList,
         )
         from .generation_utils import top_k_top_p_filtering
+        from .gradient_checkpointing_utils import GradientCheckpointingPolicy
         from .modeling_utils import Conv1D, PreTrainedModel, apply_chunking_to_forward, prune_layer
         from .models.albert import (
             ALBERT_PRETRAINED_MODEL_ARCHIVE_LIST,
@@ -3462,6 +3479,7 @@ if TYPE_CHECKING:
         from .optimization import (
             Adafactor,
             AdamW,
+            AdamW8bit,
             get_constant_schedule,
             get_constant_schedule_with_warmup,
             get_cosine_schedule_with_warmup,
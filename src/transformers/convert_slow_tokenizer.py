@@ -19,12 +19,18 @@ All the conversions are grouped here to gather SentencePiece dependencies outsid
 allow to make our dependency on SentencePiece optional.
 """
 
-from typing import Dict, List, Tuple
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
 
 from tokenizers import Regex, Tokenizer, decoders, normalizers, pre_tokenizers, processors
 from tokenizers.models import BPE, Unigram, WordPiece
 
 from .file_utils import requires_backends
+from .utils import logging
+
+
+logger = logging.get_logger(__name__)
 
 
 class SentencePieceExtractor:
@@ -956,7 +962,7 @@ SLOW_TO_FAST_CONVERTERS = {
 }
 
 
-def convert_slow_tokenizer(transformer_tokenizer) -> Tokenizer:
+def convert_slow_tokenizer(transformer_tokenizer, cache_file: Optional[str] = None) -> Tokenizer:
     """
     Utilities to convert a slow tokenizer instance in a fast tokenizer instance.
 
@@ -964,6 +970,10 @@ def convert_slow_tokenizer(transformer_tokenizer) -> Tokenizer:
         transformer_tokenizer ([`~tokenization_utils_base.PreTrainedTokenizer`]):
             Instance of a slow tokenizer to convert in the backend tokenizer for
             [`~tokenization_utils_base.PreTrainedTokenizerFast`].
+        cache_file (`str`, *optional*):
+            Path to a JSON file caching the result of the conversion. If the file exists, the backend tokenizer is
+            deserialized from it instead of being converted, otherwise the result of the conversion is saved there. The
+            caller is responsible for choosing a path that uniquely identifies the slow tokenizer.
 
     Return:
         A instance of [`~tokenizers.Tokenizer`] to be used as the backend tokenizer of a
@@ -978,6 +988,31 @@ def convert_slow_tokenizer(transformer_tokenizer) -> Tokenizer:
             f"No converter was found. Currently available slow->fast convertors: {list(SLOW_TO_FAST_CONVERTERS.keys())}"
         )
 
+    if cache_file is not None and os.path.isfile(cache_file):
+        try:
+            return Tokenizer.from_file(cache_file)
+        except Exception as e:
+            logger.warning(f"Could not load the converted tokenizer cached at {cache_file}, converting it again: {e}")
+
     converter_class = SLOW_TO_FAST_CONVERTERS[tokenizer_class_name]
+    fast_tokenizer = converter_class(transformer_tokenizer).converted()
+
+    if cache_file is not None:
+        save_converted_tokenizer(fast_tokenizer, cache_file)
 
-    return converter_class(transformer_tokenizer).converted()
+    return fast_tokenizer
+
+
+def save_converted_tokenizer(fast_tokenizer: Tokenizer, cache_file: str):
+    """
+    Atomically saves a converted backend tokenizer to `cache_file`, so that concurrent processes converting the same
+    tokenizer never read a partially written file. Failures are logged and otherwise ignored.
+    """
+    cache_dir = os.path.dirname(cache_file)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=cache_dir, suffix=".tmp", delete=False, encoding="utf-8") as f:
+            f.write(fast_tokenizer.to_str())
+        os.replace(f.name, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not cache the converted tokenizer at {cache_file}: {e}")
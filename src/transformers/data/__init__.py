@@ -23,6 +23,7 @@ from .data_collator import (
     DataCollatorForSOP,
     DataCollatorForTokenClassification,
     DataCollatorForWholeWordMask,
+    DataCollatorWithPacking,
     DataCollatorWithPadding,
     DefaultDataCollator,
     default_data_collator,
@@ -37,6 +38,7 @@ from .processors import (
     SquadFeatures,
     SquadV1Processor,
     SquadV2Processor,
+    glue_convert_examples_to_arrays,
     glue_convert_examples_to_features,
     glue_output_modes,
     glue_processors,
@@ -392,6 +392,132 @@ class DataCollatorForTokenClassification(DataCollatorMixin):
         return batch
 
 
+def _first_fit_decreasing(lengths: List[int], capacity: int) -> List[List[int]]:
+    """
+    Bin-packs items of the given `lengths` into bins of size `capacity` with the first-fit-decreasing heuristic, and
+    returns the indices of the items in each bin (in decreasing length order).
+    """
+    bins, remaining = [], []
+    for index in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+        for bin_index, space in enumerate(remaining):
+            if lengths[index] <= space:
+                bins[bin_index].append(index)
+                remaining[bin_index] -= lengths[index]
+                break
+        else:
+            bins.append([index])
+            remaining.append(capacity - lengths[index])
+    return bins
+
+
+@dataclass
+class DataCollatorWithPacking(DataCollatorMixin):
+    """
+    Data collator that packs several examples in each row of the batch instead of padding each of them to the length of
+    the longest one. Examples are assigned to rows of `max_length` tokens with the first-fit-decreasing heuristic, so a
+    batch built from `n` examples has at most `n` rows (usually a lot less).
+
+    To prevent packed examples from attending to each other, the attention mask returned is a block-diagonal mask of
+    shape `(num_rows, max_length, max_length)`, which is supported by the PyTorch models of BERT, RoBERTa and GPT-2
+    (the causal mask of decoders is applied on top of it), and the position ids restart at the beginning of each
+    example. TensorFlow models don't accept this mask.
+
+    Per-token keys of the features (`input_ids`, `token_type_ids`, `special_tokens_mask` and `labels`) are packed,
+    other keys are ignored. Examples longer than `max_length` are truncated. The `labels` need to have one label per
+    token, sequence-level labels (as used for sequence classification) cannot be packed.
+
+    Args:
+        tokenizer ([`PreTrainedTokenizer`] or [`PreTrainedTokenizerFast`]):
+            The tokenizer used for encoding the data.
+        max_length (`int`, *optional*):
+            The length of the packed rows. Defaults to the maximum acceptable input length of the model.
+        position_ids_offset (`int`, *optional*, defaults to 0):
+            The position id of the first token of each example. RoBERTa-like models use `tokenizer.pad_token_id + 1`.
+        return_segment_ids (`bool`, *optional*, defaults to `False`):
+            Whether or not to also return `segment_ids`, the index (starting at 1) of the example each token belongs to
+            in its row, 0 being used for padding. Models don't accept this input, it is meant for custom models or loss
+            computations.
+        mask_example_start_labels (`bool`, *optional*, defaults to `True`):
+            Whether or not to replace the label of the first token of each example by `label_pad_token_id`. Causal
+            language models shift the labels inside the model, so without this the first token of an example would be
+            predicted from the end of the previous example in the row.
+        label_pad_token_id (`int`, *optional*, defaults to -100):
+            The id to use when padding the labels (-100 will be automatically ignore by PyTorch loss functions).
+        return_tensors (`str`):
+            The type of Tensor to return. Allowable values are "np", "pt" and "tf".
+    """
+
+    tokenizer: PreTrainedTokenizerBase
+    max_length: Optional[int] = None
+    position_ids_offset: int = 0
+    return_segment_ids: bool = False
+    mask_example_start_labels: bool = True
+    label_pad_token_id: int = -100
+    return_tensors: str = "pt"
+
+    def numpy_call(self, features):
+        import numpy as np
+
+        if self.tokenizer.pad_token_id is None:
+            raise ValueError(
+                "You are attempting to pack the inputs with a tokenizer that does not have a padding token."
+            )
+        max_length = self.max_length if self.max_length is not None else self.tokenizer.model_max_length
+
+        if not isinstance(features[0], (dict, BatchEncoding)):
+            features = [vars(f) for f in features]
+        keys = [k for k in ("input_ids", "token_type_ids", "special_tokens_mask", "labels") if k in features[0]]
+        if "labels" in keys:
+            for feature in features:
+                if np.ndim(feature["labels"]) != 1 or len(feature["labels"]) != len(feature["input_ids"]):
+                    raise ValueError(
+                        "DataCollatorWithPacking needs one label per token in `labels`, sequence-level labels cannot "
+                        f"be packed. Got labels {feature['labels']} for input_ids of length "
+                        f"{len(feature['input_ids'])}."
+                    )
+        lengths = [min(len(feature["input_ids"]), max_length) for feature in features]
+        rows = _first_fit_decreasing(lengths, max_length)
+
+        pad_values = {
+            "input_ids": self.tokenizer.pad_token_id,
+            "token_type_ids": self.tokenizer.pad_token_type_id,
+            "special_tokens_mask": 1,
+            "labels": self.label_pad_token_id,
+        }
+        batch = {k: np.full((len(rows), max_length), pad_values[k], dtype=np.int64) for k in keys}
+        segment_ids = np.zeros((len(rows), max_length), dtype=np.int64)
+        position_ids = np.zeros((len(rows), max_length), dtype=np.int64)
+        for row, indices in enumerate(rows):
+            start = 0
+            for segment, index in enumerate(indices, start=1):
+                end = start + lengths[index]
+                for k in keys:
+                    batch[k][row, start:end] = np.asarray(features[index][k])[: lengths[index]]
+                if "labels" in batch and self.mask_example_start_labels:
+                    batch["labels"][row, start] = self.label_pad_token_id
+                segment_ids[row, start:end] = segment
+                position_ids[row, start:end] = np.arange(lengths[index]) + self.position_ids_offset
+                start = end
+
+        # Tokens attend to the tokens of the same example only, padding attends to nothing.
+        attention_mask = (segment_ids[:, :, None] == segment_ids[:, None, :]) & (segment_ids[:, None, :] > 0)
+        batch["attention_mask"] = attention_mask.astype(np.int64)
+        batch["position_ids"] = position_ids
+        if self.return_segment_ids:
+            batch["segment_ids"] = segment_ids
+        return batch
+
+    def torch_call(self, features):
+        import torch
+
+        return {k: torch.from_numpy(v) for k, v in self.numpy_call(features).items()}
+
+    def tf_call(self, features):
+        import tensorflow as tf
+
+        return {k: tf.convert_to_tensor(v, dtype=tf.int64) for k, v in self.numpy_call(features).items()}
+
+
 def _torch_collate_batch(examples, tokenizer, pad_to_multiple_of: Optional[int] = None):
     """Collate `examples` into a batch, using the information in `tokenizer` for padding if necessary."""
     import numpy as np
@@ -867,21 +993,7 @@ class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
 
         batch_input = _torch_collate_batch(input_ids, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
 
-        mask_labels = []
-        for e in examples:
-            ref_tokens = []
-            for id in tolist(e["input_ids"]):
-                token = self.tokenizer._convert_id_to_token(id)
-                ref_tokens.append(token)
-
-            # For Chinese tokens, we need extra inf to mark sub-word, e.g [喜,欢]-> [喜，##欢]
-            if "chinese_ref" in e:
-                ref_pos = tolist(e["chinese_ref"])
-                len_seq = len(e["input_ids"])
-                for i in range(len_seq):
-                    if i in ref_pos:
-                        ref_tokens[i] = "##" + ref_tokens[i]
-            mask_labels.append(self._whole_word_mask(ref_tokens))
+        mask_labels = self._batch_whole_word_mask(examples)
         batch_mask = _torch_collate_batch(mask_labels, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
         inputs, labels = self.torch_mask_tokens(batch_input, batch_mask)
         return {"input_ids": inputs, "labels": labels}
@@ -895,21 +1007,7 @@ class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
 
         batch_input = _tf_collate_batch(input_ids, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
 
-        mask_labels = []
-        for e in examples:
-            ref_tokens = []
-            for id in tolist(e["input_ids"]):
-                token = self.tokenizer._convert_id_to_token(id)
-                ref_tokens.append(token)
-
-            # For Chinese tokens, we need extra inf to mark sub-word, e.g [喜,欢]-> [喜，##欢]
-            if "chinese_ref" in e:
-                ref_pos = tolist(e["chinese_ref"])
-                len_seq = len(e["input_ids"])
-                for i in range(len_seq):
-                    if i in ref_pos:
-                        ref_tokens[i] = "##" + ref_tokens[i]
-            mask_labels.append(self._whole_word_mask(ref_tokens))
+        mask_labels = self._batch_whole_word_mask(examples)
         batch_mask = _tf_collate_batch(mask_labels, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
         inputs, labels = self.tf_mask_tokens(batch_input, batch_mask)
         return {"input_ids": inputs, "labels": labels}
@@ -923,25 +1021,97 @@ class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
 
         batch_input = _numpy_collate_batch(input_ids, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
 
-        mask_labels = []
-        for e in examples:
-            ref_tokens = []
-            for id in tolist(e["input_ids"]):
-                token = self.tokenizer._convert_id_to_token(id)
-                ref_tokens.append(token)
-
-            # For Chinese tokens, we need extra inf to mark sub-word, e.g [喜,欢]-> [喜，##欢]
-            if "chinese_ref" in e:
-                ref_pos = tolist(e["chinese_ref"])
-                len_seq = len(e["input_ids"])
-                for i in range(len_seq):
-                    if i in ref_pos:
-                        ref_tokens[i] = "##" + ref_tokens[i]
-            mask_labels.append(self._whole_word_mask(ref_tokens))
+        mask_labels = self._batch_whole_word_mask(examples)
         batch_mask = _numpy_collate_batch(mask_labels, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
         inputs, labels = self.numpy_mask_tokens(batch_input, batch_mask)
         return {"input_ids": inputs, "labels": labels}
 
+    def _get_word_lookup_tables(self):
+        """
+        Returns two boolean arrays indexed by token id, indicating which tokens continue a word (prefixed with *##*)
+        and which tokens can't be masked (*[CLS]* and *[SEP]*). They are computed once over the whole vocabulary.
+        """
+        import numpy as np
+
+        vocab_size = len(self.tokenizer)
+        if getattr(self, "_word_lookup_tables", None) is None or len(self._word_lookup_tables[0]) != vocab_size:
+            tokens = self.tokenizer.convert_ids_to_tokens(list(range(vocab_size)))
+            is_subword = np.array([token is not None and token.startswith("##") for token in tokens], dtype=bool)
+            is_excluded = np.array([token == "[CLS]" or token == "[SEP]" for token in tokens], dtype=bool)
+            self._word_lookup_tables = (is_subword, is_excluded)
+        return self._word_lookup_tables
+
+    def _batch_whole_word_mask(self, examples: List[Dict[str, Any]], max_predictions=512) -> List[List[int]]:
+        """
+        Get 0/1 labels for masked tokens with whole word mask proxy for a batch of examples. This is a vectorized
+        version of `_whole_word_mask`: words are identified with a lookup table over the vocabulary and masked in a
+        uniformly random order as long as they fit in the number of tokens to predict, exactly like the sequential
+        version does.
+        """
+        import numpy as np
+
+        if not isinstance(self.tokenizer, (BertTokenizer, BertTokenizerFast)):
+            warnings.warn(
+                "DataCollatorForWholeWordMask is only suitable for BertTokenizer-like tokenizers. "
+                "Please refer to the documentation for more information."
+            )
+        is_subword, is_excluded = self._get_word_lookup_tables()
+
+        lengths = np.array([len(e["input_ids"]) for e in examples], dtype=np.int64)
+        batch_size, max_length = len(examples), max(int(lengths.max()), 1)
+        input_ids = np.zeros((batch_size, max_length), dtype=np.int64)
+        for i, e in enumerate(examples):
+            input_ids[i, : lengths[i]] = tolist(e["input_ids"])
+        valid = np.arange(max_length)[None, :] < lengths[:, None]
+        # Ids outside of the vocabulary are converted to the unknown token, which starts a word.
+        in_vocab = valid & (input_ids >= 0) & (input_ids < len(is_subword))
+        input_ids[~in_vocab] = 0
+        subword = is_subword[input_ids] & in_vocab
+        excluded = is_excluded[input_ids] & in_vocab
+        for i, e in enumerate(examples):
+            # For Chinese tokens, we need extra inf to mark sub-word, e.g [喜,欢]-> [喜，##欢]
+            if "chinese_ref" in e:
+                ref_pos = [pos for pos in tolist(e["chinese_ref"]) if 0 <= pos < lengths[i]]
+                subword[i, ref_pos] = True
+                excluded[i, ref_pos] = False
+
+        # A word starts at each candidate token that is not a sub-word, or at the first candidate of the sequence.
+        candidates = valid & ~excluded
+        word_starts = candidates & (~subword | (np.cumsum(candidates, axis=1) == 1))
+        word_ids = np.cumsum(word_starts, axis=1) - 1
+        num_words = word_starts.sum(axis=1)
+        max_words = max(int(num_words.max()), 1)
+        row_ids = np.broadcast_to(np.arange(batch_size)[:, None], word_ids.shape)
+        word_lengths = np.bincount(
+            (row_ids * max_words + word_ids)[candidates], minlength=batch_size * max_words
+        ).reshape(batch_size, max_words)
+
+        # Shuffle the words of each sequence, non-existing words are sorted last.
+        exists = np.arange(max_words)[None, :] < num_words[:, None]
+        order = np.argsort(np.where(exists, np.random.random_sample(exists.shape), 2.0), axis=1, kind="stable")
+        ordered_lengths = np.take_along_axis(word_lengths, order, axis=1)
+        available = np.take_along_axis(exists, order, axis=1)
+
+        # Greedily select the words in order, skipping the ones that don't fit in the number of tokens to predict. A
+        # word that doesn't fit never will, so each round selects the longest prefix of the words that still fit.
+        num_to_predict = np.round(lengths * self.mlm_probability).astype(np.int64)
+        remaining = np.minimum(max_predictions, np.maximum(1, num_to_predict))
+        selected = np.zeros_like(available)
+        while True:
+            available &= ordered_lengths <= remaining[:, None]
+            if not available.any():
+                break
+            cumulative_lengths = np.cumsum(np.where(available, ordered_lengths, 0), axis=1)
+            taken = available & (cumulative_lengths <= remaining[:, None])
+            selected |= taken
+            remaining -= np.where(taken, ordered_lengths, 0).sum(axis=1)
+            available &= ~taken
+
+        word_selected = np.zeros_like(selected)
+        np.put_along_axis(word_selected, order, selected, axis=1)
+        mask_labels = candidates & np.take_along_axis(word_selected, np.maximum(word_ids, 0), axis=1)
+        return [mask_labels[i, : lengths[i]].astype(np.int64).tolist() for i in range(batch_size)]
+
     def _whole_word_mask(self, input_tokens: List[str], max_predictions=512):
         """
         Get 0/1 labels for masked tokens with whole word mask proxy
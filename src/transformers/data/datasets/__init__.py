@@ -21,6 +21,8 @@ from .language_modeling import (
     LineByLineTextDataset,
     LineByLineWithRefDataset,
     LineByLineWithSOPTextDataset,
+    MemoryMappedTextDataset,
+    MemoryMappedTextDatasetForNextSentencePrediction,
     TextDataset,
     TextDatasetForNextSentencePrediction,
 )
@@ -13,12 +13,15 @@
 # limitations under the License.
 
 import os
+import shutil
+import tempfile
 import time
 import warnings
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
+import numpy as np
 import torch
 from torch.utils.data import Dataset
 
@@ -26,7 +29,12 @@ from filelock import FileLock
 
 from ...tokenization_utils_base import PreTrainedTokenizerBase
 from ...utils import logging
-from ..processors.glue import glue_convert_examples_to_features, glue_output_modes, glue_processors
+from ..processors.glue import (
+    glue_convert_examples_to_arrays,
+    glue_convert_examples_to_features,
+    glue_output_modes,
+    glue_processors,
+)
 from ..processors.utils import InputFeatures
 
 
@@ -56,6 +64,17 @@ class GlueDataTrainingArguments:
     overwrite_cache: bool = field(
         default=False, metadata={"help": "Overwrite the cached training and evaluation sets"}
     )
+    columnar_cache: bool = field(
+        default=False,
+        metadata={
+            "help": "Convert the examples by batches and cache the features as one memory-mapped array per input "
+            "instead of a pickled list of features."
+        },
+    )
+    preprocessing_num_workers: Optional[int] = field(
+        default=None,
+        metadata={"help": "The number of processes to use to convert the examples when using `columnar_cache`."},
+    )
 
     def __post_init__(self):
         self.task_name = self.task_name.lower()
@@ -67,6 +86,46 @@ class Split(Enum):
     test = "test"
 
 
+class ColumnarFeatures:
+    """
+    Read-only sequence of [`InputFeatures`] backed by one array per field, as returned by
+    [`~data.processors.glue.glue_convert_examples_to_arrays`]. The features are only created when accessed.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, i) -> InputFeatures:
+        return InputFeatures(**{k: v[i].tolist() for k, v in self.columns.items()})
+
+    def save(self, directory: str):
+        """
+        Saves each column in a `.npy` file of `directory`. The directory is written next to its final location and
+        renamed when complete, so it never contains partial data.
+        """
+        tmp_directory = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(directory)))
+        for name, column in self.columns.items():
+            np.save(os.path.join(tmp_directory, f"{name}.npy"), column)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp_directory, directory)
+
+    @classmethod
+    def load(cls, directory: str) -> "ColumnarFeatures":
+        """
+        Memory-maps the columns saved in `directory` with [`~ColumnarFeatures.save`].
+        """
+        columns = {
+            os.path.splitext(file_name)[0]: np.load(os.path.join(directory, file_name), mmap_mode="r")
+            for file_name in sorted(os.listdir(directory))
+            if file_name.endswith(".npy")
+        }
+        return cls(columns)
+
+
 class GlueDataset(Dataset):
     """
     This will be superseded by a framework-agnostic approach soon.
@@ -74,7 +133,7 @@ class GlueDataset(Dataset):
 
     args: GlueDataTrainingArguments
     output_mode: str
-    features: List[InputFeatures]
+    features: Union[List[InputFeatures], ColumnarFeatures]
 
     def __init__(
         self,
@@ -103,6 +162,8 @@ class GlueDataset(Dataset):
             cache_dir if cache_dir is not None else args.data_dir,
             f"cached_{mode.value}_{tokenizer.__class__.__name__}_{args.max_seq_length}_{args.task_name}",
         )
+        if args.columnar_cache:
+            cached_features_file += "_columns"
         label_list = self.processor.get_labels()
         if args.task_name in ["mnli", "mnli-mm"] and tokenizer.__class__.__name__ in (
             "RobertaTokenizer",
@@ -122,7 +183,10 @@ class GlueDataset(Dataset):
 
             if os.path.exists(cached_features_file) and not args.overwrite_cache:
                 start = time.time()
-                self.features = torch.load(cached_features_file)
+                if args.columnar_cache:
+                    self.features = ColumnarFeatures.load(cached_features_file)
+                else:
+                    self.features = torch.load(cached_features_file)
                 logger.info(
                     f"Loading features from cached file {cached_features_file} [took %.3f s]", time.time() - start
                 )
@@ -137,16 +201,32 @@ class GlueDataset(Dataset):
                     examples = self.processor.get_train_examples(args.data_dir)
                 if limit_length is not None:
                     examples = examples[:limit_length]
-                self.features = glue_convert_examples_to_features(
-                    examples,
-                    tokenizer,
-                    max_length=args.max_seq_length,
-                    label_list=label_list,
-                    output_mode=self.output_mode,
-                )
+                if args.columnar_cache:
+                    self.features = ColumnarFeatures(
+                        glue_convert_examples_to_arrays(
+                            examples,
+                            tokenizer,
+                            max_length=args.max_seq_length,
+                            label_list=label_list,
+                            output_mode=self.output_mode,
+                            num_proc=args.preprocessing_num_workers or 1,
+                        )
+                    )
+                else:
+                    self.features = glue_convert_examples_to_features(
+                        examples,
+                        tokenizer,
+                        max_length=args.max_seq_length,
+                        label_list=label_list,
+                        output_mode=self.output_mode,
+                    )
                 start = time.time()
-                torch.save(self.features, cached_features_file)
-                # ^ This seems to take a lot of time so I want to investigate why and how we can improve.
+                if args.columnar_cache:
+                    self.features.save(cached_features_file)
+                    self.features = ColumnarFeatures.load(cached_features_file)
+                else:
+                    torch.save(self.features, cached_features_file)
+                    # ^ This seems to take a lot of time so I want to investigate why and how we can improve.
                 logger.info(
                     f"Saving features into cached file {cached_features_file} [took {time.time() - start:.3f} s]"
                 )
@@ -12,7 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import glob
+import itertools
 import json
+import multiprocessing
 import os
 import pickle
 import random
@@ -20,6 +23,7 @@ import time
 import warnings
 from typing import Dict, List, Optional
 
+import numpy as np
 import torch
 from torch.utils.data import Dataset
 
@@ -31,6 +35,9 @@ from ...utils import logging
 
 logger = logging.get_logger(__name__)
 
+# Tokenizer of the processes spawned by `build_memory_mapped_token_file`
+_worker_tokenizer = None
+
 
 DEPRECATION_WARNING = (
     "This dataset will be removed from the library soon, preprocessing should be handled with the 🤗 Datasets "
@@ -112,6 +119,428 @@ class TextDataset(Dataset):
         return torch.tensor(self.examples[i], dtype=torch.long)
 
 
+def _tokenize_text(text: str, tokenizer: Optional[PreTrainedTokenizer] = None) -> np.ndarray:
+    """
+    Tokenizes a chunk of a text file the same way `TextDataset` tokenizes the whole file (without special tokens).
+    """
+    tokenizer = tokenizer if tokenizer is not None else _worker_tokenizer
+    return np.array(tokenizer.convert_tokens_to_ids(tokenizer.tokenize(text)), dtype=np.int64)
+
+
+def _tokenize_lines(text: str, tokenizer: Optional[PreTrainedTokenizer] = None):
+    """
+    Tokenizes each line of a chunk of a text file the same way `TextDatasetForNextSentencePrediction` does (without
+    special tokens), and returns the flat array of token ids, the number of tokens of each line and which lines are
+    blank (document boundaries).
+    """
+    tokenizer = tokenizer if tokenizer is not None else _worker_tokenizer
+    # Only split on "\n" like reading the file does (`str.splitlines` also splits on other characters).
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    lines = [line.strip() for line in lines]
+    input_ids = [tokenizer.convert_tokens_to_ids(tokenizer.tokenize(line)) for line in lines]
+    num_tokens = np.array([len(ids) for ids in input_ids], dtype=np.int64)
+    is_blank = np.array([len(line) == 0 for line in lines], dtype=bool)
+    tokens = np.fromiter(itertools.chain.from_iterable(input_ids), dtype=np.int64, count=int(num_tokens.sum()))
+    return tokens, num_tokens, is_blank
+
+
+def _init_tokenization_worker(tokenizer: PreTrainedTokenizer):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _is_chunk_boundary(line: str, next_line: str) -> bool:
+    # The tokenizers split the text on a line break between two non-whitespace characters, so chunks cut there are
+    # tokenized as they would be in the whole text. Cutting elsewhere can change the tokens, for instance runs of
+    # newlines are a single token for byte-level BPE tokenizers.
+    return len(line) >= 2 and line[-1] == "\n" and not line[-2].isspace() and not next_line[:1].isspace()
+
+
+def _read_chunks(file_path: str, chunk_size: int, line_by_line: bool = False):
+    with open(file_path, encoding="utf-8") as f:
+        lines = []
+        for line in f:
+            if len(lines) >= chunk_size and (line_by_line or _is_chunk_boundary(lines[-1], line)):
+                yield "".join(lines)
+                lines = []
+            lines.append(line)
+        if len(lines) > 0:
+            yield "".join(lines)
+
+
+def _is_valid_token_file(prefix: str, tokenizer: PreTrainedTokenizer) -> bool:
+    if not os.path.exists(f"{prefix}.bin"):
+        return False
+    with open(f"{prefix}.json", encoding="utf-8") as metadata_file:
+        metadata = json.load(metadata_file)
+    if metadata["tokenizer_class"] != tokenizer.__class__.__name__ or metadata["vocab_size"] != len(tokenizer):
+        logger.warning(
+            f"The cached token file {prefix}.bin was built with a {metadata['tokenizer_class']} of "
+            f"{metadata['vocab_size']} tokens instead of a {tokenizer.__class__.__name__} of {len(tokenizer)} tokens, "
+            "tokenizing the text file again."
+        )
+        return False
+    return True
+
+
+def _open_token_file(prefix: str) -> np.ndarray:
+    with open(prefix + ".json", encoding="utf-8") as metadata_file:
+        metadata = json.load(metadata_file)
+    # Empty files cannot be memory-mapped.
+    if metadata["num_tokens"] == 0:
+        return np.zeros(0, dtype=metadata["dtype"])
+    return np.memmap(prefix + ".bin", dtype=metadata["dtype"], mode="r")
+
+
+def build_memory_mapped_token_file(
+    tokenizer: PreTrainedTokenizer,
+    file_path: str,
+    output_prefix: str,
+    num_proc: int = 1,
+    chunk_size: int = 10000,
+    line_by_line: bool = False,
+):
+    """
+    Tokenizes a text file by chunks of lines, optionally in several processes, and writes the token ids as a flat array
+    of `uint16` (or `uint32` for vocabularies bigger than 65536 tokens) to `{output_prefix}.bin` and the metadata to
+    `{output_prefix}.json`. The token ids are the same as when tokenizing the whole file at once like `TextDataset`:
+    chunks are only cut at line breaks between two non-whitespace characters, where the tokenizers split the text
+    anyway. Only `num_proc` chunks are held in memory at once, so the memory used does not depend on the size of the
+    text file.
+
+    With `line_by_line=True`, each line is tokenized separately like `TextDatasetForNextSentencePrediction` does, and
+    the offsets (in tokens) of the non-empty lines and the offsets (in lines) of the documents, separated by blank
+    lines, are written to `{output_prefix}.idx.npz` as `line_offsets` and `document_offsets`.
+
+    Args:
+        tokenizer ([`PreTrainedTokenizer`] or [`PreTrainedTokenizerFast`]):
+            The tokenizer used to encode the text, special tokens are not added.
+        file_path (`str`):
+            The text file to tokenize.
+        output_prefix (`str`):
+            The prefix of the files to write.
+        num_proc (`int`, *optional*, defaults to 1):
+            The number of processes used to tokenize the text.
+        chunk_size (`int`, *optional*, defaults to 10000):
+            The minimum number of lines sent to a process at once.
+        line_by_line (`bool`, *optional*, defaults to `False`):
+            Whether to tokenize each line separately and write the index of the lines and documents.
+    """
+    dtype = np.uint16 if len(tokenizer) <= np.iinfo(np.uint16).max + 1 else np.uint32
+    tokenize_function = _tokenize_lines if line_by_line else _tokenize_text
+    num_tokens = 0
+    line_ends = []
+    document_offsets = [0]
+    num_lines = 0
+
+    tmp_bin_file = f"{output_prefix}.bin.tmp"
+    pool = None
+    if num_proc > 1:
+        pool = multiprocessing.Pool(num_proc, initializer=_init_tokenization_worker, initargs=(tokenizer,))
+    try:
+        with open(tmp_bin_file, "wb") as bin_file:
+            chunks = _read_chunks(file_path, chunk_size, line_by_line=line_by_line)
+            while True:
+                # Only `num_proc` chunks are read ahead to keep the memory flat.
+                window = list(itertools.islice(chunks, max(num_proc, 1)))
+                if len(window) == 0:
+                    break
+                if pool is not None:
+                    results = pool.map(tokenize_function, window)
+                else:
+                    results = [tokenize_function(text, tokenizer) for text in window]
+                for result in results:
+                    if line_by_line:
+                        tokens, line_num_tokens, is_blank = result
+                        # Lines without tokens are skipped, blank lines start a new document if the current one has
+                        # lines, like in `TextDatasetForNextSentencePrediction`.
+                        is_line = ~is_blank & (line_num_tokens > 0)
+                        line_ends.append(num_tokens + np.cumsum(line_num_tokens)[is_line])
+                        lines_before = num_lines + np.cumsum(is_line) - is_line
+                        for blank_index in np.nonzero(is_blank)[0]:
+                            if lines_before[blank_index] > document_offsets[-1]:
+                                document_offsets.append(int(lines_before[blank_index]))
+                        num_lines += int(is_line.sum())
+                    else:
+                        tokens = result
+                    bin_file.write(tokens.astype(dtype).tobytes())
+                    num_tokens += len(tokens)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if line_by_line:
+        np.savez(
+            f"{output_prefix}.idx.npz",
+            line_offsets=np.concatenate([np.zeros(1, dtype=np.int64)] + line_ends),
+            document_offsets=np.array(document_offsets + [num_lines], dtype=np.int64),
+        )
+    with open(f"{output_prefix}.json", "w", encoding="utf-8") as metadata_file:
+        json.dump(
+            {
+                "dtype": np.dtype(dtype).name,
+                "num_tokens": num_tokens,
+                "tokenizer_class": tokenizer.__class__.__name__,
+                "vocab_size": len(tokenizer),
+            },
+            metadata_file,
+        )
+    # The token file is renamed last, its presence means the files are complete.
+    os.replace(tmp_bin_file, f"{output_prefix}.bin")
+
+
+class MemoryMappedTextDataset(Dataset):
+    """
+    Dataset of contiguous blocks of tokens, giving the same examples as `TextDataset`, backed by a memory-mapped array
+    of token ids on disk instead of a pickled list of examples.
+
+    The text file is tokenized once (in `num_proc` processes, with a memory usage independent of its size) with
+    [`~data.datasets.language_modeling.build_memory_mapped_token_file`], then each block is read from the memory-mapped
+    file when accessed, so loading the dataset is instant and does not use memory proportional to the corpus. The cache
+    does not depend on the block size and can be shared between runs using different block sizes. It is tokenized again
+    if it was built with a tokenizer of another class or vocabulary size.
+
+    Args:
+        tokenizer ([`PreTrainedTokenizer`] or [`PreTrainedTokenizerFast`]):
+            The tokenizer used to encode the text.
+        file_path (`str`):
+            The text file to use.
+        block_size (`int`):
+            The length of the examples, special tokens included.
+        overwrite_cache (`bool`, *optional*, defaults to `False`):
+            Whether or not to tokenize the text file again if cached token files exist.
+        cache_dir (`str`, *optional*):
+            The directory in which the token files are cached. Defaults to the directory of `file_path`.
+        num_proc (`int`, *optional*, defaults to 1):
+            The number of processes used to tokenize the text file.
+    """
+
+    def __init__(
+        self,
+        tokenizer: PreTrainedTokenizer,
+        file_path: str,
+        block_size: int,
+        overwrite_cache=False,
+        cache_dir: Optional[str] = None,
+        num_proc: int = 1,
+    ):
+        if os.path.isfile(file_path) is False:
+            raise ValueError(f"Input file path {file_path} not found")
+
+        self.tokenizer = tokenizer
+        self.block_size = block_size - tokenizer.num_special_tokens_to_add(pair=False)
+
+        directory, filename = os.path.split(file_path)
+        cached_prefix = os.path.join(
+            cache_dir if cache_dir is not None else directory,
+            f"cached_lm_mmap_{tokenizer.__class__.__name__}_{filename}",
+        )
+
+        # Make sure only the first process in distributed training processes the dataset,
+        # and the others will use the cache.
+        lock_path = cached_prefix + ".lock"
+        with FileLock(lock_path):
+            if overwrite_cache or not _is_valid_token_file(cached_prefix, tokenizer):
+                logger.info(f"Creating token file from dataset file at {directory}")
+                start = time.time()
+                build_memory_mapped_token_file(tokenizer, file_path, cached_prefix, num_proc=num_proc)
+                logger.info(f"Saving tokens into cached file {cached_prefix}.bin [took {time.time() - start:.3f} s]")
+
+        self.cached_prefix = cached_prefix
+        self.tokens = _open_token_file(cached_prefix)
+
+    def __getstate__(self):
+        # Memory-mapped arrays would be pickled with all their content, so they are opened again instead (e.g. in the
+        # workers of a `DataLoader`).
+        state = self.__dict__.copy()
+        state.pop("tokens")
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tokens = _open_token_file(self.cached_prefix)
+
+    def __len__(self):
+        # Note that we are losing the last truncated example here for the sake of simplicity (no padding), like
+        # `TextDataset`.
+        return len(self.tokens) // self.block_size
+
+    def __getitem__(self, i) -> torch.Tensor:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Index {i} out of range for a dataset of {len(self)} blocks")
+        block = self.tokens[i * self.block_size : (i + 1) * self.block_size].tolist()
+        return torch.tensor(self.tokenizer.build_inputs_with_special_tokens(block), dtype=torch.long)
+
+
+class MemoryMappedTextDatasetForNextSentencePrediction(Dataset):
+    """
+    Dataset of sentence pairs for next sentence prediction, giving the same examples as
+    `TextDatasetForNextSentencePrediction` for the same random state, backed by a memory-mapped array of token ids on
+    disk instead of a pickled list of examples.
+
+    The text file (one sentence per line, documents separated by blank lines) is tokenized once line by line with
+    [`~data.datasets.language_modeling.build_memory_mapped_token_file`], which also writes the offsets of the lines and
+    documents. The examples only hold the offsets of their two sentences in the token file (and their label), they are
+    cached for each block size and read from the memory-mapped file when accessed. The token file is tokenized again
+    (and the examples sampled again) if it was built with a tokenizer of another class or vocabulary size.
+
+    Args:
+        tokenizer ([`PreTrainedTokenizer`] or [`PreTrainedTokenizerFast`]):
+            The tokenizer used to encode the text.
+        file_path (`str`):
+            The text file to use.
+        block_size (`int`):
+            The maximum length of the examples, special tokens included.
+        overwrite_cache (`bool`, *optional*, defaults to `False`):
+            Whether or not to tokenize the text file and sample the examples again if cached files exist.
+        short_seq_probability (`float`, *optional*, defaults to 0.1):
+            The probability of using a random target length shorter than `block_size` for the examples of a document.
+        nsp_probability (`float`, *optional*, defaults to 0.5):
+            The probability of the second sentence being taken from a random document.
+        cache_dir (`str`, *optional*):
+            The directory in which the token files are cached. Defaults to the directory of `file_path`.
+        num_proc (`int`, *optional*, defaults to 1):
+            The number of processes used to tokenize the text file.
+    """
+
+    def __init__(
+        self,
+        tokenizer: PreTrainedTokenizer,
+        file_path: str,
+        block_size: int,
+        overwrite_cache=False,
+        short_seq_probability=0.1,
+        nsp_probability=0.5,
+        cache_dir: Optional[str] = None,
+        num_proc: int = 1,
+    ):
+        if not os.path.isfile(file_path):
+            raise ValueError(f"Input file path {file_path} not found")
+
+        self.tokenizer = tokenizer
+        self.short_seq_probability = short_seq_probability
+        self.nsp_probability = nsp_probability
+
+        directory, filename = os.path.split(file_path)
+        cached_prefix = os.path.join(
+            cache_dir if cache_dir is not None else directory,
+            f"cached_nsp_mmap_{tokenizer.__class__.__name__}_{filename}",
+        )
+        cached_examples_file = f"{cached_prefix}_{block_size}.examples.npy"
+
+        # Make sure only the first process in distributed training processes the dataset,
+        # and the others will use the cache.
+        lock_path = cached_prefix + ".lock"
+        with FileLock(lock_path):
+            if overwrite_cache or not _is_valid_token_file(cached_prefix, tokenizer):
+                logger.info(f"Creating token file from dataset file at {directory}")
+                start = time.time()
+                # The examples sampled from the previous token file are stale.
+                for examples_file in glob.glob(f"{glob.escape(cached_prefix)}_*.examples.npy"):
+                    os.remove(examples_file)
+                build_memory_mapped_token_file(
+                    tokenizer, file_path, cached_prefix, num_proc=num_proc, line_by_line=True
+                )
+                logger.info(f"Saving tokens into cached file {cached_prefix}.bin [took {time.time() - start:.3f} s]")
+
+            if overwrite_cache or not os.path.exists(cached_examples_file):
+                index = np.load(f"{cached_prefix}.idx.npz")
+                line_offsets, document_offsets = index["line_offsets"], index["document_offsets"]
+                logger.info(f"Creating examples from {len(document_offsets) - 1} documents.")
+                examples = self.create_examples(line_offsets.tolist(), document_offsets.tolist(), block_size)
+                np.save(cached_examples_file, examples)
+
+        self.cached_prefix = cached_prefix
+        self.tokens = _open_token_file(cached_prefix)
+        self.examples = np.load(cached_examples_file)
+
+    def create_examples(self, line_offsets: List[int], document_offsets: List[int], block_size: int) -> np.ndarray:
+        """
+        Samples the examples of all the documents exactly like
+        [`~TextDatasetForNextSentencePrediction.create_examples_from_document`], and returns them as an array of
+        `(a_start, a_end, b_start, b_end, next_sentence_label)` rows, the sentences being the tokens between the
+        offsets.
+        """
+        max_num_tokens = block_size - self.tokenizer.num_special_tokens_to_add(pair=True)
+        num_documents = len(document_offsets) - 1
+        examples = []
+        for doc_index in range(num_documents):
+            first_line, end_line = document_offsets[doc_index], document_offsets[doc_index + 1]
+            target_seq_length = max_num_tokens
+            if random.random() < self.short_seq_probability:
+                target_seq_length = random.randint(2, max_num_tokens)
+
+            # The lines of a document are contiguous in the token file, so a chunk of lines is a range of tokens.
+            chunk_start = first_line
+            i = first_line
+            while i < end_line:
+                if i == end_line - 1 or line_offsets[i + 1] - line_offsets[chunk_start] >= target_seq_length:
+                    num_chunk_lines = i + 1 - chunk_start
+                    a_end = 1
+                    if num_chunk_lines >= 2:
+                        a_end = random.randint(1, num_chunk_lines - 1)
+                    a_start_offset, a_end_offset = line_offsets[chunk_start], line_offsets[chunk_start + a_end]
+
+                    if num_chunk_lines == 1 or random.random() < self.nsp_probability:
+                        is_random_next = True
+                        target_b_length = target_seq_length - (a_end_offset - a_start_offset)
+                        for _ in range(10):
+                            random_document_index = random.randint(0, num_documents - 1)
+                            if random_document_index != doc_index:
+                                break
+                        random_first_line = document_offsets[random_document_index]
+                        random_end_line = document_offsets[random_document_index + 1]
+                        random_start = random_first_line + random.randint(0, random_end_line - random_first_line - 1)
+                        j = random_start
+                        while (
+                            j < random_end_line - 1
+                            and line_offsets[j + 1] - line_offsets[random_start] < target_b_length
+                        ):
+                            j += 1
+                        b_start_offset, b_end_offset = line_offsets[random_start], line_offsets[j + 1]
+                        # The lines of the chunk not used in the first sentence are put back.
+                        i -= num_chunk_lines - a_end
+                    else:
+                        is_random_next = False
+                        b_start_offset, b_end_offset = a_end_offset, line_offsets[i + 1]
+
+                    examples.append((a_start_offset, a_end_offset, b_start_offset, b_end_offset, int(is_random_next)))
+                    chunk_start = i + 1
+                i += 1
+        return np.array(examples, dtype=np.int64).reshape(-1, 5)
+
+    def __getstate__(self):
+        # Memory-mapped arrays would be pickled with all their content, so they are opened again instead (e.g. in the
+        # workers of a `DataLoader`).
+        state = self.__dict__.copy()
+        state.pop("tokens")
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tokens = _open_token_file(self.cached_prefix)
+
+    def __len__(self):
+        return len(self.examples)
+
+    def __getitem__(self, i) -> Dict[str, torch.Tensor]:
+        a_start, a_end, b_start, b_end, next_sentence_label = self.examples[i].tolist()
+        tokens_a = self.tokens[a_start:a_end].tolist()
+        tokens_b = self.tokens[b_start:b_end].tolist()
+        input_ids = self.tokenizer.build_inputs_with_special_tokens(tokens_a, tokens_b)
+        token_type_ids = self.tokenizer.create_token_type_ids_from_sequences(tokens_a, tokens_b)
+        return {
+            "input_ids": torch.tensor(input_ids, dtype=torch.long),
+            "token_type_ids": torch.tensor(token_type_ids, dtype=torch.long),
+            "next_sentence_label": torch.tensor(next_sentence_label, dtype=torch.long),
+        }
+
+
 class LineByLineTextDataset(Dataset):
     """
     This will be superseded by a framework-agnostic approach soon.
@@ -15,11 +15,14 @@
 # limitations under the License.
 """ GLUE processors and helpers"""
 
+import multiprocessing
 import os
 import warnings
 from dataclasses import asdict
 from enum import Enum
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
+
+import numpy as np
 
 from ...file_utils import is_tf_available
 from ...tokenization_utils import PreTrainedTokenizer
@@ -32,6 +35,9 @@ if is_tf_available():
 
 logger = logging.get_logger(__name__)
 
+# Tokenizer of the processes spawned by `glue_convert_examples_to_arrays`
+_worker_tokenizer = None
+
 DEPRECATION_WARNING = (
     "This {0} will be removed from the library soon, preprocessing should be handled with the 🤗 Datasets "
     "library. You can have a look at this example script for pointers: "
@@ -107,19 +113,12 @@ if is_tf_available():
         )
 
 
-def _glue_convert_examples_to_features(
-    examples: List[InputExample],
-    tokenizer: PreTrainedTokenizer,
-    max_length: Optional[int] = None,
-    task=None,
-    label_list=None,
-    output_mode=None,
-):
-    if max_length is None:
-        max_length = tokenizer.model_max_length
-
+def _glue_labels(examples: List[InputExample], task=None, label_list=None, output_mode=None):
     if task is not None:
-        processor = glue_processors[task]()
+        # Only the labels of the processor are needed, its deprecation warning is not relevant here.
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            processor = glue_processors[task]()
         if label_list is None:
             label_list = processor.get_labels()
             logger.info(f"Using label list {label_list} for task {task}")
@@ -138,7 +137,21 @@ def _glue_convert_examples_to_features(
             return float(example.label)
         raise KeyError(output_mode)
 
-    labels = [label_from_example(example) for example in examples]
+    return [label_from_example(example) for example in examples]
+
+
+def _glue_convert_examples_to_features(
+    examples: List[InputExample],
+    tokenizer: PreTrainedTokenizer,
+    max_length: Optional[int] = None,
+    task=None,
+    label_list=None,
+    output_mode=None,
+):
+    if max_length is None:
+        max_length = tokenizer.model_max_length
+
+    labels = _glue_labels(examples, task=task, label_list=label_list, output_mode=output_mode)
 
     batch_encoding = tokenizer(
         [(example.text_a, example.text_b) for example in examples],
@@ -162,6 +175,75 @@ def _glue_convert_examples_to_features(
     return features
 
 
+def _init_tokenization_worker(tokenizer: PreTrainedTokenizer):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _encode_text_pairs(text_pairs, max_length: int, tokenizer: Optional[PreTrainedTokenizer] = None):
+    tokenizer = tokenizer if tokenizer is not None else _worker_tokenizer
+    batch_encoding = tokenizer(
+        text_pairs, max_length=max_length, padding="max_length", truncation=True, return_tensors="np"
+    )
+    return {k: v.astype(np.int32) for k, v in batch_encoding.items()}
+
+
+def glue_convert_examples_to_arrays(
+    examples: List[InputExample],
+    tokenizer: PreTrainedTokenizer,
+    max_length: Optional[int] = None,
+    task=None,
+    label_list=None,
+    output_mode=None,
+    batch_size: int = 1000,
+    num_proc: int = 1,
+) -> Dict[str, np.ndarray]:
+    """
+    Converts examples into a columnar set of features: one array per model input, of shape `(num_examples,
+    max_length)`, plus a `label` array if the examples are labeled. This is equivalent to
+    [`~data.processors.glue.glue_convert_examples_to_features`] but the examples are tokenized by batches of
+    `batch_size`, optionally in `num_proc` processes, and no Python object is created per example.
+
+    Args:
+        examples: List of `InputExamples` containing the examples.
+        tokenizer: Instance of a tokenizer that will tokenize the examples
+        max_length: Maximum example length. Defaults to the tokenizer's max_len
+        task: GLUE task
+        label_list: List of labels. Can be obtained from the processor using the `processor.get_labels()` method
+        output_mode: String indicating the output mode. Either `regression` or `classification`
+        batch_size: Number of examples tokenized in one call to the tokenizer
+        num_proc: Number of processes used to tokenize the examples. Fast tokenizers already use several threads for
+            each batch, so this is mostly useful for slow tokenizers.
+
+    Returns:
+        A dictionary mapping each model input (and `label`) to an array, `int32` for the inputs, `int64` or `float32`
+        for the labels depending on the output mode.
+    """
+    if max_length is None:
+        max_length = tokenizer.model_max_length
+
+    labels = _glue_labels(examples, task=task, label_list=label_list, output_mode=output_mode)
+
+    text_pairs = [(example.text_a, example.text_b) for example in examples]
+    batches = [text_pairs[i : i + batch_size] for i in range(0, len(text_pairs), batch_size)]
+    if num_proc > 1 and len(batches) > 1:
+        with multiprocessing.Pool(
+            min(num_proc, len(batches)), initializer=_init_tokenization_worker, initargs=(tokenizer,)
+        ) as pool:
+            encodings = pool.starmap(_encode_text_pairs, [(batch, max_length) for batch in batches])
+    else:
+        encodings = [_encode_text_pairs(batch, max_length, tokenizer) for batch in batches]
+
+    if len(encodings) == 0:
+        arrays = {k: np.zeros((0, max_length), dtype=np.int32) for k in tokenizer.model_input_names}
+    else:
+        arrays = {k: np.concatenate([encoding[k] for encoding in encodings]) for k in encodings[0]}
+    if len(labels) > 0 and all(label is not None for label in labels):
+        arrays["label"] = np.array(labels, dtype=np.float32 if isinstance(labels[0], float) else np.int64)
+
+    return arrays
+
+
 class OutputMode(Enum):
     classification = "classification"
     regression = "regression"
@@ -332,6 +332,13 @@ def is_offline_mode():
     return _is_offline_mode
 
 
+_is_tokenizer_cache_enabled = os.environ.get("TRANSFORMERS_TOKENIZER_CACHE", "0").upper() in ENV_VARS_TRUE_VALUES
+
+
+def is_tokenizer_cache_enabled():
+    return _is_tokenizer_cache_enabled
+
+
 def is_torch_available():
     return _torch_available
 
@@ -0,0 +1,394 @@
+# coding=utf-8
+# Copyright 2022 The HuggingFace Team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Selective gradient checkpointing and offloading of activations for PyTorch models.
+"""
+import inspect
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import torch
+import torch.utils.checkpoint
+from torch import nn
+
+from .utils import logging
+from .utils.versions import require_version
+
+
+logger = logging.get_logger(__name__)
+
+
+@dataclass
+class GradientCheckpointingPolicy:
+    """
+    Selects the layers of a model that are checkpointed by [`~PreTrainedModel.gradient_checkpointing_enable`], and how.
+
+    The layers are the blocks of the encoders and decoders of the models that support gradient checkpointing (for
+    instance `encoder.layer.3` for BERT, `h.3` for GPT-2, `decoder.block.3` for T5 or `decoder.layers.3` for BART).
+    Checkpointing a layer frees the activations it saves for the backward pass and recomputes them during the backward
+    pass, which trades compute for memory: checkpointing less layers, or only their attention, recomputes less for a
+    smaller memory saving.
+
+    Args:
+        every_k_layers (`int`, *optional*, defaults to 1):
+            Checkpoints one layer out of `every_k_layers` in each stack of layers (the first one, then the
+            `k+1`-th...).
+        layers (`List[str]`, *optional*):
+            The names of the layers to checkpoint, overrides `every_k_layers`. Use
+            [`~GradientCheckpointingPolicy.from_memory_budget`] to select them to fit a memory budget.
+        submodules (`str`, *optional*, defaults to `"layer"`):
+            What is checkpointed in the selected layers: `"layer"` recomputes the whole layer, and `"attention"` only
+            its attention modules (self and cross-attention), whose attention probabilities are the largest activations
+            for long sequences. The attention modules are the outermost modules whose class name contains
+            `"Attention"`, so the layer norm and dropout that some models wrap with the attention (like
+            `T5LayerSelfAttention`) are recomputed with it.
+        offload_to_cpu (`bool`, *optional*, defaults to `False`):
+            Whether to move the activations saved by all the layers (only their inputs for the checkpointed ones) to
+            CPU memory during the forward pass. They are moved back to the device of the model during the backward
+            pass, one layer ahead of the one that needs them to overlap the copies with the computation. Needs
+            PyTorch>=1.10.
+        pin_memory (`bool`, *optional*, defaults to `True`):
+            Whether to offload activations to pinned memory, which is needed for the copies to be asynchronous.
+    """
+
+    every_k_layers: int = 1
+    layers: Optional[List[str]] = None
+    submodules: str = "layer"
+    offload_to_cpu: bool = False
+    pin_memory: bool = True
+
+    def __post_init__(self):
+        if self.every_k_layers < 1:
+            raise ValueError(f"`every_k_layers` should be at least 1, got {self.every_k_layers}.")
+        if self.submodules not in ["layer", "attention"]:
+            raise ValueError(f"`submodules` should be 'layer' or 'attention', got {self.submodules}.")
+
+    @classmethod
+    def from_memory_budget(cls, model: nn.Module, inputs: Dict, max_memory: int, **kwargs):
+        """
+        Selects the layers to checkpoint so that the activations saved by the layers of `model` fit in `max_memory`.
+
+        The activations saved by each layer are measured with a forward pass of `model` on `inputs` (in training mode),
+        and the layers saving the most are checkpointed until the activations of the other layers fit in the budget.
+        The inputs of the checkpointed layers, which are kept, are not counted.
+
+        Args:
+            model ([`PreTrainedModel`]):
+                The model to checkpoint.
+            inputs (`Dict`):
+                A batch of inputs of the size used for training.
+            max_memory (`int`):
+                The memory budget (in bytes) for the activations saved by the layers.
+            kwargs:
+                The other arguments of the policy.
+
+        Returns:
+            [`GradientCheckpointingPolicy`]: The policy checkpointing the selected layers.
+        """
+        memory = get_layers_activation_memory(model, inputs)
+        total_memory = sum(memory.values())
+        layers = []
+        for name in sorted(memory, key=lambda name: memory[name], reverse=True):
+            if total_memory <= max_memory:
+                break
+            layers.append(name)
+            total_memory -= memory[name]
+        logger.info(
+            f"Checkpointing {len(layers)} out of {len(memory)} layers, their activations go from "
+            f"{sum(memory.values()) / 2 ** 20:.1f}MB to {total_memory / 2 ** 20:.1f}MB."
+        )
+        return cls(layers=layers, **kwargs)
+
+
+def get_checkpointable_layers(model: nn.Module) -> "OrderedDict[str, nn.Module]":
+    """
+    Returns the layers of the stacks of `model` supporting gradient checkpointing, by name: the modules in the list of
+    layers of each module with a `gradient_checkpointing` attribute.
+    """
+    layers = OrderedDict()
+    for name, module in model.named_modules():
+        if not hasattr(module, "gradient_checkpointing"):
+            continue
+        layer_lists = [
+            (child_name, child) for child_name, child in module.named_children() if isinstance(child, nn.ModuleList)
+        ]
+        if len(layer_lists) != 1:
+            continue
+        list_name, layer_list = layer_lists[0]
+        prefix = f"{name}.{list_name}" if name else list_name
+        for i, layer in enumerate(layer_list):
+            layers[f"{prefix}.{i}"] = layer
+    return layers
+
+
+def get_layers_activation_memory(model: nn.Module, inputs: Dict) -> Dict[str, int]:
+    """
+    Measures the memory (in bytes) of the activations each layer of `model` saves for the backward pass, with a forward
+    pass on `inputs` in training mode.
+    """
+    require_version("torch>=1.10", "Measuring the activations saved for the backward pass needs torch>=1.10")
+    layers = get_checkpointable_layers(model)
+    memory = OrderedDict((name, 0) for name in layers)
+    parameters = {p.data_ptr() for p in model.parameters()}
+    seen = set()
+    current_layer = [None]
+
+    def pack(tensor):
+        if current_layer[0] is not None and tensor.data_ptr() not in parameters and tensor.data_ptr() not in seen:
+            seen.add(tensor.data_ptr())
+            memory[current_layer[0]] += tensor.numel() * tensor.element_size()
+        return tensor
+
+    def enter(name):
+        def hook(module, inputs):
+            current_layer[0] = name
+
+        return hook
+
+    def leave(module, inputs, outputs):
+        current_layer[0] = None
+
+    handles = []
+    for name, layer in layers.items():
+        handles.append(layer.register_forward_pre_hook(enter(name)))
+        handles.append(layer.register_forward_hook(leave))
+    training = model.training
+    model.train()
+    try:
+        with torch.enable_grad(), torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+            model(**inputs)
+    finally:
+        model.train(training)
+        for handle in handles:
+            handle.remove()
+    return memory
+
+
+class _OffloadedActivations:
+    """
+    The activations saved by one call of a layer, moved to CPU memory when they are saved and back to their device when
+    they are needed. Unpacking the first of them also prefetches the activations of the layer called before, which are
+    the next ones needed by the backward pass.
+    """
+
+    def __init__(self, pin_memory, parameters, previous=None):
+        self.pin_memory = pin_memory
+        self.parameters = parameters
+        self.previous = weakref.ref(previous) if previous is not None else None
+        self.saved = []
+        self.prefetched = False
+        self.unpacked = False
+
+    def pack(self, tensor):
+        # Parameters are in device memory anyway
+        if tensor.device.type == "cpu" or tensor.data_ptr() in self.parameters:
+            return tensor
+        cpu_tensor = torch.empty(
+            tensor.size(), dtype=tensor.dtype, layout=tensor.layout, pin_memory=self.pin_memory, device="cpu"
+        )
+        cpu_tensor.copy_(tensor, non_blocking=self.pin_memory)
+        record = [cpu_tensor, tensor.device, None, None]
+        self.saved.append(record)
+        return record
+
+    def prefetch(self):
+        if self.prefetched or len(self.saved) == 0:
+            return
+        self.prefetched = True
+        device = self.saved[0][1]
+        if device.type != "cuda":
+            return
+        stream = torch.cuda.Stream(device)
+        stream.wait_stream(torch.cuda.current_stream(device))
+        with torch.cuda.stream(stream):
+            for record in self.saved:
+                record[2] = record[0].to(record[1], non_blocking=self.pin_memory)
+                record[3] = torch.cuda.Event()
+                record[3].record(stream)
+
+    def unpack(self, record):
+        if torch.is_tensor(record):
+            return record
+        if not self.unpacked:
+            self.unpacked = True
+            previous = self.previous() if self.previous is not None else None
+            if previous is not None:
+                previous.prefetch()
+        cpu_tensor, device, tensor, event = record
+        if tensor is None:
+            return cpu_tensor.to(device, non_blocking=self.pin_memory)
+        current_stream = torch.cuda.current_stream(device)
+        current_stream.wait_event(event)
+        tensor.record_stream(current_stream)
+        record[2] = None
+        return tensor
+
+
+class _PolicyForward:
+    """
+    Replaces the `forward` of a module to checkpoint it and/or offload the activations it saves, in training mode. With
+    `disable_cache`, the module is a stack of layers and its `use_cache` argument is forced to `False` like the default
+    gradient checkpointing does, since the layers it checkpoints cannot return their key/value states.
+    """
+
+    def __init__(self, forward, checkpoint=False, offloader=None, disable_cache=False):
+        self.forward = forward
+        self.checkpoint = checkpoint
+        self.offloader = offloader
+        self.disable_cache = disable_cache
+        self.hook_handle = None
+        # Modules about to run, by thread, set by `_set_calling_module`.
+        self.calling_modules = {}
+
+    def __call__(self, *args, **kwargs):
+        module = self.calling_modules.pop(threading.get_ident(), self.forward.__self__)
+        # `nn.DataParallel` replicas are shallow copies of the module sharing this forward, bound to the module.
+        forward = self.forward if module is self.forward.__self__ else type(module).forward.__get__(module)
+        if not (module.training and torch.is_grad_enabled()):
+            return forward(*args, **kwargs)
+        if self.disable_cache:
+            use_cache = kwargs.get("use_cache", None)
+            if use_cache is None:
+                use_cache = getattr(getattr(module, "config", None), "use_cache", False)
+            if use_cache:
+                logger.warning(
+                    "`use_cache=True` is incompatible with gradient checkpointing. Setting `use_cache=False`..."
+                )
+            kwargs["use_cache"] = False
+        if self.offloader is None:
+            return self._forward(forward, *args, **kwargs)
+        with self.offloader.saved_tensors_hooks(module):
+            return self._forward(forward, *args, **kwargs)
+
+    def _forward(self, forward, *args, **kwargs):
+        if not self.checkpoint:
+            return forward(*args, **kwargs)
+        # Tensors given as keyword arguments are inputs of the checkpoint too, for their gradients to be computed.
+        tensor_names = [name for name, value in kwargs.items() if torch.is_tensor(value)]
+        other_kwargs = {name: value for name, value in kwargs.items() if name not in tensor_names}
+        num_args = len(args)
+
+        def custom_forward(*inputs):
+            tensor_kwargs = dict(zip(tensor_names, inputs[num_args:]))
+            return forward(*inputs[:num_args], **other_kwargs, **tensor_kwargs)
+
+        return torch.utils.checkpoint.checkpoint(custom_forward, *args, *(kwargs[name] for name in tensor_names))
+
+
+def _set_calling_module(module, inputs):
+    policy_forward = module.__dict__.get("forward", None)
+    if isinstance(policy_forward, _PolicyForward):
+        policy_forward.calling_modules[threading.get_ident()] = module
+
+
+def _set_policy_forward(module, **kwargs):
+    module.forward = _PolicyForward(module.forward, **kwargs)
+    module.forward.hook_handle = module.register_forward_pre_hook(_set_calling_module)
+
+
+class _ActivationOffloader:
+    def __init__(self, pin_memory):
+        self.pin_memory = pin_memory and torch.cuda.is_available()
+        self._last_activations = None
+
+    def saved_tensors_hooks(self, module):
+        previous = self._last_activations() if self._last_activations is not None else None
+        # Only chain the layers of the same forward pass
+        if previous is not None and previous.unpacked:
+            previous = None
+        activations = _OffloadedActivations(
+            self.pin_memory, {p.data_ptr() for p in module.parameters()}, previous=previous
+        )
+        self._last_activations = weakref.ref(activations)
+        return torch.autograd.graph.saved_tensors_hooks(activations.pack, activations.unpack)
+
+
+def _find_attention_modules(module: nn.Module) -> List[nn.Module]:
+    """
+    Returns the outermost submodules of `module` whose class name contains `"Attention"`. They include what some models
+    wrap with the attention, like the layer norm and dropout of `T5LayerSelfAttention`.
+    """
+    attention_modules = []
+    for child in module.children():
+        if "Attention" in child.__class__.__name__:
+            attention_modules.append(child)
+        else:
+            attention_modules.extend(_find_attention_modules(child))
+    return attention_modules
+
+
+def apply_gradient_checkpointing_policy(model: nn.Module, policy: GradientCheckpointingPolicy):
+    """
+    Checkpoints the layers of `model` selected by `policy`, and offloads their activations if requested.
+    """
+    layers = get_checkpointable_layers(model)
+    if len(layers) == 0:
+        raise ValueError(f"{model.__class__.__name__} has no layers supporting gradient checkpointing policies.")
+    if policy.layers is not None:
+        unknown_layers = [name for name in policy.layers if name not in layers]
+        if len(unknown_layers) > 0:
+            raise ValueError(
+                f"Unknown layers {', '.join(unknown_layers)} in the gradient checkpointing policy, the layers of "
+                f"{model.__class__.__name__} are {', '.join(layers)}."
+            )
+        checkpointed_layers = set(policy.layers)
+    else:
+        checkpointed_layers = {name for name in layers if int(name.rsplit(".", 1)[1]) % policy.every_k_layers == 0}
+
+    offloader = None
+    if policy.offload_to_cpu:
+        require_version("torch>=1.10", "Offloading activations to CPU needs torch>=1.10")
+        offloader = _ActivationOffloader(policy.pin_memory)
+
+    for name, layer in layers.items():
+        checkpoint_layer = name in checkpointed_layers
+        if checkpoint_layer and policy.submodules == "attention":
+            attention_modules = _find_attention_modules(layer)
+            if len(attention_modules) == 0:
+                raise ValueError(f"No attention module found in {name} ({layer.__class__.__name__}).")
+            for attention_module in attention_modules:
+                _set_policy_forward(attention_module, checkpoint=True)
+            checkpoint_layer = False
+        if checkpoint_layer or offloader is not None:
+            _set_policy_forward(layer, checkpoint=checkpoint_layer, offloader=offloader)
+
+    # The stacks of the checkpointed layers cannot use the cache, like with the default gradient checkpointing.
+    modules = dict(model.named_modules())
+    stack_names = {name.rsplit(".", 2)[0] if name.count(".") > 1 else "" for name in checkpointed_layers}
+    for stack_name in stack_names:
+        stack = modules[stack_name]
+        if "use_cache" in inspect.signature(stack.forward).parameters:
+            _set_policy_forward(stack, disable_cache=True)
+
+
+def remove_gradient_checkpointing_policy(model: nn.Module):
+    """
+    Restores the modules of `model` changed by [`apply_gradient_checkpointing_policy`].
+    """
+    for module in model.modules():
+        policy_forward = module.__dict__.get("forward", None)
+        if isinstance(policy_forward, _PolicyForward):
+            policy_forward.hook_handle.remove()
+            del module.forward
+
+
+def has_gradient_checkpointing_policy(model: nn.Module) -> bool:
+    return any(
+        isinstance(module.__dict__.get("forward", None), _PolicyForward) and module.forward.checkpoint
+        for module in model.modules()
+    )
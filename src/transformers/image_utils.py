@@ -184,6 +184,50 @@ class ImageFeatureExtractionMixin:
         else:
             return (image - mean) / std
 
+    def normalize_batch(self, images, mean, std):
+        """
+        Normalizes a batch of `uint8` images with `mean` and `std` in a single vectorized operation, and puts the
+        channel dimension first. Gives the same values as [`~ImageFeatureExtractionMixin.normalize`] applied to each
+        image converted with [`~ImageFeatureExtractionMixin.to_numpy_array`].
+
+        Args:
+            images (`np.ndarray` or `torch.Tensor`):
+                The images to normalize, of shape (batch_size, height, width, num_channels).
+            mean (`List[float]` or `np.ndarray` or `torch.Tensor`):
+                The mean (per channel) to use for normalization.
+            std (`List[float]` or `np.ndarray` or `torch.Tensor`):
+                The standard deviation (per channel) to use for normalization.
+
+        Returns:
+            `np.ndarray` or `torch.Tensor`: The `float32` normalized images, of shape (batch_size, num_channels,
+            height, width).
+        """
+        if is_torch_tensor(images):
+            import torch
+
+            mean = torch.as_tensor(mean, dtype=torch.float32, device=images.device)[:, None, None]
+            std = torch.as_tensor(std, dtype=torch.float32, device=images.device)[:, None, None]
+            # Moving channels first is cheaper on `uint8` values, the conversion then allocates the only float buffer.
+            images = images.permute(0, 3, 1, 2).to(torch.float32, memory_format=torch.contiguous_format)
+            return images.div_(255.0).sub_(mean).div_(std)
+
+        mean = np.asarray(mean, dtype=np.float32)[:, None, None]
+        std = np.asarray(std, dtype=np.float32)[:, None, None]
+        images = np.ascontiguousarray(images.transpose(0, 3, 1, 2)).astype(np.float32)
+        images /= 255.0
+        images -= mean
+        images /= std
+        return images
+
+    @property
+    def supports_batched_normalization(self) -> bool:
+        """
+        `bool`: Whether images can be prepared with the `resize_and_crop` method of the feature extractor (applying its
+        resizing and cropping steps to a PIL image, without normalizing it), then normalized as a batch with
+        [`~ImageFeatureExtractionMixin.normalize_batch`], instead of calling the feature extractor.
+        """
+        return getattr(self, "do_normalize", False) and hasattr(self, "resize_and_crop")
+
     def resize(self, image, size, resample=PIL.Image.BILINEAR):
         """
         Resizes `image`. Note that this will trigger a conversion of `image` to a PIL Image.
@@ -52,6 +52,12 @@ from .file_utils import (
     replace_return_docstrings,
 )
 from .generation_utils import GenerationMixin
+from .gradient_checkpointing_utils import (
+    GradientCheckpointingPolicy,
+    apply_gradient_checkpointing_policy,
+    has_gradient_checkpointing_policy,
+    remove_gradient_checkpointing_policy,
+)
 from .utils import logging
 from .utils.versions import require_version_core
 
@@ -960,16 +966,35 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
 
         self.base_model._prune_heads(heads_to_prune)
 
-    def gradient_checkpointing_enable(self):
+    def gradient_checkpointing_enable(self, policy: Optional[GradientCheckpointingPolicy] = None):
         """
         Activates gradient checkpointing for the current model.
 
         Note that in other frameworks this feature can be referred to as "activation checkpointing" or "checkpoint
         activations".
+
+        Args:
+            policy ([`GradientCheckpointingPolicy`], *optional*):
+                Which layers to checkpoint and how, and whether to offload activations to CPU. All the layers are
+                checkpointed if not set.
+
+        Example:
+
+        ```python
+        from transformers import BertForMaskedLM, GradientCheckpointingPolicy
+
+        model = BertForMaskedLM.from_pretrained("bert-base-uncased")
+        # Only recompute the attention of every other layer
+        model.gradient_checkpointing_enable(GradientCheckpointingPolicy(every_k_layers=2, submodules="attention"))
+        ```
         """
         if not self.supports_gradient_checkpointing:
             raise ValueError(f"{self.__class__.__name__} does not support gradient checkpointing.")
-        self.apply(partial(self._set_gradient_checkpointing, value=True))
+        self.gradient_checkpointing_disable()
+        if policy is None:
+            self.apply(partial(self._set_gradient_checkpointing, value=True))
+        else:
+            apply_gradient_checkpointing_policy(self, policy)
 
     def gradient_checkpointing_disable(self):
         """
@@ -980,6 +1005,7 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
         """
         if self.supports_gradient_checkpointing:
             self.apply(partial(self._set_gradient_checkpointing, value=False))
+            remove_gradient_checkpointing_policy(self)
 
     @property
     def is_gradient_checkpointing(self) -> bool:
@@ -989,7 +1015,9 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
         Note that in other frameworks this feature can be referred to as "activation checkpointing" or "checkpoint
         activations".
         """
-        return any(hasattr(m, "gradient_checkpointing") and m.gradient_checkpointing for m in self.modules())
+        return any(
+            hasattr(m, "gradient_checkpointing") and m.gradient_checkpointing for m in self.modules()
+        ) or has_gradient_checkpointing_policy(self)
 
     def save_pretrained(
         self,
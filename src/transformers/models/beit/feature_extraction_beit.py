@@ -95,6 +95,13 @@ class BeitFeatureExtractor(FeatureExtractionMixin, ImageFeatureExtractionMixin):
         self.image_std = image_std if image_std is not None else IMAGENET_STANDARD_STD
         self.reduce_labels = reduce_labels
 
+    def resize_and_crop(self, image):
+        if self.do_resize and self.size is not None and self.resample is not None:
+            image = self.resize(image=image, size=self.size, resample=self.resample)
+        if self.do_center_crop and self.crop_size is not None:
+            image = self.center_crop(image, self.crop_size)
+        return image
+
     def __call__(
         self,
         images: ImageInput,
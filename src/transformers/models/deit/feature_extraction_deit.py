@@ -89,6 +89,13 @@ class DeiTFeatureExtractor(FeatureExtractionMixin, ImageFeatureExtractionMixin):
         self.image_mean = image_mean if image_mean is not None else IMAGENET_DEFAULT_MEAN
         self.image_std = image_std if image_std is not None else IMAGENET_DEFAULT_STD
 
+    def resize_and_crop(self, image):
+        if self.do_resize and self.size is not None and self.resample is not None:
+            image = self.resize(image=image, size=self.size, resample=self.resample)
+        if self.do_center_crop and self.crop_size is not None:
+            image = self.center_crop(image, self.crop_size)
+        return image
+
     def __call__(
         self, images: ImageInput, return_tensors: Optional[Union[str, TensorType]] = None, **kwargs
     ) -> BatchFeature:
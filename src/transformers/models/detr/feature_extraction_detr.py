@@ -401,6 +401,11 @@ class DetrFeatureExtractor(FeatureExtractionMixin, ImageFeatureExtractionMixin):
 
         return image, target
 
+    def resize_and_crop(self, image):
+        if self.do_resize and self.size is not None:
+            image = self._resize(image=image, target=None, size=self.size, max_size=self.max_size)[0]
+        return image
+
     def __call__(
         self,
         images: ImageInput,
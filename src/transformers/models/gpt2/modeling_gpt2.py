@@ -570,6 +570,9 @@ GPT2_INPUTS_DOCSTRING = r"""
             - 1 for tokens that are **not masked**,
             - 0 for tokens that are **masked**.
 
+            A mask of shape `(batch_size, sequence_length, sequence_length)` can also be provided to specify which
+            tokens each token can attend to (e.g. with [`DataCollatorWithPacking`]).
+
             [What are attention masks?](../glossary#attention-mask)
         token_type_ids (`torch.LongTensor` of shape `(batch_size, input_ids_length)`, *optional*):
             Segment token indices to indicate first and second portions of the inputs. Indices are selected in `[0,
@@ -796,13 +799,20 @@ class GPT2Model(GPT2PreTrainedModel):
         if attention_mask is not None:
             if batch_size <= 0:
                 raise ValueError("batch_size has to be defined and > 0")
-            attention_mask = attention_mask.view(batch_size, -1)
-            # We create a 3D attention mask from a 2D tensor mask.
-            # Sizes are [batch_size, 1, 1, to_seq_length]
-            # So we can broadcast to [batch_size, num_heads, from_seq_length, to_seq_length]
-            # this attention mask is more simple than the triangular masking of causal attention
-            # used in OpenAI GPT, we just need to prepare the broadcast dimension here.
-            attention_mask = attention_mask[:, None, None, :]
+            if attention_mask.dim() == 3 and attention_mask.shape[0] == batch_size:
+                # We can provide a self-attention mask of dimensions [batch_size, from_seq_length, to_seq_length]
+                # ourselves (e.g. to pack several sequences per row) in which case we just need to make it
+                # broadcastable to all heads. The causal mask is still applied in the attention layers. Masks of
+                # dimensions [batch_size, num_choices, seq_length] have a different first dimension.
+                attention_mask = attention_mask[:, None, :, :]
+            else:
+                attention_mask = attention_mask.view(batch_size, -1)
+                # We create a 3D attention mask from a 2D tensor mask.
+                # Sizes are [batch_size, 1, 1, to_seq_length]
+                # So we can broadcast to [batch_size, num_heads, from_seq_length, to_seq_length]
+                # this attention mask is more simple than the triangular masking of causal attention
+                # used in OpenAI GPT, we just need to prepare the broadcast dimension here.
+                attention_mask = attention_mask[:, None, None, :]
 
             # Since attention_mask is 1.0 for positions we want to attend and 0.0 for
             # masked positions, this operation will create a tensor which is 0.0 for
@@ -303,8 +303,8 @@ class GPT2Tokenizer(PreTrainedTokenizer):
 
     def _build_conversation_input_ids(self, conversation: "Conversation") -> List[int]:
         input_ids = []
-        for is_user, text in conversation.iter_texts():
-            input_ids.extend(self.encode(text, add_special_tokens=False) + [self.eos_token_id])
+        for is_user, text_ids in conversation.iter_text_ids(self):
+            input_ids.extend(text_ids + [self.eos_token_id])
         if len(input_ids) > self.model_max_length:
             input_ids = input_ids[-self.model_max_length :]
         return input_ids
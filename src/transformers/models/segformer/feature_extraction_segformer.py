@@ -87,6 +87,11 @@ class SegformerFeatureExtractor(FeatureExtractionMixin, ImageFeatureExtractionMi
         self.image_std = image_std if image_std is not None else IMAGENET_DEFAULT_STD
         self.reduce_labels = reduce_labels
 
+    def resize_and_crop(self, image):
+        if self.do_resize and self.size is not None:
+            image = self.resize(image=image, size=self.size, resample=self.resample)
+        return image
+
     def __call__(
         self,
         images: ImageInput,
@@ -31,6 +31,18 @@ from .utils.versions import require_version
 logger = logging.get_logger(__name__)
 
 
+def _group_params_by_device_and_dtype(params):
+    """
+    Groups the parameters that have a gradient by device and dtype, the granularity of `torch._foreach_*` operations.
+    """
+    grouped_params = {}
+    for p in params:
+        if p.grad is None:
+            continue
+        grouped_params.setdefault((p.device, p.dtype), []).append(p)
+    return grouped_params
+
+
 def get_constant_schedule(optimizer: Optimizer, last_epoch: int = -1):
     """
     Create a schedule with a constant learning rate, using the learning rate set in optimizer.
@@ -290,6 +302,10 @@ class AdamW(Optimizer):
             Whether or not to correct bias in Adam (for instance, in Bert TF repository they use `False`).
         no_deprecation_warning (`bool`, *optional*, defaults to `False`):
             A flag used to disable the deprecation warning (set to `True` to disable the warning).
+        foreach (`bool`, *optional*, defaults to `False`):
+            Whether to use the multi-tensor implementation, which updates all the parameters sharing a device and a
+            dtype at once with batched `torch._foreach_*` operations instead of one parameter at a time. The results
+            are the same, with far fewer kernel launches on GPU for models with many parameter tensors.
     """
 
     def __init__(
@@ -301,6 +317,7 @@ class AdamW(Optimizer):
         weight_decay: float = 0.0,
         correct_bias: bool = True,
         no_deprecation_warning: bool = False,
+        foreach: bool = False,
     ):
         if not no_deprecation_warning:
             warnings.warn(
@@ -317,9 +334,19 @@ class AdamW(Optimizer):
             raise ValueError(f"Invalid beta parameter: {betas[1]} - should be in [0.0, 1.0)")
         if not 0.0 <= eps:
             raise ValueError(f"Invalid epsilon value: {eps} - should be >= 0.0")
-        defaults = dict(lr=lr, betas=betas, eps=eps, weight_decay=weight_decay, correct_bias=correct_bias)
+        if foreach:
+            require_version("torch>=1.9.0", "The multi-tensor implementation of AdamW needs torch>=1.9.0")
+        defaults = dict(
+            lr=lr, betas=betas, eps=eps, weight_decay=weight_decay, correct_bias=correct_bias, foreach=foreach
+        )
         super().__init__(params, defaults)
 
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        # Optimizer states saved before `foreach` was introduced
+        for group in self.param_groups:
+            group.setdefault("foreach", self.defaults.get("foreach", False))
+
     def step(self, closure: Callable = None):
         """
         Performs a single optimization step.
@@ -332,6 +359,10 @@ class AdamW(Optimizer):
             loss = closure()
 
         for group in self.param_groups:
+            if group["foreach"]:
+                self._multi_tensor_step(group)
+                continue
+
             for p in group["params"]:
                 if p.grad is None:
                     continue
@@ -381,6 +412,258 @@ class AdamW(Optimizer):
 
         return loss
 
+    def _multi_tensor_step(self, group):
+        """
+        Same update as the loop of [`~AdamW.step`], with each operation applied to all the parameters of the same
+        device and dtype at once.
+        """
+        beta1, beta2 = group["betas"]
+        for params in _group_params_by_device_and_dtype(group["params"]).values():
+            grads, exp_avgs, exp_avg_sqs, step_sizes = [], [], [], []
+            for p in params:
+                grad = p.grad.data
+                if grad.is_sparse:
+                    raise RuntimeError("Adam does not support sparse gradients, please consider SparseAdam instead")
+
+                state = self.state[p]
+                if len(state) == 0:
+                    state["step"] = 0
+                    state["exp_avg"] = torch.zeros_like(p.data)
+                    state["exp_avg_sq"] = torch.zeros_like(p.data)
+                state["step"] += 1
+
+                step_size = group["lr"]
+                if group["correct_bias"]:
+                    bias_correction1 = 1.0 - beta1 ** state["step"]
+                    bias_correction2 = 1.0 - beta2 ** state["step"]
+                    step_size = step_size * math.sqrt(bias_correction2) / bias_correction1
+
+                grads.append(grad)
+                exp_avgs.append(state["exp_avg"])
+                exp_avg_sqs.append(state["exp_avg_sq"])
+                step_sizes.append(-step_size)
+            params_data = [p.data for p in params]
+
+            torch._foreach_mul_(exp_avgs, beta1)
+            torch._foreach_add_(exp_avgs, grads, alpha=(1.0 - beta1))
+            torch._foreach_mul_(exp_avg_sqs, beta2)
+            torch._foreach_addcmul_(exp_avg_sqs, grads, grads, value=1.0 - beta2)
+            denoms = torch._foreach_sqrt(exp_avg_sqs)
+            torch._foreach_add_(denoms, group["eps"])
+
+            torch._foreach_addcdiv_(params_data, exp_avgs, denoms, step_sizes)
+
+            if group["weight_decay"] > 0.0:
+                torch._foreach_add_(params_data, params_data, alpha=(-group["lr"] * group["weight_decay"]))
+
+
+def _create_dynamic_map(signed: bool):
+    """
+    Creates the 8-bit code book of the states of [`AdamW8bit`], with the dynamic tree quantization of [8-Bit
+    Approximations for Parallelism in Deep Learning](https://arxiv.org/abs/1511.04561): the code is split in 7 decades
+    between 1e-7 and 1, with more linearly spaced values in the upper decades. Values are normalized by the absolute
+    maximum of their block before being quantized, so large values are kept with a precision of about 1%, and smaller
+    values with the same order of magnitude as the block are still represented.
+    """
+    values = [0.0, 1.0]
+    num_decades = 7
+    for i in range(num_decades):
+        # The sign takes one bit of the signed code book
+        num_fractions = 2 ** i if signed else 2 ** (i + 1)
+        fractions = torch.linspace(0.1, 1.0, num_fractions + 1, dtype=torch.float64)
+        means = (10 ** (i - num_decades + 1)) * (fractions[:-1] + fractions[1:]) / 2
+        values += means.tolist()
+        if signed:
+            values += (-means).tolist()
+    code = torch.tensor(sorted(values), dtype=torch.float64)
+    # Values are rounded to the closest entry of the code book
+    boundaries = (code[1:] + code[:-1]) / 2
+    if not signed:
+        # Only zeros are quantized to zero, so that small second moments never give huge updates
+        boundaries[0] = 0.0
+    return code.float(), boundaries.float()
+
+
+def _quantize_blockwise(tensor, code, boundaries, block_size):
+    flat_tensor = tensor.reshape(-1)
+    padding = -flat_tensor.numel() % block_size
+    if padding > 0:
+        flat_tensor = nn.functional.pad(flat_tensor, (0, padding))
+    blocks = flat_tensor.view(-1, block_size)
+    absmax = blocks.abs().max(dim=1)[0]
+    normalized = blocks / absmax.clamp(min=torch.finfo(absmax.dtype).tiny).unsqueeze(1)
+    quantized = torch.bucketize(normalized, boundaries, out_int32=True).to(torch.uint8)
+    return quantized.view(-1), absmax
+
+
+def _dequantize_blockwise(quantized, absmax, code, shape):
+    values = code[quantized.long()].view(absmax.numel(), -1)
+    values.mul_(absmax.float().unsqueeze(1))
+    return values.view(-1)[: shape.numel()].view(shape)
+
+
+class AdamW8bit(Optimizer):
+    """
+    Implements the same algorithm as [`AdamW`], with its moments stored in 8 bits: the first and second moments of each
+    parameter are split in blocks of `block_size` values, and each block is stored as its absolute maximum (in fp32)
+    and 8-bit indices in a code book of values between -1 and 1 (0 and 1 for the second moment) covering seven orders
+    of magnitude. The states then take about 2 bytes per parameter instead of 8, and the moments are dequantized to
+    fp32 to compute the update of each parameter.
+
+    Quantization is a binary search in the code book for each value, which is cheap on GPU but makes the step
+    noticeably slower than [`AdamW`] on CPU.
+
+    Parameters with less than `min_8bit_size` values (biases, layer norms...) keep fp32 moments: they account for
+    little memory, and are more sensitive to quantization errors.
+
+    Parameters:
+        params (`Iterable[nn.parameter.Parameter]`):
+            Iterable of parameters to optimize or dictionaries defining parameter groups.
+        lr (`float`, *optional*, defaults to 1e-3):
+            The learning rate to use.
+        betas (`Tuple[float,float]`, *optional*, defaults to (0.9, 0.999)):
+            Adam's betas parameters (b1, b2).
+        eps (`float`, *optional*, defaults to 1e-6):
+            Adam's epsilon for numerical stability.
+        weight_decay (`float`, *optional*, defaults to 0):
+            Decoupled weight decay to apply.
+        correct_bias (`bool`, *optional*, defaults to `True`):
+            Whether or not to correct bias in Adam (for instance, in Bert TF repository they use `False`).
+        block_size (`int`, *optional*, defaults to 2048):
+            The number of values sharing the same scale in the quantized moments.
+        min_8bit_size (`int`, *optional*, defaults to 4096):
+            The minimum number of values of a parameter for its moments to be quantized.
+    """
+
+    def __init__(
+        self,
+        params: Iterable[nn.parameter.Parameter],
+        lr: float = 1e-3,
+        betas: Tuple[float, float] = (0.9, 0.999),
+        eps: float = 1e-6,
+        weight_decay: float = 0.0,
+        correct_bias: bool = True,
+        block_size: int = 2048,
+        min_8bit_size: int = 4096,
+    ):
+        require_version("torch>=1.6.0")  # torch.bucketize
+        if lr < 0.0:
+            raise ValueError(f"Invalid learning rate: {lr} - should be >= 0.0")
+        if not 0.0 <= betas[0] < 1.0:
+            raise ValueError(f"Invalid beta parameter: {betas[0]} - should be in [0.0, 1.0)")
+        if not 0.0 <= betas[1] < 1.0:
+            raise ValueError(f"Invalid beta parameter: {betas[1]} - should be in [0.0, 1.0)")
+        if not 0.0 <= eps:
+            raise ValueError(f"Invalid epsilon value: {eps} - should be >= 0.0")
+        if block_size <= 0:
+            raise ValueError(f"Invalid block size: {block_size} - should be > 0")
+        defaults = dict(
+            lr=lr,
+            betas=betas,
+            eps=eps,
+            weight_decay=weight_decay,
+            correct_bias=correct_bias,
+            block_size=block_size,
+            min_8bit_size=min_8bit_size,
+        )
+        super().__init__(params, defaults)
+        self._code_books = {}
+
+    def _get_code_book(self, signed, device):
+        if (signed, device) not in self._code_books:
+            code, boundaries = _create_dynamic_map(signed)
+            self._code_books[(signed, device)] = (code.to(device), boundaries.to(device))
+        return self._code_books[(signed, device)]
+
+    def _load_moment(self, state, name, signed, p_data_fp32):
+        if f"{name}_absmax" not in state:
+            # `Optimizer.load_state_dict` casts floating point states to the dtype of the parameter
+            state[name] = state[name].to(p_data_fp32)
+            return state[name]
+        code, _ = self._get_code_book(signed, p_data_fp32.device)
+        return _dequantize_blockwise(state[name], state[f"{name}_absmax"], code, p_data_fp32.shape)
+
+    def _store_moment(self, state, name, signed, moment):
+        if f"{name}_absmax" not in state:
+            return
+        code, boundaries = self._get_code_book(signed, moment.device)
+        # Keep the block size the states were created with
+        block_size = state[name].numel() // state[f"{name}_absmax"].numel()
+        state[name], state[f"{name}_absmax"] = _quantize_blockwise(moment, code, boundaries, block_size)
+
+    def step(self, closure: Callable = None):
+        """
+        Performs a single optimization step.
+
+        Arguments:
+            closure (`Callable`, *optional*): A closure that reevaluates the model and returns the loss.
+        """
+        loss = None
+        if closure is not None:
+            loss = closure()
+
+        for group in self.param_groups:
+            for p in group["params"]:
+                if p.grad is None:
+                    continue
+                grad = p.grad.data
+                if grad.is_sparse:
+                    raise RuntimeError("Adam does not support sparse gradients, please consider SparseAdam instead")
+                if grad.dtype in {torch.float16, torch.bfloat16}:
+                    grad = grad.float()
+
+                p_data_fp32 = p.data
+                if p.data.dtype in {torch.float16, torch.bfloat16}:
+                    p_data_fp32 = p_data_fp32.float()
+
+                state = self.state[p]
+
+                # State initialization
+                if len(state) == 0:
+                    state["step"] = 0
+                    exp_avg = torch.zeros_like(p_data_fp32)
+                    exp_avg_sq = torch.zeros_like(p_data_fp32)
+                    if p.numel() >= group["min_8bit_size"]:
+                        block_size = group["block_size"]
+                        for name, signed, moment in (("exp_avg", True, exp_avg), ("exp_avg_sq", False, exp_avg_sq)):
+                            code, boundaries = self._get_code_book(signed, p.device)
+                            state[name], state[f"{name}_absmax"] = _quantize_blockwise(
+                                moment, code, boundaries, block_size
+                            )
+                    else:
+                        state["exp_avg"] = exp_avg
+                        state["exp_avg_sq"] = exp_avg_sq
+
+                exp_avg = self._load_moment(state, "exp_avg", True, p_data_fp32)
+                exp_avg_sq = self._load_moment(state, "exp_avg_sq", False, p_data_fp32)
+                beta1, beta2 = group["betas"]
+
+                state["step"] += 1
+
+                exp_avg.mul_(beta1).add_(grad, alpha=(1.0 - beta1))
+                exp_avg_sq.mul_(beta2).addcmul_(grad, grad, value=1.0 - beta2)
+                denom = exp_avg_sq.sqrt().add_(group["eps"])
+
+                step_size = group["lr"]
+                if group["correct_bias"]:
+                    bias_correction1 = 1.0 - beta1 ** state["step"]
+                    bias_correction2 = 1.0 - beta2 ** state["step"]
+                    step_size = step_size * math.sqrt(bias_correction2) / bias_correction1
+
+                p_data_fp32.addcdiv_(exp_avg, denom, value=-step_size)
+
+                # Decoupled weight decay, see `AdamW`
+                if group["weight_decay"] > 0.0:
+                    p_data_fp32.add_(p_data_fp32, alpha=(-group["lr"] * group["weight_decay"]))
+
+                self._store_moment(state, "exp_avg", True, exp_avg)
+                self._store_moment(state, "exp_avg_sq", False, exp_avg_sq)
+
+                if p.data.dtype in {torch.float16, torch.bfloat16}:
+                    p.data.copy_(p_data_fp32)
+
+        return loss
+
 
 class Adafactor(Optimizer):
     """
@@ -413,6 +696,11 @@ class Adafactor(Optimizer):
             If True, time-dependent learning rate is computed instead of external learning rate
         warmup_init (`bool`, *optional*, defaults to `False`):
             Time-dependent learning rate computation depends on whether warm-up initialization is being used
+        foreach (`bool`, *optional*, defaults to `False`):
+            Whether to use the multi-tensor implementation, which applies the element-wise operations of the update to
+            the parameters sharing a device and a dtype at once with batched `torch._foreach_*` operations. Reductions
+            (root mean squares and factored second moments) are still computed per parameter. The results are the same
+            as with the default implementation.
 
     This implementation handles low-precision (FP16, bfloat) values, but we have not thoroughly tested.
 
@@ -479,8 +767,11 @@ class Adafactor(Optimizer):
         scale_parameter=True,
         relative_step=True,
         warmup_init=False,
+        foreach=False,
     ):
         require_version("torch>=1.5.0")  # add_ with alpha
+        if foreach:
+            require_version("torch>=1.9.0", "The multi-tensor implementation of Adafactor needs torch>=1.9.0")
         if lr is not None and relative_step:
             raise ValueError("Cannot combine manual `lr` and `relative_step=True` options")
         if warmup_init and not relative_step:
@@ -496,9 +787,16 @@ class Adafactor(Optimizer):
             scale_parameter=scale_parameter,
             relative_step=relative_step,
             warmup_init=warmup_init,
+            foreach=foreach,
         )
         super().__init__(params, defaults)
 
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        # Optimizer states saved before `foreach` was introduced
+        for group in self.param_groups:
+            group.setdefault("foreach", self.defaults.get("foreach", False))
+
     @staticmethod
     def _get_lr(param_group, param_state):
         rel_step_sz = param_group["lr"]
@@ -528,6 +826,32 @@ class Adafactor(Optimizer):
         c_factor = exp_avg_sq_col.unsqueeze(-2).rsqrt()
         return torch.mul(r_factor, c_factor)
 
+    @staticmethod
+    def _init_state(state, grad, factored, use_first_moment):
+        grad_shape = grad.shape
+        # State Initialization
+        if len(state) == 0:
+            state["step"] = 0
+
+            if use_first_moment:
+                # Exponential moving average of gradient values
+                state["exp_avg"] = torch.zeros_like(grad)
+            if factored:
+                state["exp_avg_sq_row"] = torch.zeros(grad_shape[:-1]).to(grad)
+                state["exp_avg_sq_col"] = torch.zeros(grad_shape[:-2] + grad_shape[-1:]).to(grad)
+            else:
+                state["exp_avg_sq"] = torch.zeros_like(grad)
+
+            state["RMS"] = 0
+        else:
+            if use_first_moment:
+                state["exp_avg"] = state["exp_avg"].to(grad)
+            if factored:
+                state["exp_avg_sq_row"] = state["exp_avg_sq_row"].to(grad)
+                state["exp_avg_sq_col"] = state["exp_avg_sq_col"].to(grad)
+            else:
+                state["exp_avg_sq"] = state["exp_avg_sq"].to(grad)
+
     def step(self, closure=None):
         """
         Performs a single optimization step
@@ -541,6 +865,10 @@ class Adafactor(Optimizer):
             loss = closure()
 
         for group in self.param_groups:
+            if group["foreach"]:
+                self._multi_tensor_step(group)
+                continue
+
             for p in group["params"]:
                 if p.grad is None:
                     continue
@@ -554,28 +882,7 @@ class Adafactor(Optimizer):
                 grad_shape = grad.shape
 
                 factored, use_first_moment = self._get_options(group, grad_shape)
-                # State Initialization
-                if len(state) == 0:
-                    state["step"] = 0
-
-                    if use_first_moment:
-                        # Exponential moving average of gradient values
-                        state["exp_avg"] = torch.zeros_like(grad)
-                    if factored:
-                        state["exp_avg_sq_row"] = torch.zeros(grad_shape[:-1]).to(grad)
-                        state["exp_avg_sq_col"] = torch.zeros(grad_shape[:-2] + grad_shape[-1:]).to(grad)
-                    else:
-                        state["exp_avg_sq"] = torch.zeros_like(grad)
-
-                    state["RMS"] = 0
-                else:
-                    if use_first_moment:
-                        state["exp_avg"] = state["exp_avg"].to(grad)
-                    if factored:
-                        state["exp_avg_sq_row"] = state["exp_avg_sq_row"].to(grad)
-                        state["exp_avg_sq_col"] = state["exp_avg_sq_col"].to(grad)
-                    else:
-                        state["exp_avg_sq"] = state["exp_avg_sq"].to(grad)
+                self._init_state(state, grad, factored, use_first_moment)
 
                 p_data_fp32 = p.data
                 if p.data.dtype in {torch.float16, torch.bfloat16}:
@@ -621,6 +928,95 @@ class Adafactor(Optimizer):
 
         return loss
 
+    def _multi_tensor_step(self, group):
+        """
+        Same update as the loop of [`~Adafactor.step`]. Parameters are batched when they share a device, a dtype, a
+        step and whether their second moment is factored, so that the scalars of the update are the same for all of
+        them.
+        """
+        grouped_params = {}
+        for p in group["params"]:
+            if p.grad is None:
+                continue
+            grad = p.grad.data
+            if grad.dtype in {torch.float16, torch.bfloat16}:
+                grad = grad.float()
+            if grad.is_sparse:
+                raise RuntimeError("Adafactor does not support sparse gradients.")
+
+            state = self.state[p]
+            factored, use_first_moment = self._get_options(group, grad.shape)
+            self._init_state(state, grad, factored, use_first_moment)
+
+            p_data_fp32 = p.data
+            if p.data.dtype in {torch.float16, torch.bfloat16}:
+                p_data_fp32 = p_data_fp32.float()
+
+            state["step"] += 1
+            state["RMS"] = self._rms(p_data_fp32)
+            lr = self._get_lr(group, state)
+
+            key = (p.device, p.dtype, state["step"], factored)
+            grouped_params.setdefault(key, []).append((p, grad, p_data_fp32, lr))
+
+        for (_, _, step, factored), params in grouped_params.items():
+            grads = [grad for _, grad, _, _ in params]
+            states = [self.state[p] for p, _, _, _ in params]
+            params_data_fp32 = [p_data_fp32 for _, _, p_data_fp32, _ in params]
+            lrs = [lr for _, _, _, lr in params]
+
+            beta2t = 1.0 - math.pow(step, group["decay_rate"])
+            updates = torch._foreach_mul(grads, grads)
+            torch._foreach_add_(updates, group["eps"][0])
+            if factored:
+                exp_avg_sq_rows = [state["exp_avg_sq_row"] for state in states]
+                exp_avg_sq_cols = [state["exp_avg_sq_col"] for state in states]
+
+                torch._foreach_mul_(exp_avg_sq_rows, beta2t)
+                torch._foreach_add_(exp_avg_sq_rows, [update.mean(dim=-1) for update in updates], alpha=(1.0 - beta2t))
+                torch._foreach_mul_(exp_avg_sq_cols, beta2t)
+                torch._foreach_add_(exp_avg_sq_cols, [update.mean(dim=-2) for update in updates], alpha=(1.0 - beta2t))
+
+                # Approximation of exponential moving average of square of gradient
+                updates = [self._approx_sq_grad(row, col) for row, col in zip(exp_avg_sq_rows, exp_avg_sq_cols)]
+            else:
+                exp_avg_sqs = [state["exp_avg_sq"] for state in states]
+
+                torch._foreach_mul_(exp_avg_sqs, beta2t)
+                torch._foreach_add_(exp_avg_sqs, updates, alpha=(1.0 - beta2t))
+                updates = [exp_avg_sq.rsqrt() for exp_avg_sq in exp_avg_sqs]
+            torch._foreach_mul_(updates, grads)
+
+            for update in updates:
+                update.div_((self._rms(update) / group["clip_threshold"]).clamp_(min=1.0))
+            scalar_lrs = not any(torch.is_tensor(lr) for lr in lrs)
+            if scalar_lrs:
+                torch._foreach_mul_(updates, lrs)
+            else:
+                # With `scale_parameter`, learning rates are scaled by the root mean square (a tensor) of each
+                # parameter
+                for update, lr in zip(updates, lrs):
+                    update.mul_(lr)
+
+            if group["beta1"] is not None:
+                exp_avgs = [state["exp_avg"] for state in states]
+                torch._foreach_mul_(exp_avgs, group["beta1"])
+                torch._foreach_add_(exp_avgs, updates, alpha=(1 - group["beta1"]))
+                updates = exp_avgs
+
+            if group["weight_decay"] != 0:
+                if scalar_lrs and len(set(lrs)) == 1:
+                    torch._foreach_add_(params_data_fp32, params_data_fp32, alpha=(-group["weight_decay"] * lrs[0]))
+                else:
+                    for p_data_fp32, lr in zip(params_data_fp32, lrs):
+                        p_data_fp32.add_(p_data_fp32, alpha=(-group["weight_decay"] * lr))
+
+            torch._foreach_sub_(params_data_fp32, updates)
+
+            for (p, _, p_data_fp32, _) in params:
+                if p.data.dtype in {torch.float16, torch.bfloat16}:
+                    p.data.copy_(p_data_fp32)
+
 
 class AdafactorSchedule(LambdaLR):
     """
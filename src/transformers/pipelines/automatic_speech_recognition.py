@@ -12,7 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import subprocess
-from typing import TYPE_CHECKING, Union
+import threading
+from itertools import chain
+from typing import TYPE_CHECKING, Iterable, Iterator, Union
 
 import numpy as np
 
@@ -30,14 +32,11 @@ if is_torch_available():
     from ..models.auto.modeling_auto import MODEL_FOR_CTC_MAPPING, MODEL_FOR_SPEECH_SEQ_2_SEQ_MAPPING
 
 
-def ffmpeg_read(bpayload: bytes, sampling_rate: int) -> np.array:
-    """
-    Helper function to read an audio file through ffmpeg.
-    """
+def _ffmpeg_command(sampling_rate: int):
     ar = f"{sampling_rate}"
     ac = "1"
     format_for_conversion = "f32le"
-    ffmpeg_command = [
+    return [
         "ffmpeg",
         "-i",
         "pipe:0",
@@ -53,6 +52,13 @@ def ffmpeg_read(bpayload: bytes, sampling_rate: int) -> np.array:
         "pipe:1",
     ]
 
+
+def ffmpeg_read(bpayload: bytes, sampling_rate: int) -> np.array:
+    """
+    Helper function to read an audio file through ffmpeg.
+    """
+    ffmpeg_command = _ffmpeg_command(sampling_rate)
+
     try:
         ffmpeg_process = subprocess.Popen(ffmpeg_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
     except FileNotFoundError:
@@ -66,6 +72,70 @@ def ffmpeg_read(bpayload: bytes, sampling_rate: int) -> np.array:
     return audio
 
 
+def ffmpeg_stream(
+    bpayload_stream: Iterable[bytes], sampling_rate: int, read_size: int = 2 ** 16
+) -> Iterator[np.array]:
+    """
+    Helper function to read an audio stream through ffmpeg. The stream is fed to ffmpeg from a background thread and
+    the waveform is yielded piece by piece as soon as it is decoded.
+    """
+    ffmpeg_command = _ffmpeg_command(sampling_rate)
+
+    try:
+        ffmpeg_process = subprocess.Popen(ffmpeg_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    except FileNotFoundError:
+        raise ValueError("ffmpeg was not found but is required to load audio files from filename")
+
+    feed_errors = []
+
+    def feed():
+        try:
+            for bpayload in bpayload_stream:
+                ffmpeg_process.stdin.write(bpayload)
+                ffmpeg_process.stdin.flush()
+        except BrokenPipeError:
+            # ffmpeg exited, either on malformed input or because the output is not consumed anymore.
+            pass
+        except Exception as e:
+            feed_errors.append(e)
+        finally:
+            try:
+                ffmpeg_process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, name="ffmpeg-feeder", daemon=True)
+    feeder.start()
+
+    num_samples = 0
+    remainder = b""
+    try:
+        while True:
+            out_bytes = ffmpeg_process.stdout.read1(read_size)
+            if not out_bytes:
+                break
+            out_bytes = remainder + out_bytes
+            # Samples can be split between two reads.
+            n_bytes = len(out_bytes) - len(out_bytes) % 4
+            remainder = out_bytes[n_bytes:]
+            if n_bytes > 0:
+                audio = np.frombuffer(out_bytes[:n_bytes], np.float32)
+                num_samples += audio.shape[0]
+                yield audio
+    finally:
+        if ffmpeg_process.poll() is None:
+            # The stream was not consumed until the end.
+            ffmpeg_process.kill()
+        ffmpeg_process.wait()
+        ffmpeg_process.stdout.close()
+
+    feeder.join()
+    if feed_errors:
+        raise feed_errors[0]
+    if num_samples == 0:
+        raise ValueError("Malformed soundfile")
+
+
 def rescale_stride(tokens_or_logits, stride):
     """
     Rescales the stride values from audio space to tokens/logits space.
@@ -119,6 +189,44 @@ def chunk_iter(inputs, feature_extractor, chunk_len, stride_left, stride_right):
             yield {"is_last": is_last, "stride": (chunk.shape[0], _stride_left, _stride_right), **processed}
 
 
+def chunk_stream_iter(audio_stream, feature_extractor, chunk_len, stride_left, stride_right):
+    """
+    Same as `chunk_iter`, but for a waveform given as an iterable of consecutive pieces. Chunks are processed as soon
+    as enough audio has been received, so only about `chunk_len` samples are held in memory at any time.
+    """
+    step = chunk_len - stride_left - stride_right
+    if step <= 0:
+        # The chunks would never move forward through the stream.
+        raise ValueError("Chunk length must be superior to stride length")
+
+    def process(chunk, is_first, is_last):
+        processed = feature_extractor(chunk, sampling_rate=feature_extractor.sampling_rate, return_tensors="pt")
+        _stride_left = 0 if is_first else stride_left
+        _stride_right = 0 if is_last else stride_right
+        if chunk.shape[0] > _stride_left:
+            yield {"is_last": is_last, "stride": (chunk.shape[0], _stride_left, _stride_right), **processed}
+
+    buffer = None
+    is_first = True
+    for audio in audio_stream:
+        buffer = audio if buffer is None else np.concatenate([buffer, audio])
+        # A chunk can only be processed once we know whether more audio follows it.
+        while buffer.shape[0] >= chunk_len and buffer.shape[0] > step:
+            yield from process(buffer[:chunk_len], is_first, False)
+            buffer = buffer[step:]
+            is_first = False
+
+    if buffer is None:
+        return
+    while True:
+        is_last = buffer.shape[0] <= step
+        yield from process(buffer[:chunk_len], is_first, is_last)
+        if is_last:
+            return
+        buffer = buffer[step:]
+        is_first = False
+
+
 class AutomaticSpeechRecognitionPipeline(ChunkPipeline):
     """
     Pipeline that aims at extracting spoken text contained within some audio.
@@ -224,23 +332,7 @@ class AutomaticSpeechRecognitionPipeline(ChunkPipeline):
             raise ValueError("We expect a single channel audio input for AutomaticSpeechRecognitionPipeline")
 
         if chunk_length_s:
-            if stride_length_s is None:
-                stride_length_s = chunk_length_s / 6
-
-            chunk_len = int(round(chunk_length_s * self.feature_extractor.sampling_rate))
-
-            if isinstance(stride_length_s, (int, float)):
-                stride_length_s = [stride_length_s, stride_length_s]
-
-            stride_left = int(round(stride_length_s[0] * self.feature_extractor.sampling_rate))
-            stride_right = int(round(stride_length_s[1] * self.feature_extractor.sampling_rate))
-
-            if self.type not in {"ctc", "ctc_with_lm"}:
-                raise ValueError(
-                    "`chunk_length_s` is only valid for CTC models, use other chunking options for other models"
-                )
-            if chunk_len < stride_left + stride_right:
-                raise ValueError("Chunk length must be superior to stride length")
+            chunk_len, stride_left, stride_right = self._get_chunk_lengths(chunk_length_s, stride_length_s)
 
             # make sure that
             for item in chunk_iter(inputs, self.feature_extractor, chunk_len, stride_left, stride_right):
@@ -251,6 +343,138 @@ class AutomaticSpeechRecognitionPipeline(ChunkPipeline):
             )
             yield {"is_last": True, **processed}
 
+    def _get_chunk_lengths(self, chunk_length_s, stride_length_s=None):
+        if stride_length_s is None:
+            stride_length_s = chunk_length_s / 6
+
+        chunk_len = int(round(chunk_length_s * self.feature_extractor.sampling_rate))
+
+        if isinstance(stride_length_s, (int, float)):
+            stride_length_s = [stride_length_s, stride_length_s]
+
+        stride_left = int(round(stride_length_s[0] * self.feature_extractor.sampling_rate))
+        stride_right = int(round(stride_length_s[1] * self.feature_extractor.sampling_rate))
+
+        if self.type not in {"ctc", "ctc_with_lm"}:
+            raise ValueError(
+                "`chunk_length_s` is only valid for CTC models, use other chunking options for other models"
+            )
+        if chunk_len < stride_left + stride_right:
+            raise ValueError("Chunk length must be superior to stride length")
+        return chunk_len, stride_left, stride_right
+
+    def stream(self, inputs: Union[np.ndarray, bytes, str, Iterable[Union[np.ndarray, bytes]]], **kwargs):
+        """
+        Transcribes audio as it arrives, yielding the transcription of the audio received so far after each chunk.
+
+        The audio is cut into chunks of `chunk_length_s` seconds, with `stride_length_s` seconds of stride, exactly
+        like with `chunk_length_s` in [`~AutomaticSpeechRecognitionPipeline.__call__`]. Each chunk goes through the
+        model as soon as enough audio has been received, so that long or live recordings can be transcribed with
+        bounded memory. Only available for CTC models without language model.
+
+        Args:
+            inputs (`np.ndarray` or `bytes` or `str` or iterable of `np.ndarray` or `bytes`):
+                Either any input accepted by [`~AutomaticSpeechRecognitionPipeline.__call__`] or an iterable of
+                consecutive pieces of audio. Pieces can be raw waveforms (`np.ndarray` of shape (n, )) at the correct
+                sampling rate or `bytes` of an audio file or stream, which are decoded incrementally with *ffmpeg*.
+            chunk_length_s (`float`):
+                The input length for in each chunk. Defaults to the value the pipeline was initialized with.
+            stride_length_s (`float`, *optional*, defaults to `chunk_length_s / 6`):
+                The length of stride on the left and right of each chunk.
+
+        Return:
+            A generator of `dict` with the following keys:
+
+            - **text** (`str`) -- The text recognized so far. The last one is the transcription of the whole audio.
+
+        Example:
+
+        ```python
+        >>> from transformers import pipeline
+
+        >>> speech_recognizer = pipeline("automatic-speech-recognition", model="facebook/wav2vec2-base-960h")
+
+
+        >>> def read_call(path):
+        ...     with open(path, "rb") as f:
+        ...         for chunk in iter(lambda: f.read(4096), b""):
+        ...             yield chunk
+
+
+        >>> for output in speech_recognizer.stream(read_call("call.mp3"), chunk_length_s=10.0):
+        ...     print(output["text"])
+        ```"""
+        preprocess_params, _, _ = self._sanitize_parameters(**kwargs)
+        preprocess_params = {**self._preprocess_params, **preprocess_params}
+        chunk_length_s = preprocess_params.get("chunk_length_s", 0)
+        if not chunk_length_s:
+            raise ValueError("`chunk_length_s` is required to stream audio through the pipeline")
+        chunk_len, stride_left, stride_right = self._get_chunk_lengths(
+            chunk_length_s, preprocess_params.get("stride_length_s", None)
+        )
+        if self.type != "ctc":
+            raise ValueError("Streaming is only available for CTC models without language model")
+
+        # Tokens are decoded incrementally: everything up to the last complete word is decoded only once and the
+        # remaining tokens are kept until the next chunk, since CTC decoding merges tokens across chunk boundaries.
+        word_delimiter_token_id = getattr(self.tokenizer, "word_delimiter_token_id", None)
+        all_tokens = []
+        pending_tokens = np.zeros((0,), dtype=np.int64)
+        text = ""
+
+        audio_stream = self._audio_stream(inputs)
+        chunks = chunk_stream_iter(audio_stream, self.feature_extractor, chunk_len, stride_left, stride_right)
+        for model_inputs in chunks:
+            model_outputs = self.forward(model_inputs)
+            tokens = model_outputs["tokens"].numpy().squeeze(0)
+            all_tokens.append(tokens)
+            if model_outputs["is_last"]:
+                break
+            pending_tokens = np.concatenate([pending_tokens, tokens])
+
+            if word_delimiter_token_id is not None:
+                # Cut after the last word delimiter that is followed by a letter.
+                is_delimiter = pending_tokens == word_delimiter_token_id
+                is_cut = is_delimiter[:-1] & ~is_delimiter[1:] & (pending_tokens[1:] != self.tokenizer.pad_token_id)
+                cuts = np.flatnonzero(is_cut)
+                if len(cuts) > 0:
+                    cut = cuts[-1] + 1
+                    words = self.tokenizer.decode(pending_tokens[:cut], skip_special_tokens=False)
+                    text = " ".join(t for t in (text, words) if t)
+                    pending_tokens = pending_tokens[cut:]
+
+            pending_text = self.tokenizer.decode(pending_tokens, skip_special_tokens=False)
+            yield {"text": " ".join(t for t in (text, pending_text) if t)}
+
+        if not all_tokens:
+            # Empty audio
+            return
+        # The last transcription is decoded in one go to be exactly the one of `__call__`.
+        yield {"text": self.tokenizer.decode(np.concatenate(all_tokens), skip_special_tokens=False)}
+
+    def _audio_stream(self, inputs):
+        if isinstance(inputs, str):
+            with open(inputs, "rb") as f:
+                yield from ffmpeg_stream(iter(lambda: f.read(2 ** 16), b""), self.feature_extractor.sampling_rate)
+            return
+        if isinstance(inputs, (bytes, np.ndarray)):
+            inputs = [inputs]
+
+        inputs = iter(inputs)
+        first = next(inputs, None)
+        if first is None:
+            return
+        if isinstance(first, bytes):
+            yield from ffmpeg_stream(chain([first], inputs), self.feature_extractor.sampling_rate)
+            return
+
+        for audio in chain([first], inputs):
+            if not isinstance(audio, np.ndarray):
+                raise ValueError("We expect a numpy ndarray or bytes as input")
+            if len(audio.shape) != 1:
+                raise ValueError("We expect a single channel audio input for AutomaticSpeechRecognitionPipeline")
+            yield audio
+
     def _forward(self, model_inputs):
         is_last = model_inputs.pop("is_last")
         if self.type == "seq2seq":
@@ -668,6 +668,23 @@ PIPELINE_INIT_ARGS = r"""
             When the pipeline will use *DataLoader* (when passing a dataset, on GPU for a Pytorch model), the size of
             the batch to use, for inference this is not always beneficial, please read [Batching with
             pipelines](https://huggingface.co/transformers/main_classes/pipelines.html#pipeline-batching) .
+        group_by_length (`bool`, *optional*, defaults to `False`):
+            When batching with *DataLoader* (`batch_size > 1`), whether to look ahead a window of preprocessed inputs
+            and group them by length before running the model, in order to minimize padding. Outputs are still returned
+            in the original order.
+        length_grouping_window (`int`, *optional*):
+            The number of preprocessed inputs to look ahead when `group_by_length=True`. Defaults to 50 times
+            `batch_size`.
+        prefetch_size (`int`, *optional*, defaults to 0):
+            When the pipeline will use *DataLoader*, run preprocessing and model inference in background threads that
+            can each get up to `prefetch_size` batches ahead of the next stage, so that preprocessing, inference and
+            postprocessing of consecutive batches overlap. This also applies to generator inputs. 0 disables it and
+            runs every stage in the caller's thread.
+        preprocess_threads (`int`, *optional*, defaults to 0):
+            When the pipeline will use *DataLoader*, the number of threads preprocessing inputs concurrently, ahead of
+            the model. This speeds up preprocessing that releases the GIL, like decoding and resizing images. Outputs
+            are still returned in the original order. Only supported by pipelines without tokenizer, since tokenizers
+            cannot be used from several threads at once. 0 disables it and preprocesses inputs one at a time.
         args_parser ([`~pipelines.ArgumentHandler`], *optional*):
             Reference to the object in charge of parsing supplied pipeline parameters.
         device (`int`, *optional*, defaults to -1):
@@ -682,7 +699,10 @@ if is_torch_available():
         PipelineChunkIterator,
         PipelineDataset,
         PipelineIterator,
+        PipelineLengthGroupedIterator,
         PipelinePackIterator,
+        PipelinePrefetchIterator,
+        PipelineThreadPoolIterator,
     )
 
 
@@ -744,6 +764,10 @@ class Pipeline(_ScikitCompat):
         self.call_count = 0
         self._batch_size = kwargs.pop("batch_size", None)
         self._num_workers = kwargs.pop("num_workers", None)
+        self._group_by_length = kwargs.pop("group_by_length", False)
+        self._length_grouping_window = kwargs.pop("length_grouping_window", None)
+        self._prefetch_size = kwargs.pop("prefetch_size", 0)
+        self._preprocess_threads = kwargs.pop("preprocess_threads", 0)
         self._preprocess_params, self._forward_params, self._postprocess_params = self._sanitize_parameters(**kwargs)
 
     def save_pretrained(self, save_directory: str):
@@ -927,9 +951,33 @@ class Pipeline(_ScikitCompat):
         return model_outputs
 
     def get_iterator(
-        self, inputs, num_workers: int, batch_size: int, preprocess_params, forward_params, postprocess_params
+        self,
+        inputs,
+        num_workers: int,
+        batch_size: int,
+        preprocess_params,
+        forward_params,
+        postprocess_params,
+        group_by_length: bool = False,
+        length_grouping_window: Optional[int] = None,
+        prefetch_size: int = 0,
+        preprocess_threads: int = 0,
     ):
-        if isinstance(inputs, collections.abc.Sized):
+        if preprocess_threads > 0 and self.tokenizer is not None:
+            logger.warning(
+                "`preprocess_threads` is not supported by pipelines with a tokenizer since tokenizers cannot be used from"
+                " several threads at once, ignoring it."
+            )
+            preprocess_threads = 0
+        if preprocess_threads > 0:
+            if num_workers > 1:
+                logger.warning(
+                    "Preprocessing with threads already makes the dataset iterable, using num_workers>1 is likely to"
+                    " result in errors, setting `num_workers=1` to guarantee correctness."
+                )
+                num_workers = 1
+            dataset = PipelineThreadPoolIterator(inputs, self.preprocess, preprocess_params, preprocess_threads)
+        elif isinstance(inputs, collections.abc.Sized):
             dataset = PipelineDataset(inputs, self.preprocess, preprocess_params)
         else:
             if num_workers > 1:
@@ -944,12 +992,42 @@ class Pipeline(_ScikitCompat):
             logger.info("Disabling tokenizer parallelism, we're using DataLoader multithreading already")
             os.environ["TOKENIZERS_PARALLELISM"] = "false"
         collate_fn = no_collate_fn if batch_size == 1 else pad_collate_fn(self.tokenizer, self.feature_extractor)
-        dataloader = DataLoader(dataset, num_workers=num_workers, batch_size=batch_size, collate_fn=collate_fn)
-        model_iterator = PipelineIterator(dataloader, self.forward, forward_params, loader_batch_size=batch_size)
+        if group_by_length and batch_size > 1:
+            # Preprocessed items are fetched one by one so that they can be regrouped by length before batching.
+            dataloader = DataLoader(dataset, num_workers=num_workers, batch_size=1, collate_fn=no_collate_fn)
+            if prefetch_size > 0:
+                dataloader = PipelinePrefetchIterator(dataloader, max_size=prefetch_size * batch_size)
+            model_iterator = PipelineLengthGroupedIterator(
+                dataloader,
+                self.forward,
+                forward_params,
+                loader_batch_size=batch_size,
+                collate_fn=collate_fn,
+                window_size=length_grouping_window,
+            )
+        else:
+            dataloader = DataLoader(dataset, num_workers=num_workers, batch_size=batch_size, collate_fn=collate_fn)
+            if prefetch_size > 0:
+                dataloader = PipelinePrefetchIterator(dataloader, max_size=prefetch_size)
+            model_iterator = PipelineIterator(dataloader, self.forward, forward_params, loader_batch_size=batch_size)
+        if prefetch_size > 0:
+            # `model_iterator` yields unbatched outputs.
+            model_iterator = PipelinePrefetchIterator(model_iterator, max_size=prefetch_size * batch_size)
         final_iterator = PipelineIterator(model_iterator, self.postprocess, postprocess_params)
         return final_iterator
 
-    def __call__(self, inputs, *args, num_workers=None, batch_size=None, **kwargs):
+    def __call__(
+        self,
+        inputs,
+        *args,
+        num_workers=None,
+        batch_size=None,
+        group_by_length=None,
+        length_grouping_window=None,
+        prefetch_size=None,
+        preprocess_threads=None,
+        **kwargs
+    ):
         if args:
             logger.warning(f"Ignoring args : {args}")
 
@@ -963,6 +1041,14 @@ class Pipeline(_ScikitCompat):
                 batch_size = 1
             else:
                 batch_size = self._batch_size
+        if group_by_length is None:
+            group_by_length = self._group_by_length
+        if length_grouping_window is None:
+            length_grouping_window = self._length_grouping_window
+        if prefetch_size is None:
+            prefetch_size = self._prefetch_size
+        if preprocess_threads is None:
+            preprocess_threads = self._preprocess_threads
 
         preprocess_params, forward_params, postprocess_params = self._sanitize_parameters(**kwargs)
 
@@ -990,7 +1076,16 @@ class Pipeline(_ScikitCompat):
         if is_list:
             if can_use_iterator:
                 final_iterator = self.get_iterator(
-                    inputs, num_workers, batch_size, preprocess_params, forward_params, postprocess_params
+                    inputs,
+                    num_workers,
+                    batch_size,
+                    preprocess_params,
+                    forward_params,
+                    postprocess_params,
+                    group_by_length=group_by_length,
+                    length_grouping_window=length_grouping_window,
+                    prefetch_size=prefetch_size,
+                    preprocess_threads=preprocess_threads,
                 )
                 outputs = [output for output in final_iterator]
                 return outputs
@@ -998,7 +1093,16 @@ class Pipeline(_ScikitCompat):
                 return self.run_multi(inputs, preprocess_params, forward_params, postprocess_params)
         elif can_use_iterator:
             return self.get_iterator(
-                inputs, num_workers, batch_size, preprocess_params, forward_params, postprocess_params
+                inputs,
+                num_workers,
+                batch_size,
+                preprocess_params,
+                forward_params,
+                postprocess_params,
+                group_by_length=group_by_length,
+                length_grouping_window=length_grouping_window,
+                prefetch_size=prefetch_size,
+                preprocess_threads=preprocess_threads,
             )
         elif is_iterable:
             return self.iterate(inputs, preprocess_params, forward_params, postprocess_params)
@@ -1031,8 +1135,28 @@ class ChunkPipeline(Pipeline):
         return outputs
 
     def get_iterator(
-        self, inputs, num_workers: int, batch_size: int, preprocess_params, forward_params, postprocess_params
+        self,
+        inputs,
+        num_workers: int,
+        batch_size: int,
+        preprocess_params,
+        forward_params,
+        postprocess_params,
+        group_by_length: bool = False,
+        length_grouping_window: Optional[int] = None,
+        prefetch_size: int = 0,
+        preprocess_threads: int = 0,
     ):
+        if group_by_length:
+            logger.warning(
+                "`group_by_length` is not supported by chunk pipelines since all the chunks of an input need to be"
+                " processed contiguously, ignoring it."
+            )
+        if preprocess_threads > 0:
+            logger.warning(
+                "`preprocess_threads` is not supported by chunk pipelines since inputs are split into chunks lazily,"
+                " ignoring it."
+            )
         if "TOKENIZERS_PARALLELISM" not in os.environ:
             logger.info("Disabling tokenizer parallelism, we're using DataLoader multithreading already")
             os.environ["TOKENIZERS_PARALLELISM"] = "false"
@@ -1044,6 +1168,10 @@ class ChunkPipeline(Pipeline):
         dataset = PipelineChunkIterator(inputs, self.preprocess, preprocess_params)
         collate_fn = no_collate_fn if batch_size == 1 else pad_collate_fn(self.tokenizer, self.feature_extractor)
         dataloader = DataLoader(dataset, num_workers=num_workers, batch_size=batch_size, collate_fn=collate_fn)
+        if prefetch_size > 0:
+            dataloader = PipelinePrefetchIterator(dataloader, max_size=prefetch_size)
         model_iterator = PipelinePackIterator(dataloader, self.forward, forward_params, loader_batch_size=batch_size)
+        if prefetch_size > 0:
+            model_iterator = PipelinePrefetchIterator(model_iterator, max_size=prefetch_size * batch_size)
         final_iterator = PipelineIterator(model_iterator, self.postprocess, postprocess_params)
         return final_iterator
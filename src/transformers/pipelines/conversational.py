@@ -1,4 +1,6 @@
+import inspect
 import uuid
+import weakref
 from typing import Any, Dict, List, Optional, Union
 
 from ..file_utils import add_end_docstrings, is_tf_available, is_torch_available
@@ -68,6 +70,18 @@ class Conversation:
         self.past_user_inputs: List[str] = past_user_inputs
         self.generated_responses: List[str] = generated_responses
         self.new_user_input: Optional[str] = text
+        # Token ids of the texts and model state of the last turn, see `iter_text_ids` and `ConversationalPipeline`.
+        self._cache = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cache"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Conversations pickled before the cache was added don't have one.
+        self.__dict__.setdefault("_cache", {})
 
     def __eq__(self, other):
         if not isinstance(other, Conversation):
@@ -135,6 +149,31 @@ class Conversation:
         if self.new_user_input:
             yield True, self.new_user_input
 
+    def iter_text_ids(self, tokenizer):
+        """
+        Iterates over all blobs of the conversation like [`~Conversation.iter_texts`], encoded with `tokenizer`
+        (without special tokens). The token ids of the texts are kept with the conversation, so that only new texts are
+        encoded on the next turn.
+
+        Returns: Iterator of (is_user, token_ids) in chronological order of the conversation. `is_user` is a `bool`,
+        `token_ids` is a `List[int]`.
+        """
+        tokenizer_ref = self._cache.get("tokenizer")
+        if tokenizer_ref is None or tokenizer_ref() is not tokenizer:
+            self._cache["tokenizer"] = weakref.ref(tokenizer)
+            self._cache["text_ids"] = {}
+        text_ids = self._cache["text_ids"]
+        for is_user, text in self.iter_texts():
+            if text not in text_ids:
+                text_ids[text] = tokenizer.encode(text, add_special_tokens=False)
+            yield is_user, text_ids[text]
+
+    def clear_cache(self):
+        """
+        Frees the token ids and model state kept with the conversation to speed up the next turn.
+        """
+        self._cache = {}
+
     def __repr__(self):
         """
         Generates a string representation of the conversation.
@@ -159,6 +198,11 @@ class Conversation:
             The minimum length (in number of tokens) for a response.
         minimum_tokens (`int`, *optional*, defaults to 10):
             The minimum length of tokens to leave for a response.
+        cache_past_key_values (`bool`, *optional*, defaults to `False`):
+            Whether or not to keep the keys and values computed by the model with each conversation (only for
+            decoder-only PyTorch models), so that the next turn only runs the model on the tokens that were added to
+            the conversation. The cache is dropped when the history of the conversation no longer starts with the same
+            tokens, for instance when it got truncated. Use [`~Conversation.clear_cache`] to free it.
     """,
 )
 class ConversationalPipeline(Pipeline):
@@ -195,7 +239,12 @@ class ConversationalPipeline(Pipeline):
             self.tokenizer.pad_token = self.tokenizer.eos_token
 
     def _sanitize_parameters(
-        self, min_length_for_response=None, minimum_tokens=None, clean_up_tokenization_spaces=None, **generate_kwargs
+        self,
+        min_length_for_response=None,
+        minimum_tokens=None,
+        clean_up_tokenization_spaces=None,
+        cache_past_key_values=None,
+        **generate_kwargs
     ):
         preprocess_params = {}
         forward_params = {}
@@ -205,6 +254,13 @@ class ConversationalPipeline(Pipeline):
             preprocess_params["min_length_for_response"] = min_length_for_response
         if minimum_tokens is not None:
             forward_params["minimum_tokens"] = minimum_tokens
+        if cache_past_key_values is not None:
+            if cache_past_key_values and not self.supports_past_key_values_caching:
+                raise ValueError(
+                    "`cache_past_key_values` is only supported for decoder-only PyTorch models returning "
+                    "`past_key_values`."
+                )
+            forward_params["cache_past_key_values"] = cache_past_key_values
 
         if "max_length" in generate_kwargs:
             forward_params["max_length"] = generate_kwargs["max_length"]
@@ -216,6 +272,17 @@ class ConversationalPipeline(Pipeline):
             forward_params.update(generate_kwargs)
         return preprocess_params, forward_params, postprocess_params
 
+    @property
+    def supports_past_key_values_caching(self) -> bool:
+        """
+        `bool`: Whether the keys and values of a conversation can be kept from one turn to the next.
+        """
+        return (
+            self.framework == "pt"
+            and not self.model.config.is_encoder_decoder
+            and "past_key_values" in inspect.signature(self.model.forward).parameters
+        )
+
     def __call__(self, conversations: Union[Conversation, List[Conversation]], num_workers=0, **kwargs):
         r"""
         Generate responses for the conversation(s) given as inputs.
@@ -225,6 +292,9 @@ class ConversationalPipeline(Pipeline):
                 Conversations to generate responses for.
             clean_up_tokenization_spaces (`bool`, *optional*, defaults to `False`):
                 Whether or not to clean up the potential extra spaces in the text output.
+            cache_past_key_values (`bool`, *optional*, defaults to `False`):
+                Whether or not to keep the keys and values computed by the model with each conversation, so that the
+                next turn only runs the model on the new tokens.
             generate_kwargs:
                 Additional keyword arguments to pass along to the generate method of the model (see the generate method
                 corresponding to your framework [here](./model#generative-models)).
@@ -262,7 +332,7 @@ class ConversationalPipeline(Pipeline):
             input_ids = tf.constant([input_ids])
         return {"input_ids": input_ids, "conversation": conversation}
 
-    def _forward(self, model_inputs, minimum_tokens=10, **generate_kwargs):
+    def _forward(self, model_inputs, minimum_tokens=10, cache_past_key_values=False, **generate_kwargs):
         max_length = generate_kwargs.get("max_length", self.model.config.max_length)
 
         n = model_inputs["input_ids"].shape[1]
@@ -274,13 +344,59 @@ class ConversationalPipeline(Pipeline):
                 model_inputs["attention_mask"] = model_inputs["attention_mask"][:, -trim:]
         conversation = model_inputs.pop("conversation")
         generate_kwargs["max_length"] = max_length
-        output_ids = self.model.generate(**model_inputs, **generate_kwargs)
+        if cache_past_key_values and model_inputs["input_ids"].shape[0] == 1:
+            output_ids = self._generate_with_past(conversation, model_inputs["input_ids"], **generate_kwargs)
+        else:
+            output_ids = self.model.generate(**model_inputs, **generate_kwargs)
         if self.model.config.is_encoder_decoder:
             start_position = 1
         else:
             start_position = n
         return {"output_ids": output_ids[:, start_position:], "conversation": conversation}
 
+    def _generate_with_past(self, conversation: Conversation, input_ids, **generate_kwargs):
+        num_beams = generate_kwargs.get("num_beams", self.model.config.num_beams)
+        num_return_sequences = generate_kwargs.get("num_return_sequences", self.model.config.num_return_sequences)
+        if num_beams != 1 or num_return_sequences != 1:
+            raise ValueError("`cache_past_key_values` only supports generating one sequence without beam search.")
+
+        # Keys and values of the tokens the conversation already went through, as long as the history still starts
+        # with them. The last input token is left to `generate`, which only runs the model on it given a `past`.
+        past, num_cached = None, 0
+        model_ref = conversation._cache.get("model")
+        if model_ref is not None and model_ref() is self.model:
+            num_cached = _common_prefix_length(conversation._cache["past_ids"], input_ids[0].tolist())
+            num_cached = min(num_cached, input_ids.shape[1] - 1)
+            if num_cached > 0:
+                past = _truncate_past(conversation._cache["past_key_values"], num_cached)
+            if past is None:
+                num_cached = 0
+        for key in ("model", "past_ids", "past_key_values"):
+            conversation._cache.pop(key, None)
+        if num_cached < input_ids.shape[1] - 1:
+            past = self.model.base_model(
+                input_ids[:, num_cached:-1], past_key_values=past, use_cache=True
+            ).past_key_values
+
+        last_outputs = {}
+
+        def keep_past(module, inputs, outputs):
+            last_outputs["past_key_values"] = outputs.get("past_key_values")
+
+        hook = self.model.register_forward_hook(keep_past)
+        try:
+            output_ids = self.model.generate(input_ids=input_ids, past=past, **generate_kwargs)
+        finally:
+            hook.remove()
+
+        # The last model call ran on all the tokens but the last generated one.
+        past = last_outputs.get("past_key_values")
+        if past is not None and _past_length(past) == output_ids.shape[1] - 1:
+            conversation._cache["model"] = weakref.ref(self.model)
+            conversation._cache["past_ids"] = output_ids[0, :-1].tolist()
+            conversation._cache["past_key_values"] = past
+        return output_ids
+
     def postprocess(self, model_outputs, clean_up_tokenization_spaces=True):
         output_ids = model_outputs["output_ids"]
         answer = self.tokenizer.decode(
@@ -296,12 +412,40 @@ class ConversationalPipeline(Pipeline):
     def _legacy_parse_and_tokenize(self, conversation: Conversation) -> Dict:
         eos_token_id = self.tokenizer.eos_token_id
         input_ids = []
-        for is_user, text in conversation.iter_texts():
+        for is_user, text_ids in conversation.iter_text_ids(self.tokenizer):
             if eos_token_id is not None:
-                input_ids.extend(self.tokenizer.encode(text, add_special_tokens=False) + [eos_token_id])
+                input_ids.extend(text_ids + [eos_token_id])
             else:
-                input_ids.extend(self.tokenizer.encode(text, add_special_tokens=False))
+                input_ids.extend(text_ids)
 
         if len(input_ids) > self.tokenizer.model_max_length:
             input_ids = input_ids[-self.tokenizer.model_max_length :]
         return input_ids
+
+
+def _common_prefix_length(ids: List[int], other_ids: List[int]) -> int:
+    length = 0
+    for token_id, other_token_id in zip(ids, other_ids):
+        if token_id != other_token_id:
+            break
+        length += 1
+    return length
+
+
+def _past_length(past) -> Optional[int]:
+    """
+    Number of tokens covered by `past`, when it holds one tuple of tensors of shape (batch_size, num_heads,
+    sequence_length, head_dim) per layer, `None` otherwise.
+    """
+    lengths = {
+        tensor.shape[-2] if isinstance(tensor, torch.Tensor) and tensor.dim() == 4 else None
+        for layer_past in past
+        for tensor in layer_past
+    }
+    return lengths.pop() if len(lengths) == 1 else None
+
+
+def _truncate_past(past, length: int):
+    if _past_length(past) is None:
+        return None
+    return tuple(tuple(tensor[:, :, :length] for tensor in layer_past) for layer_past in past)
@@ -0,0 +1,290 @@
+# coding=utf-8
+# Copyright 2022 The HuggingFace Team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from ..file_utils import is_torch_available
+from .base import ChunkPipeline, Pipeline, no_collate_fn, pad_collate_fn
+
+
+if is_torch_available():
+    from .pt_utils import PipelineIterator
+
+
+class _Request:
+    """
+    Bookkeeping for one call to [`DynamicBatchingExecutor.submit`]: the parameters it was submitted with, the model
+    outputs of its chunks as they come back from the batching thread and the future its result is delivered to.
+    """
+
+    def __init__(self, future: Future, forward_params: dict, postprocess_params: dict):
+        self.future = future
+        self.forward_params = forward_params
+        self.postprocess_params = postprocess_params
+        self.model_outputs = None
+        self.num_pending_chunks = None
+
+
+class DynamicBatchingExecutor:
+    """
+    Thread-safe front-end to a [`Pipeline`] that coalesces concurrent requests into batched forward passes, typically
+    to serve a pipeline behind a web server where every request only holds one input.
+
+    Each submitted input goes through:
+
+        preprocess (worker pool) -> batched forward (batching thread) -> postprocess (worker pool)
+
+    The batching thread waits for up to `max_wait_ms` milliseconds after the first pending input to gather up to
+    `max_batch_size` inputs, pads them together and runs a single forward pass. Only inputs with the same forward
+    parameters end up in the same batch. The results are then dispatched back to each caller, either through the
+    [`~concurrent.futures.Future`] returned by [`~DynamicBatchingExecutor.submit`], by calling the executor directly or
+    by awaiting [`~DynamicBatchingExecutor.acall`] from asyncio code.
+
+    Inputs are given to `preprocess` as is, exactly like the elements of a dataset or a list given to the pipeline, and
+    call parameters are resolved like in [`Pipeline.__call__`].
+
+    Only PyTorch pipelines are supported. Fast tokenizers cannot be used from several threads at once, so when the
+    pipeline has one, the `preprocess` calls of the worker pool are run one at a time.
+
+    Args:
+        pipeline ([`Pipeline`]):
+            The pipeline to serve.
+        max_batch_size (`int`, *optional*, defaults to 8):
+            The maximum number of inputs (or chunks of inputs for a [`ChunkPipeline`]) run in a single forward pass.
+        max_wait_ms (`float`, *optional*, defaults to 5):
+            How long to wait for other inputs after the first pending one, in milliseconds, before running an
+            incomplete batch.
+        num_workers (`int`, *optional*, defaults to 4):
+            The number of threads used to run `preprocess`, and the number of threads used to run `postprocess`.
+
+    Example:
+
+    ```python
+    >>> from transformers import pipeline, DynamicBatchingExecutor
+
+    >>> classifier = pipeline("text-classification")
+    >>> executor = DynamicBatchingExecutor(classifier, max_batch_size=32, max_wait_ms=10)
+
+    >>> # Can be called concurrently from any number of threads
+    >>> result = executor("This restaurant is awesome")
+
+    >>> # Or awaited from coroutines
+    >>> async def classify(text):
+    ...     return await executor.acall(text)
+
+
+    >>> executor.close()
+    ```"""
+
+    def __init__(
+        self, pipeline: Pipeline, max_batch_size: int = 8, max_wait_ms: float = 5, num_workers: Optional[int] = 4
+    ):
+        if pipeline.framework != "pt":
+            raise ValueError(f"DynamicBatchingExecutor only supports PyTorch pipelines, got {pipeline.framework}.")
+        if max_batch_size < 1:
+            raise ValueError(f"`max_batch_size` has to be a positive integer, got {max_batch_size}.")
+        self.pipeline = pipeline
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.collate_fn = (
+            no_collate_fn if max_batch_size == 1 else pad_collate_fn(pipeline.tokenizer, pipeline.feature_extractor)
+        )
+
+        self._queue = queue.Queue()
+        self._preprocess_workers = ThreadPoolExecutor(
+            max_workers=num_workers, thread_name_prefix="pipeline-preprocess"
+        )
+        self._postprocess_workers = ThreadPoolExecutor(
+            max_workers=num_workers, thread_name_prefix="pipeline-postprocess"
+        )
+        # Fast tokenizers raise "Already borrowed" when their truncation or padding settings are changed while another
+        # thread is using them.
+        tokenizer = pipeline.tokenizer
+        self._preprocess_lock = threading.Lock() if tokenizer is not None and tokenizer.is_fast else None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._batching_thread = threading.Thread(target=self._batching_loop, name="pipeline-batching", daemon=True)
+        self._batching_thread.start()
+
+    def submit(self, inputs: Any, **kwargs) -> Future:
+        """
+        Schedules `inputs` to be run through the pipeline.
+
+        Args:
+            inputs:
+                A single input for the pipeline `preprocess` method.
+            kwargs:
+                Call parameters of the pipeline, overriding the ones it was initialized with.
+
+        Return:
+            [`~concurrent.futures.Future`]: A future holding the output of the pipeline for `inputs`.
+        """
+        preprocess_params, forward_params, postprocess_params = self.pipeline._sanitize_parameters(**kwargs)
+        preprocess_params = {**self.pipeline._preprocess_params, **preprocess_params}
+        forward_params = {**self.pipeline._forward_params, **forward_params}
+        postprocess_params = {**self.pipeline._postprocess_params, **postprocess_params}
+
+        future = Future()
+        future.set_running_or_notify_cancel()
+        request = _Request(future, forward_params, postprocess_params)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Cannot submit new inputs to a closed DynamicBatchingExecutor.")
+            self._preprocess_workers.submit(self._preprocess, request, inputs, preprocess_params)
+        return future
+
+    def __call__(self, inputs: Any, **kwargs):
+        """
+        Runs `inputs` through the pipeline, batched with the inputs of concurrent callers, and waits for its output.
+        """
+        return self.submit(inputs, **kwargs).result()
+
+    async def acall(self, inputs: Any, **kwargs):
+        """
+        Asyncio version of [`~DynamicBatchingExecutor.__call__`], which does not block the event loop while waiting for
+        the output.
+        """
+        return await asyncio.wrap_future(self.submit(inputs, **kwargs))
+
+    def close(self):
+        """
+        Stops accepting new inputs and blocks until all the pending ones have been processed.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        # Each stage feeds the next one, so they are stopped in order.
+        self._preprocess_workers.shutdown(wait=True)
+        self._queue.put(None)
+        self._batching_thread.join()
+        self._postprocess_workers.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _run_preprocess(self, inputs: Any, preprocess_params: dict) -> List:
+        if isinstance(self.pipeline, ChunkPipeline):
+            return list(self.pipeline.preprocess(inputs, **preprocess_params))
+        return [self.pipeline.preprocess(inputs, **preprocess_params)]
+
+    def _preprocess(self, request: _Request, inputs: Any, preprocess_params: dict):
+        try:
+            if self._preprocess_lock is None:
+                model_inputs = self._run_preprocess(inputs, preprocess_params)
+            else:
+                with self._preprocess_lock:
+                    model_inputs = self._run_preprocess(inputs, preprocess_params)
+        except Exception as e:
+            request.future.set_exception(e)
+            return
+        request.model_outputs = [None] * len(model_inputs)
+        request.num_pending_chunks = len(model_inputs)
+        if len(model_inputs) == 0:
+            # Nothing goes through the batching thread, the (empty) result can be computed right away.
+            self._postprocess_workers.submit(self._postprocess, request)
+            return
+        for index, chunk in enumerate(model_inputs):
+            self._queue.put((request, index, chunk))
+
+    def _next_batch(self) -> Optional[List]:
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                # Let the loop stop once this batch is done.
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _batching_loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            # Inputs can only share a forward pass if they are run with the same forward parameters and keys.
+            groups = []
+            for item in batch:
+                request, _, model_inputs = item
+                for group in groups:
+                    group_request, _, group_inputs = group[0]
+                    if (
+                        group_request.forward_params == request.forward_params
+                        and group_inputs.keys() == model_inputs.keys()
+                    ):
+                        group.append(item)
+                        break
+                else:
+                    groups.append([item])
+            for group in groups:
+                self._forward(group)
+
+    def _forward(self, group: List):
+        requests = [request for request, _, _ in group]
+        try:
+            model_inputs = self.collate_fn([model_inputs for _, _, model_inputs in group])
+            model_outputs = self.pipeline.forward(model_inputs, **requests[0].forward_params)
+            if self.max_batch_size == 1:
+                unbatched_outputs = [model_outputs]
+            else:
+                # Reuse `PipelineIterator` to unbatch the outputs exactly like the regular batched iteration does.
+                unbatched_outputs = list(
+                    PipelineIterator([model_outputs], lambda x: x, {}, loader_batch_size=len(group))
+                )
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        for (request, index, _), output in zip(group, unbatched_outputs):
+            if request.future.done():
+                # Another chunk of this request already failed.
+                continue
+            request.model_outputs[index] = output
+            request.num_pending_chunks -= 1
+            if request.num_pending_chunks == 0:
+                self._postprocess_workers.submit(self._postprocess, request)
+
+    def _postprocess(self, request: _Request):
+        try:
+            if isinstance(self.pipeline, ChunkPipeline):
+                for output in request.model_outputs:
+                    output.pop("is_last")
+                outputs = self.pipeline.postprocess(request.model_outputs, **request.postprocess_params)
+            else:
+                outputs = self.pipeline.postprocess(request.model_outputs[0], **request.postprocess_params)
+        except Exception as e:
+            request.future.set_exception(e)
+            return
+        request.future.set_result(outputs)
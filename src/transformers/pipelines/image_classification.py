@@ -1,5 +1,7 @@
 from typing import List, Union
 
+import numpy as np
+
 from ..file_utils import (
     add_end_docstrings,
     is_tf_available,
@@ -22,6 +24,8 @@ if is_tf_available():
     from ..models.auto.modeling_tf_auto import TF_MODEL_FOR_IMAGE_CLASSIFICATION_MAPPING
 
 if is_torch_available():
+    import torch
+
     from ..models.auto.modeling_auto import MODEL_FOR_IMAGE_CLASSIFICATION_MAPPING
 
 logger = logging.get_logger(__name__)
@@ -88,10 +92,20 @@ class ImageClassificationPipeline(Pipeline):
 
     def preprocess(self, image):
         image = load_image(image)
+        if self.framework == "pt" and getattr(self.feature_extractor, "supports_batched_normalization", False):
+            # Normalized in `_forward`, once for the whole batch.
+            image = self.feature_extractor.resize_and_crop(image)
+            return {"uint8_pixel_values": torch.from_numpy(np.array(image))[None]}
         model_inputs = self.feature_extractor(images=image, return_tensors=self.framework)
         return model_inputs
 
     def _forward(self, model_inputs):
+        if "uint8_pixel_values" in model_inputs:
+            model_inputs["pixel_values"] = self.feature_extractor.normalize_batch(
+                model_inputs.pop("uint8_pixel_values"),
+                self.feature_extractor.image_mean,
+                self.feature_extractor.image_std,
+            )
         model_outputs = self.model(**model_inputs)
         return model_outputs
 
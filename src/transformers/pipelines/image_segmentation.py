@@ -94,12 +94,27 @@ class ImageSegmentationPipeline(Pipeline):
     def preprocess(self, image):
         image = load_image(image)
         target_size = torch.IntTensor([[image.height, image.width]])
+        if getattr(self.feature_extractor, "supports_batched_normalization", False):
+            # Normalized in `_forward`, once for the whole batch.
+            image = self.feature_extractor.resize_and_crop(image)
+            return {"uint8_pixel_values": torch.from_numpy(np.array(image))[None], "target_size": target_size}
         inputs = self.feature_extractor(images=[image], return_tensors="pt")
         inputs["target_size"] = target_size
         return inputs
 
     def _forward(self, model_inputs):
         target_size = model_inputs.pop("target_size")
+        if "uint8_pixel_values" in model_inputs:
+            pixel_values = self.feature_extractor.normalize_batch(
+                model_inputs.pop("uint8_pixel_values"),
+                self.feature_extractor.image_mean,
+                self.feature_extractor.image_std,
+            )
+            # Images of a batch have the same size, no pixel is padding.
+            model_inputs["pixel_values"] = pixel_values
+            model_inputs["pixel_mask"] = torch.ones(
+                (pixel_values.shape[0],) + pixel_values.shape[2:], dtype=torch.long, device=pixel_values.device
+            )
         model_outputs = self.model(**model_inputs)
         model_outputs["target_size"] = target_size
         return model_outputs
@@ -0,0 +1,303 @@
+# coding=utf-8
+# Copyright 2022 The HuggingFace Team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import copy
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+
+from ..file_utils import ModelOutput, is_torch_available
+from .base import Pipeline
+from .feature_extraction import FeatureExtractionPipeline
+from .text_classification import TextClassificationPipeline
+from .token_classification import TokenClassificationPipeline
+
+
+if is_torch_available():
+    import torch
+    from torch import nn
+
+
+SUPPORTED_PIPELINES = (TextClassificationPipeline, TokenClassificationPipeline, FeatureExtractionPipeline)
+
+
+def _get_layers_container(model):
+    """
+    Returns the name of the module of the base model of `model` holding its list of layers, for BERT-like encoders
+    (`encoder.layer`) and DistilBERT-like encoders (`transformer.layer`).
+    """
+    base_model = model.base_model
+    if getattr(base_model, "embeddings", None) is not None:
+        for name in ("encoder", "transformer"):
+            container = getattr(base_model, name, None)
+            if container is not None and isinstance(getattr(container, "layer", None), nn.ModuleList):
+                return name
+    raise ValueError(
+        f"{model.__class__.__name__} is not supported by MultiTaskPipeline, only BERT-like encoders (with "
+        "`embeddings` and a list of `layer`) can share their lower layers."
+    )
+
+
+def _same_module(module, other) -> bool:
+    if module is other:
+        return True
+    state_dict, other_state_dict = module.state_dict(), other.state_dict()
+    if state_dict.keys() != other_state_dict.keys():
+        return False
+    return all(
+        state_dict[key].shape == other_state_dict[key].shape and torch.equal(state_dict[key], other_state_dict[key])
+        for key in state_dict
+    )
+
+
+def _replace_submodules(module, **submodules):
+    """
+    Shallow copy of `module` with some of its direct submodules replaced. Parameters are shared with `module`, which is
+    left untouched.
+    """
+    new_module = copy.copy(module)
+    new_module._modules = OrderedDict(module._modules)
+    new_module._modules.update(submodules)
+    return new_module
+
+
+if is_torch_available():
+
+    class _TrunkOutput(nn.Module):
+        """
+        Stands for the embeddings of a task head: the output of the shared trunk is given to the head as
+        `inputs_embeds`.
+        """
+
+        def forward(self, *args, inputs_embeds=None, **kwargs):
+            return inputs_embeds
+
+
+class MultiTaskPipeline(Pipeline):
+    """
+    Runs several pipelines whose models were fine-tuned from the same encoder over the same inputs, while only running
+    what they share once.
+
+    Inputs are tokenized once and go through the shared trunk of the models (their embeddings and the lower layers they
+    have in common, typically layers that were frozen during fine-tuning) once. The hidden states of the trunk are then
+    fanned out to the remaining layers and head of each model, and each output is postprocessed by its own pipeline.
+
+    Supports `text-classification`, `token-classification` and `feature-extraction` pipelines with BERT-like PyTorch
+    models (BERT, RoBERTa, ELECTRA, DistilBERT...) sharing the same tokenizer.
+
+    Arguments:
+        pipelines (`Dict[str, Pipeline]`):
+            The pipelines to run, by name. The outputs of the pipeline are dictionaries with the same keys.
+        num_shared_layers (`int`, *optional*):
+            The number of lower layers to run only once. Defaults to the number of lower layers that have the same
+            weights in all models.
+        truncation (`bool`, *optional*):
+            Whether to truncate inputs to the maximum length of the model. Defaults to `True` when the tokenizer has a
+            maximum length.
+
+    Example:
+
+    ```python
+    >>> from transformers import MultiTaskPipeline, pipeline
+
+    >>> enrichment = MultiTaskPipeline(
+    ...     {
+    ...         "sentiment": pipeline("text-classification", model="my-org/bert-sentiment"),
+    ...         "entities": pipeline("token-classification", model="my-org/bert-ner", aggregation_strategy="simple"),
+    ...         "embedding": pipeline("feature-extraction", model="my-org/bert-base"),
+    ...     }
+    ... )
+    >>> outputs = enrichment("My name is Sarah and I live in London", entities={"ignore_labels": []})
+    >>> sorted(outputs.keys())
+    ['embedding', 'entities', 'sentiment']
+    ```"""
+
+    def __init__(self, pipelines: Dict[str, Pipeline], num_shared_layers: Optional[int] = None, **kwargs):
+        if len(pipelines) == 0:
+            raise ValueError("MultiTaskPipeline needs at least one pipeline to run.")
+        self.pipelines = pipelines
+        first_pipeline = next(iter(pipelines.values()))
+        for name, task_pipeline in pipelines.items():
+            if not isinstance(task_pipeline, SUPPORTED_PIPELINES):
+                raise ValueError(
+                    f"{task_pipeline.__class__.__name__} ({name}) is not supported by MultiTaskPipeline, supported "
+                    f"pipelines are {', '.join(supported.__name__ for supported in SUPPORTED_PIPELINES)}."
+                )
+            if task_pipeline.framework != "pt":
+                raise ValueError("MultiTaskPipeline is only available in PyTorch.")
+            if task_pipeline.device != first_pipeline.device:
+                raise ValueError("The pipelines of a MultiTaskPipeline have to be on the same device.")
+            if task_pipeline.tokenizer.get_vocab() != first_pipeline.tokenizer.get_vocab():
+                raise ValueError("The pipelines of a MultiTaskPipeline have to share the same tokenizer.")
+
+        device = first_pipeline.device.index if first_pipeline.device.type == "cuda" else -1
+        super().__init__(
+            model=first_pipeline.model,
+            tokenizer=first_pipeline.tokenizer,
+            framework="pt",
+            device=device,
+            **kwargs,
+        )
+
+        containers = {name: _get_layers_container(p.model) for name, p in pipelines.items()}
+        layers = {name: getattr(p.model.base_model, containers[name]).layer for name, p in pipelines.items()}
+        first_name = next(iter(pipelines))
+        first_base_model = first_pipeline.model.base_model
+        # ELECTRA projects its embeddings to the hidden size before its first layer.
+        for embedding_name in ("embeddings", "embeddings_project"):
+            first_module = getattr(first_base_model, embedding_name, None)
+            modules = [getattr(p.model.base_model, embedding_name, None) for p in pipelines.values()]
+            if not all(
+                module is first_module
+                or (module is not None and first_module is not None and _same_module(first_module, module))
+                for module in modules
+            ):
+                raise ValueError("The models of the pipelines of a MultiTaskPipeline have to share their embeddings.")
+        max_shared_layers = 0
+        for i, layer in enumerate(layers[first_name]):
+            if not all(
+                len(task_layers) > i and _same_module(layer, task_layers[i]) for task_layers in layers.values()
+            ):
+                break
+            max_shared_layers = i + 1
+        if num_shared_layers is None:
+            num_shared_layers = max_shared_layers
+        elif num_shared_layers > max_shared_layers:
+            raise ValueError(
+                f"`num_shared_layers` is {num_shared_layers}, but the models only share their {max_shared_layers} "
+                "lower layers."
+            )
+        self.num_shared_layers = num_shared_layers
+
+        # The trunk and the heads share their parameters with the models of the pipelines.
+        trunk_container = _replace_submodules(
+            getattr(first_base_model, containers[first_name]),
+            layer=nn.ModuleList(list(layers[first_name])[:num_shared_layers]),
+        )
+        trunk_submodules = {containers[first_name]: trunk_container}
+        if getattr(first_base_model, "pooler", None) is not None:
+            trunk_submodules["pooler"] = None
+        self._trunk = _replace_submodules(first_base_model, **trunk_submodules)
+
+        self._heads = {}
+        for name, task_pipeline in pipelines.items():
+            model = task_pipeline.model
+            base_model = model.base_model
+            container = _replace_submodules(
+                getattr(base_model, containers[name]), layer=nn.ModuleList(list(layers[name])[num_shared_layers:])
+            )
+            head_submodules = {"embeddings": _TrunkOutput(), containers[name]: container}
+            if getattr(base_model, "embeddings_project", None) is not None:
+                # Already run by the trunk
+                head_submodules["embeddings_project"] = nn.Identity()
+            head = _replace_submodules(base_model, **head_submodules)
+            if model is not base_model:
+                head = _replace_submodules(model, **{model.base_model_prefix: head})
+            self._heads[name] = head
+
+    def _sanitize_parameters(self, truncation=None, **kwargs):
+        preprocess_params = {}
+        if truncation is not None:
+            preprocess_params["truncation"] = truncation
+
+        postprocess_params = {}
+        for name, params in kwargs.items():
+            if name not in self.pipelines:
+                raise ValueError(
+                    f"Unknown parameter {name}, parameters of each pipeline are given as a dictionary under its name "
+                    f"({', '.join(self.pipelines)})."
+                )
+            task_preprocess_params, task_forward_params, task_postprocess_params = self.pipelines[
+                name
+            ]._sanitize_parameters(**params)
+            if task_preprocess_params or task_forward_params:
+                raise ValueError(
+                    f"Only postprocessing parameters can be given to {name}, the inputs are tokenized and run through "
+                    f"the model once for all the pipelines (got {', '.join(params)})."
+                )
+            postprocess_params[name] = task_postprocess_params
+        return preprocess_params, {}, postprocess_params
+
+    def __call__(self, inputs: Union[str, List[str]], **kwargs):
+        """
+        Runs all the pipelines on the text(s) given as inputs.
+
+        Args:
+            inputs (`str` or `List[str]`):
+                One or several texts.
+            truncation (`bool`, *optional*):
+                Whether to truncate inputs to the maximum length of the model.
+            kwargs:
+                Parameters of the postprocessing of each pipeline, as a dictionary under the name of the pipeline.
+
+        Return:
+            A dictionary or a list of dictionaries with the output of each pipeline under its name.
+        """
+        return super().__call__(inputs, **kwargs)
+
+    def preprocess(self, inputs, truncation=None):
+        if truncation is None:
+            truncation = True if self.tokenizer.model_max_length and self.tokenizer.model_max_length > 0 else False
+        model_inputs = self.tokenizer(
+            inputs,
+            return_tensors=self.framework,
+            truncation=truncation,
+            return_special_tokens_mask=True,
+            return_offsets_mapping=self.tokenizer.is_fast,
+        )
+        model_inputs["sentence"] = inputs
+        return model_inputs
+
+    def _forward(self, model_inputs):
+        # Only needed by token classification postprocessing.
+        postprocess_inputs = {
+            name: model_inputs.pop(name)
+            for name in ("special_tokens_mask", "offset_mapping", "sentence")
+            if name in model_inputs
+        }
+
+        if "special_tokens_mask" in postprocess_inputs and "attention_mask" in model_inputs:
+            # Padding of batched inputs is not part of the entities
+            postprocess_inputs["special_tokens_mask"] = postprocess_inputs["special_tokens_mask"] | (
+                model_inputs["attention_mask"] == 0
+            )
+
+        hidden_states = self._trunk(**model_inputs)[0]
+        head_inputs = {
+            name: tensor for name, tensor in model_inputs.items() if name in {"attention_mask", "token_type_ids"}
+        }
+        model_outputs = {"input_ids": model_inputs["input_ids"], **postprocess_inputs}
+        for name, head in self._heads.items():
+            # `logits` or `last_hidden_state` for the heads of feature extraction pipelines.
+            model_outputs[f"{name}_outputs"] = head(inputs_embeds=hidden_states, **head_inputs)[0]
+        return model_outputs
+
+    def postprocess(self, model_outputs, **postprocess_params):
+        outputs = {}
+        for name, task_pipeline in self.pipelines.items():
+            task_outputs = model_outputs[f"{name}_outputs"]
+            if isinstance(task_pipeline, FeatureExtractionPipeline):
+                task_model_outputs = ModelOutput({"last_hidden_state": task_outputs})
+            elif isinstance(task_pipeline, TokenClassificationPipeline):
+                task_model_outputs = {
+                    "logits": task_outputs,
+                    "input_ids": model_outputs["input_ids"],
+                    "special_tokens_mask": model_outputs["special_tokens_mask"],
+                    "offset_mapping": model_outputs.get("offset_mapping", None),
+                    "sentence": model_outputs["sentence"],
+                }
+            else:
+                task_model_outputs = ModelOutput({"logits": task_outputs})
+            task_postprocess_params = {**task_pipeline._postprocess_params, **postprocess_params.get(name, {})}
+            outputs[name] = task_pipeline.postprocess(task_model_outputs, **task_postprocess_params)
+        return outputs
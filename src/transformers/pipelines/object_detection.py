@@ -1,5 +1,7 @@
 from typing import Any, Dict, List, Union
 
+import numpy as np
+
 from ..file_utils import add_end_docstrings, is_torch_available, is_vision_available, requires_backends
 from ..utils import logging
 from .base import PIPELINE_INIT_ARGS, Pipeline
@@ -82,12 +84,27 @@ class ObjectDetectionPipeline(Pipeline):
     def preprocess(self, image):
         image = load_image(image)
         target_size = torch.IntTensor([[image.height, image.width]])
+        if getattr(self.feature_extractor, "supports_batched_normalization", False):
+            # Normalized in `_forward`, once for the whole batch.
+            image = self.feature_extractor.resize_and_crop(image)
+            return {"uint8_pixel_values": torch.from_numpy(np.array(image))[None], "target_size": target_size}
         inputs = self.feature_extractor(images=[image], return_tensors="pt")
         inputs["target_size"] = target_size
         return inputs
 
     def _forward(self, model_inputs):
         target_size = model_inputs.pop("target_size")
+        if "uint8_pixel_values" in model_inputs:
+            pixel_values = self.feature_extractor.normalize_batch(
+                model_inputs.pop("uint8_pixel_values"),
+                self.feature_extractor.image_mean,
+                self.feature_extractor.image_std,
+            )
+            # Images of a batch have the same size, no pixel is padding.
+            model_inputs["pixel_values"] = pixel_values
+            model_inputs["pixel_mask"] = torch.ones(
+                (pixel_values.shape[0],) + pixel_values.shape[2:], dtype=torch.long, device=pixel_values.device
+            )
         outputs = self.model(**model_inputs)
         model_outputs = outputs.__class__({"target_size": target_size, **outputs})
         return model_outputs
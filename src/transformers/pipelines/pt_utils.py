@@ -1,3 +1,8 @@
+import collections
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import torch
 from torch.utils.data import Dataset, IterableDataset
@@ -280,6 +285,271 @@ class PipelinePackIterator(PipelineIterator):
         return accumulator
 
 
+class PipelineLengthGroupedIterator(PipelineIterator):
+    def __init__(self, loader, infer, params, loader_batch_size, collate_fn, window_size=None):
+        """
+        Roughly equivalent to
+
+        ```
+        for window in chunks(loader, window_size):
+            order = sorted(range(len(window)), key=lambda i: length(window[i]), reverse=True)
+            outputs = [None] * len(window)
+            for indices in chunks(order, loader_batch_size):
+                batch = infer(collate_fn([window[i] for i in indices]), **params)
+                for i, item in zip(indices, unbatch(batch)):
+                    outputs[i] = item
+            yield from outputs
+        ```
+
+        Items of `loader` are expected to be single (unbatched) preprocessed items. Within each window, items of
+        similar length are batched together so that padding is minimized, and the outputs are re-emitted in the
+        original order.
+
+                Arguments:
+                    loader (`torch.utils.data.DataLoader` or any iterator):
+                        The iterator that will be used to apply `infer` on.
+                    infer (any function):
+                        The function to apply of each batch of `loader`.
+                    params (`dict`):
+                        The parameters passed to `infer` along with every batch
+                    loader_batch_size (`int`):
+                        The number of items to batch together before calling `infer`.
+                    collate_fn (any function):
+                        The function used to collate a list of items of `loader` into a batch.
+                    window_size (`int`, *optional*):
+                        The number of items to look ahead before grouping them by length. Defaults to 50 times
+                        `loader_batch_size`.
+        """
+        super().__init__(loader, infer, params)
+        self.batch_size = loader_batch_size
+        self.collate_fn = collate_fn
+        self.window_size = window_size if window_size is not None else 50 * loader_batch_size
+
+    def __iter__(self):
+        self.iterator = iter(self.loader)
+        self._window_outputs = []
+        self._window_index = 0
+        return self
+
+    def _get_window(self):
+        window = []
+        while len(window) < self.window_size:
+            try:
+                window.append(next(self.iterator))
+            except StopIteration:
+                break
+        return window
+
+    def _infer_window(self, window):
+        lengths = [get_item_length(item) for item in window]
+        order = sorted(range(len(window)), key=lambda i: lengths[i], reverse=True)
+        batches = [order[i : i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        # Reuse `PipelineIterator` to unbatch the outputs exactly like the regular batched iteration does.
+        unbatcher = PipelineIterator(
+            [self.collate_fn([window[i] for i in indices]) for indices in batches],
+            self.infer,
+            self.params,
+            loader_batch_size=self.batch_size,
+        )
+        outputs = [None] * len(window)
+        for i, output in zip(order, unbatcher):
+            outputs[i] = output
+        return outputs
+
+    def __next__(self):
+        if self._window_index >= len(self._window_outputs):
+            window = self._get_window()
+            if not window:
+                raise StopIteration
+            self._window_outputs = self._infer_window(window)
+            self._window_index = 0
+        output = self._window_outputs[self._window_index]
+        self._window_index += 1
+        return output
+
+
+def get_item_length(item):
+    """
+    Returns the sequence length of a single preprocessed item, as used by [`PipelineLengthGroupedIterator`] to group
+    items of similar length. Items without any sequence are considered of length 0.
+    """
+    for key, value in item.items():
+        if key.startswith("input_") and isinstance(value, torch.Tensor) and value.dim() in (2, 3):
+            return value.shape[1]
+    return 0
+
+
+class _PrefetchError:
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class PipelinePrefetchIterator(IterableDataset):
+    _sentinel = object()
+
+    def __init__(self, loader, max_size):
+        """
+        Roughly equivalent to
+
+        ```
+        for item in loader:
+            yield item
+        ```
+
+        but `loader` is consumed by a background thread that stays up to `max_size` items ahead of the caller, so that
+        the work done by `loader` (typically preprocessing or running the model) overlaps with the work done on the
+        items it already yielded (typically running the model or postprocessing). Exceptions raised in the background
+        thread are raised again in the caller's thread.
+
+                Arguments:
+                    loader (`torch.utils.data.DataLoader` or any iterator):
+                        The iterator to consume in a background thread.
+                    max_size (`int`):
+                        The maximum number of items waiting to be consumed.
+        """
+        self.loader = loader
+        self.max_size = max_size
+        self._thread = None
+        self._stop_event = None
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        self._stop()
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._produce, args=(iter(self.loader), self._queue, self._stop_event), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _produce(self, iterator, items_queue, stop_event):
+        def put(item):
+            # Periodically check whether the consumer went away instead of blocking forever on a full queue.
+            while not stop_event.is_set():
+                try:
+                    items_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            # `PipelineIterator.__iter__` restarts the iteration, so `iterator` is advanced with `next` only.
+            while True:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                if not put(item):
+                    return
+        except Exception as e:
+            put(_PrefetchError(e))
+            return
+        put(self._sentinel)
+
+    def _stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def __next__(self):
+        if self._thread is None:
+            raise StopIteration
+        item = self._queue.get()
+        if item is self._sentinel:
+            self._thread.join()
+            self._thread = None
+            raise StopIteration
+        if isinstance(item, _PrefetchError):
+            self._thread.join()
+            self._thread = None
+            raise item.exception
+        return item
+
+    def __del__(self):
+        # Only signal the background thread, `__del__` might run in it.
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+
+class PipelineThreadPoolIterator(IterableDataset):
+    def __init__(self, loader, process, params, num_threads):
+        """
+        Roughly equivalent to
+
+        ```
+        for item in loader:
+            yield process(item, **params)
+        ```
+
+        but `process` runs on several items at once in a pool of `num_threads` threads, which speeds it up when it
+        releases the GIL (decoding and resizing images with PIL...). `process` has to be thread-safe: this is not the
+        case of tokenizers, fast tokenizers cannot be used from several threads at once. Items are still yielded in
+        order, and at most `2 * num_threads` of them are processed ahead of the caller.
+
+        Arguments:
+            loader (`torch.utils.data.Dataset` or any iterable):
+                The items to process.
+            process (any function):
+                The function to apply to each item, typically `Pipeline.preprocess`.
+            params (`dict`):
+                The parameters passed to `process`.
+            num_threads (`int`):
+                The number of threads running `process`.
+        """
+        self.loader = loader
+        self.process = process
+        self.params = params
+        self.num_threads = num_threads
+        self._executor = None
+        self._pending = collections.deque()
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        self._shutdown()
+        self.iterator = iter(self.loader)
+        self._executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix="pipeline-preprocess")
+        self._submit()
+        return self
+
+    def _submit(self):
+        while len(self._pending) < 2 * self.num_threads:
+            try:
+                item = next(self.iterator)
+            except StopIteration:
+                return
+            self._pending.append(self._executor.submit(self.process, item, **self.params))
+
+    def _shutdown(self):
+        while self._pending:
+            self._pending.popleft().cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def __next__(self):
+        if not self._pending:
+            self._shutdown()
+            raise StopIteration
+        future = self._pending.popleft()
+        try:
+            processed = future.result()
+        except Exception:
+            self._shutdown()
+            raise
+        self._submit()
+        return processed
+
+    def __del__(self):
+        self._shutdown()
+
+
 class KeyDataset(Dataset):
     def __init__(self, dataset: Dataset, key: str):
         self.dataset = dataset
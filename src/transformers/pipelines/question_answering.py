@@ -376,98 +376,119 @@ class QuestionAnsweringPipeline(ChunkPipeline):
         handle_impossible_answer=False,
         max_answer_len=15,
     ):
-        min_null_score = 1000000  # large and positive
-        answers = []
-        for output in model_outputs:
-            start_ = output["start"]
-            end_ = output["end"]
-            example = output["example"]
+        example = model_outputs[0]["example"]
+
+        # All the chunks of the example are scored together, padded to the length of the longest one.
+        max_length = max(np.shape(output["start"])[-1] for output in model_outputs)
+        dtype = np.asarray(model_outputs[0]["start"]).dtype
+        start_ = np.full((len(model_outputs), max_length), -10000.0, dtype=dtype)
+        end_ = np.full((len(model_outputs), max_length), -10000.0, dtype=dtype)
+        desired_tokens = np.zeros((len(model_outputs), max_length), dtype=bool)
+        for i, output in enumerate(model_outputs):
+            length = np.shape(output["start"])[-1]
+            start_[i, :length] = np.asarray(output["start"])[0]
+            end_[i, :length] = np.asarray(output["end"])[0]
 
             # Ensure padded tokens & question tokens cannot belong to the set of candidate answers.
-            undesired_tokens = np.abs(np.array(output["p_mask"]) - 1)
-
+            chunk_desired_tokens = np.abs(np.array(output["p_mask"]) - 1)
             if output.get("attention_mask", None) is not None:
-                undesired_tokens = undesired_tokens & output["attention_mask"].numpy()
-
-            # Generate mask
-            undesired_tokens_mask = undesired_tokens == 0.0
-
-            # Make sure non-context indexes in the tensor cannot contribute to the softmax
-            start_ = np.where(undesired_tokens_mask, -10000.0, start_)
-            end_ = np.where(undesired_tokens_mask, -10000.0, end_)
-
-            # Normalize logits and spans to retrieve the answer
-            start_ = np.exp(start_ - np.log(np.sum(np.exp(start_), axis=-1, keepdims=True)))
-            end_ = np.exp(end_ - np.log(np.sum(np.exp(end_), axis=-1, keepdims=True)))
-
-            if handle_impossible_answer:
-                min_null_score = min(min_null_score, (start_[0, 0] * end_[0, 0]).item())
-
-            # Mask CLS
-            start_[0, 0] = end_[0, 0] = 0.0
-
-            starts, ends, scores = self.decode(start_, end_, top_k, max_answer_len, undesired_tokens)
-            if not self.tokenizer.is_fast:
-                char_to_word = np.array(example.char_to_word_offset)
-
-                # Convert the answer (tokens) back to the original text
-                # Score: score from the model
-                # Start: Index of the first character of the answer in the context string
-                # End: Index of the character following the last character of the answer in the context string
-                # Answer: Plain text of the answer
-                for s, e, score in zip(starts, ends, scores):
-                    token_to_orig_map = output["token_to_orig_map"]
-                    answers.append(
-                        {
-                            "score": score.item(),
-                            "start": np.where(char_to_word == token_to_orig_map[s])[0][0].item(),
-                            "end": np.where(char_to_word == token_to_orig_map[e])[0][-1].item(),
-                            "answer": " ".join(example.doc_tokens[token_to_orig_map[s] : token_to_orig_map[e] + 1]),
-                        }
-                    )
-            else:
-                # Convert the answer (tokens) back to the original text
-                # Score: score from the model
-                # Start: Index of the first character of the answer in the context string
-                # End: Index of the character following the last character of the answer in the context string
-                # Answer: Plain text of the answer
-                question_first = bool(self.tokenizer.padding_side == "right")
+                chunk_desired_tokens = chunk_desired_tokens & np.asarray(output["attention_mask"])
+            desired_tokens[i, :length] = chunk_desired_tokens[0] != 0
+
+        # Make sure non-context indexes in the tensor cannot contribute to the softmax
+        start_ = np.where(desired_tokens, start_, -10000.0)
+        end_ = np.where(desired_tokens, end_, -10000.0)
+
+        # Normalize logits and spans to retrieve the answer
+        start_ = np.exp(start_ - np.log(np.sum(np.exp(start_), axis=-1, keepdims=True)))
+        end_ = np.exp(end_ - np.log(np.sum(np.exp(end_), axis=-1, keepdims=True)))
+
+        if handle_impossible_answer:
+            min_null_score = (start_[:, 0] * end_[:, 0]).min().item()
+
+        # Mask CLS
+        start_[:, 0] = end_[:, 0] = 0.0
+
+        chunks, starts, ends, scores = self._decode_spans(start_, end_, top_k, max_answer_len, desired_tokens)
+
+        answers = []
+        if not self.tokenizer.is_fast:
+            char_to_word = np.array(example.char_to_word_offset)
+            # `char_to_word` is sorted, so the first and last characters of every word are found all at once.
+            words = np.arange(len(example.doc_tokens))
+            word_start_chars = np.searchsorted(char_to_word, words, side="left")
+            word_end_chars = np.searchsorted(char_to_word, words, side="right") - 1
+
+            # Convert the answer (tokens) back to the original text
+            # Score: score from the model
+            # Start: Index of the first character of the answer in the context string
+            # End: Index of the character following the last character of the answer in the context string
+            # Answer: Plain text of the answer
+            for c, s, e, score in zip(chunks, starts, ends, scores):
+                token_to_orig_map = model_outputs[c]["token_to_orig_map"]
+                start_word = token_to_orig_map[s]
+                end_word = token_to_orig_map[e]
+                answers.append(
+                    {
+                        "score": score.item(),
+                        "start": word_start_chars[start_word].item(),
+                        "end": word_end_chars[end_word].item(),
+                        "answer": " ".join(example.doc_tokens[start_word : end_word + 1]),
+                    }
+                )
+        else:
+            # Convert the answer (tokens) back to the original text
+            # Score: score from the model
+            # Start: Index of the first character of the answer in the context string
+            # End: Index of the character following the last character of the answer in the context string
+            # Answer: Plain text of the answer
+            question_first = bool(self.tokenizer.padding_side == "right")
+            sequence_index = 1 if question_first else 0
+            chunk_word_to_tokens = {}
+            for c, s, e, score in zip(chunks, starts, ends, scores):
+                output = model_outputs[c]
                 enc = output["encoding"]
+                if c not in chunk_word_to_tokens:
+                    chunk_word_to_tokens[c] = self._get_word_to_tokens(enc, sequence_index)
+                token_to_word, word_first_token, word_last_token = chunk_word_to_tokens[c]
 
                 # Encoding was *not* padded, input_ids *might*.
                 # It doesn't make a difference unless we're padding on
                 # the left hand side, since now we have different offsets
                 # everywhere.
                 if self.tokenizer.padding_side == "left":
-                    offset = (output["input_ids"] == self.tokenizer.pad_token_id).numpy().sum()
+                    offset = (np.asarray(output["input_ids"]) == self.tokenizer.pad_token_id).sum()
                 else:
                     offset = 0
+                s = s - offset
+                e = e - offset
 
                 # Sometimes the max probability token is in the middle of a word so:
                 # - we start by finding the right word containing the token with `token_to_word`
-                # - then we convert this word in a character span with `word_to_chars`
-                sequence_index = 1 if question_first else 0
-                for s, e, score in zip(starts, ends, scores):
-                    s = s - offset
-                    e = e - offset
-                    try:
-                        start_word = enc.token_to_word(s)
-                        end_word = enc.token_to_word(e)
-                        start_index = enc.word_to_chars(start_word, sequence_index=sequence_index)[0]
-                        end_index = enc.word_to_chars(end_word, sequence_index=sequence_index)[1]
-                    except Exception:
-                        # Some tokenizers don't really handle words. Keep to offsets then.
-                        start_index = enc.offsets[s][0]
-                        end_index = enc.offsets[e][1]
-
-                    answers.append(
-                        {
-                            "score": score.item(),
-                            "start": start_index,
-                            "end": end_index,
-                            "answer": example.context_text[start_index:end_index],
-                        }
-                    )
+                # - then we convert this word in a character span with the first and last tokens of the word
+                start_word = token_to_word[s]
+                end_word = token_to_word[e]
+                if (
+                    start_word >= 0
+                    and end_word >= 0
+                    and word_last_token[start_word] >= 0
+                    and word_last_token[end_word] >= 0
+                ):
+                    start_index = enc.offsets[word_first_token[start_word]][0]
+                    end_index = enc.offsets[word_last_token[end_word]][1]
+                else:
+                    # Some tokenizers don't really handle words. Keep to offsets then.
+                    start_index = enc.offsets[s][0]
+                    end_index = enc.offsets[e][1]
+
+                answers.append(
+                    {
+                        "score": score.item(),
+                        "start": start_index,
+                        "end": end_index,
+                        "answer": example.context_text[start_index:end_index],
+                    }
+                )
 
         if handle_impossible_answer:
             answers.append({"score": min_null_score, "start": 0, "end": 0, "answer": ""})
@@ -476,6 +497,68 @@ class QuestionAnsweringPipeline(ChunkPipeline):
             return answers[0]
         return answers
 
+    def _get_word_to_tokens(self, enc, sequence_index: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorized version of `enc.token_to_word` and `enc.word_to_tokens` for the words of sequence `sequence_index`.
+        Returns the word index of every token (-1 for special tokens) and the first and last token of every word (-1
+        for words outside of `sequence_index`).
+        """
+        token_to_word = np.array([-1 if word is None else word for word in enc.word_ids])
+        sequence_ids = np.array([-1 if sequence_id is None else sequence_id for sequence_id in enc.sequence_ids])
+        num_words = token_to_word.max() + 1 if len(token_to_word) > 0 else 0
+
+        tokens = np.nonzero((sequence_ids == sequence_index) & (token_to_word >= 0))[0]
+        word_first_token = np.full(num_words, len(token_to_word))
+        word_last_token = np.full(num_words, -1)
+        np.minimum.at(word_first_token, token_to_word[tokens], tokens)
+        np.maximum.at(word_last_token, token_to_word[tokens], tokens)
+        return token_to_word, word_first_token, word_last_token
+
+    def _decode_spans(
+        self, start: np.ndarray, end: np.ndarray, topk: int, max_answer_len: int, desired_tokens: np.ndarray
+    ) -> Tuple:
+        """
+        Batched version of [`~QuestionAnsweringPipeline.decode`] selecting the `topk` best spans across all the chunks
+        of an example at once. Only spans of at most `max_answer_len` tokens are scored, so the score matrix is a band
+        of shape `(num_chunks, seq_len, max_answer_len)` instead of `(num_chunks, seq_len, seq_len)`.
+
+        Args:
+            start (`np.ndarray`): Start probabilities for each token of each chunk, of shape `(num_chunks, seq_len)`.
+            end (`np.ndarray`): End probabilities for each token of each chunk, of shape `(num_chunks, seq_len)`.
+            topk (`int`): Indicates how many possible answer span(s) to extract from the model output.
+            max_answer_len (`int`): Maximum size of the answer to extract from the model's output.
+            desired_tokens (`np.ndarray`): Boolean mask of the tokens that can be part of the answer.
+
+        Returns:
+            `Tuple`: The chunk index, start token index, end token index and score of each selected span, sorted by
+            decreasing score.
+        """
+        num_chunks, seq_len = start.shape
+        band = max(min(max_answer_len, seq_len), 0)
+
+        # candidates[c, i, d] is the score of the span going from token i to token i + d in chunk c
+        candidates = np.full((num_chunks, seq_len, band), -1.0, dtype=start.dtype)
+        for d in range(band):
+            valid = desired_tokens[:, : seq_len - d] & desired_tokens[:, d:]
+            candidates[:, : seq_len - d, d] = np.where(valid, start[:, : seq_len - d] * end[:, d:], -1.0)
+
+        #  Inspired by Chen & al. (https://github.com/facebookresearch/DrQA)
+        scores_flat = candidates.reshape(-1)
+        topk = min(topk, int((scores_flat >= 0).sum()))
+        if topk <= 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty, np.zeros(0, dtype=start.dtype)
+        if topk == 1:
+            idx_sort = np.array([np.argmax(scores_flat)])
+        elif topk == len(scores_flat):
+            idx_sort = np.argsort(-scores_flat, kind="stable")
+        else:
+            idx = np.argpartition(-scores_flat, topk - 1)[0:topk]
+            idx_sort = idx[np.argsort(-scores_flat[idx], kind="stable")]
+
+        chunks, starts, lengths = np.unravel_index(idx_sort, candidates.shape)
+        return chunks, starts, starts + lengths, scores_flat[idx_sort]
+
     def decode(
         self, start: np.ndarray, end: np.ndarray, topk: int, max_answer_len: int, undesired_tokens: np.ndarray
     ) -> Tuple:
@@ -501,28 +584,8 @@ class QuestionAnsweringPipeline(ChunkPipeline):
         if end.ndim == 1:
             end = end[None]
 
-        # Compute the score of each tuple(start, end) to be the real answer
-        outer = np.matmul(np.expand_dims(start, -1), np.expand_dims(end, 1))
-
-        # Remove candidate with end < start and end - start > max_answer_len
-        candidates = np.tril(np.triu(outer), max_answer_len - 1)
-
-        #  Inspired by Chen & al. (https://github.com/facebookresearch/DrQA)
-        scores_flat = candidates.flatten()
-        if topk == 1:
-            idx_sort = [np.argmax(scores_flat)]
-        elif len(scores_flat) < topk:
-            idx_sort = np.argsort(-scores_flat)
-        else:
-            idx = np.argpartition(-scores_flat, topk)[0:topk]
-            idx_sort = idx[np.argsort(-scores_flat[idx])]
-
-        starts, ends = np.unravel_index(idx_sort, candidates.shape)[1:]
-        desired_spans = np.isin(starts, undesired_tokens.nonzero()) & np.isin(ends, undesired_tokens.nonzero())
-        starts = starts[desired_spans]
-        ends = ends[desired_spans]
-        scores = candidates[0, starts, ends]
-
+        desired_tokens = np.reshape(undesired_tokens, start.shape) != 0
+        _, starts, ends, scores = self._decode_spans(start, end, topk, max_answer_len, desired_tokens)
         return starts, ends, scores
 
     def span_to_answer(self, text: str, start: int, end: int) -> Dict[str, Union[str, int]]:
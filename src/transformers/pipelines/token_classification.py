@@ -1,6 +1,6 @@
 import types
 import warnings
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 
@@ -236,10 +236,10 @@ class TokenClassificationPipeline(Pipeline):
         shifted_exp = np.exp(logits - maxes)
         scores = shifted_exp / shifted_exp.sum(axis=-1, keepdims=True)
 
-        pre_entities = self.gather_pre_entities(
+        pre_entities = self._gather_pre_entity_columns(
             sentence, input_ids, scores, offset_mapping, special_tokens_mask, aggregation_strategy
         )
-        grouped_entities = self.aggregate(pre_entities, aggregation_strategy)
+        grouped_entities = self._aggregate_columns(pre_entities, aggregation_strategy)
         # Filter anything that is in self.ignore_labels
         entities = [
             entity
@@ -259,109 +259,230 @@ class TokenClassificationPipeline(Pipeline):
         aggregation_strategy: AggregationStrategy,
     ) -> List[dict]:
         """Fuse various numpy arrays into dicts with all the information needed for aggregation"""
-        pre_entities = []
-        for idx, token_scores in enumerate(scores):
-            # Filter special_tokens, they should only occur
-            # at the sentence boundaries since we're not encoding pairs of
-            # sentences so we don't have to keep track of those.
-            if special_tokens_mask[idx]:
-                continue
-
-            word = self.tokenizer.convert_ids_to_tokens(int(input_ids[idx]))
-            if offset_mapping is not None:
-                start_ind, end_ind = offset_mapping[idx]
-                if not isinstance(start_ind, int):
-                    if self.framework == "pt":
-                        start_ind = start_ind.item()
-                        end_ind = end_ind.item()
-                    else:
-                        start_ind = int(start_ind.numpy())
-                        end_ind = int(end_ind.numpy())
-                word_ref = sentence[start_ind:end_ind]
-                if getattr(self.tokenizer._tokenizer.model, "continuing_subword_prefix", None):
-                    # This is a BPE, word aware tokenizer, there is a correct way
-                    # to fuse tokens
-                    is_subword = len(word) != len(word_ref)
-                else:
-                    # This is a fallback heuristic. This will fail most likely on any kind of text + punctuation mixtures that will be considered "words". Non word aware models cannot do better than this unfortunately.
-                    if aggregation_strategy in {
-                        AggregationStrategy.FIRST,
-                        AggregationStrategy.AVERAGE,
-                        AggregationStrategy.MAX,
-                    }:
-                        warnings.warn("Tokenizer does not support real words, using fallback heuristic", UserWarning)
-                    is_subword = sentence[start_ind - 1 : start_ind] != " " if start_ind > 0 else False
-
-                if int(input_ids[idx]) == self.tokenizer.unk_token_id:
-                    word = word_ref
-                    is_subword = False
-            else:
-                start_ind = None
-                end_ind = None
-                is_subword = False
-
-            pre_entity = {
-                "word": word,
-                "scores": token_scores,
-                "start": start_ind,
-                "end": end_ind,
-                "index": idx,
-                "is_subword": is_subword,
+        columns = self._gather_pre_entity_columns(
+            sentence, input_ids, scores, offset_mapping, special_tokens_mask, aggregation_strategy
+        )
+        return [
+            {
+                "word": columns["word"][i],
+                "scores": columns["scores"][i],
+                "start": columns["start"][i],
+                "end": columns["end"][i],
+                "index": columns["index"][i],
+                "is_subword": bool(columns["is_subword"][i]),
             }
-            pre_entities.append(pre_entity)
-        return pre_entities
+            for i in range(len(columns["word"]))
+        ]
+
+    def _gather_pre_entity_columns(
+        self,
+        sentence: str,
+        input_ids: np.ndarray,
+        scores: np.ndarray,
+        offset_mapping: Optional[List[Tuple[int, int]]],
+        special_tokens_mask: np.ndarray,
+        aggregation_strategy: AggregationStrategy,
+    ) -> Dict[str, Union[list, np.ndarray]]:
+        """
+        Columnar version of [`~TokenClassificationPipeline.gather_pre_entities`]: returns a dict with one list or array
+        per field instead of one dict per token.
+        """
+        # Filter special_tokens, they should only occur
+        # at the sentence boundaries since we're not encoding pairs of
+        # sentences so we don't have to keep track of those.
+        indices = np.flatnonzero(np.asarray(special_tokens_mask) == 0)
+        input_ids = np.asarray(input_ids)[indices]
+        words = self.tokenizer.convert_ids_to_tokens(input_ids.tolist())
+
+        if offset_mapping is not None:
+            offsets = np.asarray(offset_mapping).reshape(-1, 2)[indices]
+            starts = offsets[:, 0]
+            ends = offsets[:, 1]
+            if getattr(self.tokenizer._tokenizer.model, "continuing_subword_prefix", None):
+                # This is a BPE, word aware tokenizer, there is a correct way
+                # to fuse tokens
+                word_ref_lengths = np.maximum(np.minimum(ends, len(sentence)) - np.minimum(starts, len(sentence)), 0)
+                is_subword = np.array([len(word) for word in words], dtype=int) != word_ref_lengths
+            else:
+                # This is a fallback heuristic. This will fail most likely on any kind of text + punctuation mixtures that will be considered "words". Non word aware models cannot do better than this unfortunately.
+                if len(words) > 0 and aggregation_strategy in {
+                    AggregationStrategy.FIRST,
+                    AggregationStrategy.AVERAGE,
+                    AggregationStrategy.MAX,
+                }:
+                    warnings.warn("Tokenizer does not support real words, using fallback heuristic", UserWarning)
+                # A token is a subword unless it starts the sentence or follows a space.
+                is_space = np.append(np.array(list(sentence), dtype=str) == " ", False)
+                previous_chars = np.where((starts > 0) & (starts <= len(sentence)), starts - 1, len(sentence))
+                is_subword = (starts > 0) & ~is_space[previous_chars]
+
+            if self.tokenizer.unk_token_id is not None:
+                is_unk = input_ids == self.tokenizer.unk_token_id
+                for i in np.flatnonzero(is_unk):
+                    words[i] = sentence[starts[i] : ends[i]]
+                is_subword = is_subword & ~is_unk
+            starts = starts.tolist()
+            ends = ends.tolist()
+        else:
+            starts = [None] * len(words)
+            ends = [None] * len(words)
+            is_subword = np.zeros(len(words), dtype=bool)
+
+        return {
+            "word": words,
+            "scores": scores[indices],
+            "start": starts,
+            "end": ends,
+            "index": indices.tolist(),
+            "is_subword": is_subword,
+        }
+
+    def _pre_entity_columns(self, pre_entities: List[dict]) -> Dict[str, Union[list, np.ndarray]]:
+        if len(pre_entities) > 0:
+            scores = np.stack([pre_entity["scores"] for pre_entity in pre_entities])
+        else:
+            scores = np.zeros((0, len(self.model.config.id2label)))
+        return {
+            "word": [pre_entity["word"] for pre_entity in pre_entities],
+            "scores": scores,
+            "start": [pre_entity["start"] for pre_entity in pre_entities],
+            "end": [pre_entity["end"] for pre_entity in pre_entities],
+            "index": [pre_entity.get("index", None) for pre_entity in pre_entities],
+            "is_subword": np.array([pre_entity.get("is_subword", False) for pre_entity in pre_entities], dtype=bool),
+        }
 
     def aggregate(self, pre_entities: List[dict], aggregation_strategy: AggregationStrategy) -> List[dict]:
+        return self._aggregate_columns(self._pre_entity_columns(pre_entities), aggregation_strategy)
+
+    def _aggregate_columns(
+        self, pre_entities: Dict[str, Union[list, np.ndarray]], aggregation_strategy: AggregationStrategy
+    ) -> List[dict]:
         if aggregation_strategy in {AggregationStrategy.NONE, AggregationStrategy.SIMPLE}:
-            entities = []
-            for pre_entity in pre_entities:
-                entity_idx = pre_entity["scores"].argmax()
-                score = pre_entity["scores"][entity_idx]
-                entity = {
-                    "entity": self.model.config.id2label[entity_idx],
-                    "score": score,
-                    "index": pre_entity["index"],
-                    "word": pre_entity["word"],
-                    "start": pre_entity["start"],
-                    "end": pre_entity["end"],
-                }
-                entities.append(entity)
+            scores = pre_entities["scores"]
+            entity_ids = scores.argmax(axis=-1)
+            entity_scores = scores[np.arange(len(scores)), entity_ids]
+            words, starts, ends = pre_entities["word"], pre_entities["start"], pre_entities["end"]
+            if aggregation_strategy == AggregationStrategy.NONE:
+                return [
+                    {
+                        "entity": self.model.config.id2label[entity_idx],
+                        "score": entity_scores[i],
+                        "index": pre_entities["index"][i],
+                        "word": words[i],
+                        "start": starts[i],
+                        "end": ends[i],
+                    }
+                    for i, entity_idx in enumerate(entity_ids.tolist())
+                ]
         else:
-            entities = self.aggregate_words(pre_entities, aggregation_strategy)
+            entity_ids, entity_scores, words, starts, ends = self._aggregate_word_columns(
+                pre_entities, aggregation_strategy
+            )
+        return self._group_entity_columns(entity_ids, entity_scores, words, starts, ends)
+
+    def _aggregate_word_columns(
+        self, pre_entities: Dict[str, Union[list, np.ndarray]], aggregation_strategy: AggregationStrategy
+    ) -> Tuple[np.ndarray, np.ndarray, List[str], list, list]:
+        """
+        Columnar version of [`~TokenClassificationPipeline.aggregate_words`]: the scores of the tokens of each word are
+        reduced with segment reductions over the word boundaries.
+        """
+        if aggregation_strategy in {
+            AggregationStrategy.NONE,
+            AggregationStrategy.SIMPLE,
+        }:
+            raise ValueError("NONE and SIMPLE strategies are invalid for word aggregation")
 
-        if aggregation_strategy == AggregationStrategy.NONE:
-            return entities
-        return self.group_entities(entities)
+        scores = pre_entities["scores"]
+        num_tokens = len(scores)
+        if num_tokens == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=scores.dtype), [], [], []
+
+        is_word_start = ~np.asarray(pre_entities["is_subword"], dtype=bool)
+        is_word_start[0] = True
+        word_starts = np.flatnonzero(is_word_start)
+        word_ends = np.append(word_starts[1:], num_tokens)
 
-    def aggregate_word(self, entities: List[dict], aggregation_strategy: AggregationStrategy) -> dict:
-        word = self.tokenizer.convert_tokens_to_string([entity["word"] for entity in entities])
         if aggregation_strategy == AggregationStrategy.FIRST:
-            scores = entities[0]["scores"]
-            idx = scores.argmax()
-            score = scores[idx]
-            entity = self.model.config.id2label[idx]
+            word_scores = scores[word_starts]
         elif aggregation_strategy == AggregationStrategy.MAX:
-            max_entity = max(entities, key=lambda entity: entity["scores"].max())
-            scores = max_entity["scores"]
-            idx = scores.argmax()
-            score = scores[idx]
-            entity = self.model.config.id2label[idx]
+            token_max = scores.max(axis=-1)
+            # NaN scores never win over the first token of the word, like in `aggregate_word`.
+            is_nan = np.isnan(token_max)
+            token_max = np.where(is_nan, -np.inf, token_max)
+            word_max = np.maximum.reduceat(token_max, word_starts)
+            word_ids = np.cumsum(is_word_start) - 1
+            # Keep the first token reaching the maximum of its word.
+            candidates = np.where(token_max == word_max[word_ids], np.arange(num_tokens), num_tokens)
+            max_tokens = np.minimum.reduceat(candidates, word_starts)
+            max_tokens = np.where(is_nan[word_starts], word_starts, max_tokens)
+            word_scores = scores[max_tokens]
         elif aggregation_strategy == AggregationStrategy.AVERAGE:
-            scores = np.stack([entity["scores"] for entity in entities])
-            average_scores = np.nanmean(scores, axis=0)
-            entity_idx = average_scores.argmax()
-            entity = self.model.config.id2label[entity_idx]
-            score = average_scores[entity_idx]
+            # Equivalent to `np.nanmean` over the tokens of each word.
+            is_nan = np.isnan(scores)
+            sums = np.add.reduceat(np.where(is_nan, 0, scores), word_starts, axis=0)
+            counts = np.add.reduceat(~is_nan, word_starts, axis=0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                word_scores = (sums / counts).astype(scores.dtype)
         else:
             raise ValueError("Invalid aggregation_strategy")
-        new_entity = {
-            "entity": entity,
-            "score": score,
-            "word": word,
-            "start": entities[0]["start"],
-            "end": entities[-1]["end"],
-        }
-        return new_entity
+
+        entity_ids = word_scores.argmax(axis=-1)
+        entity_scores = word_scores[np.arange(len(word_scores)), entity_ids]
+        words = [
+            self.tokenizer.convert_tokens_to_string(pre_entities["word"][start:end])
+            for start, end in zip(word_starts, word_ends)
+        ]
+        starts = [pre_entities["start"][start] for start in word_starts]
+        ends = [pre_entities["end"][end - 1] for end in word_ends]
+        return entity_ids, entity_scores, words, starts, ends
+
+    def _group_entity_columns(
+        self, entity_ids: np.ndarray, entity_scores: np.ndarray, words: List[str], starts: list, ends: list
+    ) -> List[dict]:
+        """
+        Columnar version of [`~TokenClassificationPipeline.group_entities`]: entity boundaries are found on the arrays
+        of predicted labels, and only the resulting entity groups are turned into dicts.
+        """
+        if len(entity_ids) == 0:
+            return []
+
+        # The tags are computed once per label rather than once per entity
+        labels, inverse = np.unique(entity_ids, return_inverse=True)
+        label_names = [self.model.config.id2label[label] for label in labels.tolist()]
+        label_bi_tags = [self.get_tag(label_name) for label_name in label_names]
+        is_b = np.array([bi == "B" for bi, _ in label_bi_tags])[inverse]
+        tags = np.array([tag for _, tag in label_bi_tags], dtype=object)[inverse]
+        group_names = [label_name.split("-")[-1] for label_name in label_names]
+
+        # A new group starts when the tag changes, or on B- entities
+        is_group_start = np.ones(len(entity_ids), dtype=bool)
+        is_group_start[1:] = (tags[1:] != tags[:-1]) | is_b[1:]
+        group_starts = np.flatnonzero(is_group_start)
+        group_ends = np.append(group_starts[1:], len(entity_ids))
+
+        # Equivalent to `np.nanmean` over the entities of each group.
+        is_nan = np.isnan(entity_scores)
+        sums = np.add.reduceat(np.where(is_nan, 0, entity_scores), group_starts)
+        counts = np.add.reduceat(~is_nan, group_starts)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            group_scores = (sums / counts).astype(entity_scores.dtype)
+
+        return [
+            {
+                "entity_group": group_names[inverse[start]],
+                "score": group_scores[i],
+                "word": self.tokenizer.convert_tokens_to_string(words[start:end]),
+                "start": starts[start],
+                "end": ends[end - 1],
+            }
+            for i, (start, end) in enumerate(zip(group_starts, group_ends))
+        ]
+
+    def aggregate_word(self, entities: List[dict], aggregation_strategy: AggregationStrategy) -> dict:
+        columns = self._pre_entity_columns(entities)
+        columns["is_subword"] = np.arange(len(entities)) > 0
+        return self._word_entities(*self._aggregate_word_columns(columns, aggregation_strategy))[0]
 
     def aggregate_words(self, entities: List[dict], aggregation_strategy: AggregationStrategy) -> List[dict]:
         """
@@ -370,25 +491,22 @@ class TokenClassificationPipeline(Pipeline):
         Example: micro|soft| com|pany| B-ENT I-NAME I-ENT I-ENT will be rewritten with first strategy as microsoft|
         company| B-ENT I-ENT
         """
-        if aggregation_strategy in {
-            AggregationStrategy.NONE,
-            AggregationStrategy.SIMPLE,
-        }:
-            raise ValueError("NONE and SIMPLE strategies are invalid for word aggregation")
+        columns = self._pre_entity_columns(entities)
+        return self._word_entities(*self._aggregate_word_columns(columns, aggregation_strategy))
 
-        word_entities = []
-        word_group = None
-        for entity in entities:
-            if word_group is None:
-                word_group = [entity]
-            elif entity["is_subword"]:
-                word_group.append(entity)
-            else:
-                word_entities.append(self.aggregate_word(word_group, aggregation_strategy))
-                word_group = [entity]
-        # Last item
-        word_entities.append(self.aggregate_word(word_group, aggregation_strategy))
-        return word_entities
+    def _word_entities(
+        self, entity_ids: np.ndarray, entity_scores: np.ndarray, words: List[str], starts: list, ends: list
+    ) -> List[dict]:
+        return [
+            {
+                "entity": self.model.config.id2label[entity_idx],
+                "score": entity_scores[i],
+                "word": words[i],
+                "start": starts[i],
+                "end": ends[i],
+            }
+            for i, entity_idx in enumerate(entity_ids.tolist())
+        ]
 
     def group_sub_entities(self, entities: List[dict]) -> dict:
         """
@@ -411,6 +529,22 @@ class TokenClassificationPipeline(Pipeline):
         }
         return entity_group
 
+    def group_entities(self, entities: List[dict]) -> List[dict]:
+        """
+        Find and group together the adjacent tokens with the same entity predicted.
+
+        Args:
+            entities (`dict`): The entities predicted by the pipeline.
+        """
+        label_ids = {label: idx for idx, label in self.model.config.id2label.items()}
+        return self._group_entity_columns(
+            np.array([label_ids[entity["entity"]] for entity in entities], dtype=int),
+            np.array([entity["score"] for entity in entities], dtype=float),
+            [entity["word"] for entity in entities],
+            [entity["start"] for entity in entities],
+            [entity["end"] for entity in entities],
+        )
+
     def get_tag(self, entity_name: str) -> Tuple[str, str]:
         if entity_name.startswith("B-"):
             bi = "B"
@@ -425,42 +559,5 @@ class TokenClassificationPipeline(Pipeline):
             tag = entity_name
         return bi, tag
 
-    def group_entities(self, entities: List[dict]) -> List[dict]:
-        """
-        Find and group together the adjacent tokens with the same entity predicted.
-
-        Args:
-            entities (`dict`): The entities predicted by the pipeline.
-        """
-
-        entity_groups = []
-        entity_group_disagg = []
-
-        for entity in entities:
-            if not entity_group_disagg:
-                entity_group_disagg.append(entity)
-                continue
-
-            # If the current entity is similar and adjacent to the previous entity,
-            # append it to the disaggregated entity group
-            # The split is meant to account for the "B" and "I" prefixes
-            # Shouldn't merge if both entities are B-type
-            bi, tag = self.get_tag(entity["entity"])
-            last_bi, last_tag = self.get_tag(entity_group_disagg[-1]["entity"])
-
-            if tag == last_tag and bi != "B":
-                # Modify subword type to be previous_type
-                entity_group_disagg.append(entity)
-            else:
-                # If the current entity is different from the previous entity
-                # aggregate the disaggregated entity group
-                entity_groups.append(self.group_sub_entities(entity_group_disagg))
-                entity_group_disagg = [entity]
-        if entity_group_disagg:
-            # it's the last entity, add it to the entity groups
-            entity_groups.append(self.group_sub_entities(entity_group_disagg))
-
-        return entity_groups
-
 
 NerPipeline = TokenClassificationPipeline
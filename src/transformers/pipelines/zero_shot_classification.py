@@ -1,15 +1,22 @@
+import inspect
 from typing import List, Union
 
 import numpy as np
 
-from ..file_utils import add_end_docstrings
+from ..file_utils import add_end_docstrings, is_torch_available
 from ..tokenization_utils import TruncationStrategy
 from ..utils import logging
 from .base import PIPELINE_INIT_ARGS, ArgumentHandler, ChunkPipeline
 
 
+if is_torch_available():
+    import torch
+
 logger = logging.get_logger(__name__)
 
+# Maximum number of tokenized hypotheses kept across calls
+HYPOTHESIS_CACHE_SIZE = 4096
+
 
 class ZeroShotClassificationArgumentHandler(ArgumentHandler):
     """
@@ -43,6 +50,19 @@ class ZeroShotClassificationArgumentHandler(ArgumentHandler):
         return sequence_pairs, sequences
 
 
+def _expand_past_key_values(past_key_values, batch_size):
+    """
+    Repeats the keys and values computed for a single sequence along the batch dimension, which is the first dimension
+    of size 1 (some models stack keys and values in the same tensor).
+    """
+    if isinstance(past_key_values, (tuple, list)):
+        return type(past_key_values)(_expand_past_key_values(past, batch_size) for past in past_key_values)
+    batch_dim = list(past_key_values.shape).index(1)
+    shape = list(past_key_values.shape)
+    shape[batch_dim] = batch_size
+    return past_key_values.expand(*shape)
+
+
 @add_end_docstrings(PIPELINE_INIT_ARGS)
 class ZeroShotClassificationPipeline(ChunkPipeline):
     """
@@ -63,6 +83,7 @@ class ZeroShotClassificationPipeline(ChunkPipeline):
 
     def __init__(self, args_parser=ZeroShotClassificationArgumentHandler(), *args, **kwargs):
         self._args_parser = args_parser
+        self._hypothesis_ids_cache = {}
         super().__init__(*args, **kwargs)
         if self.entailment_id == -1:
             logger.warning(
@@ -118,6 +139,63 @@ class ZeroShotClassificationPipeline(ChunkPipeline):
 
         return inputs
 
+    def _tokenize_pairs(self, sequence, hypotheses):
+        """
+        Tokenizes the premise/hypothesis pairs of `sequence`, tokenizing the premise only once and reusing the
+        tokenization of hypotheses across calls.
+        """
+        premise_ids = self.tokenizer(sequence, add_special_tokens=False, verbose=False)["input_ids"]
+        model_inputs = [self._prepare_pair(premise_ids, hypothesis) for hypothesis in hypotheses]
+
+        # Check against the regular tokenization of the first pair, some tokenizers encode pairs differently.
+        reference = self._parse_and_tokenize([[sequence, hypotheses[0]]])
+        for key in self.tokenizer.model_input_names:
+            if key not in model_inputs[0] or not np.array_equal(
+                np.asarray(model_inputs[0][key]), np.asarray(reference[key])
+            ):
+                return [reference] + [
+                    self._parse_and_tokenize([[sequence, hypothesis]]) for hypothesis in hypotheses[1:]
+                ]
+        return model_inputs
+
+    def _prepare_pair(self, premise_ids, hypothesis):
+        hypothesis_ids = self._hypothesis_ids_cache.get(hypothesis, None)
+        if hypothesis_ids is None:
+            hypothesis_ids = self.tokenizer(hypothesis, add_special_tokens=False, verbose=False)["input_ids"]
+            if len(self._hypothesis_ids_cache) >= HYPOTHESIS_CACHE_SIZE:
+                self._hypothesis_ids_cache.pop(next(iter(self._hypothesis_ids_cache)))
+            self._hypothesis_ids_cache[hypothesis] = hypothesis_ids
+
+        # Like `_parse_and_tokenize`, only the premise is truncated, unless the hypothesis alone is too long.
+        if (
+            len(hypothesis_ids) + self.tokenizer.num_special_tokens_to_add(pair=True)
+            >= self.tokenizer.model_max_length
+        ):
+            truncation = TruncationStrategy.DO_NOT_TRUNCATE
+        else:
+            truncation = TruncationStrategy.ONLY_FIRST
+        return self.tokenizer.prepare_for_model(
+            premise_ids,
+            hypothesis_ids,
+            add_special_tokens=True,
+            truncation=truncation,
+            return_tensors=self.framework,
+            prepend_batch_axis=True,
+            verbose=False,
+        )
+
+    @property
+    def supports_premise_caching(self) -> bool:
+        """
+        Whether the premise can be encoded once for all hypotheses, which is only the case for decoder-only models
+        accepting `past_key_values`.
+        """
+        return (
+            self.framework == "pt"
+            and not self.model.config.is_encoder_decoder
+            and "past_key_values" in inspect.signature(self.model.forward).parameters
+        )
+
     def _sanitize_parameters(self, **kwargs):
         if kwargs.get("multi_class", None) is not None:
             kwargs["multi_label"] = kwargs["multi_class"]
@@ -131,10 +209,19 @@ class ZeroShotClassificationPipeline(ChunkPipeline):
         if "hypothesis_template" in kwargs:
             preprocess_params["hypothesis_template"] = kwargs["hypothesis_template"]
 
+        forward_params = {}
+        if kwargs.get("cache_premise", None) is not None:
+            if kwargs["cache_premise"] and not self.supports_premise_caching:
+                raise ValueError(
+                    f"`cache_premise` is only available for decoder-only PyTorch models accepting `past_key_values`, "
+                    f"{self.model.__class__.__name__} encodes the premise and the hypothesis together."
+                )
+            forward_params["cache_premise"] = kwargs["cache_premise"]
+
         postprocess_params = {}
         if "multi_label" in kwargs:
             postprocess_params["multi_label"] = kwargs["multi_label"]
-        return preprocess_params, {}, postprocess_params
+        return preprocess_params, forward_params, postprocess_params
 
     def __call__(
         self,
@@ -164,6 +251,11 @@ class ZeroShotClassificationPipeline(ChunkPipeline):
                 the sum of the label likelihoods for each sequence is 1. If `True`, the labels are considered
                 independent and probabilities are normalized for each candidate by doing a softmax of the entailment
                 score vs. the contradiction score.
+            cache_premise (`bool`, *optional*, defaults to `False`):
+                Whether or not to encode the tokens shared by all the premise/hypothesis pairs of a batch (the premise
+                and the beginning of the template) only once, and to reuse their keys and values for the rest of each
+                pair. Only available for decoder-only models (like GPT-2) and only useful with `batch_size > 1`, which
+                sets how many hypotheses are run together (batching requires `sequences` to be a list or a dataset).
 
         Return:
             A `dict` or a list of `dict`: Each result comes as a dictionary with the following keys:
@@ -183,10 +275,9 @@ class ZeroShotClassificationPipeline(ChunkPipeline):
 
     def preprocess(self, inputs, candidate_labels=None, hypothesis_template="This example is {}."):
         sequence_pairs, sequences = self._args_parser(inputs, candidate_labels, hypothesis_template)
+        model_inputs = self._tokenize_pairs(sequences[0], [hypothesis for _, hypothesis in sequence_pairs])
 
-        for i, (candidate_label, sequence_pair) in enumerate(zip(candidate_labels, sequence_pairs)):
-            model_input = self._parse_and_tokenize([sequence_pair])
-
+        for i, (candidate_label, model_input) in enumerate(zip(candidate_labels, model_inputs)):
             yield {
                 "candidate_label": candidate_label,
                 "sequence": sequences[0],
@@ -194,11 +285,14 @@ class ZeroShotClassificationPipeline(ChunkPipeline):
                 **model_input,
             }
 
-    def _forward(self, inputs):
+    def _forward(self, inputs, cache_premise=False):
         candidate_label = inputs["candidate_label"]
         sequence = inputs["sequence"]
         model_inputs = {k: inputs[k] for k in self.tokenizer.model_input_names}
-        outputs = self.model(**model_inputs)
+        if cache_premise:
+            outputs = self._forward_with_premise_cache(model_inputs)
+        else:
+            outputs = self.model(**model_inputs)
 
         model_outputs = {
             "candidate_label": candidate_label,
@@ -208,6 +302,37 @@ class ZeroShotClassificationPipeline(ChunkPipeline):
         }
         return model_outputs
 
+    def _forward_with_premise_cache(self, model_inputs):
+        input_ids = model_inputs["input_ids"]
+        attention_mask = model_inputs.get("attention_mask", None)
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        batch_size = input_ids.shape[0]
+
+        # Tokens at the same position in all the pairs of the batch are encoded the same way by a decoder-only model.
+        is_shared = ((input_ids == input_ids[:1]) & attention_mask.bool()).all(dim=0)
+        prefix_length = int(is_shared.long().cumprod(dim=0).sum())
+        # Keep at least one token of each pair to classify it
+        prefix_length = min(prefix_length, int(attention_mask.sum(dim=-1).min()) - 1)
+        if batch_size == 1 or prefix_length <= 0:
+            return self.model(**model_inputs)
+
+        prefix_outputs = self.model(
+            input_ids=input_ids[:1, :prefix_length], attention_mask=attention_mask[:1, :prefix_length], use_cache=True
+        )
+        past_key_values = _expand_past_key_values(prefix_outputs.past_key_values, batch_size)
+        other_inputs = {
+            name: tensor[:, prefix_length:]
+            for name, tensor in model_inputs.items()
+            if name not in {"input_ids", "attention_mask"}
+        }
+        return self.model(
+            input_ids=input_ids[:, prefix_length:],
+            attention_mask=attention_mask,
+            past_key_values=past_key_values,
+            **other_inputs,
+        )
+
     def postprocess(self, model_outputs, multi_label=False):
         candidate_labels = [outputs["candidate_label"] for outputs in model_outputs]
         sequences = [outputs["sequence"] for outputs in model_outputs]
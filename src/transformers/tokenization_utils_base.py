@@ -26,6 +26,7 @@ import warnings
 from collections import OrderedDict, UserDict
 from contextlib import contextmanager
 from dataclasses import dataclass, field
+from hashlib import sha256
 from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 import numpy as np
@@ -35,6 +36,7 @@ from requests import HTTPError
 
 from . import __version__
 from .file_utils import (
+    TRANSFORMERS_CACHE,
     EntryNotFoundError,
     ExplicitEnum,
     PaddingStrategy,
@@ -56,6 +58,7 @@ from .file_utils import (
     is_offline_mode,
     is_remote_url,
     is_tf_available,
+    is_tokenizer_cache_enabled,
     is_tokenizers_available,
     is_torch_available,
     to_py_obj,
@@ -124,6 +127,15 @@ TOKENIZER_CONFIG_FILE = "tokenizer_config.json"
 FULL_TOKENIZER_FILE = "tokenizer.json"
 _re_tokenizer_file = re.compile(r"tokenizer\.(.*)\.json")
 
+# Slow -> fast conversions are cached in this subfolder of the cache directory when the tokenizer cache is enabled
+CONVERTED_TOKENIZERS_FOLDER = "converted_tokenizers"
+
+# Process-level cache of fully constructed tokenizers (see `PreTrainedTokenizerBase.from_pretrained`), the least
+# recently used ones are evicted past TOKENIZERS_LOAD_CACHE_SIZE tokenizers
+TOKENIZERS_LOAD_CACHE_SIZE = 8
+_tokenizers_load_cache = OrderedDict()
+_files_hashes = {}
+
 
 class TruncationStrategy(ExplicitEnum):
     """
@@ -1576,6 +1588,12 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
             subfolder (`str`, *optional*):
                 In case the relevant files are located inside a subfolder of the model repo on huggingface.co (e.g. for
                 facebook/rag-token-base), specify it here.
+            use_tokenizer_cache (`bool`, *optional*):
+                Whether or not to reuse a tokenizer already loaded in this process from the same files and arguments,
+                and to cache the result of the slow to fast conversion on disk (in the `converted_tokenizers` subfolder
+                of the cache directory). Both caches are keyed by the hashes of the resolved files and the
+                initialization arguments. The process cache keeps the 8 most recently loaded tokenizers. Defaults to
+                `True` if the `TRANSFORMERS_TOKENIZER_CACHE` environment variable is set, `False` otherwise.
             inputs (additional positional arguments, *optional*):
                 Will be passed along to the Tokenizer `__init__` method.
             kwargs (additional keyword arguments, *optional*):
@@ -1619,9 +1637,13 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
         use_auth_token = kwargs.pop("use_auth_token", None)
         revision = kwargs.pop("revision", None)
         subfolder = kwargs.pop("subfolder", None)
+        use_tokenizer_cache = kwargs.pop("use_tokenizer_cache", None)
         from_pipeline = kwargs.pop("_from_pipeline", None)
         from_auto_class = kwargs.pop("_from_auto", False)
 
+        if use_tokenizer_cache is None:
+            use_tokenizer_cache = is_tokenizer_cache_enabled()
+
         user_agent = {"file_type": "tokenizer", "from_auto_class": from_auto_class, "is_fast": "Fast" in cls.__name__}
         if from_pipeline is not None:
             user_agent["using_pipeline"] = from_pipeline
@@ -1770,15 +1792,48 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
             else:
                 logger.info(f"loading file {file_path} from cache at {resolved_vocab_files[file_id]}")
 
-        return cls._from_pretrained(
+        if not use_tokenizer_cache:
+            return cls._from_pretrained(
+                resolved_vocab_files,
+                pretrained_model_name_or_path,
+                init_configuration,
+                *init_inputs,
+                use_auth_token=use_auth_token,
+                cache_dir=cache_dir,
+                **kwargs,
+            )
+
+        cache_key = get_tokenizer_cache_key(
+            cls, pretrained_model_name_or_path, resolved_vocab_files, init_inputs, kwargs
+        )
+        if cache_key in _tokenizers_load_cache:
+            logger.info(f"loading tokenizer {pretrained_model_name_or_path} from the process cache")
+            _tokenizers_load_cache.move_to_end(cache_key)
+            return copy.deepcopy(_tokenizers_load_cache[cache_key])
+
+        conversion_cache_file = os.path.join(
+            cache_dir if cache_dir is not None else TRANSFORMERS_CACHE,
+            CONVERTED_TOKENIZERS_FOLDER,
+            f"{cls.__name__}-{cache_key}.json",
+        )
+        tokenizer = cls._from_pretrained(
             resolved_vocab_files,
             pretrained_model_name_or_path,
             init_configuration,
             *init_inputs,
             use_auth_token=use_auth_token,
             cache_dir=cache_dir,
+            conversion_cache_file=conversion_cache_file,
             **kwargs,
         )
+        try:
+            _tokenizers_load_cache[cache_key] = copy.deepcopy(tokenizer)
+        except Exception as e:
+            logger.warning(f"Could not cache the tokenizer loaded from {pretrained_model_name_or_path}: {e}")
+        while len(_tokenizers_load_cache) > TOKENIZERS_LOAD_CACHE_SIZE:
+            _tokenizers_load_cache.popitem(last=False)
+
+        return tokenizer
 
     @classmethod
     def _from_pretrained(
@@ -1789,6 +1844,7 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
         *init_inputs,
         use_auth_token=None,
         cache_dir=None,
+        conversion_cache_file=None,
         **kwargs
     ):
         # We instantiate fast tokenizers based on a slow tokenizer if we don't have access to the tokenizer.json
@@ -1900,6 +1956,8 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
 
         if slow_tokenizer is not None:
             init_kwargs["__slow_tokenizer"] = slow_tokenizer
+            if conversion_cache_file is not None:
+                init_kwargs["__conversion_cache_file"] = conversion_cache_file
 
         init_kwargs["name_or_path"] = pretrained_model_name_or_path
 
@@ -3509,6 +3567,62 @@ For a more complete example, see the implementation of `prepare_seq2seq_batch`.
         return model_inputs
 
 
+def hash_file(file_path: str) -> str:
+    """
+    Returns the sha256 hash of the content of a file. Hashes are memoized for the process, keyed by the path, size and
+    modification time of the file, so each file is only read once.
+    """
+    stat = os.stat(file_path)
+    signature = (os.path.realpath(file_path), stat.st_size, stat.st_mtime_ns)
+    if signature not in _files_hashes:
+        file_hash = sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                file_hash.update(chunk)
+        _files_hashes[signature] = file_hash.hexdigest()
+    return _files_hashes[signature]
+
+
+def get_tokenizer_cache_key(
+    tokenizer_class, pretrained_model_name_or_path: str, resolved_vocab_files: Dict[str, str], init_inputs, kwargs
+) -> str:
+    """
+    Computes the key under which a tokenizer loaded with `from_pretrained` is cached.
+
+    The key depends on the tokenizer class, the versions of transformers and tokenizers, the content of all the
+    resolved vocabulary files and the initialization inputs and keyword arguments, so a change in any of them
+    invalidates the cached tokenizer.
+
+    Args:
+        tokenizer_class (`type`): The class of the tokenizer being loaded.
+        pretrained_model_name_or_path (`str`): The identifier or path the tokenizer is loaded from.
+        resolved_vocab_files (`Dict[str, str]`): The local paths of the vocabulary files (or `None`).
+        init_inputs (`tuple`): The positional arguments passed to the tokenizer `__init__`.
+        kwargs (`Dict[str, Any]`): The keyword arguments passed to the tokenizer `__init__`.
+
+    Returns:
+        `str`: The hexadecimal digest identifying the tokenizer.
+    """
+    key = {
+        "class": f"{tokenizer_class.__module__}.{tokenizer_class.__qualname__}",
+        "transformers_version": __version__,
+        "tokenizers_version": None,
+        "name_or_path": pretrained_model_name_or_path,
+        "files": {
+            file_id: hash_file(file_path) if file_path is not None and os.path.isfile(file_path) else None
+            for file_id, file_path in resolved_vocab_files.items()
+        },
+        "init_inputs": list(init_inputs),
+        "kwargs": kwargs,
+    }
+    if is_tokenizers_available():
+        import tokenizers
+
+        key["tokenizers_version"] = tokenizers.__version__
+    serialized_key = json.dumps(key, sort_keys=True, default=repr)
+    return sha256(serialized_key.encode("utf-8")).hexdigest()
+
+
 def get_fast_tokenizer_file(tokenization_files: List[str]) -> str:
     """
     Get the tokenization file to use for this version of transformers.
@@ -52,7 +52,7 @@ import numpy as np
 import torch
 from packaging import version
 from torch import nn
-from torch.utils.data import DataLoader, Dataset, IterableDataset, RandomSampler, SequentialSampler
+from torch.utils.data import DataLoader, Dataset, IterableDataset, SequentialSampler
 from torch.utils.data.distributed import DistributedSampler
 
 from huggingface_hub import Repository
@@ -76,29 +76,37 @@ from .file_utils import (
 )
 from .modelcard import TrainingSummary
 from .modeling_utils import PreTrainedModel, unwrap_model
-from .models.auto.modeling_auto import MODEL_FOR_QUESTION_ANSWERING_MAPPING_NAMES
+from .models.auto.modeling_auto import MODEL_FOR_CAUSAL_LM_MAPPING_NAMES, MODEL_FOR_QUESTION_ANSWERING_MAPPING_NAMES
 from .optimization import Adafactor, get_scheduler
 from .tokenization_utils_base import PreTrainedTokenizerBase
 from .trainer_callback import (
     CallbackHandler,
     DefaultFlowCallback,
     PrinterCallback,
+    ProfilerCallback,
     ProgressCallback,
     TrainerCallback,
     TrainerControl,
     TrainerState,
 )
 from .trainer_pt_utils import (
+    AsyncCheckpointWriter,
+    BatchPrefetcher,
     DistributedLengthGroupedSampler,
     DistributedSamplerWithLoop,
     DistributedTensorGatherer,
     IterableDatasetShard,
     LabelSmoother,
     LengthGroupedSampler,
+    MaxTokensBatchSampler,
+    NestedArrayAccumulator,
+    ResumableDistributedSampler,
+    SeedableRandomSampler,
     SequentialDistributedSampler,
     ShardSampler,
     distributed_broadcast_scalars,
     distributed_concat,
+    distributed_sum,
     find_batch_size,
     get_parameter_names,
     nested_concat,
@@ -118,6 +126,7 @@ from .trainer_utils import (
     IntervalStrategy,
     PredictionOutput,
     ShardedDDPOption,
+    StreamingMetric,
     TrainerMemoryTracker,
     TrainOutput,
     default_compute_objective,
@@ -132,7 +141,6 @@ from .training_args import OptimizerNames, ParallelMode, TrainingArguments
 from .utils import logging
 
 
-_is_torch_generator_available = False
 _is_native_amp_available = False
 
 DEFAULT_CALLBACKS = [DefaultFlowCallback]
@@ -147,7 +155,6 @@ if is_apex_available():
     from apex import amp
 
 if version.parse(torch.__version__) >= version.parse("1.6"):
-    _is_torch_generator_available = True
     _is_native_amp_available = True
     from torch.cuda.amp import autocast
 
@@ -240,9 +247,10 @@ class Trainer:
             The function may have zero argument, or a single one containing the optuna/Ray Tune/SigOpt trial object, to
             be able to choose different architectures according to hyper parameters (such as layer count, sizes of
             inner layers, dropout probabilities etc).
-        compute_metrics (`Callable[[EvalPrediction], Dict]`, *optional*):
+        compute_metrics (`Callable[[EvalPrediction], Dict]` or [`StreamingMetric`], *optional*):
             The function that will be used to compute metrics at evaluation. Must take a [`EvalPrediction`] and return
-            a dictionary string to metric values.
+            a dictionary string to metric values. If it is a [`StreamingMetric`], it is updated with the predictions of
+            each batch instead and the predictions are not accumulated during evaluation.
         callbacks (List of [`TrainerCallback`], *optional*):
             A list of callbacks to customize the training loop. Will add those to the list of default callbacks
             detailed in [here](callback).
@@ -251,6 +259,12 @@ class Trainer:
         optimizers (`Tuple[torch.optim.Optimizer, torch.optim.lr_scheduler.LambdaLR]`, *optional*): A tuple
             containing the optimizer and the scheduler to use. Will default to an instance of [`AdamW`] on your model
             and a scheduler given by [`get_linear_schedule_with_warmup`] controlled by `args`.
+        preprocess_logits_for_metrics (`Callable[[torch.Tensor, torch.Tensor], torch.Tensor]`, *optional*):
+            A function that preprocesses the logits of each evaluation batch before they are gathered and accumulated
+            for `compute_metrics`. Must take two tensors, the logits and the labels, and return the logits once
+            processed as desired (for instance their argmax, or the top-k predictions). The modifications made by this
+            function are reflected in the predictions received by `compute_metrics`, and reducing the logits this way
+            saves the memory needed to accumulate them over the whole evaluation dataset.
 
     Important attributes:
 
@@ -281,9 +295,10 @@ class Trainer:
         eval_dataset: Optional[Dataset] = None,
         tokenizer: Optional[PreTrainedTokenizerBase] = None,
         model_init: Callable[[], PreTrainedModel] = None,
-        compute_metrics: Optional[Callable[[EvalPrediction], Dict]] = None,
+        compute_metrics: Optional[Union[Callable[[EvalPrediction], Dict], StreamingMetric]] = None,
         callbacks: Optional[List[TrainerCallback]] = None,
         optimizers: Tuple[torch.optim.Optimizer, torch.optim.lr_scheduler.LambdaLR] = (None, None),
+        preprocess_logits_for_metrics: Callable[[torch.Tensor, torch.Tensor], torch.Tensor] = None,
     ):
         if args is None:
             output_dir = "tmp_trainer"
@@ -385,6 +400,7 @@ class Trainer:
         self.model = model
 
         self.compute_metrics = compute_metrics
+        self.preprocess_logits_for_metrics = preprocess_logits_for_metrics
         self.optimizer, self.lr_scheduler = optimizers
         if model_init is not None and (self.optimizer is not None or self.lr_scheduler is not None):
             raise RuntimeError(
@@ -392,6 +408,8 @@ class Trainer:
                 "You should subclass `Trainer` and override the `create_optimizer_and_scheduler` method."
             )
         default_callbacks = DEFAULT_CALLBACKS + get_reporting_integration_callbacks(self.args.report_to)
+        if self.args.profile:
+            default_callbacks.append(ProfilerCallback)
         callbacks = default_callbacks if callbacks is None else default_callbacks + callbacks
         self.callback_handler = CallbackHandler(
             callbacks, self.model, self.tokenizer, self.optimizer, self.lr_scheduler
@@ -422,6 +440,24 @@ class Trainer:
         if train_dataset is not None and not isinstance(train_dataset, collections.abc.Sized) and args.max_steps <= 0:
             raise ValueError("train_dataset does not implement __len__, max_steps has to be specified")
 
+        if args.save_async and (
+            is_torch_tpu_available() or is_sagemaker_mp_enabled() or args.deepspeed or self.sharded_ddp is not None
+        ):
+            raise ValueError(
+                "`save_async` is not supported with TPUs, SageMaker Model Parallel, DeepSpeed or sharded DDP."
+            )
+        self._checkpoint_writer = AsyncCheckpointWriter() if args.save_async else None
+
+        if args.max_tokens_per_batch is not None and (
+            is_torch_tpu_available() or is_sagemaker_mp_enabled() or args.deepspeed or self.sharded_ddp is not None
+        ):
+            raise ValueError(
+                "`max_tokens_per_batch` is not supported with TPUs, SageMaker Model Parallel, DeepSpeed or sharded DDP."
+            )
+
+        if args.sharded_eval and (is_torch_tpu_available() or is_sagemaker_mp_enabled()):
+            raise ValueError("`sharded_eval` is not supported with TPUs or SageMaker Model Parallel.")
+
         self._signature_columns = None
 
         # Mixed precision setup
@@ -563,33 +599,50 @@ class Trainer:
         else:
             return dataset.remove_columns(ignored_columns)
 
+    def _get_train_lengths(self):
+        """
+        Returns the precomputed lengths of the samples of the training dataset if it has a `length_column_name` column,
+        and the name of the model input to compute them from otherwise.
+        """
+        if is_datasets_available() and isinstance(self.train_dataset, datasets.Dataset):
+            lengths = (
+                self.train_dataset[self.args.length_column_name]
+                if self.args.length_column_name in self.train_dataset.column_names
+                else None
+            )
+        else:
+            lengths = None
+        model_input_name = self.tokenizer.model_input_names[0] if self.tokenizer is not None else None
+        return lengths, model_input_name
+
+    def _get_train_batch_sampler(self) -> torch.utils.data.Sampler:
+        lengths, model_input_name = self._get_train_lengths()
+        return MaxTokensBatchSampler(
+            self.args.max_tokens_per_batch,
+            dataset=self.train_dataset,
+            lengths=lengths,
+            model_input_name=model_input_name,
+            num_replicas=self.args.world_size,
+            rank=self.args.process_index,
+            seed=self.args.seed,
+            drop_last=self.args.dataloader_drop_last,
+        )
+
     def _get_train_sampler(self) -> Optional[torch.utils.data.Sampler]:
         if not isinstance(self.train_dataset, collections.abc.Sized):
             return None
 
-        generator = None
-        if self.args.world_size <= 1 and _is_torch_generator_available:
-            generator = torch.Generator()
-            generator.manual_seed(int(torch.empty((), dtype=torch.int64).random_().item()))
-
-        # Build the sampler.
+        # Build the sampler. The order of the samples only depends on the seed and the epoch, so training can be resumed
+        # in the middle of an epoch without iterating through the samples seen before.
         if self.args.group_by_length:
-            if is_datasets_available() and isinstance(self.train_dataset, datasets.Dataset):
-                lengths = (
-                    self.train_dataset[self.args.length_column_name]
-                    if self.args.length_column_name in self.train_dataset.column_names
-                    else None
-                )
-            else:
-                lengths = None
-            model_input_name = self.tokenizer.model_input_names[0] if self.tokenizer is not None else None
+            lengths, model_input_name = self._get_train_lengths()
             if self.args.world_size <= 1:
                 return LengthGroupedSampler(
                     self.args.train_batch_size * self.args.gradient_accumulation_steps,
                     dataset=self.train_dataset,
                     lengths=lengths,
                     model_input_name=model_input_name,
-                    generator=generator,
+                    seed=self.args.seed,
                 )
             else:
                 return DistributedLengthGroupedSampler(
@@ -604,9 +657,7 @@ class Trainer:
 
         else:
             if self.args.world_size <= 1:
-                if _is_torch_generator_available:
-                    return RandomSampler(self.train_dataset, generator=generator)
-                return RandomSampler(self.train_dataset)
+                return SeedableRandomSampler(self.train_dataset, seed=self.args.seed)
             elif (
                 self.args.parallel_mode in [ParallelMode.TPU, ParallelMode.SAGEMAKER_MODEL_PARALLEL]
                 and not self.args.dataloader_drop_last
@@ -620,7 +671,7 @@ class Trainer:
                     seed=self.args.seed,
                 )
             else:
-                return DistributedSampler(
+                return ResumableDistributedSampler(
                     self.train_dataset,
                     num_replicas=self.args.world_size,
                     rank=self.args.process_index,
@@ -632,7 +683,8 @@ class Trainer:
         Returns the training [`~torch.utils.data.DataLoader`].
 
         Will use no sampler if `self.train_dataset` does not implement `__len__`, a random sampler (adapted to
-        distributed training if necessary) otherwise.
+        distributed training if necessary) otherwise. If `args.max_tokens_per_batch` is set, the batches are built by a
+        [`~trainer_pt_utils.MaxTokensBatchSampler`] instead.
 
         Subclass and override this method if you want to inject some custom behavior.
         """
@@ -644,6 +696,8 @@ class Trainer:
             train_dataset = self._remove_unused_columns(train_dataset, description="training")
 
         if isinstance(train_dataset, torch.utils.data.IterableDataset):
+            if self.args.max_tokens_per_batch is not None:
+                raise ValueError("`max_tokens_per_batch` requires a training dataset that implements `__len__`.")
             if self.args.world_size > 1:
                 train_dataset = IterableDatasetShard(
                     train_dataset,
@@ -661,6 +715,15 @@ class Trainer:
                 pin_memory=self.args.dataloader_pin_memory,
             )
 
+        if self.args.max_tokens_per_batch is not None:
+            return DataLoader(
+                train_dataset,
+                batch_sampler=self._get_train_batch_sampler(),
+                collate_fn=self.data_collator,
+                num_workers=self.args.dataloader_num_workers,
+                pin_memory=self.args.dataloader_pin_memory,
+            )
+
         train_sampler = self._get_train_sampler()
 
         return DataLoader(
@@ -855,14 +918,23 @@ class Trainer:
             "betas": (args.adam_beta1, args.adam_beta2),
             "eps": args.adam_epsilon,
         }
-        if args.optim == OptimizerNames.ADAFACTOR:
+        if args.optim in [OptimizerNames.ADAFACTOR, OptimizerNames.ADAFACTOR_FOREACH]:
             optimizer_cls = Adafactor
             optimizer_kwargs.update({"scale_parameter": False, "relative_step": False})
-        elif args.optim == OptimizerNames.ADAMW_HF:
+            if args.optim == OptimizerNames.ADAFACTOR_FOREACH:
+                optimizer_kwargs["foreach"] = True
+        elif args.optim in [OptimizerNames.ADAMW_HF, OptimizerNames.ADAMW_HF_FOREACH]:
             from .optimization import AdamW
 
             optimizer_cls = AdamW
             optimizer_kwargs.update(adam_kwargs)
+            if args.optim == OptimizerNames.ADAMW_HF_FOREACH:
+                optimizer_kwargs["foreach"] = True
+        elif args.optim == OptimizerNames.ADAMW_8BIT:
+            from .optimization import AdamW8bit
+
+            optimizer_cls = AdamW8bit
+            optimizer_kwargs.update(adam_kwargs)
         elif args.optim == OptimizerNames.ADAMW_TORCH:
             from torch.optim import AdamW
 
@@ -1244,7 +1316,10 @@ class Trainer:
         logger.info("***** Running training *****")
         logger.info(f"  Num examples = {num_examples}")
         logger.info(f"  Num Epochs = {num_train_epochs}")
-        logger.info(f"  Instantaneous batch size per device = {args.per_device_train_batch_size}")
+        if args.max_tokens_per_batch is not None:
+            logger.info(f"  Max tokens per batch per device = {args.max_tokens_per_batch}")
+        else:
+            logger.info(f"  Instantaneous batch size per device = {args.per_device_train_batch_size}")
         logger.info(f"  Total train batch size (w. parallel, distributed & accumulation) = {total_train_batch_size}")
         logger.info(f"  Gradient Accumulation steps = {args.gradient_accumulation_steps}")
         logger.info(f"  Total optimization steps = {max_steps}")
@@ -1255,6 +1330,21 @@ class Trainer:
         steps_trained_in_current_epoch = 0
         steps_trained_progress_bar = None
 
+        # Samplers (or sharded iterable datasets) whose order only depends on the epoch and that can start an epoch at
+        # any position let us resume training without iterating through the batches seen before.
+        resumable_data = None
+        # Number of indices `resumable_data` yields per batch (batch samplers yield a whole batch at once).
+        resumable_data_batch_size = 1
+        batch_sampler = getattr(train_dataloader, "batch_sampler", None)
+        if hasattr(batch_sampler, "set_epoch") and hasattr(batch_sampler, "set_start_index"):
+            resumable_data = batch_sampler
+        elif getattr(train_dataloader, "batch_size", None) is not None:
+            for data in (getattr(train_dataloader, "sampler", None), getattr(train_dataloader, "dataset", None)):
+                if hasattr(data, "set_epoch") and hasattr(data, "set_start_index"):
+                    resumable_data = data
+                    resumable_data_batch_size = train_dataloader.batch_size
+                    break
+
         # Check if continuing training from a checkpoint
         if resume_from_checkpoint is not None and os.path.isfile(
             os.path.join(resume_from_checkpoint, TRAINER_STATE_NAME)
@@ -1270,7 +1360,12 @@ class Trainer:
             logger.info("  Continuing training from checkpoint, will skip to saved global_step")
             logger.info(f"  Continuing training from epoch {epochs_trained}")
             logger.info(f"  Continuing training from global step {self.state.global_step}")
-            if not args.ignore_data_skip:
+            if not args.ignore_data_skip and resumable_data is not None:
+                logger.info(
+                    f"  Will resume at batch {steps_trained_in_current_epoch} of epoch {epochs_trained} without "
+                    "iterating through the batches seen before."
+                )
+            elif not args.ignore_data_skip:
                 logger.info(
                     f"  Will skip the first {epochs_trained} epochs then the first {steps_trained_in_current_epoch} "
                     "batches in the first epoch. If this takes a lot of time, you can add the `--ignore_data_skip` "
@@ -1303,19 +1398,32 @@ class Trainer:
         # _total_loss_scalar is updated everytime .item() has to be called on tr_loss and stores the sum of all losses
         self._total_loss_scalar = 0.0
         self._globalstep_last_logged = self.state.global_step
+        # Time spent waiting for the batches since the last log, see `_timed_batches`
+        self._dataloader_wait_time = 0.0
+        self._last_log_time = time.time()
         model.zero_grad()
+        # Number of labels of the current optimization step, when batching by number of tokens
+        self._num_labels_in_step = 0
 
         self.control = self.callback_handler.on_train_begin(args, self.state, self.control)
 
         # Skip the first epochs_trained epochs to get the random state of the dataloader at the right point.
-        if not args.ignore_data_skip:
+        if not args.ignore_data_skip and resumable_data is None:
             for epoch in range(epochs_trained):
                 # We just need to begin an iteration to create the randomization of the sampler.
                 for _ in train_dataloader:
                     break
 
         for epoch in range(epochs_trained, num_train_epochs):
-            if isinstance(train_dataloader, DataLoader) and isinstance(train_dataloader.sampler, DistributedSampler):
+            # Number of steps of this epoch skipped by `resumable_data`
+            steps_skipped = 0
+            if resumable_data is not None:
+                resumable_data.set_epoch(epoch)
+                if steps_trained_in_current_epoch > 0:
+                    steps_skipped = steps_trained_in_current_epoch
+                    steps_trained_in_current_epoch = 0
+                resumable_data.set_start_index(steps_skipped * resumable_data_batch_size)
+            elif isinstance(train_dataloader, DataLoader) and isinstance(train_dataloader.sampler, DistributedSampler):
                 train_dataloader.sampler.set_epoch(epoch)
             elif isinstance(train_dataloader.dataset, IterableDatasetShard):
                 train_dataloader.dataset.set_epoch(epoch)
@@ -1331,12 +1439,20 @@ class Trainer:
                 self._past = None
 
             steps_in_epoch = (
-                len(epoch_iterator) if train_dataset_is_sized else args.max_steps * args.gradient_accumulation_steps
+                len(epoch_iterator) + steps_skipped
+                if train_dataset_is_sized
+                else args.max_steps * args.gradient_accumulation_steps
             )
             self.control = self.callback_handler.on_epoch_begin(args, self.state, self.control)
 
             step = -1
-            for step, inputs in enumerate(epoch_iterator):
+            for step, inputs in enumerate(
+                self._timed_batches(self._prefetch_batches(epoch_iterator)), start=steps_skipped
+            ):
+
+                if steps_skipped > 0 and step == steps_skipped:
+                    # First batch after the ones skipped by the sampler when resuming training
+                    self._load_rng_state(resume_from_checkpoint)
 
                 # Skip past any already trained steps if resuming training
                 if steps_trained_in_current_epoch > 0:
@@ -1359,10 +1475,11 @@ class Trainer:
                     and args._no_sync_in_gradient_accumulation
                 ):
                     # Avoid unnecessary DDP synchronization since there will be no backward pass on this example.
-                    with model.no_sync():
+                    with model.no_sync(), self.profile_region("training_step"):
                         tr_loss_step = self.training_step(model, inputs)
                 else:
-                    tr_loss_step = self.training_step(model, inputs)
+                    with self.profile_region("training_step"):
+                        tr_loss_step = self.training_step(model, inputs)
 
                 if (
                     args.logging_nan_inf_filter
@@ -1385,54 +1502,8 @@ class Trainer:
                     steps_in_epoch <= args.gradient_accumulation_steps
                     and (step + 1) == steps_in_epoch
                 ):
-                    # Gradient clipping
-                    if args.max_grad_norm is not None and args.max_grad_norm > 0 and not self.deepspeed:
-                        # deepspeed does its own clipping
-
-                        if self.do_grad_scaling:
-                            # Reduce gradients first for XLA
-                            if is_torch_tpu_available():
-                                gradients = xm._fetch_gradients(self.optimizer)
-                                xm.all_reduce("sum", gradients, scale=1.0 / xm.xrt_world_size())
-                            # AMP: gradients need unscaling
-                            self.scaler.unscale_(self.optimizer)
-
-                        if hasattr(self.optimizer, "clip_grad_norm"):
-                            # Some optimizers (like the sharded optimizer) have a specific way to do gradient clipping
-                            self.optimizer.clip_grad_norm(args.max_grad_norm)
-                        elif hasattr(model, "clip_grad_norm_"):
-                            # Some models (like FullyShardedDDP) have a specific way to do gradient clipping
-                            model.clip_grad_norm_(args.max_grad_norm)
-                        else:
-                            # Revert to normal clipping otherwise, handling Apex or full precision
-                            nn.utils.clip_grad_norm_(
-                                amp.master_params(self.optimizer) if self.use_apex else model.parameters(),
-                                args.max_grad_norm,
-                            )
-
-                    # Optimizer step
-                    optimizer_was_run = True
-                    if self.deepspeed:
-                        pass  # called outside the loop
-                    elif is_torch_tpu_available():
-                        if self.do_grad_scaling:
-                            self.scaler.step(self.optimizer)
-                            self.scaler.update()
-                        else:
-                            xm.optimizer_step(self.optimizer)
-                    elif self.do_grad_scaling:
-                        scale_before = self.scaler.get_scale()
-                        self.scaler.step(self.optimizer)
-                        self.scaler.update()
-                        scale_after = self.scaler.get_scale()
-                        optimizer_was_run = scale_before <= scale_after
-                    else:
-                        self.optimizer.step()
-
-                    if optimizer_was_run and not self.deepspeed:
-                        self.lr_scheduler.step()
-
-                    model.zero_grad()
+                    with self.profile_region("optimizer_step"):
+                        self._optimizer_step(model)
                     self.state.global_step += 1
                     self.state.epoch = epoch + (step + 1) / steps_in_epoch
                     self.control = self.callback_handler.on_step_end(args, self.state, self.control)
@@ -1470,6 +1541,10 @@ class Trainer:
             # Clean the state at the end of training
             delattr(self, "_past")
 
+        if self._checkpoint_writer is not None:
+            # Make sure the last checkpoint is written
+            self._checkpoint_writer.wait()
+
         logger.info("\n\nTraining completed. Do not forget to share your model on huggingface.co/models =)\n\n")
         if args.load_best_model_at_end and self.state.best_model_checkpoint is not None:
             # Wait for everyone to get here so we are sur the model has been saved by process 0.
@@ -1538,6 +1613,63 @@ class Trainer:
         if len(load_result.unexpected_keys) != 0:
             logger.warn(f"There were unexpected keys in the checkpoint model loaded: {load_result.unexpected_keys}.")
 
+    def _optimizer_step(self, model: nn.Module):
+        """
+        Clips the gradients accumulated since the last optimization step, then runs the optimizer and learning rate
+        scheduler steps and zeroes the gradients.
+        """
+        if self.args.max_tokens_per_batch is not None:
+            self._normalize_gradients_by_num_labels(model)
+
+        # Gradient clipping
+        if self.args.max_grad_norm is not None and self.args.max_grad_norm > 0 and not self.deepspeed:
+            # deepspeed does its own clipping
+
+            if self.do_grad_scaling:
+                # Reduce gradients first for XLA
+                if is_torch_tpu_available():
+                    gradients = xm._fetch_gradients(self.optimizer)
+                    xm.all_reduce("sum", gradients, scale=1.0 / xm.xrt_world_size())
+                # AMP: gradients need unscaling
+                self.scaler.unscale_(self.optimizer)
+
+            if hasattr(self.optimizer, "clip_grad_norm"):
+                # Some optimizers (like the sharded optimizer) have a specific way to do gradient clipping
+                self.optimizer.clip_grad_norm(self.args.max_grad_norm)
+            elif hasattr(model, "clip_grad_norm_"):
+                # Some models (like FullyShardedDDP) have a specific way to do gradient clipping
+                model.clip_grad_norm_(self.args.max_grad_norm)
+            else:
+                # Revert to normal clipping otherwise, handling Apex or full precision
+                nn.utils.clip_grad_norm_(
+                    amp.master_params(self.optimizer) if self.use_apex else model.parameters(),
+                    self.args.max_grad_norm,
+                )
+
+        # Optimizer step
+        optimizer_was_run = True
+        if self.deepspeed:
+            pass  # called outside the loop
+        elif is_torch_tpu_available():
+            if self.do_grad_scaling:
+                self.scaler.step(self.optimizer)
+                self.scaler.update()
+            else:
+                xm.optimizer_step(self.optimizer)
+        elif self.do_grad_scaling:
+            scale_before = self.scaler.get_scale()
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
+            scale_after = self.scaler.get_scale()
+            optimizer_was_run = scale_before <= scale_after
+        else:
+            self.optimizer.step()
+
+        if optimizer_was_run and not self.deepspeed:
+            self.lr_scheduler.step()
+
+        model.zero_grad()
+
     def _maybe_log_save_evaluate(self, tr_loss, model, trial, epoch, ignore_keys_for_eval):
         if self.control.should_log:
             if is_torch_tpu_available():
@@ -1553,6 +1685,14 @@ class Trainer:
 
             logs["loss"] = round(tr_loss_scalar / (self.state.global_step - self._globalstep_last_logged), 4)
             logs["learning_rate"] = self._get_learning_rate()
+            if self.args.logging_dataloader_wait:
+                num_steps = self.state.global_step - self._globalstep_last_logged
+                logs["dataloader_wait_time"] = round(self._dataloader_wait_time / num_steps, 4)
+                logs["dataloader_wait_ratio"] = round(
+                    self._dataloader_wait_time / (time.time() - self._last_log_time), 4
+                )
+                self._dataloader_wait_time = 0.0
+                self._last_log_time = time.time()
 
             self._total_loss_scalar += tr_loss_scalar
             self._globalstep_last_logged = self.state.global_step
@@ -1634,6 +1774,10 @@ class Trainer:
             self.store_flos()
 
         output_dir = os.path.join(run_dir, checkpoint_folder)
+        if self._checkpoint_writer is not None:
+            self._save_checkpoint_async(run_dir, output_dir, metrics=metrics)
+            return
+
         self.save_model(output_dir)
         if self.deepspeed:
             # under zero3 model file itself doesn't get saved since it's bogus! Unless deepspeed
@@ -1672,6 +1816,75 @@ class Trainer:
                 torch.save(self.scaler.state_dict(), os.path.join(output_dir, SCALER_NAME))
 
         # Determine the new best metric / best model checkpoint
+        self._update_best_metric(metrics, output_dir)
+
+        # Save the Trainer state
+        if self.args.should_save:
+            self.state.save_to_json(os.path.join(output_dir, TRAINER_STATE_NAME))
+
+        # A process can arrive here before the process 0 has a chance to save the model, in which case output_dir may
+        # not yet exist.
+        os.makedirs(output_dir, exist_ok=True)
+        self._save_rng_state(output_dir)
+
+        if self.args.push_to_hub:
+            self._push_from_checkpoint(output_dir)
+
+        # Maybe delete some older checkpoints.
+        if self.args.should_save:
+            self._rotate_checkpoints(use_mtime=True, output_dir=run_dir)
+
+    def _save_checkpoint_async(self, run_dir, output_dir, metrics=None):
+        """
+        Saves a checkpoint like `_save_checkpoint`, but only copies the states to the CPU on the training thread, the
+        files being written by `self._checkpoint_writer` in a background thread.
+        """
+        # Only one checkpoint is written at a time, which also bounds the memory used by the copies of the states.
+        self._checkpoint_writer.wait()
+        writer = self._checkpoint_writer
+        tmp_dir = os.path.join(run_dir, f"tmp-{os.path.basename(output_dir)}")
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        if self.args.should_save:
+            logger.info(f"Saving model checkpoint to {output_dir} in the background")
+            model_to_save = unwrap_model(self.model)
+            state_dict = self.model.state_dict()
+            if isinstance(model_to_save, PreTrainedModel):
+                model_to_save.save_pretrained(tmp_dir, state_dict=state_dict, save_function=writer.save)
+            else:
+                logger.info("Trainer.model is not a `PreTrainedModel`, only saving its state dict.")
+                writer.save(state_dict, os.path.join(tmp_dir, WEIGHTS_NAME))
+            if self.tokenizer is not None:
+                self.tokenizer.save_pretrained(tmp_dir)
+            writer.save(self.args, os.path.join(tmp_dir, TRAINING_ARGS_NAME))
+
+            writer.save(self.optimizer.state_dict(), os.path.join(tmp_dir, OPTIMIZER_NAME))
+            with warnings.catch_warnings(record=True) as caught_warnings:
+                writer.save(self.lr_scheduler.state_dict(), os.path.join(tmp_dir, SCHEDULER_NAME))
+            reissue_pt_warnings(caught_warnings)
+            if self.do_grad_scaling:
+                writer.save(self.scaler.state_dict(), os.path.join(tmp_dir, SCALER_NAME))
+
+        self._update_best_metric(metrics, output_dir)
+        if self.args.should_save:
+            self.state.save_to_json(os.path.join(tmp_dir, TRAINER_STATE_NAME))
+        self._save_rng_state(tmp_dir)
+
+        if self.args.local_rank != -1:
+            # All the RNG states have to be in the temporary folder before it is renamed.
+            dist.barrier()
+
+        if self.args.should_save:
+
+            def on_checkpoint_written():
+                if self.args.push_to_hub:
+                    self._push_from_checkpoint(output_dir)
+                # Maybe delete some older checkpoints.
+                self._rotate_checkpoints(use_mtime=True, output_dir=run_dir)
+
+            writer.commit(tmp_dir, output_dir, callback=on_checkpoint_written)
+
+    def _update_best_metric(self, metrics, output_dir):
         if metrics is not None and self.args.metric_for_best_model is not None:
             metric_to_check = self.args.metric_for_best_model
             if not metric_to_check.startswith("eval_"):
@@ -1687,10 +1900,7 @@ class Trainer:
                 self.state.best_metric = metric_value
                 self.state.best_model_checkpoint = output_dir
 
-        # Save the Trainer state
-        if self.args.should_save:
-            self.state.save_to_json(os.path.join(output_dir, TRAINER_STATE_NAME))
-
+    def _save_rng_state(self, output_dir):
         # Save RNG state in non-distributed training
         rng_states = {
             "python": random.getstate(),
@@ -1707,22 +1917,12 @@ class Trainer:
         if is_torch_tpu_available():
             rng_states["xla"] = xm.get_rng_state()
 
-        # A process can arrive here before the process 0 has a chance to save the model, in which case output_dir may
-        # not yet exist.
-        os.makedirs(output_dir, exist_ok=True)
         local_rank = xm.get_local_ordinal() if is_torch_tpu_available() else self.args.local_rank
         if local_rank == -1:
             torch.save(rng_states, os.path.join(output_dir, "rng_state.pth"))
         else:
             torch.save(rng_states, os.path.join(output_dir, f"rng_state_{local_rank}.pth"))
 
-        if self.args.push_to_hub:
-            self._push_from_checkpoint(output_dir)
-
-        # Maybe delete some older checkpoints.
-        if self.args.should_save:
-            self._rotate_checkpoints(use_mtime=True, output_dir=run_dir)
-
     def _load_optimizer_and_scheduler(self, checkpoint):
         """If optimizer and scheduler states exist, load them."""
         if checkpoint is None:
@@ -1910,6 +2110,44 @@ class Trainer:
 
         return ctx_manager
 
+    def profile_region(self, name: str):
+        """
+        A helper wrapper that labels a region of the training loop in the traces and summaries of the
+        [`ProfilerCallback`] when training is profiled (`profile=True`), and does nothing otherwise.
+        """
+        if self.args.profile:
+            return torch.autograd.profiler.record_function(f"trainer::{name}")
+        return contextlib.nullcontext() if sys.version_info >= (3, 7) else contextlib.suppress()
+
+    def _prefetch_batches(self, dataloader):
+        """
+        Wraps `dataloader` in a [`~trainer_pt_utils.BatchPrefetcher`] preparing the next batches in the background if
+        `args.dataloader_prefetch_batches` is set. TPU dataloaders already load the batches in the background.
+        """
+        if self.args.dataloader_prefetch_batches == 0 or is_torch_tpu_available():
+            return dataloader
+        return BatchPrefetcher(
+            dataloader,
+            num_batches=self.args.dataloader_prefetch_batches,
+            prepare_fn=self._prepare_input,
+            device=self.args.device,
+        )
+
+    def _timed_batches(self, epoch_iterator):
+        """
+        Iterates over `epoch_iterator`, adding the time spent waiting for each batch to `self._dataloader_wait_time`.
+        """
+        iterator = iter(epoch_iterator)
+        while True:
+            start_time = time.time()
+            with self.profile_region("dataloader"):
+                try:
+                    inputs = next(iterator)
+                except StopIteration:
+                    return
+            self._dataloader_wait_time += time.time() - start_time
+            yield inputs
+
     def training_step(self, model: nn.Module, inputs: Dict[str, Union[torch.Tensor, Any]]) -> torch.Tensor:
         """
         Perform a training step on a batch of inputs.
@@ -1936,13 +2174,22 @@ class Trainer:
             loss_mb = smp_forward_backward(model, inputs, self.args.gradient_accumulation_steps, scaler=scaler)
             return loss_mb.reduce_mean().detach().to(self.args.device)
 
+        if self.args.max_tokens_per_batch is not None:
+            num_labels = self._num_labels_in_batch(inputs)
+
         with self.autocast_smart_context_manager():
             loss = self.compute_loss(model, inputs)
 
         if self.args.n_gpu > 1:
             loss = loss.mean()  # mean() to average on multi-gpu parallel training
 
-        if self.args.gradient_accumulation_steps > 1 and not self.deepspeed:
+        if self.args.max_tokens_per_batch is not None:
+            # Batches have a variable size, so the losses of their labels are summed and the gradients are divided by
+            # the number of labels of the whole optimization step in `_normalize_gradients_by_num_labels`.
+            self._num_labels_in_step += num_labels
+            loss_to_log = loss.detach() / self.args.gradient_accumulation_steps
+            loss = loss * num_labels
+        elif self.args.gradient_accumulation_steps > 1 and not self.deepspeed:
             # deepspeed handles loss scaling by gradient_accumulation_steps in its `backward`
             loss = loss / self.args.gradient_accumulation_steps
 
@@ -1957,8 +2204,39 @@ class Trainer:
         else:
             loss.backward()
 
+        if self.args.max_tokens_per_batch is not None:
+            return loss_to_log
         return loss.detach()
 
+    def _num_labels_in_batch(self, inputs: Dict[str, Union[torch.Tensor, Any]]) -> Union[torch.Tensor, int]:
+        """
+        Returns the number of labels of a batch that are not ignored by the loss (i.e. not -100), or its number of
+        samples if it has no labels.
+        """
+        labels = inputs.get(self.label_names[0]) if len(self.label_names) > 0 else None
+        if not isinstance(labels, torch.Tensor):
+            return find_batch_size(inputs)
+        if type(unwrap_model(self.model)).__name__ in MODEL_FOR_CAUSAL_LM_MAPPING_NAMES.values():
+            # Causal language models shift the labels inside the model, the first label of each sample is not used.
+            labels = labels[..., 1:]
+        return (labels != -100).sum()
+
+    def _normalize_gradients_by_num_labels(self, model: nn.Module):
+        """
+        Divides the gradients of the sums of the losses accumulated by `training_step` when batching by number of
+        tokens by the number of labels of the optimization step on all processes.
+        """
+        num_labels = torch.as_tensor(self._num_labels_in_step, dtype=torch.float32, device=self.args.device)
+        self._num_labels_in_step = 0
+        if self.args.local_rank != -1:
+            dist.all_reduce(num_labels)
+        # DDP averages the gradients of all processes.
+        scale = self.args.world_size / num_labels.clamp(min=1)
+        parameters = amp.master_params(self.optimizer) if self.use_apex else model.parameters()
+        for parameter in parameters:
+            if parameter.grad is not None:
+                parameter.grad.mul_(scale.to(parameter.grad.dtype))
+
     def compute_loss(self, model, inputs, return_outputs=False):
         """
         How the loss is computed by Trainer. By default, all models return the loss in the first element.
@@ -2201,15 +2479,16 @@ class Trainer:
         start_time = time.time()
 
         eval_loop = self.prediction_loop if self.args.use_legacy_prediction_loop else self.evaluation_loop
-        output = eval_loop(
-            eval_dataloader,
-            description="Evaluation",
-            # No point gathering the predictions if there are no metrics, otherwise we defer to
-            # self.args.prediction_loss_only
-            prediction_loss_only=True if self.compute_metrics is None else None,
-            ignore_keys=ignore_keys,
-            metric_key_prefix=metric_key_prefix,
-        )
+        with self.profile_region("evaluation"):
+            output = eval_loop(
+                eval_dataloader,
+                description="Evaluation",
+                # No point gathering the predictions if there are no metrics, otherwise we defer to
+                # self.args.prediction_loss_only
+                prediction_loss_only=True if self.compute_metrics is None else None,
+                ignore_keys=ignore_keys,
+                metric_key_prefix=metric_key_prefix,
+            )
 
         total_batch_size = self.args.eval_batch_size * self.args.world_size
         output.metrics.update(
@@ -2352,20 +2631,50 @@ class Trainer:
         if args.past_index >= 0:
             self._past = None
 
+        # Number of samples, if it can be known before the loop.
+        if not isinstance(eval_dataset, IterableDataset):
+            num_samples = len(eval_dataset)
+        else:
+            num_samples = None
+
+        # A streaming metric is updated batch per batch, so we don't accumulate predictions and labels.
+        streaming_metric = self.compute_metrics if isinstance(self.compute_metrics, StreamingMetric) else None
+        if streaming_metric is not None:
+            streaming_metric.reset()
+        num_streamed_samples = 0
+
+        # In a sharded evaluation, each process updates the metric with the predictions of its own samples, and only the
+        # sufficient statistics of the metric and the sum of the losses are summed across processes at the end. Each
+        # batch is processed once the next one is seen, so that the extra samples the last batch of an iterable dataset
+        # may contain are skipped once the length of the dataset is known.
+        sharded_eval = args.sharded_eval
+        gather_predictions = not sharded_eval or args.eval_gather_predictions
+        if sharded_eval:
+            if streaming_metric is not None:
+                # Fails early if the metric can't be used in a sharded evaluation.
+                streaming_metric.get_sufficient_statistics()
+            elif self.compute_metrics is not None and not gather_predictions:
+                raise ValueError(
+                    "`sharded_eval` requires `compute_metrics` to be a `StreamingMetric`, unless "
+                    "`eval_gather_predictions` is set."
+                )
+        sharded_totals = {"loss_sum": 0.0, "num_losses": 0, "num_streamed_samples": 0}
+        pending_batch = None
+
         # Initialize containers
         # losses/preds/labels on GPU/TPU (accumulated for eval_accumulation_steps)
-        losses_host = None
-        preds_host = None
-        labels_host = None
+        losses_host = []
+        preds_host = []
+        labels_host = []
         # losses/preds/labels on CPU (final containers)
-        all_losses = None
-        all_preds = None
-        all_labels = None
+        all_losses = NestedArrayAccumulator(num_samples)
+        all_preds = NestedArrayAccumulator(num_samples, padding_index=-100)
+        all_labels = NestedArrayAccumulator(num_samples, padding_index=-100)
         # Will be useful when we have an iterable dataset so don't know its length.
 
         observed_num_examples = 0
         # Main evaluation loop
-        for step, inputs in enumerate(dataloader):
+        for step, inputs in enumerate(self._prefetch_batches(dataloader)):
             # Update the observed num examples
             observed_batch_size = find_batch_size(inputs)
             if observed_batch_size is not None:
@@ -2380,73 +2689,92 @@ class Trainer:
             if is_torch_tpu_available():
                 xm.mark_step()
 
+            if logits is not None and self.preprocess_logits_for_metrics is not None:
+                logits = self.preprocess_logits_for_metrics(logits, labels)
+
             # Update containers on host
-            if loss is not None:
-                losses = self._nested_gather(loss.repeat(batch_size))
-                losses_host = losses if losses_host is None else torch.cat((losses_host, losses), dim=0)
-            if logits is not None:
-                logits = self._pad_across_processes(logits)
-                logits = self._nested_gather(logits)
-                preds_host = logits if preds_host is None else nested_concat(preds_host, logits, padding_index=-100)
-            if labels is not None:
-                labels = self._pad_across_processes(labels)
-                labels = self._nested_gather(labels)
-                labels_host = labels if labels_host is None else nested_concat(labels_host, labels, padding_index=-100)
+            if sharded_eval:
+                if pending_batch is not None:
+                    self._sharded_evaluation_step(streaming_metric, sharded_totals, *pending_batch, num_samples)
+                pending_batch = (step, batch_size, observed_batch_size, loss, logits, labels)
+            elif loss is not None:
+                losses_host.append(self._nested_gather(loss.repeat(batch_size)))
+            if gather_predictions:
+                if logits is not None:
+                    logits = self._pad_across_processes(logits)
+                    logits = self._nested_gather(logits)
+                if labels is not None:
+                    labels = self._pad_across_processes(labels)
+                    labels = self._nested_gather(labels)
+                if streaming_metric is None or sharded_eval:
+                    if logits is not None:
+                        preds_host.append(logits)
+                    if labels is not None:
+                        labels_host.append(labels)
+                elif logits is not None and labels is not None:
+                    num_streamed_samples += self._update_streaming_metric(
+                        streaming_metric, logits, labels, num_samples, num_streamed_samples
+                    )
             self.control = self.callback_handler.on_prediction_step(args, self.state, self.control)
 
             # Gather all tensors and put them back on the CPU if we have done enough accumulation steps.
             if args.eval_accumulation_steps is not None and (step + 1) % args.eval_accumulation_steps == 0:
-                if losses_host is not None:
-                    losses = nested_numpify(losses_host)
-                    all_losses = losses if all_losses is None else np.concatenate((all_losses, losses), axis=0)
-                if preds_host is not None:
-                    logits = nested_numpify(preds_host)
-                    all_preds = logits if all_preds is None else nested_concat(all_preds, logits, padding_index=-100)
-                if labels_host is not None:
-                    labels = nested_numpify(labels_host)
-                    all_labels = (
-                        labels if all_labels is None else nested_concat(all_labels, labels, padding_index=-100)
-                    )
-
-                # Set back to None to begin a new accumulation
-                losses_host, preds_host, labels_host = None, None, None
+                for host, accumulator in (
+                    (losses_host, all_losses),
+                    (preds_host, all_preds),
+                    (labels_host, all_labels),
+                ):
+                    for tensors in host:
+                        accumulator.add_arrays(nested_numpify(tensors))
+                    # Clear the host container to begin a new accumulation
+                    host.clear()
 
         if args.past_index and hasattr(self, "_past"):
             # Clean the state at the end of the evaluation loop
             delattr(self, "_past")
 
         # Gather all remaining tensors and put them back on the CPU
-        if losses_host is not None:
-            losses = nested_numpify(losses_host)
-            all_losses = losses if all_losses is None else np.concatenate((all_losses, losses), axis=0)
-        if preds_host is not None:
-            logits = nested_numpify(preds_host)
-            all_preds = logits if all_preds is None else nested_concat(all_preds, logits, padding_index=-100)
-        if labels_host is not None:
-            labels = nested_numpify(labels_host)
-            all_labels = labels if all_labels is None else nested_concat(all_labels, labels, padding_index=-100)
-
-        # Number of samples
-        if not isinstance(eval_dataset, IterableDataset):
-            num_samples = len(eval_dataset)
-        # The instance check is weird and does not actually check for the type, but whether the dataset has the right
-        # methods. Therefore we need to make sure it also has the attribute.
-        elif isinstance(eval_dataset, IterableDatasetShard) and hasattr(eval_dataset, "num_examples"):
-            num_samples = eval_dataset.num_examples
-        else:
-            num_samples = observed_num_examples
-
+        for host, accumulator in ((losses_host, all_losses), (preds_host, all_preds), (labels_host, all_labels)):
+            for tensors in host:
+                accumulator.add_arrays(nested_numpify(tensors))
         # Number of losses has been rounded to a multiple of batch_size and in a distributed training, the number of
-        # samplers has been rounded to a multiple of batch_size, so we truncate.
-        if all_losses is not None:
-            all_losses = all_losses[:num_samples]
-        if all_preds is not None:
-            all_preds = nested_truncate(all_preds, num_samples)
-        if all_labels is not None:
-            all_labels = nested_truncate(all_labels, num_samples)
+        # samplers has been rounded to a multiple of batch_size, so the accumulators truncate when `num_samples` is
+        # known.
+        all_losses = all_losses.finalize()
+        all_preds = all_preds.finalize()
+        all_labels = all_labels.finalize()
+
+        # Number of samples, for iterable datasets
+        if num_samples is None:
+            # The instance check is weird and does not actually check for the type, but whether the dataset has the
+            # right methods. Therefore we need to make sure it also has the attribute.
+            if isinstance(eval_dataset, IterableDatasetShard) and hasattr(eval_dataset, "num_examples"):
+                num_samples = eval_dataset.num_examples
+            else:
+                num_samples = observed_num_examples
+
+            if all_losses is not None:
+                all_losses = all_losses[:num_samples]
+            if all_preds is not None:
+                all_preds = nested_truncate(all_preds, num_samples)
+            if all_labels is not None:
+                all_labels = nested_truncate(all_labels, num_samples)
+
+        if sharded_eval:
+            if pending_batch is not None:
+                self._sharded_evaluation_step(streaming_metric, sharded_totals, *pending_batch, num_samples)
+            sharded_totals["loss_sum"] = float(sharded_totals["loss_sum"])
+            if args.local_rank != -1:
+                sharded_totals = distributed_sum(sharded_totals, device=args.device)
+            num_streamed_samples = sharded_totals["num_streamed_samples"]
+            if streaming_metric is not None and num_streamed_samples > 0 and args.local_rank != -1:
+                statistics = distributed_sum(streaming_metric.get_sufficient_statistics(), device=args.device)
+                streaming_metric.set_sufficient_statistics(statistics)
 
         # Metrics!
-        if self.compute_metrics is not None and all_preds is not None and all_labels is not None:
+        if streaming_metric is not None:
+            metrics = streaming_metric.compute() if num_streamed_samples > 0 else {}
+        elif self.compute_metrics is not None and all_preds is not None and all_labels is not None:
             metrics = self.compute_metrics(EvalPrediction(predictions=all_preds, label_ids=all_labels))
         else:
             metrics = {}
@@ -2456,6 +2784,8 @@ class Trainer:
 
         if all_losses is not None:
             metrics[f"{metric_key_prefix}_loss"] = all_losses.mean().item()
+        elif sharded_eval and sharded_totals["num_losses"] > 0:
+            metrics[f"{metric_key_prefix}_loss"] = sharded_totals["loss_sum"] / sharded_totals["num_losses"]
 
         # Prefix all keys with metric_key_prefix + '_'
         for key in list(metrics.keys()):
@@ -2464,6 +2794,48 @@ class Trainer:
 
         return EvalLoopOutput(predictions=all_preds, label_ids=all_labels, metrics=metrics, num_samples=num_samples)
 
+    def _sharded_evaluation_step(
+        self, metric, totals, step, batch_size, observed_batch_size, loss, logits, labels, num_samples
+    ):
+        """
+        Updates a streaming metric with the `logits` and `labels` of the `step`-th batch of this process in a sharded
+        evaluation, and adds the losses and the numbers of samples of the batch to `totals`.
+
+        The samples past `num_samples`, added by the distributed sampler to have batches of the same size on all
+        processes, are skipped. The batches are dealt to the processes in turn, so the first sample of the batch is
+        sample `(step * world_size + process_index) * batch_size` of the dataset.
+        """
+        num_batch_samples = observed_batch_size if observed_batch_size is not None else batch_size
+        if num_samples is not None and batch_size is not None:
+            first_sample = (step * self.args.world_size + self.args.process_index) * batch_size
+            num_batch_samples = max(0, min(num_batch_samples, num_samples - first_sample))
+        if num_batch_samples == 0:
+            return
+
+        if loss is not None:
+            totals["loss_sum"] = totals["loss_sum"] + loss.detach().double() * num_batch_samples
+            totals["num_losses"] += num_batch_samples
+        if metric is not None and logits is not None and labels is not None:
+            predictions = nested_truncate(nested_numpify(logits), num_batch_samples)
+            label_ids = nested_truncate(nested_numpify(labels), num_batch_samples)
+            metric.update(EvalPrediction(predictions=predictions, label_ids=label_ids))
+            totals["num_streamed_samples"] += num_batch_samples
+
+    def _update_streaming_metric(self, metric, logits, labels, num_samples, num_streamed_samples):
+        """
+        Updates a streaming metric with the gathered `logits` and `labels` of a batch, without the samples past
+        `num_samples` added by the distributed sampler. Returns the number of samples in the batch.
+        """
+        predictions = nested_numpify(logits)
+        label_ids = nested_numpify(labels)
+        batch_size = find_batch_size(predictions)
+        if num_samples is not None:
+            predictions = nested_truncate(predictions, max(num_samples - num_streamed_samples, 0))
+            label_ids = nested_truncate(label_ids, max(num_samples - num_streamed_samples, 0))
+        if num_samples is None or num_streamed_samples < num_samples:
+            metric.update(EvalPrediction(predictions=predictions, label_ids=label_ids))
+        return batch_size
+
     def _nested_gather(self, tensors, name=None):
         """
         Gather value of `tensors` (tensor or list/tuple of nested tensors) and convert them to numpy before
@@ -2870,11 +3242,13 @@ class Trainer:
 
         self.callback_handler.eval_dataloader = dataloader
 
-        for step, inputs in enumerate(dataloader):
+        for step, inputs in enumerate(self._prefetch_batches(dataloader)):
             loss, logits, labels = self.prediction_step(model, inputs, prediction_loss_only, ignore_keys=ignore_keys)
             if loss is not None:
                 losses = loss.repeat(batch_size)
                 losses_host = losses if losses_host is None else torch.cat((losses_host, losses), dim=0)
+            if logits is not None and self.preprocess_logits_for_metrics is not None:
+                logits = self.preprocess_logits_for_metrics(logits, labels)
             if logits is not None:
                 preds_host = logits if preds_host is None else nested_concat(preds_host, logits, padding_index=-100)
             if labels is not None:
@@ -18,19 +18,30 @@ Callbacks to use with the Trainer class and customize the training loop.
 import collections
 import dataclasses
 import json
+import os
 from dataclasses import dataclass
+from functools import partial
 from typing import Dict, List, Optional, Union
 
 import numpy as np
 from tqdm.auto import tqdm
 
+from .file_utils import is_torch_available
 from .trainer_utils import IntervalStrategy
 from .training_args import TrainingArguments
 from .utils import logging
 
 
+if is_torch_available():
+    import torch
+    from torch import nn
+
+
 logger = logging.get_logger(__name__)
 
+# The regions of the training loop labelled by the Trainer when profiling
+PROFILED_TRAINER_REGIONS = ["dataloader", "training_step", "optimizer_step", "evaluation"]
+
 
 @dataclass
 class TrainerState:
@@ -560,3 +571,143 @@ class EarlyStoppingCallback(TrainerCallback):
         self.check_metric_value(args, state, control, metric_value)
         if self.early_stopping_patience_counter >= self.early_stopping_patience:
             control.should_training_stop = True
+
+
+class ProfilerCallback(TrainerCallback):
+    """
+    A [`TrainerCallback`] that profiles training with `torch.profiler`. It is added by the [`Trainer`] when
+    `profile=True` in its [`TrainingArguments`], which also hold its configuration.
+
+    The profiler skips `profile_wait_steps` optimization steps, warms up for `profile_warmup_steps` steps then records
+    `profile_active_steps` steps, `profile_repeat` times. At the end of each recorded cycle, it writes in the
+    `profiler` folder of `output_dir`:
+
+    - a Chrome trace, `trace_rank{process_index}_step{global_step}.pt.trace.json`, that can be opened with
+      `chrome://tracing`, [Perfetto](https://ui.perfetto.dev) or the PyTorch profiler plugin of TensorBoard,
+    - a summary, `summary_rank{process_index}_step{global_step}.txt`, of the time and FLOPs spent waiting for the
+      batches, in [`~Trainer.training_step`], in the optimizer step and in evaluation, in the forward pass of the
+      submodules of the model (the first two levels and the elements of `nn.ModuleList`, typically its layers) and in
+      the most expensive operators.
+    """
+
+    def __init__(self):
+        self.profiler = None
+        self.profile_dir = None
+        self._hooks = []
+        self._module_ranges = {}
+
+    def on_train_begin(self, args, state, control, model=None, **kwargs):
+        self.profile_dir = os.path.join(args.output_dir, "profiler")
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self._process_index = args.process_index
+        self._global_step = state.global_step
+        if model is not None:
+            self._add_module_hooks(model)
+
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self.profiler = torch.profiler.profile(
+            activities=activities,
+            schedule=torch.profiler.schedule(
+                wait=args.profile_wait_steps,
+                warmup=args.profile_warmup_steps,
+                active=args.profile_active_steps,
+                repeat=args.profile_repeat,
+            ),
+            on_trace_ready=self._on_trace_ready,
+            record_shapes=args.profile_record_shapes,
+            profile_memory=args.profile_memory,
+            with_stack=args.profile_with_stack,
+            with_flops=True,
+        )
+        self.profiler.start()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self._global_step = state.global_step
+        self.profiler.step()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self.profiler.stop()
+        self.profiler = None
+        for hook in self._hooks:
+            hook.remove()
+        self._hooks = []
+
+    def _add_module_hooks(self, model):
+        modules = dict(model.named_modules())
+        for name, module in modules.items():
+            if name == "" or isinstance(module, (nn.ModuleList, nn.ModuleDict)):
+                continue
+            # The first two levels of submodules and the layers of the model (the elements of its module lists)
+            parent_name = name.rsplit(".", 1)[0] if "." in name else ""
+            if name.count(".") > 1 and not isinstance(modules[parent_name], nn.ModuleList):
+                continue
+            self._hooks.append(module.register_forward_pre_hook(partial(self._enter_module, name)))
+            self._hooks.append(module.register_forward_hook(partial(self._exit_module, name)))
+
+    def _enter_module(self, name, module, inputs):
+        module_range = torch.autograd.profiler.record_function(f"module::{name}")
+        module_range.__enter__()
+        self._module_ranges.setdefault(name, []).append(module_range)
+
+    def _exit_module(self, name, module, inputs, outputs):
+        self._module_ranges[name].pop().__exit__(None, None, None)
+
+    def _on_trace_ready(self, profiler):
+        prefix = f"rank{self._process_index}_step{self._global_step}"
+        profiler.export_chrome_trace(os.path.join(self.profile_dir, f"trace_{prefix}.pt.trace.json"))
+        with open(os.path.join(self.profile_dir, f"summary_{prefix}.txt"), "w", encoding="utf-8") as f:
+            f.write(self.summarize(profiler))
+
+    @staticmethod
+    def summarize(profiler) -> str:
+        """
+        Returns a text summary of the time and FLOPs spent in the regions of the training loop labelled by the
+        [`Trainer`], in the submodules of the model and in the most expensive operators recorded by `profiler`.
+        """
+        use_cuda = torch.cuda.is_available()
+
+        def total_flops(event):
+            return (event.flops or 0) + sum(total_flops(child) for child in event.cpu_children)
+
+        def device_time(event):
+            # `cuda_time_total` is called `device_time_total` in recent versions of PyTorch.
+            if hasattr(event, "device_time_total"):
+                return event.device_time_total
+            return event.cuda_time_total
+
+        events = profiler.events()
+        totals = collections.OrderedDict((f"trainer::{name}", None) for name in PROFILED_TRAINER_REGIONS)
+        for event in events:
+            if event.name in totals or event.name.startswith("module::"):
+                if totals.get(event.name) is None:
+                    totals[event.name] = {"calls": 0, "cpu_time": 0, "device_time": 0, "flops": 0}
+                totals[event.name]["calls"] += 1
+                totals[event.name]["cpu_time"] += event.cpu_time_total
+                totals[event.name]["device_time"] += device_time(event)
+                totals[event.name]["flops"] += total_flops(event)
+
+        header = f"{'Name':<60}{'Calls':>8}{'CPU total (ms)':>17}"
+        if use_cuda:
+            header += f"{'CUDA total (ms)':>17}"
+        header += f"{'GFLOPs':>12}"
+        lines = []
+        for title, prefix in (("Trainer", "trainer::"), ("Modules (forward)", "module::")):
+            lines += [title, header, "-" * len(header)]
+            for name, total in totals.items():
+                if not name.startswith(prefix) or total is None:
+                    continue
+                line = f"{name[len(prefix):]:<60}{total['calls']:>8}{total['cpu_time'] / 1000:>17.3f}"
+                if use_cuda:
+                    line += f"{total['device_time'] / 1000:>17.3f}"
+                line += f"{total['flops'] / 1e9:>12.3f}"
+                lines.append(line)
+            lines.append("")
+
+        sort_by = "self_cpu_time_total"
+        if use_cuda:
+            new_names = len(events) > 0 and hasattr(events[0], "device_time_total")
+            sort_by = "self_device_time_total" if new_names else "self_cuda_time_total"
+        lines += ["Operators", profiler.key_averages().table(sort_by=sort_by, row_limit=20)]
+        return "\n".join(lines)
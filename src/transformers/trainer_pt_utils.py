@@ -16,12 +16,17 @@
 Torch utilities for the Trainer class.
 """
 
+import copy
 import datetime
 import json
 import math
 import os
+import queue
+import shutil
 import sys
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from dataclasses import dataclass
 from logging import StreamHandler
@@ -201,6 +206,112 @@ def distributed_broadcast_scalars(
         raise AssertionError("Not currently using distributed training")
 
 
+def distributed_sum(statistics: Dict[str, Any], device: Optional[torch.device] = None) -> Dict[str, Any]:
+    """
+    Sums the values of `statistics` (a dict of numbers or NumPy arrays, like the sufficient statistics of a
+    [`StreamingMetric`]) across processes. The values of each dtype are flattened in a single tensor, so there is one
+    all-reduce per dtype whatever the number of statistics. The summed values have the types of the original ones.
+    """
+    arrays = {}
+    for name, value in statistics.items():
+        array = np.asarray(value)
+        if array.dtype == np.bool_:
+            array = array.astype(np.int64)
+        if array.dtype.kind not in "iuf":
+            raise TypeError(f"Can only sum numbers and numeric arrays across processes, got {type(value)} for {name}.")
+        arrays[name] = array
+
+    names_by_dtype = {}
+    for name, array in arrays.items():
+        names_by_dtype.setdefault(array.dtype, []).append(name)
+
+    summed = {}
+    try:
+        for names in names_by_dtype.values():
+            flat = np.concatenate([arrays[name].reshape(-1) for name in names])
+            tensor = torch.from_numpy(flat).to(device)
+            dist.all_reduce(tensor)
+            flat = tensor.cpu().numpy()
+            offset = 0
+            for name in names:
+                size = arrays[name].size
+                summed[name] = flat[offset : offset + size].reshape(arrays[name].shape)
+                offset += size
+    except AssertionError:
+        raise AssertionError("Not currently using distributed training")
+
+    for name, value in statistics.items():
+        if isinstance(value, np.generic):
+            summed[name] = summed[name][()]
+        elif not isinstance(value, np.ndarray):
+            summed[name] = summed[name].item()
+    return summed
+
+
+def nested_cpu_copy(tensors):
+    """
+    Copy `tensors` (tensor or nested list/tuple/dict of tensors, like a state dict) to new CPU tensors, so that the
+    copy is not affected by later in-place updates. Other objects are deep-copied.
+    """
+    if isinstance(tensors, (list, tuple)):
+        return type(tensors)(nested_cpu_copy(t) for t in tensors)
+    if isinstance(tensors, dict):
+        return type(tensors)({k: nested_cpu_copy(t) for k, t in tensors.items()})
+    if isinstance(tensors, torch.Tensor):
+        return tensors.detach().to("cpu", copy=True)
+    return copy.deepcopy(tensors)
+
+
+class AsyncCheckpointWriter:
+    """
+    A class responsible for writing checkpoints in a background thread, so that training only stops for the time it
+    takes to copy the states to the CPU.
+
+    Objects passed to [`~AsyncCheckpointWriter.save`] are copied to the CPU right away, and written with `torch.save`
+    in the background once [`~AsyncCheckpointWriter.commit`] is called. They are written in a temporary folder, which
+    is renamed to the checkpoint folder once all files are written, so a checkpoint folder is always complete. Only one
+    checkpoint is written at a time: [`~AsyncCheckpointWriter.wait`] blocks until the previous one is done.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-writer")
+        self._pending = []
+        self._future = None
+
+    def save(self, obj, path):
+        """
+        Copies `obj` to the CPU, to be written at `path` with `torch.save` by the next commit. Has the signature of
+        `torch.save`, so it can be used as a `save_function`.
+        """
+        self._pending.append((nested_cpu_copy(obj), path))
+
+    def commit(self, tmp_dir, output_dir, callback=None):
+        """
+        Writes the objects saved since the last commit in the background, then renames `tmp_dir` to `output_dir` and
+        calls `callback` (if any).
+        """
+        pending, self._pending = self._pending, []
+        self._future = self._executor.submit(self._write, pending, tmp_dir, output_dir, callback)
+
+    def wait(self):
+        """
+        Blocks until the last commit is written, and reraises the exception it raised if any.
+        """
+        if self._future is not None:
+            future, self._future = self._future, None
+            future.result()
+
+    @staticmethod
+    def _write(pending, tmp_dir, output_dir, callback):
+        for obj, path in pending:
+            torch.save(obj, path)
+        if os.path.isdir(output_dir):
+            shutil.rmtree(output_dir)
+        os.replace(tmp_dir, output_dir)
+        if callback is not None:
+            callback()
+
+
 def reissue_pt_warnings(caught_warnings):
     # Reissue warnings that are not the SAVE_STATE_WARNING
     if len(caught_warnings) > 1:
@@ -241,6 +352,13 @@ class DistributedSamplerWithLoop(DistributedSampler):
     def __init__(self, dataset, batch_size, **kwargs):
         super().__init__(dataset, **kwargs)
         self.batch_size = batch_size
+        self.start_index = 0
+
+    def set_start_index(self, start_index: int):
+        """
+        Skips the first `start_index` samples of the current epoch, to resume training in the middle of an epoch.
+        """
+        self.start_index = start_index
 
     def __iter__(self):
         indices = list(super().__iter__())
@@ -249,7 +367,74 @@ class DistributedSamplerWithLoop(DistributedSampler):
         # of the world size, so we skip those.
         start_remainder = 1 if self.rank < len(self.dataset) % self.num_replicas else 0
         indices += indices[start_remainder : start_remainder + remainder]
-        return iter(indices)
+        return iter(indices[self.start_index :])
+
+    def __len__(self):
+        return max(super().__len__() - self.start_index, 0)
+
+
+class SeedableRandomSampler(Sampler):
+    """
+    Samples elements randomly, like `torch.utils.data.RandomSampler`, with a permutation that only depends on `seed`
+    and the current epoch (set with `set_epoch`), like `torch.utils.data.distributed.DistributedSampler`. This is what
+    makes it possible to resume an epoch at any position with `set_start_index`, without iterating through the samples
+    seen before.
+
+    Args:
+        data_source (`torch.utils.data.Dataset`):
+            Dataset used for sampling.
+        seed (`int`, *optional*, defaults to 0):
+            The random seed used to shuffle the samples, the permutation at each epoch uses `seed + epoch`.
+    """
+
+    def __init__(self, data_source: Dataset, seed: int = 0):
+        self.data_source = data_source
+        self.seed = seed
+        self.epoch = 0
+        self.start_index = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def set_start_index(self, start_index: int):
+        """
+        Skips the first `start_index` samples of the current epoch, to resume training in the middle of an epoch.
+        """
+        self.start_index = start_index
+
+    def __iter__(self):
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        indices = torch.randperm(len(self.data_source), generator=generator).tolist()
+        return iter(indices[self.start_index :])
+
+    def __len__(self):
+        return max(len(self.data_source) - self.start_index, 0)
+
+
+class ResumableDistributedSampler(DistributedSampler):
+    """
+    Like a `torch.utils.data.distributed.DistributedSampler`, that can also resume an epoch at any position with
+    `set_start_index`, without iterating through the samples seen before.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.start_index = 0
+
+    def set_start_index(self, start_index: int):
+        """
+        Skips the first `start_index` samples of the current epoch (on this process), to resume training in the middle
+        of an epoch.
+        """
+        self.start_index = start_index
+
+    def __iter__(self):
+        indices = list(super().__iter__())
+        return iter(indices[self.start_index :])
+
+    def __len__(self):
+        return max(super().__len__() - self.start_index, 0)
 
 
 class SequentialDistributedSampler(Sampler):
@@ -317,7 +502,7 @@ def get_tpu_sampler(dataset: torch.utils.data.Dataset, batch_size: int):
 def nested_new_like(arrays, num_samples, padding_index=-100):
     """Create the same nested structure as `arrays` with a first dimension always at `num_samples`."""
     if isinstance(arrays, (list, tuple)):
-        return type(arrays)(nested_new_like(x, num_samples) for x in arrays)
+        return type(arrays)(nested_new_like(x, num_samples, padding_index=padding_index) for x in arrays)
     return np.full_like(arrays, padding_index, shape=(num_samples, *arrays.shape[1:]))
 
 
@@ -335,6 +520,95 @@ def nested_truncate(tensors, limit):
     return tensors[:limit]
 
 
+class NestedArrayAccumulator:
+    """
+    A class responsible for accumulating arrays (or nested list/tuple of arrays) on the CPU, by concatenating them on
+    the first axis and padding them on the second one if necessary. The result is the same as successive calls to
+    [`nested_concat`], without copying everything accumulated so far each time new arrays are added.
+
+    If the number of samples is known in advance, the storage for all of them is initialized at the first arrays passed
+    (so that if we're bound to get an OOM, it happens at the beginning) and the samples past `num_samples` (the extras
+    added by a distributed sampler) are dropped. Otherwise, the arrays are kept and only concatenated once, by
+    [`~NestedArrayAccumulator.finalize`].
+
+    Args:
+        num_samples (`int`, *optional*):
+            The number of samples in our dataset, if known.
+        padding_index (`int`, *optional*, defaults to -100):
+            The padding index to use if the arrays don't all have the same sequence length.
+    """
+
+    def __init__(self, num_samples=None, padding_index=-100):
+        self.num_samples = num_samples
+        self.padding_index = padding_index
+        self._storage = None
+        self._offset = 0
+        self._arrays = []
+
+    def add_arrays(self, arrays):
+        """
+        Add `arrays` to the internal storage.
+        """
+        if arrays is None:
+            return
+        if self.num_samples is None:
+            self._arrays.append(arrays)
+            return
+        if self._storage is None:
+            self._storage = nested_new_like(arrays, self.num_samples, padding_index=self.padding_index)
+
+        slice_len, self._storage = self._nested_set_arrays(self._storage, arrays)
+        self._offset += slice_len
+
+    def _nested_set_arrays(self, storage, arrays):
+        if isinstance(arrays, (list, tuple)):
+            result = [self._nested_set_arrays(x, y) for x, y in zip(storage, arrays)]
+            return result[0][0], type(arrays)(r[1] for r in result)
+
+        slice_len = max(0, min(arrays.shape[0], self.num_samples - self._offset))
+        if len(arrays.shape) == 1:
+            storage[self._offset : self._offset + slice_len] = arrays[:slice_len]
+        else:
+            # Expand the array on the fly if needed.
+            if len(storage.shape) > 1 and storage.shape[1] < arrays.shape[1]:
+                storage = expand_like(storage, arrays.shape[1], padding_index=self.padding_index)
+            storage[self._offset : self._offset + slice_len, : arrays.shape[1]] = arrays[:slice_len]
+        return slice_len, storage
+
+    def _nested_concatenate(self, arrays_list):
+        first = arrays_list[0]
+        if isinstance(first, (list, tuple)):
+            return type(first)(
+                self._nested_concatenate([arrays[i] for arrays in arrays_list]) for i in range(len(first))
+            )
+        if len(first.shape) == 1 or all(arrays.shape[1] == first.shape[1] for arrays in arrays_list):
+            return np.concatenate(arrays_list, axis=0)
+
+        # Let's figure out the new shape
+        new_shape = (
+            sum(arrays.shape[0] for arrays in arrays_list),
+            max(arrays.shape[1] for arrays in arrays_list),
+        ) + first.shape[2:]
+
+        # Now let's fill the result array
+        result = np.full_like(first, self.padding_index, shape=new_shape)
+        offset = 0
+        for arrays in arrays_list:
+            result[offset : offset + arrays.shape[0], : arrays.shape[1]] = arrays
+            offset += arrays.shape[0]
+        return result
+
+    def finalize(self):
+        """
+        Return the accumulated arrays, truncated to the number of samples if it was passed.
+        """
+        if self.num_samples is None:
+            return self._nested_concatenate(self._arrays) if len(self._arrays) > 0 else None
+        if self._storage is None:
+            return
+        return nested_truncate(self._storage, self._offset)
+
+
 class DistributedTensorGatherer:
     """
     A class responsible for properly gathering tensors (or nested list/tuple of tensors) on the CPU by chunks.
@@ -522,6 +796,9 @@ class LengthGroupedSampler(Sampler):
     r"""
     Sampler that samples indices in a way that groups together features of the dataset of roughly the same length while
     keeping a bit of randomness.
+
+    If a `seed` is passed instead of a `generator`, the randomness of each epoch only depends on `seed` and the epoch
+    (set with `set_epoch`), and the sampler can resume an epoch at any position with `set_start_index`.
     """
 
     def __init__(
@@ -531,6 +808,7 @@ class LengthGroupedSampler(Sampler):
         lengths: Optional[List[int]] = None,
         model_input_name: Optional[str] = None,
         generator=None,
+        seed: Optional[int] = None,
     ):
         if dataset is None and lengths is None:
             raise ValueError("One of dataset and lengths must be provided.")
@@ -549,13 +827,30 @@ class LengthGroupedSampler(Sampler):
             lengths = [len(feature[model_input_name]) for feature in dataset]
         self.lengths = lengths
         self.generator = generator
+        self.seed = seed
+        self.epoch = 0
+        self.start_index = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def set_start_index(self, start_index: int):
+        """
+        Skips the first `start_index` samples of the current epoch, to resume training in the middle of an epoch.
+        """
+        self.start_index = start_index
 
     def __len__(self):
-        return len(self.lengths)
+        return max(len(self.lengths) - self.start_index, 0)
 
     def __iter__(self):
-        indices = get_length_grouped_indices(self.lengths, self.batch_size, generator=self.generator)
-        return iter(indices)
+        generator = self.generator
+        if self.seed is not None:
+            # Deterministically shuffle based on epoch and seed
+            generator = torch.Generator()
+            generator.manual_seed(self.seed + self.epoch)
+        indices = get_length_grouped_indices(self.lengths, self.batch_size, generator=generator)
+        return iter(indices[self.start_index :])
 
 
 class DistributedLengthGroupedSampler(DistributedSampler):
@@ -616,6 +911,17 @@ class DistributedLengthGroupedSampler(DistributedSampler):
             self.num_samples = math.ceil(len(self.lengths) / self.num_replicas)
         self.total_size = self.num_samples * self.num_replicas
         self.seed = seed
+        self.start_index = 0
+
+    def set_start_index(self, start_index: int):
+        """
+        Skips the first `start_index` samples of the current epoch (on this process), to resume training in the middle
+        of an epoch.
+        """
+        self.start_index = start_index
+
+    def __len__(self):
+        return max(self.num_samples - self.start_index, 0)
 
     def __iter__(self) -> Iterator:
         # Deterministically shuffle based on epoch and seed
@@ -635,7 +941,145 @@ class DistributedLengthGroupedSampler(DistributedSampler):
         indices = indices[self.rank : self.total_size : self.num_replicas]
         assert len(indices) == self.num_samples
 
-        return iter(indices)
+        return iter(indices[self.start_index :])
+
+
+class MaxTokensBatchSampler(Sampler):
+    r"""
+    Batch sampler that yields batches with a variable number of samples of roughly the same length, so that each batch
+    holds at most `max_tokens` tokens once padded to its longest sample.
+
+    Like in fairseq, samples are shuffled then sorted by length (so samples of the same length are in a random order),
+    greedily packed into batches and the batches are shuffled. The batch containing the longest sample is always
+    yielded first, so that an OOM happens sooner rather than later. The shuffling only depends on `seed` and the epoch
+    (set with `set_epoch`), and the sampler can resume an epoch at any batch with `set_start_index`.
+
+    In distributed training, the batches are dealt to the processes in turn, repeating the first batches (or dropping
+    the last ones if `drop_last=True`) so that all processes do the same number of steps.
+
+    Args:
+        max_tokens (`int`):
+            The maximum number of tokens (including padding) in a batch.
+        dataset (`torch.utils.data.Dataset`, *optional*):
+            The dataset to sample from, used to compute the lengths of the samples if `lengths` is not passed.
+        lengths (`List[int]`, *optional*):
+            The lengths of the samples of the dataset.
+        model_input_name (`str`, *optional*, defaults to `"input_ids"`):
+            The key of the samples of `dataset` used to compute their lengths.
+        num_replicas (`int`, *optional*, defaults to 1):
+            The number of processes participating in the training.
+        rank (`int`, *optional*, defaults to 0):
+            The rank of the current process.
+        seed (`int`, *optional*, defaults to 0):
+            The random seed used to shuffle the samples and the batches.
+        drop_last (`bool`, *optional*, defaults to `False`):
+            Whether to drop the last batches instead of repeating the first ones when the number of batches is not a
+            multiple of `num_replicas`.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        dataset: Optional[Dataset] = None,
+        lengths: Optional[List[int]] = None,
+        model_input_name: Optional[str] = None,
+        num_replicas: int = 1,
+        rank: int = 0,
+        seed: int = 0,
+        drop_last: bool = False,
+    ):
+        if dataset is None and lengths is None:
+            raise ValueError("One of dataset and lengths must be provided.")
+
+        if lengths is None:
+            model_input_name = model_input_name if model_input_name is not None else "input_ids"
+            if (
+                not (isinstance(dataset[0], dict) or isinstance(dataset[0], BatchEncoding))
+                or model_input_name not in dataset[0]
+            ):
+                raise ValueError(
+                    "Can only automatically infer lengths for datasets whose items are dictionaries with an "
+                    f"'{model_input_name}' key."
+                )
+            lengths = [len(feature[model_input_name]) for feature in dataset]
+        if len(lengths) > 0 and max(lengths) > max_tokens:
+            raise ValueError(
+                f"The longest sample of the dataset has {max(lengths)} tokens, which is more than the maximum number "
+                f"of tokens in a batch ({max_tokens}). Truncate the samples or increase `max_tokens`."
+            )
+        self.max_tokens = max_tokens
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+        self.start_index = 0
+
+        # The lengths are sorted before being packed, so the number of batches does not depend on the shuffling.
+        self.batch_sizes = self._get_batch_sizes(sorted(lengths, reverse=True))
+        num_batches = len(self.batch_sizes)
+        if self.drop_last:
+            self.num_batches = num_batches // self.num_replicas
+        else:
+            self.num_batches = math.ceil(num_batches / self.num_replicas)
+
+    def _get_batch_sizes(self, sorted_lengths: List[int]) -> List[int]:
+        batch_sizes = []
+        batch_size = 0
+        max_length = 0
+        for length in sorted_lengths:
+            # Lengths are sorted in descending order, so the first sample of a batch is the longest one.
+            if batch_size > 0 and (batch_size + 1) * max_length > self.max_tokens:
+                batch_sizes.append(batch_size)
+                batch_size = 0
+            if batch_size == 0:
+                max_length = length
+            batch_size += 1
+        if batch_size > 0:
+            batch_sizes.append(batch_size)
+        return batch_sizes
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def set_start_index(self, start_index: int):
+        """
+        Skips the first `start_index` batches of the current epoch (on this process), to resume training in the middle
+        of an epoch.
+        """
+        self.start_index = start_index
+
+    def __len__(self):
+        return max(self.num_batches - self.start_index, 0)
+
+    def __iter__(self) -> Iterator[List[int]]:
+        # Deterministically shuffle based on epoch and seed
+        g = torch.Generator()
+        g.manual_seed(self.seed + self.epoch)
+        indices = torch.randperm(len(self.lengths), generator=g).numpy()
+        # A stable sort keeps samples of the same length in a random order.
+        indices = indices[np.argsort(-self.lengths[indices], kind="stable")].tolist()
+
+        batches = []
+        offset = 0
+        for batch_size in self.batch_sizes:
+            batches.append(indices[offset : offset + batch_size])
+            offset += batch_size
+        # Shuffle the batches but keep the one with the longest sample first.
+        shuffled = torch.randperm(max(len(batches) - 1, 0), generator=g).tolist()
+        batches = batches[:1] + [batches[i + 1] for i in shuffled]
+
+        total_batches = self.num_batches * self.num_replicas
+        if not self.drop_last:
+            # Add extra batches to make it evenly divisible. While loop is there in the edge case we have a tiny
+            # dataset and it needs to be done several times.
+            while len(batches) < total_batches:
+                batches += batches[: (total_batches - len(batches))]
+        batches = batches[self.rank : total_batches : self.num_replicas]
+        assert len(batches) == self.num_batches
+
+        return iter(batches[self.start_index :])
 
 
 class ShardSampler(Sampler):
@@ -743,12 +1187,20 @@ class IterableDatasetShard(IterableDataset):
         self.seed = seed
         self.epoch = 0
         self.num_examples = 0
+        self.start_index = 0
 
     def set_epoch(self, epoch):
         self.epoch = epoch
         if hasattr(self.dataset, "set_epoch"):
             self.dataset.set_epoch(epoch)
 
+    def set_start_index(self, start_index: int):
+        """
+        Skips the first `start_index` samples of this shard at the next iteration, to resume training in the middle of
+        an epoch. The elements of the underlying dataset still have to be iterated through, but they are not yielded.
+        """
+        self.start_index = start_index
+
     def __iter__(self):
         self.num_examples = 0
         if (
@@ -762,13 +1214,17 @@ class IterableDatasetShard(IterableDataset):
 
         first_batch = None
         current_batch = []
+        # Index of the next sample of this shard, to skip the first `start_index` ones.
+        index = 0
         for element in self.dataset:
             self.num_examples += 1
             current_batch.append(element)
             # Wait to have a full batch before yielding elements.
             if len(current_batch) == real_batch_size:
                 for i in process_slice:
-                    yield current_batch[i]
+                    if index >= self.start_index:
+                        yield current_batch[i]
+                    index += 1
                 if first_batch is None:
                     first_batch = current_batch.copy()
                 current_batch = []
@@ -780,14 +1236,125 @@ class IterableDatasetShard(IterableDataset):
             while len(current_batch) < real_batch_size:
                 current_batch += first_batch
             for i in process_slice:
-                yield current_batch[i]
+                if index >= self.start_index:
+                    yield current_batch[i]
+                index += 1
 
     def __len__(self):
         # Will raise an error if the underlying dataset is not sized.
         if self.drop_last:
-            return (len(self.dataset) // (self.batch_size * self.num_processes)) * self.batch_size
+            length = (len(self.dataset) // (self.batch_size * self.num_processes)) * self.batch_size
         else:
-            return math.ceil(len(self.dataset) / (self.batch_size * self.num_processes)) * self.batch_size
+            length = math.ceil(len(self.dataset) / (self.batch_size * self.num_processes)) * self.batch_size
+        return max(length - self.start_index, 0)
+
+
+def _record_stream(tensors, stream):
+    "Marks the CUDA tensors of `tensors` (even if it's a nested list/tuple/dict of tensors) as used by `stream`."
+    if isinstance(tensors, (list, tuple)):
+        for t in tensors:
+            _record_stream(t, stream)
+    elif isinstance(tensors, (dict, BatchEncoding)):
+        for t in tensors.values():
+            _record_stream(t, stream)
+    elif isinstance(tensors, torch.Tensor) and tensors.is_cuda:
+        tensors.record_stream(stream)
+
+
+class BatchPrefetcher:
+    """
+    Wraps an iterable of batches (typically a [`~torch.utils.data.DataLoader`]) to load, collate and prepare the next
+    `num_batches` batches in a background thread while the current one is used. This hides the data loading time when
+    it can't be done by the workers of the dataloader (with `num_workers=0`, for instance because the collator isn't
+    picklable or the dataset is an `IterableDataset` that can't be split between workers).
+
+    The other attributes of the wrapped iterable (`dataset`, `sampler`, `batch_size`...) are accessible from the
+    prefetcher and each iteration over the prefetcher starts a new iteration over the wrapped iterable.
+
+    Args:
+        iterable (`Iterable`):
+            The iterable of batches to prefetch.
+        num_batches (`int`, *optional*, defaults to 2):
+            The maximum number of batches prepared in advance.
+        prepare_fn (`Callable`, *optional*):
+            A function applied to each batch in the background thread, typically to move it to the device.
+        device (`torch.device`, *optional*):
+            The device `prepare_fn` moves the batches to. On a CUDA device, `prepare_fn` is run on a separate CUDA
+            stream so that the copies overlap with the computations on the current stream.
+    """
+
+    _END = object()
+
+    def __init__(self, iterable, num_batches: int = 2, prepare_fn=None, device=None):
+        if num_batches < 1:
+            raise ValueError(f"`num_batches` has to be a positive integer, got {num_batches}.")
+        self.iterable = iterable
+        self.num_batches = num_batches
+        self.prepare_fn = prepare_fn
+        self.device = device
+
+    def __len__(self):
+        return len(self.iterable)
+
+    def __getattr__(self, name):
+        if name == "iterable":
+            raise AttributeError(name)
+        return getattr(self.iterable, name)
+
+    def __iter__(self):
+        batches = queue.Queue(maxsize=self.num_batches)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._prefetch, args=(batches, stop), name="batch-prefetcher", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is self._END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                batch, event = item
+                if event is not None:
+                    # Wait for the copies of the batch and keep its memory from being reused while it's in use.
+                    current_stream = torch.cuda.current_stream(self.device)
+                    current_stream.wait_event(event)
+                    _record_stream(batch, current_stream)
+                yield batch
+        finally:
+            # The iteration is over or was interrupted, so the background thread can stop.
+            stop.set()
+            thread.join()
+
+    def _prefetch(self, batches, stop):
+        stream = None
+        if self.prepare_fn is not None and self.device is not None and torch.device(self.device).type == "cuda":
+            stream = torch.cuda.Stream(self.device)
+        try:
+            for batch in self.iterable:
+                event = None
+                if stream is not None:
+                    with torch.cuda.stream(stream):
+                        batch = self.prepare_fn(batch)
+                    event = torch.cuda.Event()
+                    event.record(stream)
+                elif self.prepare_fn is not None:
+                    batch = self.prepare_fn(batch)
+                if not self._put(batches, (batch, event), stop):
+                    return
+            self._put(batches, self._END, stop)
+        except Exception as e:
+            self._put(batches, e, stop)
+
+    @staticmethod
+    def _put(batches, item, stop):
+        # Don't block forever on a full queue once the consumer stopped iterating.
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
 
 
 # In order to keep `trainer.py` compact and easy to understand, place any secondary PT Trainer
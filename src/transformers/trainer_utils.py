@@ -25,7 +25,7 @@ import random
 import re
 import threading
 import time
-from typing import Any, Dict, NamedTuple, Optional, Tuple, Union
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
 import numpy as np
 
@@ -77,6 +77,92 @@ class EvalPrediction(NamedTuple):
     label_ids: Union[np.ndarray, Tuple[np.ndarray]]
 
 
+class StreamingMetric:
+    """
+    Base class for metrics computed incrementally, one batch of predictions at a time, that can be passed as
+    `compute_metrics` to a [`Trainer`].
+
+    Instead of accumulating the predictions and labels of the whole dataset to call `compute_metrics` once, the
+    evaluation loop resets the metric, passes the [`EvalPrediction`] of each batch (gathered across processes, as NumPy
+    arrays) to [`~StreamingMetric.update`] and gets the metrics from [`~StreamingMetric.compute`] at the end, so the
+    predictions are never held in memory for the whole dataset. The predictions and labels returned by
+    [`Trainer.predict`] are then `None`. Note that with an iterable dataset in a distributed setup, the last batches
+    can contain a few extra samples (used to have batches of the same size on all processes), unless the evaluation is
+    sharded.
+
+    Subclasses have to implement [`~StreamingMetric.reset`], [`~StreamingMetric.update`] and
+    [`~StreamingMetric.compute`]. To be used in a sharded evaluation (`sharded_eval=True` in [`TrainingArguments`]),
+    where each process only updates the metric with its own predictions, a metric also has to list in
+    `sufficient_statistics` the attributes holding its state that can be summed across processes (sums, counts,
+    confusion matrices, histograms...), or override [`~StreamingMetric.get_sufficient_statistics`] and
+    [`~StreamingMetric.set_sufficient_statistics`].
+
+    Example:
+
+    ```python
+    class Accuracy(StreamingMetric):
+        sufficient_statistics = ["correct", "total"]
+
+        def reset(self):
+            self.correct, self.total = 0, 0
+
+        def update(self, eval_prediction):
+            predictions = eval_prediction.predictions.argmax(-1)
+            self.correct += (predictions == eval_prediction.label_ids).sum()
+            self.total += len(predictions)
+
+        def compute(self):
+            return {"accuracy": self.correct / self.total}
+    ```
+    """
+
+    sufficient_statistics: List[str] = []
+
+    def reset(self):
+        """
+        Resets the state of the metric, called at the beginning of each evaluation.
+        """
+        raise NotImplementedError
+
+    def update(self, eval_prediction: EvalPrediction):
+        """
+        Updates the state of the metric with the predictions and labels of a batch.
+        """
+        raise NotImplementedError
+
+    def compute(self) -> Dict[str, float]:
+        """
+        Returns the metrics computed on all the batches passed to [`~StreamingMetric.update`] since the last reset.
+        """
+        raise NotImplementedError
+
+    def get_sufficient_statistics(self) -> Dict[str, Union[int, float, np.ndarray]]:
+        """
+        Returns the state of the metric as numbers or NumPy arrays that are summed across processes in a sharded
+        evaluation. Defaults to the attributes listed in `sufficient_statistics`.
+        """
+        if len(self.sufficient_statistics) == 0:
+            raise NotImplementedError(
+                f"{self.__class__.__name__} does not define its `sufficient_statistics`, so it can't be used in a "
+                "sharded evaluation."
+            )
+        return {name: getattr(self, name) for name in self.sufficient_statistics}
+
+    def set_sufficient_statistics(self, statistics: Dict[str, Union[int, float, np.ndarray]]):
+        """
+        Sets the state of the metric from the sufficient statistics summed across processes, before calling
+        [`~StreamingMetric.compute`].
+        """
+        for name, value in statistics.items():
+            setattr(self, name, value)
+
+    def __call__(self, eval_prediction: EvalPrediction) -> Dict[str, float]:
+        # Computes the metrics on all predictions at once, like a regular `compute_metrics` function.
+        self.reset()
+        self.update(eval_prediction)
+        return self.compute()
+
+
 class EvalLoopOutput(NamedTuple):
     predictions: Union[np.ndarray, Tuple[np.ndarray]]
     label_ids: Optional[Union[np.ndarray, Tuple[np.ndarray]]]
@@ -22,6 +22,8 @@ from enum import Enum
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+from packaging import version
+
 from .debug_utils import DebugOption
 from .file_utils import (
     ExplicitEnum,
@@ -76,9 +78,12 @@ class OptimizerNames(ExplicitEnum):
     """
 
     ADAMW_HF = "adamw_hf"
+    ADAMW_HF_FOREACH = "adamw_hf_foreach"
+    ADAMW_8BIT = "adamw_8bit"
     ADAMW_TORCH = "adamw_torch"
     ADAMW_APEX_FUSED = "adamw_apex_fused"
     ADAFACTOR = "adafactor"
+    ADAFACTOR_FOREACH = "adafactor_foreach"
 
 
 @dataclass
@@ -137,6 +142,15 @@ class TrainingArguments:
             Number of predictions steps to accumulate the output tensors for, before moving the results to the CPU. If
             left unset, the whole predictions are accumulated on GPU/TPU before being moved to the CPU (faster but
             requires more memory).
+        sharded_eval (`bool`, *optional*, defaults to `False`):
+            Whether to evaluate without gathering the predictions and labels across processes in a distributed
+            evaluation. Each process updates `compute_metrics`, which has to be a [`StreamingMetric`] defining its
+            sufficient statistics, with the predictions of its own samples and only those statistics (and the loss) are
+            summed across processes, so all processes get the same metrics. The predictions and labels returned by
+            [`Trainer.predict`] are then `None`, unless `eval_gather_predictions` is set.
+        eval_gather_predictions (`bool`, *optional*, defaults to `False`):
+            With `sharded_eval`, whether to still gather the predictions and labels of all processes, to return them
+            from [`Trainer.predict`] or to pass them to a `compute_metrics` function that isn't a [`StreamingMetric`].
         learning_rate (`float`, *optional*, defaults to 5e-5):
             The initial learning rate for [`AdamW`] optimizer.
         weight_decay (`float`, *optional*, defaults to 0):
@@ -197,6 +211,10 @@ class TrainingArguments:
 
             </Tip>
 
+        logging_dataloader_wait (`bool`, *optional*, defaults to `False`):
+            Whether to log, along with the loss, the average time spent waiting for the training batches per
+            optimization step (`dataloader_wait_time`, in seconds) and the fraction of the training time it accounts
+            for (`dataloader_wait_ratio`). A ratio that isn't close to 0 means the training is stalled by data loading.
         save_strategy (`str` or [`~trainer_utils.IntervalStrategy`], *optional*, defaults to `"steps"`):
             The checkpoint save strategy to adopt during training. Possible values are:
 
@@ -214,6 +232,12 @@ class TrainingArguments:
 
             This should not be activated when the different nodes use the same storage as the files will be saved with
             the same names for each node.
+        save_async (`bool`, *optional*, defaults to `False`):
+            Whether to write checkpoints in a background thread. Training only stops while the model, optimizer and
+            scheduler states are copied to the CPU memory (which needs room for a copy of them), and the files are
+            written in a temporary folder renamed to the checkpoint folder once complete. Training only waits for a
+            checkpoint to be written when the next one is saved or at the end of training. Not supported with TPUs,
+            SageMaker Model Parallel, DeepSpeed or sharded DDP.
         no_cuda (`bool`, *optional*, defaults to `False`):
             Whether to not use CUDA even when it is available or not.
         seed (`int`, *optional*, defaults to 42):
@@ -340,7 +364,10 @@ class TrainingArguments:
 
             The options should be separated by whitespaces.
         optim (`str` or [`training_args.OptimizerNames`], *optional*, defaults to `"adamw_hf"`):
-            The optimizer to use: adamw_hf, adamw_torch, adamw_apex_fused, or adafactor.
+            The optimizer to use: adamw_hf, adamw_hf_foreach, adamw_8bit, adamw_torch, adamw_apex_fused, adafactor or
+            adafactor_foreach. The `_foreach` variants are the multi-tensor implementations of [`AdamW`] and
+            [`Adafactor`], which give the same results while updating the parameters with batched operations.
+            adamw_8bit is [`AdamW8bit`], which stores the moments of large parameters in 8 bits.
         adafactor (`bool`, *optional*, defaults to `False`):
             This argument is deprecated. Use `--optim adafactor` instead.
         group_by_length (`bool`, *optional*, defaults to `False`):
@@ -348,8 +375,14 @@ class TrainingArguments:
             padding applied and be more efficient). Only useful if applying dynamic padding.
         length_column_name (`str`, *optional*, defaults to `"length"`):
             Column name for precomputed lengths. If the column exists, grouping by length will use these values rather
-            than computing them on train startup. Ignored unless `group_by_length` is `True` and the dataset is an
-            instance of `Dataset`.
+            than computing them on train startup. Ignored unless `group_by_length` is `True` or `max_tokens_per_batch`
+            is set and the dataset is an instance of `Dataset`.
+        max_tokens_per_batch (`int`, *optional*):
+            If set, the training batches are built with a variable number of samples of roughly the same length, so
+            that each of them holds at most this number of tokens (including padding) instead of
+            `per_device_train_batch_size` samples. The losses of the batches making up an optimization step are then
+            weighted by their number of labels (that are not -100), so that each label contributes the same to the
+            gradients whatever the size of its batch. Only useful if applying dynamic padding.
         report_to (`str` or `List[str]`, *optional*, defaults to `"all"`):
             The list of integrations to report the results and logs to. Supported platforms are `"azure_ml"`,
             `"comet_ml"`, `"mlflow"`, `"tensorboard"` and `"wandb"`. Use `"all"` to report to all integrations
@@ -361,9 +394,32 @@ class TrainingArguments:
             When using distributed training, the value of the flag `bucket_cap_mb` passed to `DistributedDataParallel`.
         dataloader_pin_memory (`bool`, *optional*, defaults to `True`):
             Whether you want to pin memory in data loaders or not. Will default to `True`.
+        dataloader_prefetch_batches (`int`, *optional*, defaults to 0):
+            The number of batches to load, collate and move to the device in a background thread ahead of the training
+            and evaluation loops (see [`~trainer_pt_utils.BatchPrefetcher`]). 0 (default) means the batches are loaded
+            by the loops themselves. Mostly useful with `dataloader_num_workers=0`. Random operations of the data
+            collator (like dynamic masking) then run concurrently with training, so training on CPU is not exactly
+            reproducible anymore.
         skip_memory_metrics (`bool`, *optional*, defaults to `True`):
             Whether to skip adding of memory profiler reports to metrics. This is skipped by default because it slows
             down the training and evaluation speed.
+        profile (`bool`, *optional*, defaults to `False`):
+            Whether to profile the training with `torch.profiler`, see [`ProfilerCallback`]. The Chrome traces and
+            summaries of the profiled steps are written in the `profiler` folder of `output_dir`.
+        profile_wait_steps (`int`, *optional*, defaults to 1):
+            The number of optimization steps the profiler skips at the beginning of each cycle.
+        profile_warmup_steps (`int`, *optional*, defaults to 1):
+            The number of optimization steps the profiler warms up for (without recording) after the skipped ones.
+        profile_active_steps (`int`, *optional*, defaults to 3):
+            The number of optimization steps the profiler records after warming up.
+        profile_repeat (`int`, *optional*, defaults to 1):
+            The number of profiling cycles. Use 0 to profile until the end of training.
+        profile_record_shapes (`bool`, *optional*, defaults to `False`):
+            Whether the profiler records the shapes of the inputs of the operators.
+        profile_memory (`bool`, *optional*, defaults to `False`):
+            Whether the profiler tracks the memory allocated and released by the operators.
+        profile_with_stack (`bool`, *optional*, defaults to `False`):
+            Whether the profiler records the Python stack of the operators.
         push_to_hub (`bool`, *optional*, defaults to `False`):
             Whether or not to upload the trained model to the hub after training. If this is activated, and
             `output_dir` exists, it needs to be a local clone of the repository to which the [`Trainer`] will be
@@ -457,6 +513,17 @@ class TrainingArguments:
         default=None,
         metadata={"help": "Number of predictions steps to accumulate before moving the tensors to the CPU."},
     )
+    sharded_eval: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to compute the evaluation metrics from statistics summed across processes, instead of "
+            "gathering the predictions and labels of all processes."
+        },
+    )
+    eval_gather_predictions: bool = field(
+        default=False,
+        metadata={"help": "With `sharded_eval`, whether to still gather the predictions and labels of all processes."},
+    )
 
     learning_rate: float = field(default=5e-5, metadata={"help": "The initial learning rate for AdamW."})
     weight_decay: float = field(default=0.0, metadata={"help": "Weight decay for AdamW if we apply some."})
@@ -507,6 +574,9 @@ class TrainingArguments:
     logging_first_step: bool = field(default=False, metadata={"help": "Log the first global_step"})
     logging_steps: int = field(default=500, metadata={"help": "Log every X updates steps."})
     logging_nan_inf_filter: str = field(default=True, metadata={"help": "Filter nan and inf losses for logging."})
+    logging_dataloader_wait: bool = field(
+        default=False, metadata={"help": "Log the time spent waiting for training batches along with the loss."}
+    )
     save_strategy: IntervalStrategy = field(
         default="steps",
         metadata={"help": "The checkpoint save strategy to use."},
@@ -527,6 +597,10 @@ class TrainingArguments:
             "help": "When doing multi-node distributed training, whether to save models and checkpoints on each node, or only on the main one"
         },
     )
+    save_async: bool = field(
+        default=False,
+        metadata={"help": "Whether to write checkpoints in a background thread to avoid stalling training."},
+    )
     no_cuda: bool = field(default=False, metadata={"help": "Do not use CUDA even when it is available"})
     seed: int = field(default=42, metadata={"help": "Random seed that will be set at the beginning of training."})
     bf16: bool = field(
@@ -668,6 +742,13 @@ class TrainingArguments:
         default="length",
         metadata={"help": "Column name with precomputed lengths to use when grouping by length."},
     )
+    max_tokens_per_batch: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": "If set, build training batches of samples of roughly the same length with at most this number of "
+            "tokens (including padding) instead of a fixed number of samples."
+        },
+    )
     report_to: Optional[List[str]] = field(
         default=None, metadata={"help": "The list of integrations to report the results and logs to."}
     )
@@ -688,9 +769,38 @@ class TrainingArguments:
     dataloader_pin_memory: bool = field(
         default=True, metadata={"help": "Whether or not to pin memory for DataLoader."}
     )
+    dataloader_prefetch_batches: int = field(
+        default=0,
+        metadata={
+            "help": "Number of batches to load, collate and move to the device in a background thread ahead of the "
+            "training and evaluation loops (0 to disable)."
+        },
+    )
     skip_memory_metrics: bool = field(
         default=True, metadata={"help": "Whether or not to skip adding of memory profiler reports to metrics."}
     )
+    profile: bool = field(default=False, metadata={"help": "Whether or not to profile training with torch.profiler."})
+    profile_wait_steps: int = field(
+        default=1, metadata={"help": "Number of steps the profiler skips at the beginning of each cycle."}
+    )
+    profile_warmup_steps: int = field(
+        default=1, metadata={"help": "Number of steps the profiler warms up for after the skipped ones."}
+    )
+    profile_active_steps: int = field(
+        default=3, metadata={"help": "Number of steps the profiler records after warming up."}
+    )
+    profile_repeat: int = field(
+        default=1, metadata={"help": "Number of profiling cycles, 0 to profile until the end of training."}
+    )
+    profile_record_shapes: bool = field(
+        default=False, metadata={"help": "Whether the profiler records the shapes of the inputs of the operators."}
+    )
+    profile_memory: bool = field(
+        default=False, metadata={"help": "Whether the profiler tracks the memory used by the operators."}
+    )
+    profile_with_stack: bool = field(
+        default=False, metadata={"help": "Whether the profiler records the Python stack of the operators."}
+    )
     use_legacy_prediction_loop: bool = field(
         default=False, metadata={"help": "Whether or not to use the legacy prediction_loop in the Trainer."}
     )
@@ -784,6 +894,19 @@ class TrainingArguments:
                     f"evaluation strategy {self.evaluation_strategy} requires either non-zero --eval_steps or --logging_steps"
                 )
 
+        if self.dataloader_prefetch_batches < 0:
+            raise ValueError(
+                f"`dataloader_prefetch_batches` has to be a non-negative integer, got {self.dataloader_prefetch_batches}."
+            )
+        if self.max_tokens_per_batch is not None and self.max_tokens_per_batch <= 0:
+            raise ValueError(f"`max_tokens_per_batch` has to be a positive integer, got {self.max_tokens_per_batch}.")
+
+        if self.profile and (not is_torch_available() or version.parse(torch.__version__) < version.parse("1.8.1")):
+            raise ValueError("`profile` requires PyTorch >= 1.8.1.")
+
+        if self.sharded_eval and self.use_legacy_prediction_loop:
+            raise ValueError("`sharded_eval` is not supported with `use_legacy_prediction_loop`.")
+
         # logging_steps must be non-zero for logging_strategy that is other than 'no'
         if self.logging_strategy == IntervalStrategy.STEPS and self.logging_steps == 0:
             raise ValueError(f"logging strategy {self.logging_strategy} requires non-zero --logging_steps")
@@ -52,6 +52,20 @@ class LineByLineWithSOPTextDataset(metaclass=DummyObject):
         requires_backends(self, ["torch"])
 
 
+class MemoryMappedTextDataset(metaclass=DummyObject):
+    _backends = ["torch"]
+
+    def __init__(self, *args, **kwargs):
+        requires_backends(self, ["torch"])
+
+
+class MemoryMappedTextDatasetForNextSentencePrediction(metaclass=DummyObject):
+    _backends = ["torch"]
+
+    def __init__(self, *args, **kwargs):
+        requires_backends(self, ["torch"])
+
+
 class SquadDataset(metaclass=DummyObject):
     _backends = ["torch"]
 
@@ -231,6 +245,13 @@ def top_k_top_p_filtering(*args, **kwargs):
     requires_backends(top_k_top_p_filtering, ["torch"])
 
 
+class GradientCheckpointingPolicy(metaclass=DummyObject):
+    _backends = ["torch"]
+
+    def __init__(self, *args, **kwargs):
+        requires_backends(self, ["torch"])
+
+
 class Conv1D(metaclass=DummyObject):
     _backends = ["torch"]
 
@@ -4133,6 +4154,13 @@ class AdamW(metaclass=DummyObject):
         requires_backends(self, ["torch"])
 
 
+class AdamW8bit(metaclass=DummyObject):
+    _backends = ["torch"]
+
+    def __init__(self, *args, **kwargs):
+        requires_backends(self, ["torch"])
+
+
 def get_constant_schedule(*args, **kwargs):
     requires_backends(get_constant_schedule, ["torch"])
 
@@ -25,6 +25,7 @@ from transformers import (
     DataCollatorForPermutationLanguageModeling,
     DataCollatorForTokenClassification,
     DataCollatorForWholeWordMask,
+    DataCollatorWithPacking,
     DataCollatorWithPadding,
     default_data_collator,
     is_tf_available,
@@ -123,6 +124,58 @@ class DataCollatorIntegrationTest(unittest.TestCase):
         batch = data_collator(features)
         self.assertEqual(batch["input_ids"].shape, torch.Size([2, 8]))
 
+    def test_data_collator_with_packing(self):
+        tokenizer = BertTokenizer(self.vocab_file)
+        features = [
+            {"input_ids": [5, 6, 7], "labels": [1, 1, 1]},
+            {"input_ids": [5, 6, 7, 8, 9, 10], "labels": [2, 2, 2, 2, 2, 2]},
+            {"input_ids": [5, 6], "labels": [3, 3]},
+            {"input_ids": [5, 6, 7, 8], "labels": [4, 4, 4, 4]},
+        ]
+
+        data_collator = DataCollatorWithPacking(tokenizer, max_length=8, return_segment_ids=True)
+        batch = data_collator(features)
+        # First-fit-decreasing: [6 + 2] and [4 + 3]
+        self.assertEqual(batch["input_ids"].shape, torch.Size([2, 8]))
+        self.assertEqual(batch["input_ids"][0].tolist(), [5, 6, 7, 8, 9, 10, 5, 6])
+        self.assertEqual(batch["input_ids"][1].tolist(), [5, 6, 7, 8, 5, 6, 7] + [tokenizer.pad_token_id])
+        self.assertEqual(batch["position_ids"][0].tolist(), [0, 1, 2, 3, 4, 5, 0, 1])
+        self.assertEqual(batch["segment_ids"][1].tolist(), [1, 1, 1, 1, 2, 2, 2, 0])
+        self.assertEqual(batch["labels"][1].tolist(), [-100, 4, 4, 4, -100, 1, 1, -100])
+        self.assertEqual(batch["attention_mask"].shape, torch.Size([2, 8, 8]))
+        self.assertEqual(batch["attention_mask"][1, 5].tolist(), [0, 0, 0, 0, 1, 1, 1, 0])
+        self.assertEqual(batch["attention_mask"][1, 7].tolist(), [0] * 8)
+
+        data_collator = DataCollatorWithPacking(tokenizer, max_length=4, mask_example_start_labels=False)
+        batch = data_collator(features)
+        self.assertEqual(batch["input_ids"].shape, torch.Size([4, 4]))
+        self.assertEqual(batch["input_ids"][0].tolist(), [5, 6, 7, 8])
+        self.assertEqual(batch["labels"][0].tolist(), [2, 2, 2, 2])
+        self.assertNotIn("segment_ids", batch)
+
+        # Sequence-level labels cannot be packed
+        with self.assertRaises(ValueError):
+            data_collator([{"input_ids": [5, 6, 7], "labels": 1}, {"input_ids": [5, 6], "labels": 0}])
+
+    def test_data_collator_with_packing_matches_unpacked_models(self):
+        from transformers import BertConfig, BertModel, GPT2Config, GPT2Model
+
+        tokenizer = BertTokenizer(self.vocab_file)
+        features = [{"input_ids": [5, 6, 7]}, {"input_ids": [8, 9, 10, 11, 12]}]
+        batch = DataCollatorWithPacking(tokenizer, max_length=8)(features)
+
+        bert_config = BertConfig(
+            vocab_size=20, hidden_size=16, num_hidden_layers=2, num_attention_heads=2, intermediate_size=32
+        )
+        gpt2_config = GPT2Config(vocab_size=20, n_embd=16, n_layer=2, n_head=2, n_positions=16)
+        for model in [BertModel(bert_config).eval(), GPT2Model(gpt2_config).eval()]:
+            with torch.no_grad():
+                packed = model(**batch).last_hidden_state
+                first = model(torch.tensor([[8, 9, 10, 11, 12]])).last_hidden_state
+                second = model(torch.tensor([[5, 6, 7]])).last_hidden_state
+            self.assertTrue(torch.allclose(packed[0, :5], first[0], atol=1e-5))
+            self.assertTrue(torch.allclose(packed[0, 5:], second[0], atol=1e-5))
+
     def test_data_collator_for_token_classification(self):
         tokenizer = BertTokenizer(self.vocab_file)
         features = [
@@ -235,6 +288,31 @@ class DataCollatorIntegrationTest(unittest.TestCase):
         self.assertEqual(batch["input_ids"].shape, torch.Size((2, 10)))
         self.assertEqual(batch["labels"].shape, torch.Size((2, 10)))
 
+    def test_whole_word_mask_selects_whole_words(self):
+        with open(self.vocab_file, "a", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("".join([x + "\n" for x in ["un", "##want", "##ed", "runn", "##ing", "the"]]))
+        tokenizer = BertTokenizer(self.vocab_file)
+        # [CLS] un ##want ##ed runn ##ing the [SEP]
+        features = [{"input_ids": [1, 5, 6, 7, 8, 9, 10, 2]}] * 200
+
+        set_seed(42)
+        data_collator = DataCollatorForWholeWordMask(tokenizer, mlm_probability=0.5)
+        mask_labels = np.array(data_collator._batch_whole_word_mask(features))
+        # Special tokens are never masked and sub-words are masked with the start of their word
+        self.assertTrue((mask_labels[:, [0, 7]] == 0).all())
+        self.assertTrue((mask_labels[:, 1:4] == mask_labels[:, 1:2]).all())
+        self.assertTrue((mask_labels[:, 4:6] == mask_labels[:, 4:5]).all())
+        # round(8 * 0.5) = 4 tokens to predict: "un ##want ##ed" and "runn ##ing" never fit together but "the" always
+        # fits after any of them
+        self.assertTrue((mask_labels[:, 1] & mask_labels[:, 4] == 0).all())
+        self.assertTrue((mask_labels[:, 6] == 1).all())
+        self.assertTrue(mask_labels[:, 1].any() and mask_labels[:, 4].any())
+
+        # Chinese references mark sub-words
+        features = [{"input_ids": [1, 10, 10, 10, 2], "chinese_ref": [2, 3]}] * 10
+        mask_labels = np.array(data_collator._batch_whole_word_mask(features))
+        self.assertTrue((mask_labels[:, 1:4] == mask_labels[:, 1:2]).all())
+
     def test_plm(self):
         tokenizer = BertTokenizer(self.vocab_file)
         no_pad_features = [{"input_ids": list(range(10))}, {"input_ids": list(range(10))}]
@@ -673,6 +751,19 @@ class NumpyDataCollatorIntegrationTest(unittest.TestCase):
         batch = data_collator(features)
         self.assertEqual(batch["input_ids"].shape, (2, 8))
 
+    def test_data_collator_with_packing(self):
+        tokenizer = BertTokenizer(self.vocab_file)
+        features = [{"input_ids": [5, 6, 7]}, {"input_ids": [5, 6, 7, 8, 9, 10]}, {"input_ids": [5, 6]}]
+
+        data_collator = DataCollatorWithPacking(tokenizer, max_length=8, position_ids_offset=2, return_tensors="np")
+        batch = data_collator(features)
+        self.assertEqual(batch["input_ids"].shape, (2, 8))
+        self.assertEqual(batch["input_ids"][1].tolist(), [5, 6, 7] + [tokenizer.pad_token_id] * 5)
+        self.assertEqual(batch["position_ids"][0].tolist(), [2, 3, 4, 5, 6, 7, 2, 3])
+        self.assertEqual(batch["attention_mask"].shape, (2, 8, 8))
+        self.assertEqual(batch["attention_mask"].dtype, np.int64)
+        self.assertNotIn("labels", batch)
+
     def test_data_collator_for_token_classification(self):
         tokenizer = BertTokenizer(self.vocab_file)
         features = [
@@ -0,0 +1,327 @@
+# Copyright 2022 The HuggingFace Team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+import warnings
+
+import numpy as np
+
+from transformers import (
+    BertTokenizer,
+    BertTokenizerFast,
+    GPT2Tokenizer,
+    GPT2TokenizerFast,
+    InputExample,
+    glue_convert_examples_to_arrays,
+    glue_convert_examples_to_features,
+    is_torch_available,
+)
+from transformers.data.processors.xnli import xnli_output_modes, xnli_processors
+from transformers.models.gpt2.tokenization_gpt2 import bytes_to_unicode
+from transformers.testing_utils import require_tokenizers, require_torch
+
+
+if is_torch_available():
+    import torch
+
+    from transformers import (
+        GlueDataset,
+        GlueDataTrainingArguments,
+        MemoryMappedTextDataset,
+        MemoryMappedTextDatasetForNextSentencePrediction,
+        TextDataset,
+        TextDatasetForNextSentencePrediction,
+    )
+    from transformers.data.datasets.language_modeling import build_memory_mapped_token_file
+
+
+SAMPLE_TEXT = """the lower newer
+lowest  newest
+
+the newer lower.
+   widest new
+
+\t
+newest lowest the
+the
+
+
+low
+"""
+
+
+@require_torch
+class MemoryMappedTextDatasetTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+
+        # Byte-level BPE vocabulary with newline tokens ("Ċ" and "ĊĊ"), the merges of whitespace depend on the text
+        # around them.
+        vocab = list(bytes_to_unicode().values())
+        merges = [
+            "Ġ l",
+            "Ġ n",
+            "Ġ t",
+            "Ċ Ċ",
+            "Ġ Ġ",
+            "l o",
+            "lo w",
+            "e r",
+            "Ġl o",
+            "Ġlo w",
+            "Ġn e",
+            "Ġne w",
+            "t h",
+            "th e",
+        ]
+        vocab += ["".join(merge.split()) for merge in merges]
+        self.gpt2_vocab_file = os.path.join(self.tmpdirname, "vocab.json")
+        self.gpt2_merges_file = os.path.join(self.tmpdirname, "merges.txt")
+        with open(self.gpt2_vocab_file, "w", encoding="utf-8") as vocab_writer:
+            json.dump({token: i for i, token in enumerate(vocab)}, vocab_writer)
+        with open(self.gpt2_merges_file, "w", encoding="utf-8") as merges_writer:
+            merges_writer.write("#version: 0.2\n" + "\n".join(merges))
+
+        bert_vocab = ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]", "the", "low", "##er", "##est", "new", ".", "wide"]
+        self.bert_vocab_file = os.path.join(self.tmpdirname, "vocab.txt")
+        with open(self.bert_vocab_file, "w", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("".join([x + "\n" for x in bert_vocab]))
+
+        self.text_file = os.path.join(self.tmpdirname, "text.txt")
+        with open(self.text_file, "w", encoding="utf-8") as text_writer:
+            text_writer.write(SAMPLE_TEXT * 5)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def get_tokenizers(self):
+        return [
+            GPT2Tokenizer(self.gpt2_vocab_file, self.gpt2_merges_file),
+            GPT2TokenizerFast(self.gpt2_vocab_file, self.gpt2_merges_file),
+            BertTokenizer(self.bert_vocab_file),
+        ]
+
+    @require_tokenizers
+    def test_token_file_same_as_whole_text(self):
+        with open(self.text_file, encoding="utf-8") as f:
+            text = f.read()
+        for tokenizer in self.get_tokenizers():
+            expected = tokenizer.convert_tokens_to_ids(tokenizer.tokenize(text))
+            for num_proc in [1, 2]:
+                prefix = os.path.join(self.tmpdirname, f"tokens_{tokenizer.__class__.__name__}_{num_proc}")
+                build_memory_mapped_token_file(tokenizer, self.text_file, prefix, num_proc=num_proc, chunk_size=1)
+                tokens = np.memmap(prefix + ".bin", dtype=np.uint16, mode="r")
+                self.assertEqual(tokens.tolist(), expected)
+
+    @require_tokenizers
+    def test_same_blocks_as_text_dataset(self):
+        for tokenizer in self.get_tokenizers():
+            for block_size in [4, 7]:
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    dataset = MemoryMappedTextDataset(tokenizer, self.text_file, block_size, cache_dir=cache_dir)
+                    expected_dataset = TextDataset(tokenizer, self.text_file, block_size, cache_dir=cache_dir)
+                    self.assertEqual(len(dataset), len(expected_dataset))
+                    for i in range(len(dataset)):
+                        self.assertEqual(dataset[i].tolist(), expected_dataset[i].tolist())
+
+                    # The memory-mapped array is opened again when unpickled
+                    unpickled_dataset = pickle.loads(pickle.dumps(dataset))
+                    self.assertEqual(unpickled_dataset[-1].tolist(), expected_dataset[-1].tolist())
+
+    def test_empty_file(self):
+        empty_file = os.path.join(self.tmpdirname, "empty.txt")
+        open(empty_file, "w").close()
+        tokenizer = BertTokenizer(self.bert_vocab_file)
+        self.assertEqual(len(TextDataset(tokenizer, empty_file, 8)), 0)
+        self.assertEqual(len(MemoryMappedTextDataset(tokenizer, empty_file, 8)), 0)
+        self.assertEqual(len(MemoryMappedTextDatasetForNextSentencePrediction(tokenizer, empty_file, 8)), 0)
+
+    @require_tokenizers
+    def test_line_by_line_token_file(self):
+        tokenizer = BertTokenizer(self.bert_vocab_file)
+        prefix = os.path.join(self.tmpdirname, "tokens")
+        build_memory_mapped_token_file(tokenizer, self.text_file, prefix, line_by_line=True)
+        tokens = np.memmap(prefix + ".bin", dtype=np.uint16, mode="r")
+        index = np.load(prefix + ".idx.npz")
+        line_offsets, document_offsets = index["line_offsets"], index["document_offsets"]
+
+        # Same documents and lines as `TextDatasetForNextSentencePrediction`
+        dataset = TextDatasetForNextSentencePrediction(tokenizer, self.text_file, 8, overwrite_cache=True)
+        self.assertEqual(len(document_offsets) - 1, len(dataset.documents))
+        for document, first_line, end_line in zip(dataset.documents, document_offsets[:-1], document_offsets[1:]):
+            lines = [tokens[line_offsets[i] : line_offsets[i + 1]].tolist() for i in range(first_line, end_line)]
+            self.assertEqual(lines, document)
+
+        # Chunks can be cut at any line
+        for num_proc in [1, 2]:
+            chunked_prefix = os.path.join(self.tmpdirname, f"chunked_tokens_{num_proc}")
+            build_memory_mapped_token_file(
+                tokenizer, self.text_file, chunked_prefix, num_proc=num_proc, chunk_size=1, line_by_line=True
+            )
+            chunked_index = np.load(chunked_prefix + ".idx.npz")
+            self.assertEqual(chunked_index["line_offsets"].tolist(), line_offsets.tolist())
+            self.assertEqual(chunked_index["document_offsets"].tolist(), document_offsets.tolist())
+
+    @require_tokenizers
+    def test_same_examples_as_text_dataset_for_next_sentence_prediction(self):
+        for tokenizer in [
+            BertTokenizer(self.bert_vocab_file),
+            GPT2TokenizerFast(self.gpt2_vocab_file, self.gpt2_merges_file),
+        ]:
+            for block_size, seed in [(8, 0), (12, 1), (32, 2)]:
+                kwargs = {"short_seq_probability": 0.5, "overwrite_cache": True}
+                random.seed(seed)
+                expected_dataset = TextDatasetForNextSentencePrediction(
+                    tokenizer, self.text_file, block_size, **kwargs
+                )
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    random.seed(seed)
+                    dataset = MemoryMappedTextDatasetForNextSentencePrediction(
+                        tokenizer, self.text_file, block_size, cache_dir=cache_dir, **kwargs
+                    )
+                    self.assertEqual(len(dataset), len(expected_dataset))
+                    for i in range(len(dataset)):
+                        for key, value in expected_dataset[i].items():
+                            self.assertEqual(dataset[i][key].tolist(), value.tolist())
+
+                    # The examples are cached
+                    cached_dataset = MemoryMappedTextDatasetForNextSentencePrediction(
+                        tokenizer, self.text_file, block_size, cache_dir=cache_dir
+                    )
+                    self.assertEqual(cached_dataset.examples.tolist(), dataset.examples.tolist())
+                    unpickled_dataset = pickle.loads(pickle.dumps(dataset))
+                    self.assertEqual(unpickled_dataset[-1]["input_ids"].tolist(), dataset[-1]["input_ids"].tolist())
+
+    def test_cache(self):
+        tokenizer = BertTokenizer(self.bert_vocab_file)
+        dataset = MemoryMappedTextDataset(tokenizer, self.text_file, 8)
+        cached_file = dataset.cached_prefix + ".bin"
+        cached_time = os.path.getmtime(cached_file)
+
+        # The cache does not depend on the block size
+        dataset = MemoryMappedTextDataset(tokenizer, self.text_file, 16)
+        self.assertEqual(dataset.cached_prefix + ".bin", cached_file)
+        self.assertEqual(os.path.getmtime(cached_file), cached_time)
+
+        # A cache built with another vocabulary is not reused
+        tokenizer.add_tokens(["lowest"])
+        dataset = MemoryMappedTextDataset(tokenizer, self.text_file, 8)
+        self.assertIn(len(tokenizer) - 1, torch.cat([dataset[i] for i in range(len(dataset))]).tolist())
+
+
+GLUE_VOCAB = ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]", "the", "low", "##er", "##est", "new", ".", "wide", "a"]
+
+MRPC_LINES = [
+    ["Quality", "#1 ID", "#2 ID", "#1 String", "#2 String"],
+    ["1", "1", "2", "the lower newer.", "a new low"],
+    ["0", "3", "4", "widest", "the newest lowest lower newer wide ."],
+    ["1", "5", "6", "new new new new new new new new new new new new new new", "low"],
+    ["0", "7", "8", "a", "a wide new lower"],
+    ["1", "9", "10", "lowest", "the the the"],
+]
+
+
+class GlueConversionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+        self.vocab_file = os.path.join(self.tmpdirname, "vocab.txt")
+        with open(self.vocab_file, "w", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("".join([x + "\n" for x in GLUE_VOCAB]))
+
+        self.data_dir = os.path.join(self.tmpdirname, "mrpc")
+        os.makedirs(self.data_dir)
+        for split in ["train", "dev"]:
+            with open(os.path.join(self.data_dir, f"{split}.tsv"), "w", encoding="utf-8") as data_writer:
+                data_writer.write("".join("\t".join(line) + "\n" for line in MRPC_LINES))
+
+        self.examples = [
+            InputExample(guid=str(i), text_a=line[3], text_b=line[4], label=line[0])
+            for i, line in enumerate(MRPC_LINES[1:])
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def get_tokenizers(self):
+        return [BertTokenizer(self.vocab_file), BertTokenizerFast(self.vocab_file)]
+
+    def check_arrays_same_as_features(self, arrays, features):
+        self.assertEqual(set(arrays), {"input_ids", "token_type_ids", "attention_mask", "label"})
+        for name, array in arrays.items():
+            self.assertEqual(array.tolist(), [getattr(feature, name) for feature in features])
+
+    @require_tokenizers
+    def test_arrays_same_as_features(self):
+        for tokenizer in self.get_tokenizers():
+            for task in ["mrpc", "sts-b"]:
+                features = glue_convert_examples_to_features(self.examples, tokenizer, max_length=8, task=task)
+                for num_proc in [1, 2]:
+                    arrays = glue_convert_examples_to_arrays(
+                        self.examples, tokenizer, max_length=8, task=task, batch_size=2, num_proc=num_proc
+                    )
+                    self.assertEqual(arrays["input_ids"].dtype, np.int32)
+                    self.assertEqual(arrays["label"].dtype, np.int64 if task == "mrpc" else np.float32)
+                    self.check_arrays_same_as_features(arrays, features)
+
+    def test_arrays_not_deprecated(self):
+        tokenizer = BertTokenizer(self.vocab_file)
+        with warnings.catch_warnings(record=True) as caught_warnings:
+            warnings.simplefilter("always")
+            glue_convert_examples_to_arrays(self.examples, tokenizer, max_length=8, task="mrpc")
+        self.assertEqual([w for w in caught_warnings if issubclass(w.category, FutureWarning)], [])
+
+    @require_tokenizers
+    def test_xnli_arrays_same_as_features(self):
+        label_list = xnli_processors["xnli"](language="en").get_labels()
+        examples = [
+            InputExample(guid=example.guid, text_a=example.text_a, text_b=example.text_b, label=label_list[i % 3])
+            for i, example in enumerate(self.examples)
+        ]
+        for tokenizer in self.get_tokenizers():
+            kwargs = {"max_length": 8, "label_list": label_list, "output_mode": xnli_output_modes["xnli"]}
+            features = glue_convert_examples_to_features(examples, tokenizer, **kwargs)
+            arrays = glue_convert_examples_to_arrays(examples, tokenizer, batch_size=2, num_proc=2, **kwargs)
+            self.check_arrays_same_as_features(arrays, features)
+
+    @require_torch
+    @require_tokenizers
+    def test_columnar_cache(self):
+        for tokenizer in self.get_tokenizers():
+            args = GlueDataTrainingArguments(task_name="mrpc", data_dir=self.data_dir, max_seq_length=8)
+            expected_features = list(GlueDataset(args, tokenizer))
+
+            columnar_args = GlueDataTrainingArguments(
+                task_name="mrpc",
+                data_dir=self.data_dir,
+                max_seq_length=8,
+                columnar_cache=True,
+                preprocessing_num_workers=2,
+            )
+            dataset = GlueDataset(columnar_args, tokenizer)
+            self.assertEqual(list(dataset), expected_features)
+
+            # The cache is reused
+            with unittest.mock.patch(
+                "transformers.data.datasets.glue.glue_convert_examples_to_arrays"
+            ) as convert_examples:
+                cached_dataset = GlueDataset(columnar_args, tokenizer)
+                convert_examples.assert_not_called()
+            self.assertEqual(list(cached_dataset), expected_features)
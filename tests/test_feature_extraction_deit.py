@@ -102,6 +102,24 @@ class DeiTFeatureExtractionTest(FeatureExtractionSavingTestMixin, unittest.TestC
     def test_batch_feature(self):
         pass
 
+    def test_resize_and_crop(self):
+        # Initialize feature_extractor
+        feature_extractor = self.feature_extraction_class(**self.feat_extract_dict)
+        self.assertTrue(feature_extractor.supports_batched_normalization)
+        # create random PIL images
+        image_inputs = prepare_image_inputs(self.feature_extract_tester, equal_resolution=False)
+
+        # Same pixel values as the feature extractor once normalized
+        for image in image_inputs:
+            expected_pixel_values = feature_extractor(image, return_tensors="pt").pixel_values
+            image = feature_extractor.resize_and_crop(image)
+            self.assertIsInstance(image, Image.Image)
+            pixel_values = feature_extractor.normalize_batch(
+                torch.from_numpy(np.array(image))[None], feature_extractor.image_mean, feature_extractor.image_std
+            )
+            self.assertEqual(pixel_values.shape, expected_pixel_values.shape)
+            self.assertTrue(torch.allclose(pixel_values, expected_pixel_values, atol=1e-5))
+
     def test_call_pil(self):
         # Initialize feature_extractor
         feature_extractor = self.feature_extraction_class(**self.feat_extract_dict)
@@ -0,0 +1,262 @@
+# Copyright 2022 The HuggingFace Team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from parameterized import parameterized
+from transformers import BartConfig, BertConfig, GPT2Config, T5Config, is_torch_available
+from transformers.testing_utils import require_torch, require_torch_gpu, torch_device
+
+
+if is_torch_available():
+    import torch
+
+    from transformers import (
+        BartForConditionalGeneration,
+        BertForMaskedLM,
+        GPT2LMHeadModel,
+        GradientCheckpointingPolicy,
+        T5ForConditionalGeneration,
+    )
+    from transformers.gradient_checkpointing_utils import (
+        _find_attention_modules,
+        get_checkpointable_layers,
+        get_layers_activation_memory,
+    )
+
+
+def get_model_and_inputs(model_type):
+    torch.manual_seed(0)
+    if model_type == "bert":
+        config = BertConfig(
+            vocab_size=99, hidden_size=32, num_hidden_layers=4, num_attention_heads=4, intermediate_size=37
+        )
+        model = BertForMaskedLM(config)
+    elif model_type == "gpt2":
+        model = GPT2LMHeadModel(GPT2Config(vocab_size=99, n_embd=32, n_layer=4, n_head=4))
+    elif model_type == "t5":
+        config = T5Config(
+            vocab_size=99, d_model=32, d_ff=37, d_kv=8, num_layers=2, num_heads=4, decoder_start_token_id=0
+        )
+        model = T5ForConditionalGeneration(config)
+    else:
+        config = BartConfig(
+            vocab_size=99,
+            d_model=32,
+            encoder_layers=2,
+            decoder_layers=2,
+            encoder_attention_heads=4,
+            decoder_attention_heads=4,
+            encoder_ffn_dim=37,
+            decoder_ffn_dim=37,
+        )
+        model = BartForConditionalGeneration(config)
+
+    input_ids = torch.randint(3, 99, (2, 12))
+    if model_type in ["bert", "gpt2"]:
+        inputs = {"input_ids": input_ids, "labels": input_ids}
+    else:
+        inputs = {"input_ids": input_ids, "labels": torch.randint(3, 99, (2, 7))}
+    return model.to(torch_device), {name: tensor.to(torch_device) for name, tensor in inputs.items()}
+
+
+def get_loss_and_gradients(model, inputs):
+    model.train()
+    model.zero_grad()
+    # Same dropout masks for all the runs
+    torch.manual_seed(42)
+    loss = model(**inputs).loss
+    loss.backward()
+    return loss.item(), {name: p.grad.clone() for name, p in model.named_parameters() if p.grad is not None}
+
+
+def replicate_on_same_device(model):
+    """
+    Replicates `model` like `nn.DataParallel` does, with copies of its parameters on the same device.
+    """
+    replicas = {module: module._replicate_for_data_parallel() for module in model.modules()}
+    for module, replica in replicas.items():
+        for name, child in module._modules.items():
+            replica._modules[name] = replicas[child] if child is not None else None
+        for name, param in module._parameters.items():
+            if param is not None:
+                setattr(replica, name, param.detach().clone().requires_grad_())
+    return replicas[model]
+
+
+def get_saved_activations_size(model, inputs):
+    parameters = {p.data_ptr() for p in model.parameters()}
+    saved = {}
+
+    def pack(tensor):
+        if tensor.data_ptr() not in parameters:
+            saved[tensor.data_ptr()] = tensor.numel() * tensor.element_size()
+        return tensor
+
+    model.train()
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        model(**inputs)
+    return sum(saved.values())
+
+
+@require_torch
+class GradientCheckpointingPolicyTest(unittest.TestCase):
+    def test_checkpointable_layers(self):
+        expected_layers = {
+            "bert": [f"bert.encoder.layer.{i}" for i in range(4)],
+            "gpt2": [f"transformer.h.{i}" for i in range(4)],
+            "t5": ["encoder.block.0", "encoder.block.1", "decoder.block.0", "decoder.block.1"],
+            "bart": [f"model.{stack}.layers.{i}" for stack in ["encoder", "decoder"] for i in range(2)],
+        }
+        for model_type, layers in expected_layers.items():
+            model, _ = get_model_and_inputs(model_type)
+            self.assertEqual(list(get_checkpointable_layers(model)), layers)
+
+    @parameterized.expand([("bert",), ("gpt2",), ("t5",), ("bart",)])
+    def test_policies_give_same_gradients(self, model_type):
+        model, inputs = get_model_and_inputs(model_type)
+        expected_loss, expected_gradients = get_loss_and_gradients(model, inputs)
+
+        policies = [
+            GradientCheckpointingPolicy(),
+            GradientCheckpointingPolicy(every_k_layers=2),
+            GradientCheckpointingPolicy(submodules="attention"),
+            GradientCheckpointingPolicy(layers=list(get_checkpointable_layers(model))[-1:]),
+            GradientCheckpointingPolicy(every_k_layers=2, offload_to_cpu=True),
+        ]
+        for policy in policies:
+            model.gradient_checkpointing_enable(policy)
+            self.assertTrue(model.is_gradient_checkpointing)
+            loss, gradients = get_loss_and_gradients(model, inputs)
+            self.assertEqual(loss, expected_loss)
+            self.assertEqual(gradients.keys(), expected_gradients.keys())
+            for name, gradient in gradients.items():
+                self.assertTrue(torch.allclose(gradient, expected_gradients[name], atol=1e-6), f"{policy} {name}")
+
+        model.gradient_checkpointing_disable()
+        self.assertFalse(model.is_gradient_checkpointing)
+        self.assertFalse(any("forward" in module.__dict__ for module in model.modules()))
+
+    def test_policies_save_memory(self):
+        model, inputs = get_model_and_inputs("bert")
+        memory = get_saved_activations_size(model, inputs)
+
+        model.gradient_checkpointing_enable(GradientCheckpointingPolicy())
+        all_layers_memory = get_saved_activations_size(model, inputs)
+        model.gradient_checkpointing_enable(GradientCheckpointingPolicy(every_k_layers=2))
+        half_layers_memory = get_saved_activations_size(model, inputs)
+        model.gradient_checkpointing_enable(GradientCheckpointingPolicy(submodules="attention"))
+        attention_memory = get_saved_activations_size(model, inputs)
+
+        self.assertLess(all_layers_memory, half_layers_memory)
+        self.assertLess(half_layers_memory, memory)
+        self.assertLess(all_layers_memory, attention_memory)
+        self.assertLess(attention_memory, memory)
+
+        # Same as the default gradient checkpointing
+        model.gradient_checkpointing_enable()
+        self.assertEqual(get_saved_activations_size(model, inputs), all_layers_memory)
+
+    def test_from_memory_budget(self):
+        model, inputs = get_model_and_inputs("t5")
+        memory = get_layers_activation_memory(model, inputs)
+        self.assertEqual(list(memory), list(get_checkpointable_layers(model)))
+        self.assertTrue(all(layer_memory > 0 for layer_memory in memory.values()))
+
+        policy = GradientCheckpointingPolicy.from_memory_budget(model, inputs, max_memory=sum(memory.values()))
+        self.assertEqual(policy.layers, [])
+        policy = GradientCheckpointingPolicy.from_memory_budget(model, inputs, max_memory=0)
+        self.assertEqual(sorted(policy.layers), sorted(memory))
+
+        max_memory = sum(memory.values()) // 2
+        policy = GradientCheckpointingPolicy.from_memory_budget(
+            model, inputs, max_memory=max_memory, submodules="attention"
+        )
+        self.assertEqual(policy.submodules, "attention")
+        self.assertLessEqual(sum(memory[name] for name in memory if name not in policy.layers), max_memory)
+        # The layers saving the most activations are checkpointed first
+        self.assertGreaterEqual(
+            min(memory[name] for name in policy.layers),
+            max(memory[name] for name in memory if name not in policy.layers),
+        )
+
+    @parameterized.expand([("gpt2",), ("t5",), ("bart",)])
+    def test_policies_disable_cache(self, model_type):
+        model, inputs = get_model_and_inputs(model_type)
+        model.train()
+        self.assertIsNotNone(model(**inputs).past_key_values)
+
+        model.gradient_checkpointing_enable(GradientCheckpointingPolicy(every_k_layers=2))
+        self.assertIsNone(model(**inputs).past_key_values)
+        # Offloading alone does not recompute anything
+        model.gradient_checkpointing_enable(GradientCheckpointingPolicy(layers=[], offload_to_cpu=True))
+        self.assertIsNotNone(model(**inputs).past_key_values)
+        model.gradient_checkpointing_disable()
+        self.assertFalse(any("forward" in module.__dict__ for module in model.modules()))
+
+    def test_policies_with_replicas(self):
+        model, inputs = get_model_and_inputs("bert")
+        expected_loss, _ = get_loss_and_gradients(model, inputs)
+
+        policies = [
+            GradientCheckpointingPolicy(),
+            GradientCheckpointingPolicy(submodules="attention"),
+            GradientCheckpointingPolicy(every_k_layers=2, offload_to_cpu=True),
+        ]
+        for policy in policies:
+            model.gradient_checkpointing_enable(policy)
+            model.zero_grad()
+            replica = replicate_on_same_device(model)
+            torch.manual_seed(42)
+            loss = replica(**inputs).loss
+            loss.backward()
+            self.assertEqual(loss.item(), expected_loss)
+            # The replicas of the layers run with their own parameters
+            self.assertTrue(all(p.grad is None for p in model.parameters()), str(policy))
+
+        model.gradient_checkpointing_disable()
+        self.assertFalse(any(module._forward_pre_hooks for module in model.modules()))
+
+    def test_attention_submodules(self):
+        model, _ = get_model_and_inputs("t5")
+        layer = get_checkpointable_layers(model)["decoder.block.0"]
+        self.assertEqual(
+            [module.__class__.__name__ for module in _find_attention_modules(layer)],
+            ["T5LayerSelfAttention", "T5LayerCrossAttention"],
+        )
+
+    def test_invalid_policies(self):
+        with self.assertRaises(ValueError):
+            GradientCheckpointingPolicy(every_k_layers=0)
+        with self.assertRaises(ValueError):
+            GradientCheckpointingPolicy(submodules="mlp")
+        model, _ = get_model_and_inputs("bert")
+        with self.assertRaises(ValueError):
+            model.gradient_checkpointing_enable(GradientCheckpointingPolicy(layers=["bert.encoder.layer.4"]))
+
+    @require_torch_gpu
+    def test_offload_to_cpu(self):
+        model, inputs = get_model_and_inputs("gpt2")
+        expected_loss, expected_gradients = get_loss_and_gradients(model, inputs)
+
+        for policy in [
+            GradientCheckpointingPolicy(offload_to_cpu=True),
+            GradientCheckpointingPolicy(every_k_layers=4, offload_to_cpu=True),
+        ]:
+            model.gradient_checkpointing_enable(policy)
+            for _ in range(2):
+                loss, gradients = get_loss_and_gradients(model, inputs)
+                self.assertAlmostEqual(loss, expected_loss, places=5)
+                for name, gradient in gradients.items():
+                    self.assertTrue(torch.allclose(gradient, expected_gradients[name], atol=1e-5))
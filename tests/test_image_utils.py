@@ -318,6 +318,38 @@ class ImageFeatureExtractionTester(unittest.TestCase):
         normalized_tensor = feature_extractor.normalize(tensor, torch.tensor(mean), torch.tensor(std))
         self.assertTrue(torch.equal(normalized_tensor, expected))
 
+    def test_normalize_batch_array(self):
+        feature_extractor = ImageFeatureExtractionMixin()
+        # No `resize_and_crop` method to prepare images
+        feature_extractor.do_normalize = True
+        self.assertFalse(feature_extractor.supports_batched_normalization)
+
+        images = [get_random_image(16, 32) for _ in range(3)]
+        mean = [0.1, 0.5, 0.9]
+        std = [0.2, 0.4, 0.6]
+
+        # Same values as normalizing each image, with the channel dimension first.
+        batch = np.stack([np.array(image) for image in images])
+        normalized_batch = feature_extractor.normalize_batch(batch, mean, std)
+        expected = np.stack([feature_extractor.normalize(image, mean, std) for image in images])
+        self.assertEqual(normalized_batch.dtype, np.float32)
+        self.assertEqual(normalized_batch.shape, (3, 3, 16, 32))
+        self.assertTrue(np.array_equal(normalized_batch, expected))
+
+    @require_torch
+    def test_normalize_batch_tensor(self):
+        feature_extractor = ImageFeatureExtractionMixin()
+        images = [get_random_image(16, 32) for _ in range(3)]
+        mean = [0.1, 0.5, 0.9]
+        std = [0.2, 0.4, 0.6]
+
+        batch = torch.stack([torch.from_numpy(np.array(image)) for image in images])
+        normalized_batch = feature_extractor.normalize_batch(batch, mean, std)
+        expected = torch.stack([torch.from_numpy(feature_extractor.normalize(image, mean, std)) for image in images])
+        self.assertEqual(normalized_batch.dtype, torch.float32)
+        self.assertTrue(normalized_batch.is_contiguous())
+        self.assertTrue(torch.equal(normalized_batch, expected))
+
     def test_center_crop_image(self):
         feature_extractor = ImageFeatureExtractionMixin()
         image = get_random_image(16, 32)
@@ -29,6 +29,7 @@ if is_torch_available():
     from transformers import (
         Adafactor,
         AdamW,
+        AdamW8bit,
         get_constant_schedule,
         get_constant_schedule_with_warmup,
         get_cosine_schedule_with_warmup,
@@ -36,6 +37,7 @@ if is_torch_available():
         get_linear_schedule_with_warmup,
         get_polynomial_decay_schedule_with_warmup,
     )
+    from transformers.optimization import _create_dynamic_map, _dequantize_blockwise, _quantize_blockwise
 
 
 def unwrap_schedule(scheduler, num_steps=10):
@@ -107,6 +109,124 @@ class OptimizationTest(unittest.TestCase):
             w.grad.zero_()
         self.assertListAlmostEqual(w.tolist(), [0.4, 0.2, -0.5], tol=1e-2)
 
+    def test_quantize_blockwise(self):
+        torch.manual_seed(0)
+        # Blocks of different scales, with a last block that is not full
+        tensor = torch.randn(10, 100) * torch.logspace(-3, 0, 10).unsqueeze(1)
+        for signed in (True, False):
+            values = tensor if signed else tensor**2
+            code, boundaries = _create_dynamic_map(signed)
+            self.assertEqual(len(code), 256)
+            quantized, absmax = _quantize_blockwise(values, code, boundaries, block_size=64)
+            self.assertEqual(quantized.dtype, torch.uint8)
+            self.assertEqual(quantized.numel(), 16 * 64)
+            self.assertEqual(absmax.numel(), 16)
+
+            dequantized = _dequantize_blockwise(quantized, absmax, code, values.shape)
+            self.assertEqual(dequantized.shape, values.shape)
+            # The largest value of each block is (almost) exact, the others are close relatively to the block
+            block_max = absmax.repeat_interleave(64)[: values.numel()].view_as(values)
+            self.assertTrue(torch.all((dequantized - values).abs() <= 0.1 * block_max))
+            self.assertTrue(torch.allclose(dequantized.abs().max(), values.abs().max(), rtol=1e-2))
+            if not signed:
+                self.assertTrue(torch.all(dequantized[values > 0] > 0))
+
+    def test_adam_w_8bit(self):
+        torch.manual_seed(0)
+        w = torch.randn(64, 64, requires_grad=True)
+        target = torch.randn(64, 64)
+        criterion = nn.MSELoss()
+        optimizer = AdamW8bit(params=[w], lr=2e-1, block_size=256, min_8bit_size=1024)
+        for _ in range(100):
+            loss = criterion(w, target)
+            loss.backward()
+            optimizer.step()
+            w.grad.detach_()
+            w.grad.zero_()
+        self.assertEqual(optimizer.state[w]["exp_avg"].dtype, torch.uint8)
+        self.assertEqual(optimizer.state[w]["exp_avg_sq"].dtype, torch.uint8)
+        self.assertTrue(torch.allclose(w, target, atol=5e-2))
+
+    def test_adam_w_8bit_small_params(self):
+        # Below `min_8bit_size`, the states are the ones of AdamW
+        torch.manual_seed(0)
+        model = nn.Linear(8, 8)
+        model_8bit = nn.Linear(8, 8)
+        model_8bit.load_state_dict(model.state_dict())
+        optimizer = AdamW(model.parameters(), lr=1e-2, weight_decay=0.1)
+        optimizer_8bit = AdamW8bit(model_8bit.parameters(), lr=1e-2, weight_decay=0.1)
+        for _ in range(5):
+            inputs = torch.randn(4, 8)
+            for m, opt in ((model, optimizer), (model_8bit, optimizer_8bit)):
+                m(inputs).pow(2).sum().backward()
+                opt.step()
+                opt.zero_grad()
+        for p, p_8bit in zip(model.parameters(), model_8bit.parameters()):
+            self.assertTrue(torch.equal(p, p_8bit))
+
+    def test_adam_w_8bit_save_and_load(self):
+        torch.manual_seed(0)
+        model = nn.Sequential(nn.Linear(32, 64), nn.Linear(64, 1))
+        optimizer = AdamW8bit(model.parameters(), lr=1e-2, block_size=256, min_8bit_size=1024)
+
+        def train(model, optimizer, num_steps):
+            torch.manual_seed(1)
+            for _ in range(num_steps):
+                model(torch.randn(4, 32)).pow(2).sum().backward()
+                optimizer.step()
+                optimizer.zero_grad()
+
+        train(model, optimizer, 3)
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            file_name = os.path.join(tmpdirname, "optimizer.pt")
+            torch.save(optimizer.state_dict(), file_name)
+            resumed_model = nn.Sequential(nn.Linear(32, 64), nn.Linear(64, 1))
+            resumed_model.load_state_dict(model.state_dict())
+            # The block size is the one of the saved states
+            resumed_optimizer = AdamW8bit(resumed_model.parameters(), lr=1e-2, block_size=64, min_8bit_size=1024)
+            resumed_optimizer.load_state_dict(torch.load(file_name))
+
+        train(model, optimizer, 2)
+        train(resumed_model, resumed_optimizer, 2)
+        for p, resumed_p in zip(model.parameters(), resumed_model.parameters()):
+            self.assertTrue(torch.equal(p, resumed_p))
+
+    def check_foreach_same_as_loop(self, optimizer_cls, **kwargs):
+        torch.manual_seed(0)
+        model = nn.Sequential(nn.Embedding(16, 8), nn.Linear(8, 8), nn.LayerNorm(8), nn.Linear(8, 2))
+        foreach_model = nn.Sequential(nn.Embedding(16, 8), nn.Linear(8, 8), nn.LayerNorm(8), nn.Linear(8, 2))
+        foreach_model.load_state_dict(model.state_dict())
+
+        optimizer = optimizer_cls(model.parameters(), **kwargs)
+        foreach_optimizer = optimizer_cls(foreach_model.parameters(), foreach=True, **kwargs)
+        for step in range(5):
+            inputs = torch.randint(16, (4,))
+            for m, opt in ((model, optimizer), (foreach_model, foreach_optimizer)):
+                m(inputs).pow(2).sum().backward()
+                if step == 1:
+                    # Parameters without gradients are skipped and end up a step behind the others
+                    m[3].weight.grad = None
+                opt.step()
+                opt.zero_grad()
+
+        for p, foreach_p in zip(model.parameters(), foreach_model.parameters()):
+            self.assertTrue(torch.equal(p, foreach_p))
+        for p, foreach_p in zip(model.parameters(), foreach_model.parameters()):
+            state, foreach_state = optimizer.state[p], foreach_optimizer.state[foreach_p]
+            self.assertEqual(state.keys(), foreach_state.keys())
+            for key in state:
+                self.assertTrue(torch.equal(torch.as_tensor(state[key]), torch.as_tensor(foreach_state[key])))
+
+    def test_adam_w_foreach(self):
+        self.check_foreach_same_as_loop(AdamW, lr=1e-2, weight_decay=0.1)
+        self.check_foreach_same_as_loop(AdamW, lr=1e-2, correct_bias=False)
+
+    def test_adafactor_foreach(self):
+        self.check_foreach_same_as_loop(
+            Adafactor, lr=1e-2, weight_decay=0.1, scale_parameter=False, relative_step=False
+        )
+        self.check_foreach_same_as_loop(Adafactor, beta1=0.9, weight_decay=0.1)
+
 
 @require_torch
 class ScheduleInitTest(unittest.TestCase):
@@ -27,7 +27,7 @@ from transformers import (
     Wav2Vec2ForCTC,
 )
 from transformers.pipelines import AutomaticSpeechRecognitionPipeline, pipeline
-from transformers.pipelines.automatic_speech_recognition import apply_stride, chunk_iter
+from transformers.pipelines.automatic_speech_recognition import apply_stride, chunk_iter, chunk_stream_iter
 from transformers.testing_utils import (
     is_pipeline_test,
     is_torch_available,
@@ -295,6 +295,28 @@ class AutomaticSpeechRecognitionPipelineTests(unittest.TestCase, metaclass=Pipel
         self.assertEqual(output, [{"text": ANY(str)}])
         self.assertEqual(output[0]["text"][:6], "ZBT ZC")
 
+    @require_torch
+    def test_chunking_fast_stream(self):
+        speech_recognizer = pipeline(
+            task="automatic-speech-recognition",
+            model="hf-internal-testing/tiny-random-wav2vec2",
+            chunk_length_s=10.0,
+        )
+
+        ds = load_dataset("hf-internal-testing/librispeech_asr_dummy", "clean", split="validation").sort("id")
+        audio = ds[40]["audio"]["array"]
+
+        n_repeats = 2
+        audio_tiled = np.tile(audio, n_repeats)
+        expected = speech_recognizer(audio_tiled)
+
+        # Feed the audio in pieces that don't line up with the chunks
+        pieces = np.array_split(audio_tiled, 7)
+        outputs = list(speech_recognizer.stream(iter(pieces)))
+        self.assertEqual(outputs, [{"text": ANY(str)}] * len(outputs))
+        self.assertGreater(len(outputs), 1)
+        self.assertEqual(outputs[-1], expected)
+
     @require_torch
     @require_pyctcdecode
     def test_chunking_fast_with_lm(self):
@@ -455,6 +477,22 @@ class AutomaticSpeechRecognitionPipelineTests(unittest.TestCase, metaclass=Pipel
         # (85, 100)
         self.assertEqual(nested_simplify(input_values[:, 80:100]), nested_simplify(outs[4]["input_values"]))
 
+    @require_torch
+    def test_chunk_stream_iterator(self):
+        feature_extractor = AutoFeatureExtractor.from_pretrained("facebook/wav2vec2-base-960h")
+        inputs = torch.arange(100).long()
+
+        for chunk_len, stride_left, stride_right in [(100, 0, 0), (50, 0, 0), (80, 0, 0), (80, 20, 10), (30, 5, 5)]:
+            expected = list(chunk_iter(inputs, feature_extractor, chunk_len, stride_left, stride_right))
+            for pieces in [[inputs], torch.split(inputs, 7), torch.split(inputs, [1, 49, 0, 50])]:
+                outs = list(chunk_stream_iter(pieces, feature_extractor, chunk_len, stride_left, stride_right))
+                self.assertEqual([o["stride"] for o in outs], [o["stride"] for o in expected])
+                self.assertEqual([o["is_last"] for o in outs], [o["is_last"] for o in expected])
+                self.assertEqual(
+                    nested_simplify([o["input_values"] for o in outs]),
+                    nested_simplify([o["input_values"] for o in expected]),
+                )
+
 
 @require_torch
 class ApplyStrideTest(unittest.TestCase):
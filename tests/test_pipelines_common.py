@@ -15,8 +15,10 @@
 import copy
 import importlib
 import logging
+import os
 import random
 import string
+import tempfile
 import unittest
 from abc import abstractmethod
 from functools import lru_cache
@@ -27,15 +29,20 @@ from transformers import (
     TOKENIZER_MAPPING,
     AutoFeatureExtractor,
     AutoTokenizer,
+    DistilBertConfig,
+    DistilBertForQuestionAnswering,
     DistilBertForSequenceClassification,
+    DistilBertTokenizerFast,
+    DynamicBatchingExecutor,
     IBertConfig,
+    QuestionAnsweringPipeline,
     RobertaConfig,
     TextClassificationPipeline,
     pipeline,
 )
 from transformers.pipelines import get_task
-from transformers.pipelines.base import _pad
-from transformers.testing_utils import is_pipeline_test, nested_simplify, require_tf, require_torch
+from transformers.pipelines.base import ChunkPipeline, _pad
+from transformers.testing_utils import CaptureLogger, is_pipeline_test, nested_simplify, require_tf, require_torch
 
 
 logger = logging.getLogger(__name__)
@@ -375,6 +382,154 @@ class CommonPipelineTest(unittest.TestCase):
         outputs = text_classifier(["This is great !"] * 20, batch_size=32)
         self.assertEqual(len(outputs), 20)
 
+    def get_tiny_text_classification_pipeline(
+        self,
+        tmpdirname,
+        pipeline_class=TextClassificationPipeline,
+        model_class=DistilBertForSequenceClassification,
+        **tokenizer_kwargs,
+    ):
+        vocab = [
+            "[UNK]",
+            "[CLS]",
+            "[SEP]",
+            "[PAD]",
+            "[MASK]",
+            "this",
+            "is",
+            "a",
+            "test",
+            "another",
+            "longer",
+            ",",
+            ".",
+        ]
+        vocab_file = os.path.join(tmpdirname, "vocab.txt")
+        with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("".join([x + "\n" for x in vocab]))
+        tokenizer = DistilBertTokenizerFast(vocab_file, **tokenizer_kwargs)
+        config = DistilBertConfig(
+            vocab_size=len(vocab), dim=16, n_layers=2, n_heads=2, hidden_dim=32, max_position_embeddings=64
+        )
+        model = model_class(config).eval()
+        return pipeline_class(model=model, tokenizer=tokenizer)
+
+    @require_torch
+    def test_dynamic_batching_executor(self):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            pipe = self.get_tiny_text_classification_pipeline(tmpdirname)
+        inputs = ["This is a test", "This is another, longer, test of dynamic batching"] * 5
+        expected_outputs = nested_simplify(pipe(inputs))
+
+        with DynamicBatchingExecutor(pipe, max_batch_size=4, max_wait_ms=50) as executor:
+            # Preprocessing with the fast tokenizer is serialized, the truncation settings change on every call
+            with ThreadPoolExecutor(len(inputs)) as pool:
+                outputs = list(pool.map(lambda x: executor(x[1], truncation=x[0] % 2 == 0), enumerate(inputs)))
+            self.assertEqual(nested_simplify(outputs), expected_outputs)
+
+            async def gather():
+                return await asyncio.gather(*[executor.acall(text) for text in inputs])
+
+            outputs = asyncio.run(gather())
+            self.assertEqual(nested_simplify(outputs), expected_outputs)
+
+        with self.assertRaises(RuntimeError):
+            executor.submit("This is a test")
+
+    @require_torch
+    def test_dynamic_batching_executor_chunk_pipeline(self):
+        class SentenceClassificationPipeline(ChunkPipeline):
+            def _sanitize_parameters(self, **kwargs):
+                return {}, {}, {}
+
+            def preprocess(self, inputs):
+                sentences = [sentence for sentence in inputs.split(".") if sentence.strip()]
+                for i, sentence in enumerate(sentences):
+                    model_inputs = self.tokenizer(sentence, return_tensors="pt")
+                    yield {"is_last": i == len(sentences) - 1, **model_inputs}
+
+            def _forward(self, model_inputs):
+                is_last = model_inputs.pop("is_last")
+                return {"is_last": is_last, "logits": self.model(**model_inputs).logits}
+
+            def postprocess(self, model_outputs):
+                return [output["logits"][0].argmax().item() for output in model_outputs]
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            pipe = self.get_tiny_text_classification_pipeline(tmpdirname, SentenceClassificationPipeline)
+        inputs = ["This is a test. This is another test.", "This is a longer, longer test.", "This is a test."]
+        expected_outputs = [pipe(text) for text in inputs]
+
+        with DynamicBatchingExecutor(pipe, max_batch_size=4, max_wait_ms=50) as executor:
+            futures = [executor.submit(text) for text in inputs]
+            self.assertEqual([future.result() for future in futures], expected_outputs)
+
+            # An input without any chunk does not go through the model
+            self.assertEqual(executor.submit("").result(timeout=10), [])
+
+    def get_inputs_of_various_lengths(self):
+        texts = ["This is a test", "This is another, longer, longer, longer test", "A test.", "This is a longer test"]
+        return [texts[i % len(texts)] * (1 + i % 3) for i in range(13)]
+
+    @require_torch
+    def test_group_by_length_same_outputs(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            pipe = self.get_tiny_text_classification_pipeline(tmpdirname)
+        inputs = self.get_inputs_of_various_lengths()
+        expected_outputs = nested_simplify(pipe(inputs, batch_size=4))
+
+        for kwargs in [{"group_by_length": True}, {"group_by_length": True, "length_grouping_window": 5}]:
+            # Same outputs, in the same order, with a list or a generator of inputs
+            self.assertEqual(nested_simplify(pipe(inputs, batch_size=4, **kwargs)), expected_outputs, kwargs)
+            outputs = pipe((text for text in inputs), batch_size=4, **kwargs)
+            self.assertEqual(nested_simplify(list(outputs)), expected_outputs, kwargs)
+
+    @require_torch
+    def test_prefetch_same_outputs(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            pipe = self.get_tiny_text_classification_pipeline(tmpdirname)
+        inputs = self.get_inputs_of_various_lengths()
+        expected_outputs = nested_simplify(pipe(inputs, batch_size=4))
+
+        for kwargs in [{"prefetch_size": 1}, {"prefetch_size": 2, "group_by_length": True}]:
+            # Same outputs, in the same order, with a list or a generator of inputs
+            self.assertEqual(nested_simplify(pipe(inputs, batch_size=4, **kwargs)), expected_outputs, kwargs)
+            outputs = pipe((text for text in inputs), batch_size=4, **kwargs)
+            self.assertEqual(nested_simplify(list(outputs)), expected_outputs, kwargs)
+
+    @require_torch
+    def test_prefetch_chunk_pipeline_same_outputs(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            pipe = self.get_tiny_text_classification_pipeline(
+                tmpdirname, QuestionAnsweringPipeline, DistilBertForQuestionAnswering, model_max_length=16
+            )
+        context = "This is a test, this is another test. This is a longer, longer test. A test."
+        inputs = [{"question": "Is this a test?", "context": context[: 20 + 9 * i]} for i in range(7)]
+        # The contexts are split into a varying number of chunks, padded to the same length
+        call_kwargs = {"doc_stride": 4, "padding": "max_length"}
+        self.assertGreater(len(list(pipe.preprocess(pipe._args_parser(inputs[-1])[0], **call_kwargs))), 2)
+        expected_outputs = nested_simplify(pipe(inputs, batch_size=3, **call_kwargs))
+
+        for kwargs in [{"prefetch_size": 2}, {"group_by_length": True}, {"group_by_length": True, "prefetch_size": 1}]:
+            outputs = pipe(inputs, batch_size=3, **call_kwargs, **kwargs)
+            self.assertEqual(nested_simplify(outputs), expected_outputs, kwargs)
+
+    @require_torch
+    def test_preprocess_threads_ignored_with_tokenizer(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            pipe = self.get_tiny_text_classification_pipeline(tmpdirname)
+        inputs = ["This is a test", "This is another, longer, test"] * 3
+        expected_outputs = pipe(inputs, batch_size=2)
+
+        logger = logging.getLogger("transformers.pipelines.base")
+        with CaptureLogger(logger) as cl:
+            outputs = pipe(inputs, batch_size=2, preprocess_threads=2)
+        self.assertIn("`preprocess_threads` is not supported by pipelines with a tokenizer", cl.out)
+        self.assertEqual(outputs, expected_outputs)
+
 
 @is_pipeline_test
 class PipelinePadTest(unittest.TestCase):
@@ -535,6 +690,73 @@ class PipelineUtilsTest(unittest.TestCase):
             nested_simplify(outputs), [{"id": [[12, 22]]}, {"id": [[2, 3]]}, {"id": [[2, 4]]}, {"id": [[5]]}]
         )
 
+    def test_pipeline_length_grouped_iterator(self):
+        import torch
+
+        from transformers.pipelines.pt_utils import PipelineLengthGroupedIterator
+
+        lengths = [1, 5, 2, 4, 3, 6, 1]
+        dummy_dataset = [
+            {"input_ids": torch.ones((1, length), dtype=torch.long) * i} for i, length in enumerate(lengths)
+        ]
+
+        def collate_fn(items):
+            max_length = max(item["input_ids"].shape[1] for item in items)
+            input_ids = torch.zeros((len(items), max_length), dtype=torch.long)
+            for i, item in enumerate(items):
+                input_ids[i, : item["input_ids"].shape[1]] = item["input_ids"][0]
+            return {"input_ids": input_ids}
+
+        batch_shapes = []
+
+        def forward(batch):
+            batch_shapes.append(tuple(batch["input_ids"].shape))
+            return {"id": batch["input_ids"][:, 0]}
+
+        dataset = PipelineLengthGroupedIterator(
+            dummy_dataset, forward, {}, loader_batch_size=2, collate_fn=collate_fn, window_size=4
+        )
+        self.assertEqual(len(dataset), 7)
+
+        outputs = [item for item in dataset]
+        # Outputs come back in the original order
+        self.assertEqual([output["id"].item() for output in outputs], list(range(7)))
+        # Batches are built within windows of 4 items, sorted by decreasing length.
+        self.assertEqual(batch_shapes, [(2, 5), (2, 2), (2, 6), (1, 1)])
+
+    def test_pipeline_prefetch_iterator(self):
+        import threading
+
+        from transformers.pipelines.pt_utils import PipelineIterator, PipelinePrefetchIterator
+
+        threads = set()
+
+        def add(number, extra=0):
+            threads.add(threading.get_ident())
+            return number + extra
+
+        def dummy_dataset():
+            for i in range(10):
+                yield i
+
+        dataset = PipelinePrefetchIterator(PipelineIterator(dummy_dataset(), add, {"extra": 2}), max_size=2)
+        outputs = [item for item in dataset]
+        self.assertEqual(outputs, list(range(2, 12)))
+        # `add` ran in the background thread.
+        self.assertNotIn(threading.get_ident(), threads)
+
+        def fail(number):
+            if number == 3:
+                raise ValueError("Failed on 3")
+            return number
+
+        dataset = PipelinePrefetchIterator(PipelineIterator(dummy_dataset(), fail, {}), max_size=2)
+        outputs = []
+        with self.assertRaises(ValueError):
+            for item in dataset:
+                outputs.append(item)
+        self.assertEqual(outputs, [0, 1, 2])
+
     def test_pipeline_chunk_iterator(self):
         from transformers.pipelines.pt_utils import PipelineChunkIterator
 
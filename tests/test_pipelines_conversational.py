@@ -12,7 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import pickle
+import tempfile
 import unittest
+from unittest.mock import patch
 
 from transformers import (
     MODEL_FOR_CAUSAL_LM_MAPPING,
@@ -22,6 +26,7 @@ from transformers import (
     AutoModelForCausalLM,
     AutoModelForSeq2SeqLM,
     AutoTokenizer,
+    BertTokenizer,
     BlenderbotSmallForConditionalGeneration,
     BlenderbotSmallTokenizer,
     Conversation,
@@ -173,6 +178,48 @@ class ConversationalPipelineTests(unittest.TestCase, metaclass=PipelineTestCaseM
         output = conversation_agent(conversation)
         self.assertEqual(output, Conversation(past_user_inputs=["hello"], generated_responses=["Hi"]))
 
+    @require_torch
+    def test_cache_past_key_values_pt(self):
+        tokenizer = AutoTokenizer.from_pretrained("microsoft/DialoGPT-small")
+        model = AutoModelForCausalLM.from_pretrained("microsoft/DialoGPT-small")
+        conversation_agent = ConversationalPipeline(model=model, tokenizer=tokenizer, max_length=128)
+        self.assertTrue(conversation_agent.supports_past_key_values_caching)
+
+        conversation = Conversation()
+        cached_conversation = Conversation()
+        for text in ["hello", "How are you?", "What is your favorite movie?"]:
+            conversation.add_user_input(text)
+            cached_conversation.add_user_input(text)
+            input_ids = tokenizer._build_conversation_input_ids(cached_conversation)
+            conversation_agent(conversation)
+            conversation_agent(cached_conversation, cache_past_key_values=True)
+            self.assertEqual(cached_conversation.generated_responses, conversation.generated_responses)
+            # The model state of the input and the generated tokens is kept for the next turn.
+            self.assertEqual(cached_conversation._cache["past_ids"][: len(input_ids)], input_ids)
+
+        cached_conversation.clear_cache()
+        self.assertEqual(cached_conversation._cache, {})
+
+        with self.assertRaises(ValueError):
+            conversation_agent(Conversation("hello"), cache_past_key_values=True, num_beams=2)
+
+    def test_unpickle_conversation_without_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            vocab_file = os.path.join(tmpdirname, "vocab.txt")
+            with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+                vocab_writer.write("".join([x + "\n" for x in ["[UNK]", "hi", "hello", "there", "!"]]))
+            tokenizer = BertTokenizer(vocab_file)
+
+        conversation = Conversation("Hi there!", past_user_inputs=["Hello"], generated_responses=["Hi!"])
+        expected = list(conversation.iter_text_ids(tokenizer))
+
+        # Conversations pickled before the cache was added
+        old_state = {k: v for k, v in conversation.__dict__.items() if k != "_cache"}
+        with patch.object(Conversation, "__getstate__", lambda self: old_state):
+            state = pickle.dumps(conversation)
+        unpickled_conversation = pickle.loads(state)
+        self.assertEqual(list(unpickled_conversation.iter_text_ids(tokenizer)), expected)
+
     @require_tf
     def test_small_model_tf(self):
         tokenizer = AutoTokenizer.from_pretrained("microsoft/DialoGPT-small")
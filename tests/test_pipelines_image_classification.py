@@ -18,6 +18,9 @@ from transformers import (
     MODEL_FOR_IMAGE_CLASSIFICATION_MAPPING,
     TF_MODEL_FOR_IMAGE_CLASSIFICATION_MAPPING,
     PreTrainedTokenizer,
+    ViTConfig,
+    ViTFeatureExtractor,
+    is_torch_available,
     is_vision_available,
 )
 from transformers.pipelines import ImageClassificationPipeline, pipeline
@@ -33,6 +36,11 @@ from transformers.testing_utils import (
 from .test_pipelines_common import ANY, PipelineTestCaseMeta
 
 
+if is_torch_available():
+    import torch
+
+    from transformers import ViTForImageClassification
+
 if is_vision_available():
     from PIL import Image
 else:
@@ -149,6 +157,37 @@ class ImageClassificationPipelineTests(unittest.TestCase, metaclass=PipelineTest
             ],
         )
 
+    @require_torch
+    def test_batched_normalization_pt(self):
+        config = ViTConfig(
+            image_size=30,
+            patch_size=10,
+            hidden_size=32,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=37,
+            num_labels=3,
+        )
+        model = ViTForImageClassification(config).eval()
+        feature_extractor = ViTFeatureExtractor(size=30)
+        self.assertTrue(feature_extractor.supports_batched_normalization)
+        image_classifier = ImageClassificationPipeline(model=model, feature_extractor=feature_extractor, top_k=3)
+
+        image = Image.open("./tests/fixtures/tests_samples/COCO/000000039769.png")
+        with torch.no_grad():
+            logits = model(**feature_extractor(images=image.convert("RGB"), return_tensors="pt")).logits
+        scores, ids = logits.softmax(-1)[0].topk(3)
+        expected = [{"score": score, "label": config.id2label[i]} for score, i in zip(scores.tolist(), ids.tolist())]
+
+        images = [image, image.rotate(90), image]
+        outputs = image_classifier(images)
+        self.assertEqual(outputs[0], expected)
+        self.assertEqual(outputs[2], expected)
+
+        # Decoded and resized concurrently, normalized as a batch
+        batched_outputs = image_classifier(images, batch_size=2, preprocess_threads=2)
+        self.assertEqual(nested_simplify(batched_outputs), nested_simplify(outputs))
+
     @require_tf
     def test_small_model_tf(self):
         small_model = "lysandre/tiny-vit-random"
@@ -0,0 +1,244 @@
+# Copyright 2022 The HuggingFace Team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from transformers import (
+    BertConfig,
+    BertTokenizer,
+    DistilBertConfig,
+    DistilBertTokenizer,
+    ElectraConfig,
+    MultiTaskPipeline,
+    is_torch_available,
+    pipeline,
+)
+from transformers.pipelines import FeatureExtractionPipeline, TextClassificationPipeline, TokenClassificationPipeline
+from transformers.testing_utils import is_pipeline_test, nested_simplify, require_torch
+
+
+if is_torch_available():
+    import torch
+
+    from transformers import (
+        BertForSequenceClassification,
+        BertForTokenClassification,
+        BertModel,
+        DistilBertForSequenceClassification,
+        DistilBertForTokenClassification,
+        DistilBertModel,
+        ElectraForSequenceClassification,
+        ElectraForTokenClassification,
+    )
+
+
+VOCAB = ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]", "this", "is", "a", "test", "another", "bit", "longer", "than"]
+VOCAB += ["the", "first", "one", ",", "##s", "##er"]
+
+LABELS = ["O", "B-PER", "I-PER", "B-LOC", "I-LOC"]
+
+
+@is_pipeline_test
+@require_torch
+class MultiTaskPipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+        self.vocab_file = os.path.join(self.tmpdirname, "vocab.txt")
+        with open(self.vocab_file, "w", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("".join([x + "\n" for x in VOCAB]))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def get_pipelines(self, num_shared_layers):
+        tokenizer = DistilBertTokenizer(self.vocab_file)
+        config_kwargs = {"vocab_size": len(tokenizer), "dim": 32, "n_layers": 3, "n_heads": 2, "hidden_dim": 37}
+        labels = LABELS
+
+        torch.manual_seed(0)
+        base_model = DistilBertModel(DistilBertConfig(**config_kwargs)).eval()
+        classification_model = DistilBertForSequenceClassification(
+            DistilBertConfig(num_labels=3, **config_kwargs)
+        ).eval()
+        token_classification_model = DistilBertForTokenClassification(
+            DistilBertConfig(
+                id2label=dict(enumerate(labels)),
+                label2id={label: i for i, label in enumerate(labels)},
+                **config_kwargs,
+            )
+        ).eval()
+        # Fine-tuned from `base_model` with frozen lower layers
+        for model in (classification_model, token_classification_model):
+            model.distilbert.embeddings.load_state_dict(base_model.embeddings.state_dict())
+            for i in range(num_shared_layers):
+                model.distilbert.transformer.layer[i].load_state_dict(base_model.transformer.layer[i].state_dict())
+
+        return {
+            "sentiment": TextClassificationPipeline(model=classification_model, tokenizer=tokenizer),
+            "entities": TokenClassificationPipeline(
+                model=token_classification_model, tokenizer=tokenizer, aggregation_strategy="simple"
+            ),
+            "embedding": FeatureExtractionPipeline(model=base_model, tokenizer=tokenizer),
+        }
+
+    def test_same_outputs_as_pipelines(self):
+        pipelines = self.get_pipelines(num_shared_layers=2)
+        multi_task_pipeline = MultiTaskPipeline(pipelines)
+        self.assertEqual(multi_task_pipeline.num_shared_layers, 2)
+
+        inputs = ["This is a test", "Another test, a bit longer than the first one"]
+        outputs = multi_task_pipeline(inputs, entities={"ignore_labels": []})
+        expected = [
+            {
+                "sentiment": pipelines["sentiment"](text)[0],
+                "entities": pipelines["entities"](text, ignore_labels=[]),
+                "embedding": pipelines["embedding"](text),
+            }
+            for text in inputs
+        ]
+        self.assertEqual(nested_simplify(outputs), nested_simplify(expected))
+
+        # Batched
+        outputs = multi_task_pipeline(inputs, batch_size=2, entities={"ignore_labels": []})
+        for output, expected_output in zip(outputs, expected):
+            self.assertEqual(nested_simplify(output["sentiment"]), nested_simplify(expected_output["sentiment"]))
+            self.assertEqual(nested_simplify(output["entities"]), nested_simplify(expected_output["entities"]))
+
+    def test_same_outputs_as_pipelines_from_checkpoints(self):
+        config_kwargs = {
+            "vocab_size": len(VOCAB),
+            "hidden_size": 32,
+            "num_hidden_layers": 3,
+            "num_attention_heads": 2,
+            "intermediate_size": 37,
+        }
+        torch.manual_seed(0)
+        base_model = BertModel(BertConfig(**config_kwargs))
+        classification_model = BertForSequenceClassification(BertConfig(num_labels=3, **config_kwargs))
+        token_classification_model = BertForTokenClassification(
+            BertConfig(
+                id2label=dict(enumerate(LABELS)),
+                label2id={label: i for i, label in enumerate(LABELS)},
+                **config_kwargs,
+            )
+        )
+        # Fine-tuned from `base_model` with frozen embeddings and first layer
+        for model in (classification_model, token_classification_model):
+            model.bert.embeddings.load_state_dict(base_model.embeddings.state_dict())
+            model.bert.encoder.layer[0].load_state_dict(base_model.encoder.layer[0].state_dict())
+
+        tokenizer = BertTokenizer(self.vocab_file)
+        checkpoints = {}
+        for name, model in [
+            ("embedding", base_model),
+            ("sentiment", classification_model),
+            ("entities", token_classification_model),
+        ]:
+            checkpoints[name] = os.path.join(self.tmpdirname, name)
+            model.save_pretrained(checkpoints[name])
+            tokenizer.save_pretrained(checkpoints[name])
+
+        pipelines = {
+            "sentiment": pipeline("text-classification", model=checkpoints["sentiment"]),
+            "entities": pipeline("token-classification", model=checkpoints["entities"], aggregation_strategy="simple"),
+            "embedding": pipeline("feature-extraction", model=checkpoints["embedding"]),
+        }
+        multi_task_pipeline = MultiTaskPipeline(pipelines)
+        self.assertEqual(multi_task_pipeline.num_shared_layers, 1)
+
+        inputs = ["This is a test", "Another test, a bit longer than the first one"]
+        outputs = multi_task_pipeline(inputs, entities={"ignore_labels": []})
+        expected = [
+            {
+                "sentiment": pipelines["sentiment"](text)[0],
+                "entities": pipelines["entities"](text, ignore_labels=[]),
+                "embedding": pipelines["embedding"](text),
+            }
+            for text in inputs
+        ]
+        self.assertEqual(nested_simplify(outputs), nested_simplify(expected))
+
+    def test_same_outputs_as_pipelines_projected_embeddings(self):
+        # The embeddings of ELECTRA are projected to the hidden size before the first layer
+        config_kwargs = {
+            "vocab_size": len(VOCAB),
+            "embedding_size": 8,
+            "hidden_size": 16,
+            "num_hidden_layers": 2,
+            "num_attention_heads": 2,
+            "intermediate_size": 37,
+        }
+        torch.manual_seed(0)
+        classification_model = ElectraForSequenceClassification(ElectraConfig(num_labels=3, **config_kwargs)).eval()
+        token_classification_model = ElectraForTokenClassification(
+            ElectraConfig(
+                id2label=dict(enumerate(LABELS)),
+                label2id={label: i for i, label in enumerate(LABELS)},
+                **config_kwargs,
+            )
+        ).eval()
+        # Fine-tuned from the same model with frozen embeddings and first layer
+        token_classification_model.electra.embeddings.load_state_dict(
+            classification_model.electra.embeddings.state_dict()
+        )
+        token_classification_model.electra.embeddings_project.load_state_dict(
+            classification_model.electra.embeddings_project.state_dict()
+        )
+        token_classification_model.electra.encoder.layer[0].load_state_dict(
+            classification_model.electra.encoder.layer[0].state_dict()
+        )
+
+        tokenizer = BertTokenizer(self.vocab_file)
+        pipelines = {
+            "sentiment": TextClassificationPipeline(model=classification_model, tokenizer=tokenizer),
+            "entities": TokenClassificationPipeline(
+                model=token_classification_model, tokenizer=tokenizer, aggregation_strategy="simple"
+            ),
+        }
+        multi_task_pipeline = MultiTaskPipeline(pipelines)
+        self.assertEqual(multi_task_pipeline.num_shared_layers, 1)
+
+        inputs = ["This is a test", "Another test, a bit longer than the first one"]
+        outputs = multi_task_pipeline(inputs, entities={"ignore_labels": []})
+        expected = [
+            {
+                "sentiment": pipelines["sentiment"](text)[0],
+                "entities": pipelines["entities"](text, ignore_labels=[]),
+            }
+            for text in inputs
+        ]
+        self.assertEqual(nested_simplify(outputs), nested_simplify(expected))
+
+        # The projection is part of the embeddings the models have to share
+        token_classification_model.electra.embeddings_project.reset_parameters()
+        with self.assertRaises(ValueError):
+            MultiTaskPipeline(pipelines)
+
+    def test_num_shared_layers(self):
+        pipelines = self.get_pipelines(num_shared_layers=1)
+        self.assertEqual(MultiTaskPipeline(pipelines).num_shared_layers, 1)
+        self.assertEqual(MultiTaskPipeline(pipelines, num_shared_layers=0).num_shared_layers, 0)
+        with self.assertRaises(ValueError):
+            MultiTaskPipeline(pipelines, num_shared_layers=2)
+
+    def test_parameters(self):
+        multi_task_pipeline = MultiTaskPipeline(self.get_pipelines(num_shared_layers=2))
+        with self.assertRaises(ValueError):
+            multi_task_pipeline("This is a test", unknown={})
+        with self.assertRaises(ValueError):
+            # Inputs are only tokenized once
+            multi_task_pipeline("This is a test", entities={"offset_mapping": [(0, 4)]})
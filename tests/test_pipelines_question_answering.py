@@ -12,21 +12,116 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import tempfile
 import unittest
 
+import numpy as np
+
 from transformers import (
     MODEL_FOR_QUESTION_ANSWERING_MAPPING,
     TF_MODEL_FOR_QUESTION_ANSWERING_MAPPING,
+    DistilBertConfig,
+    DistilBertForQuestionAnswering,
+    DistilBertTokenizer,
+    DistilBertTokenizerFast,
     LxmertConfig,
     QuestionAnsweringPipeline,
 )
 from transformers.data.processors.squad import SquadExample
 from transformers.pipelines import QuestionAnsweringArgumentHandler, pipeline
-from transformers.testing_utils import is_pipeline_test, nested_simplify, require_tf, require_torch, slow
+from transformers.testing_utils import (
+    is_pipeline_test,
+    nested_simplify,
+    require_tf,
+    require_tokenizers,
+    require_torch,
+    slow,
+)
 
 from .test_pipelines_common import ANY, PipelineTestCaseMeta
 
 
+class PerChunkQuestionAnsweringPipeline(QuestionAnsweringPipeline):
+    """
+    Previous implementation of `postprocess`, decoding the spans of every chunk separately, used as a reference.
+    """
+
+    def postprocess(self, model_outputs, top_k=1, handle_impossible_answer=False, max_answer_len=15):
+        min_null_score = 1000000  # large and positive
+        answers = []
+        for output in model_outputs:
+            start_ = output["start"]
+            end_ = output["end"]
+            example = output["example"]
+
+            undesired_tokens = np.abs(np.array(output["p_mask"]) - 1)
+            if output.get("attention_mask", None) is not None:
+                undesired_tokens = undesired_tokens & output["attention_mask"].numpy()
+            undesired_tokens_mask = undesired_tokens == 0.0
+            start_ = np.where(undesired_tokens_mask, -10000.0, start_)
+            end_ = np.where(undesired_tokens_mask, -10000.0, end_)
+            start_ = np.exp(start_ - np.log(np.sum(np.exp(start_), axis=-1, keepdims=True)))
+            end_ = np.exp(end_ - np.log(np.sum(np.exp(end_), axis=-1, keepdims=True)))
+            if handle_impossible_answer:
+                min_null_score = min(min_null_score, (start_[0, 0] * end_[0, 0]).item())
+            start_[0, 0] = end_[0, 0] = 0.0
+
+            outer = np.matmul(np.expand_dims(start_, -1), np.expand_dims(end_, 1))
+            candidates = np.tril(np.triu(outer), max_answer_len - 1)
+            scores_flat = candidates.flatten()
+            if top_k == 1:
+                idx_sort = [np.argmax(scores_flat)]
+            elif len(scores_flat) < top_k:
+                idx_sort = np.argsort(-scores_flat)
+            else:
+                idx = np.argpartition(-scores_flat, top_k)[0:top_k]
+                idx_sort = idx[np.argsort(-scores_flat[idx])]
+            starts, ends = np.unravel_index(idx_sort, candidates.shape)[1:]
+            desired_spans = np.isin(starts, undesired_tokens.nonzero()) & np.isin(ends, undesired_tokens.nonzero())
+            starts = starts[desired_spans]
+            ends = ends[desired_spans]
+            scores = candidates[0, starts, ends]
+
+            if not self.tokenizer.is_fast:
+                char_to_word = np.array(example.char_to_word_offset)
+                for s, e, score in zip(starts, ends, scores):
+                    token_to_orig_map = output["token_to_orig_map"]
+                    answers.append(
+                        {
+                            "score": score.item(),
+                            "start": np.where(char_to_word == token_to_orig_map[s])[0][0].item(),
+                            "end": np.where(char_to_word == token_to_orig_map[e])[0][-1].item(),
+                            "answer": " ".join(example.doc_tokens[token_to_orig_map[s] : token_to_orig_map[e] + 1]),
+                        }
+                    )
+            else:
+                enc = output["encoding"]
+                sequence_index = 1 if self.tokenizer.padding_side == "right" else 0
+                for s, e, score in zip(starts, ends, scores):
+                    try:
+                        start_index = enc.word_to_chars(enc.token_to_word(s), sequence_index=sequence_index)[0]
+                        end_index = enc.word_to_chars(enc.token_to_word(e), sequence_index=sequence_index)[1]
+                    except Exception:
+                        start_index = enc.offsets[s][0]
+                        end_index = enc.offsets[e][1]
+                    answers.append(
+                        {
+                            "score": score.item(),
+                            "start": start_index,
+                            "end": end_index,
+                            "answer": example.context_text[start_index:end_index],
+                        }
+                    )
+
+        if handle_impossible_answer:
+            answers.append({"score": min_null_score, "start": 0, "end": 0, "answer": ""})
+        answers = sorted(answers, key=lambda x: x["score"], reverse=True)[:top_k]
+        if len(answers) == 1:
+            return answers[0]
+        return answers
+
+
 @is_pipeline_test
 class QAPipelineTests(unittest.TestCase, metaclass=PipelineTestCaseMeta):
     model_mapping = MODEL_FOR_QUESTION_ANSWERING_MAPPING
@@ -106,6 +201,16 @@ class QAPipelineTests(unittest.TestCase, metaclass=PipelineTestCaseMeta):
         )
         self.assertEqual(outputs, {"answer": ANY(str), "start": ANY(int), "end": ANY(int), "score": ANY(float)})
 
+        # The best spans are selected across all the features at once
+        context = "HuggingFace was founded in Paris." * 20
+        outputs = question_answerer(question="Where was HuggingFace founded ?", context=context, top_k=5)
+        self.assertEqual(
+            outputs, [{"answer": ANY(str), "start": ANY(int), "end": ANY(int), "score": ANY(float)} for i in range(5)]
+        )
+        self.assertEqual(
+            [output["score"] for output in outputs], sorted([output["score"] for output in outputs])[::-1]
+        )
+
     @require_torch
     def test_small_model_pt(self):
         question_answerer = pipeline(
@@ -117,6 +222,48 @@ class QAPipelineTests(unittest.TestCase, metaclass=PipelineTestCaseMeta):
 
         self.assertEqual(nested_simplify(outputs), {"score": 0.01, "start": 0, "end": 11, "answer": "HuggingFace"})
 
+    @require_torch
+    @require_tokenizers
+    def test_small_model_multi_chunk_same_as_per_chunk_decoding(self):
+        words = ["the", "museum", "was", "built", "in", "paris", "by", "an", "architect", "from", "london", "during"]
+        words += ["winter", "of", "year", "where", "who", "when", "old", "new", "city", "river", "##s", "##ed", "."]
+        vocab = ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]"] + words
+        config = DistilBertConfig(
+            vocab_size=len(vocab), dim=16, n_layers=2, n_heads=2, hidden_dim=32, max_position_embeddings=64
+        )
+        model = DistilBertForQuestionAnswering(config).eval()
+
+        question = "Where was the museum built?"
+        context = (
+            "The old museum was built in Paris by an architect from London during the winter. The new city "
+            "museums were built by the river, where architects from Paris built old cities. Who built the "
+            "rivers of London when the year was new? An architect from the old city, during the winters of Paris."
+        )
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            vocab_file = os.path.join(tmpdirname, "vocab.txt")
+            with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+                vocab_writer.write("".join([x + "\n" for x in vocab]))
+            # Short sequences to split the context in many chunks
+            tokenizers = [
+                DistilBertTokenizer(vocab_file, model_max_length=24),
+                DistilBertTokenizerFast(vocab_file, model_max_length=24),
+            ]
+
+        for tokenizer in tokenizers:
+            question_answerer = QuestionAnsweringPipeline(model, tokenizer)
+            reference_question_answerer = PerChunkQuestionAnsweringPipeline(model, tokenizer)
+            for top_k in [1, 3, 10]:
+                for max_answer_len in [1, 4, 15]:
+                    for handle_impossible_answer in [False, True]:
+                        kwargs = {
+                            "top_k": top_k,
+                            "max_answer_len": max_answer_len,
+                            "handle_impossible_answer": handle_impossible_answer,
+                        }
+                        outputs = question_answerer(question=question, context=context, **kwargs)
+                        expected_outputs = reference_question_answerer(question=question, context=context, **kwargs)
+                        self.assertEqual(nested_simplify(outputs, 6), nested_simplify(expected_outputs, 6))
+
     @require_tf
     def test_small_model_tf(self):
         question_answerer = pipeline(
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import tempfile
 import unittest
 
 import numpy as np
@@ -21,7 +23,12 @@ from transformers import (
     TF_MODEL_FOR_TOKEN_CLASSIFICATION_MAPPING,
     AutoModelForTokenClassification,
     AutoTokenizer,
+    DistilBertConfig,
+    DistilBertForTokenClassification,
+    DistilBertTokenizer,
+    DistilBertTokenizerFast,
     TokenClassificationPipeline,
+    is_torch_available,
     pipeline,
 )
 from transformers.pipelines import AggregationStrategy, TokenClassificationArgumentHandler
@@ -29,6 +36,7 @@ from transformers.testing_utils import (
     is_pipeline_test,
     nested_simplify,
     require_tf,
+    require_tokenizers,
     require_torch,
     require_torch_gpu,
     slow,
@@ -37,6 +45,10 @@ from transformers.testing_utils import (
 from .test_pipelines_common import ANY, PipelineTestCaseMeta
 
 
+if is_torch_available():
+    import torch
+
+
 VALID_INPUTS = ["A simple string", ["list of strings", "A simple string that is quite a bit longer"]]
 
 
@@ -580,6 +592,137 @@ class TokenClassificationPipelineTests(unittest.TestCase, metaclass=PipelineTest
             ],
         )
 
+    @require_torch
+    @require_tokenizers
+    def test_small_model_aggregation(self):
+        vocab = [
+            "[UNK]",
+            "[CLS]",
+            "[SEP]",
+            "[PAD]",
+            "[MASK]",
+            "enzo",
+            "works",
+            "at",
+            "micro",
+            "##soft",
+            "com",
+            "##pany",
+            "##s",
+        ]
+        config = DistilBertConfig(
+            vocab_size=len(vocab), dim=16, n_layers=2, n_heads=2, hidden_dim=32, max_position_embeddings=64
+        )
+        # "MISC" is not in B-, I- format
+        config.id2label = {0: "O", 1: "B-PER", 2: "I-PER", 3: "B-ORG", 4: "I-ORG", 5: "MISC"}
+        config.label2id = {label: i for i, label in config.id2label.items()}
+        model = DistilBertForTokenClassification(config).eval()
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            vocab_file = os.path.join(tmpdirname, "vocab.txt")
+            with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+                vocab_writer.write("".join([x + "\n" for x in vocab]))
+            tokenizers = [DistilBertTokenizerFast(vocab_file), DistilBertTokenizer(vocab_file)]
+
+        sentence = "Enzo works at Microsoft companys Zorro"
+        # Scores of enzo, works, at, micro, ##soft, com, ##pany, ##s and [UNK]
+        scores = np.array(
+            [
+                [0.1, 0.8, 0.1, 0.0, 0.0, 0.0],
+                [0.7, 0.0, 0.1, 0.0, 0.0, 0.2],
+                [0.6, 0.0, 0.0, 0.0, 0.0, 0.4],
+                [0.1, 0.0, 0.0, 0.6, 0.3, 0.0],
+                [0.0, 0.0, 0.9, 0.0, 0.1, 0.0],
+                [0.2, 0.0, 0.0, 0.0, 0.5, 0.3],
+                [0.1, 0.0, 0.0, 0.0, 0.2, 0.7],
+                [0.1, 0.0, 0.0, 0.0, 0.6, 0.3],
+                [0.3, 0.0, 0.0, 0.0, 0.0, 0.7],
+            ]
+        )
+        uniform_scores = np.full((1, 6), 1 / 6)
+        logits = np.log(np.concatenate([uniform_scores, scores, uniform_scores]) + 1e-12)
+
+        simple_entities = [
+            {"entity_group": "PER", "score": 0.8, "word": "enzo", "start": 0, "end": 4},
+            {"entity_group": "O", "score": 0.65, "word": "works at", "start": 5, "end": 13},
+            {"entity_group": "ORG", "score": 0.6, "word": "micro", "start": 14, "end": 19},
+            {"entity_group": "PER", "score": 0.9, "word": "##soft", "start": 19, "end": 23},
+            {"entity_group": "ORG", "score": 0.5, "word": "com", "start": 24, "end": 27},
+            {"entity_group": "MISC", "score": 0.7, "word": "##pany", "start": 27, "end": 31},
+            {"entity_group": "ORG", "score": 0.6, "word": "##s", "start": 31, "end": 32},
+            {"entity_group": "MISC", "score": 0.7, "word": "Zorro", "start": 33, "end": 38},
+        ]
+        expected_entities = {
+            AggregationStrategy.SIMPLE: simple_entities,
+            AggregationStrategy.FIRST: [
+                {"entity_group": "PER", "score": 0.8, "word": "enzo", "start": 0, "end": 4},
+                {"entity_group": "O", "score": 0.65, "word": "works at", "start": 5, "end": 13},
+                {"entity_group": "ORG", "score": 0.55, "word": "microsoft companys", "start": 14, "end": 32},
+                {"entity_group": "MISC", "score": 0.7, "word": "Zorro", "start": 33, "end": 38},
+            ],
+            AggregationStrategy.MAX: [
+                {"entity_group": "PER", "score": 0.8, "word": "enzo", "start": 0, "end": 4},
+                {"entity_group": "O", "score": 0.65, "word": "works at", "start": 5, "end": 13},
+                {"entity_group": "PER", "score": 0.9, "word": "microsoft", "start": 14, "end": 23},
+                {"entity_group": "MISC", "score": 0.7, "word": "companys Zorro", "start": 24, "end": 38},
+            ],
+            AggregationStrategy.AVERAGE: [
+                {"entity_group": "PER", "score": 0.8, "word": "enzo", "start": 0, "end": 4},
+                {"entity_group": "O", "score": 0.65, "word": "works at", "start": 5, "end": 13},
+                {"entity_group": "PER", "score": 0.45, "word": "microsoft", "start": 14, "end": 23},
+                {"entity_group": "ORG", "score": 0.433, "word": "companys", "start": 24, "end": 32},
+                {"entity_group": "MISC", "score": 0.7, "word": "Zorro", "start": 33, "end": 38},
+            ],
+        }
+
+        for tokenizer in tokenizers:
+            token_classifier = TokenClassificationPipeline(model=model, tokenizer=tokenizer)
+            model_outputs = token_classifier.forward(token_classifier.preprocess(sentence))
+            model_outputs["logits"] = torch.tensor(logits, dtype=torch.float32)[None]
+
+            outputs = token_classifier.postprocess(model_outputs, ignore_labels=[])
+            labels = ["B-PER", "O", "O", "B-ORG", "I-PER", "I-ORG", "MISC", "I-ORG", "MISC"]
+            self.assertEqual([entity["entity"] for entity in outputs], labels)
+            self.assertEqual(nested_simplify([entity["score"] for entity in outputs]), scores.max(axis=-1).tolist())
+            self.assertEqual([entity["index"] for entity in outputs], list(range(1, 10)))
+
+            for aggregation_strategy, entities in expected_entities.items():
+                if not tokenizer.is_fast:
+                    # Slow tokenizers have no offsets, so they cannot aggregate words
+                    if aggregation_strategy != AggregationStrategy.SIMPLE:
+                        continue
+                    entities = [{**entity, "start": None, "end": None} for entity in entities]
+                    entities[-1]["word"] = "[UNK]"
+                outputs = token_classifier.postprocess(
+                    model_outputs, aggregation_strategy=aggregation_strategy, ignore_labels=[]
+                )
+                self.assertEqual(nested_simplify(outputs), entities)
+
+        # The per-entity methods give the same entities as the pipeline
+        token_classifier = TokenClassificationPipeline(model=model, tokenizer=tokenizers[0])
+        model_outputs = token_classifier.forward(token_classifier.preprocess(sentence))
+        pre_entities = token_classifier.gather_pre_entities(
+            sentence,
+            model_outputs["input_ids"][0].numpy(),
+            np.concatenate([uniform_scores, scores, uniform_scores]),
+            model_outputs["offset_mapping"][0],
+            model_outputs["special_tokens_mask"][0].numpy(),
+            AggregationStrategy.FIRST,
+        )
+        for aggregation_strategy in [AggregationStrategy.FIRST, AggregationStrategy.MAX, AggregationStrategy.AVERAGE]:
+            entities = token_classifier.aggregate_words(pre_entities, aggregation_strategy)
+            grouped_entities = token_classifier.group_entities(entities)
+            self.assertEqual(nested_simplify(grouped_entities), expected_entities[aggregation_strategy])
+
+        entity = token_classifier.aggregate_word(pre_entities[3:5], AggregationStrategy.MAX)
+        self.assertEqual(
+            nested_simplify(entity), {"entity": "I-PER", "score": 0.9, "word": "microsoft", "start": 14, "end": 23}
+        )
+        entities = token_classifier.aggregate_words(pre_entities[:3], AggregationStrategy.FIRST)
+        self.assertEqual(
+            nested_simplify(token_classifier.group_sub_entities(entities[1:])),
+            {"entity_group": "O", "score": 0.65, "word": "works at", "start": 5, "end": 13},
+        )
+
     @require_tf
     def test_tf_only(self):
         model_name = "hf-internal-testing/tiny-random-bert-tf-only"  # This model only has a TensorFlow version
@@ -145,6 +145,35 @@ class ZeroShotClassificationPipelineTests(unittest.TestCase, metaclass=PipelineT
             "Who are you voting for in 2020?" * 100, candidate_labels=["politics", "public health", "science"]
         )
 
+    @require_torch
+    def test_premise_caching_pt(self):
+        zero_shot_classifier = pipeline(
+            "zero-shot-classification", model="hf-internal-testing/tiny-random-gpt2", framework="pt"
+        )
+        zero_shot_classifier.tokenizer.pad_token = zero_shot_classifier.tokenizer.eos_token
+        zero_shot_classifier.model.config.pad_token_id = zero_shot_classifier.tokenizer.eos_token_id
+        self.assertTrue(zero_shot_classifier.supports_premise_caching)
+
+        sequences = ["Who are you voting for in 2020?", "My stomach hurts."]
+        candidate_labels = ["politics", "public health", "science", "sports"]
+        expected = zero_shot_classifier(sequences, candidate_labels=candidate_labels, batch_size=4)
+        outputs = zero_shot_classifier(sequences, candidate_labels=candidate_labels, batch_size=4, cache_premise=True)
+        self.assertEqual(nested_simplify(outputs), nested_simplify(expected))
+
+        # Hypotheses are only tokenized once
+        self.assertEqual(len(zero_shot_classifier._hypothesis_ids_cache), len(candidate_labels))
+
+        encoder_classifier = pipeline(
+            "zero-shot-classification",
+            model="sshleifer/tiny-distilbert-base-cased-distilled-squad",
+            framework="pt",
+        )
+        self.assertFalse(encoder_classifier.supports_premise_caching)
+        with self.assertRaises(ValueError):
+            encoder_classifier(
+                "Who are you voting for in 2020?", candidate_labels=candidate_labels, cache_premise=True
+            )
+
     @require_torch
     def test_small_model_pt(self):
         zero_shot_classifier = pipeline(
@@ -20,9 +20,12 @@ import pickle
 import tempfile
 import unittest
 from typing import Callable, Optional
+from unittest.mock import patch
 
 import numpy as np
 
+import transformers
+
 # Ensure there are no circular imports when importing the parent class
 from transformers import PreTrainedTokenizerFast
 
@@ -285,3 +288,65 @@ class TokenizerUtilsTest(unittest.TestCase):
         with tempfile.TemporaryDirectory() as tmpdirname:
             bert_tokenizer.save(os.path.join(tmpdirname, "tokenizer.json"))
             PreTrainedTokenizerFast(tokenizer_file=os.path.join(tmpdirname, "tokenizer.json"))
+
+    def test_tokenizer_cache(self):
+        # The process-level cache must not leak into the other tests
+        self.addCleanup(transformers.tokenization_utils_base._tokenizers_load_cache.clear)
+        vocab_tokens = ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]", "want", "##want", "##ed", "un", "runn", "##ing"]
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            with open(os.path.join(tmpdirname, "vocab.txt"), "w", encoding="utf-8") as vocab_writer:
+                vocab_writer.write("".join([x + "\n" for x in vocab_tokens]))
+
+            tokenizer = BertTokenizer.from_pretrained(tmpdirname, use_tokenizer_cache=True)
+            cached_tokenizer = BertTokenizer.from_pretrained(tmpdirname, use_tokenizer_cache=True)
+            self.assertIsNot(tokenizer, cached_tokenizer)
+            self.assertEqual(tokenizer.get_vocab(), cached_tokenizer.get_vocab())
+            self.assertEqual(tokenizer.tokenize("unwanted running"), cached_tokenizer.tokenize("unwanted running"))
+
+            # Mutating a tokenizer returned by the cache does not affect the next ones
+            cached_tokenizer.add_tokens(["new_token"])
+            self.assertEqual(len(BertTokenizer.from_pretrained(tmpdirname, use_tokenizer_cache=True)), len(tokenizer))
+
+            # Different init kwargs give a different tokenizer
+            other_tokenizer = BertTokenizer.from_pretrained(tmpdirname, use_tokenizer_cache=True, do_lower_case=False)
+            self.assertFalse(other_tokenizer.do_lower_case)
+
+            # The least recently used tokenizers are evicted
+            load_cache = transformers.tokenization_utils_base._tokenizers_load_cache
+            with patch.object(transformers.tokenization_utils_base, "TOKENIZERS_LOAD_CACHE_SIZE", 1):
+                BertTokenizer.from_pretrained(tmpdirname, use_tokenizer_cache=True, model_max_length=12)
+                self.assertEqual(len(load_cache), 1)
+                self.assertEqual(next(iter(load_cache.values())).model_max_length, 12)
+
+    @require_tokenizers
+    def test_tokenizer_cache_slow_to_fast_conversion(self):
+        # The process-level cache must not leak into the other tests
+        self.addCleanup(transformers.tokenization_utils_base._tokenizers_load_cache.clear)
+        vocab_tokens = ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]", "want", "##want", "##ed", "un", "runn", "##ing"]
+        with tempfile.TemporaryDirectory() as tmpdirname, tempfile.TemporaryDirectory() as cache_dir:
+            with open(os.path.join(tmpdirname, "vocab.txt"), "w", encoding="utf-8") as vocab_writer:
+                vocab_writer.write("".join([x + "\n" for x in vocab_tokens]))
+
+            tokenizer = BertTokenizerFast.from_pretrained(tmpdirname, cache_dir=cache_dir, use_tokenizer_cache=True)
+            converted_files = os.listdir(os.path.join(cache_dir, "converted_tokenizers"))
+            self.assertEqual(len(converted_files), 1)
+            self.assertTrue(converted_files[0].startswith("BertTokenizerFast-"))
+
+            # A new process would only find the on-disk conversion cache
+            transformers.tokenization_utils_base._tokenizers_load_cache.clear()
+            cached_tokenizer = BertTokenizerFast.from_pretrained(
+                tmpdirname, cache_dir=cache_dir, use_tokenizer_cache=True
+            )
+            self.assertEqual(tokenizer.get_vocab(), cached_tokenizer.get_vocab())
+            self.assertEqual(
+                tokenizer("unwanted running")["input_ids"], cached_tokenizer("unwanted running")["input_ids"]
+            )
+
+            # Changing the vocabulary file invalidates the cache
+            with open(os.path.join(tmpdirname, "vocab.txt"), "a", encoding="utf-8") as vocab_writer:
+                vocab_writer.write("low\n")
+            updated_tokenizer = BertTokenizerFast.from_pretrained(
+                tmpdirname, cache_dir=cache_dir, use_tokenizer_cache=True
+            )
+            self.assertEqual(len(updated_tokenizer), len(vocab_tokens) + 1)
+            self.assertEqual(len(os.listdir(os.path.join(cache_dir, "converted_tokenizers"))), 2)
@@ -62,7 +62,7 @@ from transformers.testing_utils import (
     require_torch_up_to_2_gpus,
     slow,
 )
-from transformers.trainer_utils import PREFIX_CHECKPOINT_DIR
+from transformers.trainer_utils import PREFIX_CHECKPOINT_DIR, StreamingMetric
 from transformers.training_args import OptimizerNames
 from transformers.utils.hp_naming import TrialShortNamer
 
@@ -86,6 +86,7 @@ if is_torch_available():
         TrainerState,
     )
     from transformers.modeling_utils import unwrap_model
+    from transformers.trainer_pt_utils import ShardSampler
 
 
 PATH_SAMPLE_TEXT = f"{get_tests_dir()}/fixtures/sample_text.txt"
@@ -158,6 +159,28 @@ class AlmostAccuracy:
         return {"accuracy": true.astype(np.float32).mean().item()}
 
 
+class StreamingAlmostAccuracy(StreamingMetric):
+    sufficient_statistics = ["num_true", "num_samples"]
+
+    def __init__(self, thresh=0.25):
+        self.thresh = thresh
+        self.batch_sizes = []
+
+    def reset(self):
+        self.num_true = 0
+        self.num_samples = 0
+        self.batch_sizes = []
+
+    def update(self, eval_pred):
+        predictions, labels = eval_pred
+        self.num_true += (np.abs(predictions - labels) <= self.thresh).sum()
+        self.num_samples += len(predictions)
+        self.batch_sizes.append(len(predictions))
+
+    def compute(self):
+        return {"accuracy": (self.num_true / self.num_samples).item()}
+
+
 class RegressionModelConfig(PretrainedConfig):
     def __init__(self, a=0, b=0, double_output=False, **kwargs):
         super().__init__(**kwargs)
@@ -202,6 +225,22 @@ if is_torch_available():
             loss = nn.functional.mse_loss(y, labels)
             return (loss, y, y) if self.double_output else (loss, y)
 
+    class TokenRegressionModel(nn.Module):
+        def __init__(self, a=0, b=0):
+            super().__init__()
+            self.a = nn.Parameter(torch.tensor(a).float())
+            self.b = nn.Parameter(torch.tensor(b).float())
+            self.config = None
+
+        def forward(self, input_ids, labels=None, **kwargs):
+            y = input_ids * self.a + self.b
+            if labels is None:
+                return (y,)
+            # Mean over the labels that are not padding
+            mask = labels != -100
+            loss = ((y - labels) ** 2 * mask).sum() / mask.sum()
+            return (loss, y)
+
     class RegressionDictModel(nn.Module):
         def __init__(self, a=0, b=0):
             super().__init__()
@@ -288,6 +327,7 @@ if is_torch_available():
         data_collator = kwargs.pop("data_collator", None)
         optimizers = kwargs.pop("optimizers", (None, None))
         output_dir = kwargs.pop("output_dir", "./regression")
+        preprocess_logits_for_metrics = kwargs.pop("preprocess_logits_for_metrics", None)
 
         args = RegressionTrainingArguments(output_dir, a=a, b=b, **kwargs)
         return Trainer(
@@ -299,6 +339,7 @@ if is_torch_available():
             compute_metrics=compute_metrics,
             optimizers=optimizers,
             model_init=model_init,
+            preprocess_logits_for_metrics=preprocess_logits_for_metrics,
         )
 
 
@@ -448,6 +489,24 @@ class TrainerIntegrationPrerunTest(TestCasePlus, TrainerIntegrationCommon):
         trainer.train()
         self.check_trained_model(trainer.model)
 
+    def test_dataloader_prefetch_batches(self):
+        trainer = get_regression_trainer(learning_rate=0.1, dataloader_prefetch_batches=2)
+        trainer.train()
+        self.check_trained_model(trainer.model)
+
+        results = trainer.evaluate()
+        trainer.args.dataloader_prefetch_batches = 0
+        expected_results = trainer.evaluate()
+        self.assertAlmostEqual(results["eval_loss"], expected_results["eval_loss"])
+
+        # With an iterable dataset
+        config = RegressionModelConfig()
+        model = RegressionPreTrainedModel(config)
+        args = RegressionTrainingArguments(output_dir="./examples", max_steps=4, dataloader_prefetch_batches=2)
+        trainer = Trainer(model=model, args=args, train_dataset=SampleIterableDataset())
+        trainer.train()
+        self.assertEqual(trainer.state.global_step, 4)
+
     def test_training_loss(self):
         n_gpus = max(1, get_gpu_count())
 
@@ -483,6 +542,60 @@ class TrainerIntegrationPrerunTest(TestCasePlus, TrainerIntegrationCommon):
         self.assertFalse(torch.allclose(trainer.model.b, b))
         self.assertEqual(trainer.optimizer.state_dict()["param_groups"][0]["lr"], 1.0)
 
+    def test_max_tokens_per_batch(self):
+        np.random.seed(42)
+        lengths = np.random.randint(1, 10, (40,))
+        train_dataset = [
+            {"input_ids": np.random.normal(size=(length,)).astype(np.float32), "labels": np.ones(length, np.float32)}
+            for length in lengths
+        ]
+
+        def data_collator(features):
+            max_length = max(len(feature["input_ids"]) for feature in features)
+            batch = {
+                "input_ids": torch.zeros(len(features), max_length),
+                "labels": torch.full((len(features), max_length), -100.0),
+            }
+            for i, feature in enumerate(features):
+                batch["input_ids"][i, : len(feature["input_ids"])] = torch.tensor(feature["input_ids"])
+                batch["labels"][i, : len(feature["labels"])] = torch.tensor(feature["labels"])
+            return batch
+
+        model = TokenRegressionModel()
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+        lr_scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, lr_lambda=lambda x: 1.0)
+        args = TrainingArguments("./regression", max_tokens_per_batch=16, max_grad_norm=0, num_train_epochs=1)
+        trainer = Trainer(
+            model, args, train_dataset=train_dataset, data_collator=data_collator, optimizers=(optimizer, lr_scheduler)
+        )
+        train_dataloader = trainer.get_train_dataloader()
+        for batch in train_dataloader:
+            self.assertLessEqual(batch["input_ids"].numel(), 16)
+        self.assertLess(len(train_dataloader), 20)
+
+        # One optimization step over the whole dataset, with batches of different sizes.
+        trainer.args.gradient_accumulation_steps = len(train_dataloader)
+        trainer.train()
+        self.assertEqual(trainer.state.global_step, 1)
+
+        # The gradients are the ones of the mean of the losses of all the labels (each label weighs the same).
+        x = np.concatenate([sample["input_ids"] for sample in train_dataset])
+        expected_a = 0.1 * np.mean(2 * x)
+        expected_b = 0.1 * 2
+        self.assertAlmostEqual(trainer.model.a.item(), expected_a, places=5)
+        self.assertAlmostEqual(trainer.model.b.item(), expected_b, places=5)
+
+    def test_num_labels_in_batch(self):
+        inputs = {"labels": torch.tensor([[1, 2, 3, -100], [4, 5, -100, -100]])}
+        args = TrainingArguments("./regression", max_tokens_per_batch=16)
+        trainer = Trainer(RegressionModel(), args)
+        self.assertEqual(trainer._num_labels_in_batch(inputs).item(), 5)
+
+        # Causal language models never predict the first label of each sample
+        config = GPT2Config(vocab_size=10, n_positions=8, n_embd=8, n_layer=1, n_head=2)
+        trainer = Trainer(GPT2LMHeadModel(config), args)
+        self.assertEqual(trainer._num_labels_in_batch(inputs).item(), 3)
+
     def test_adafactor_lr_none(self):
         # test the special case where lr=None, since Trainer can't not have lr_scheduler
 
@@ -683,6 +796,139 @@ class TrainerIntegrationTest(TestCasePlus, TrainerIntegrationCommon):
         expected_acc = AlmostAccuracy()((pred, y))["accuracy"]
         self.assertAlmostEqual(results["eval_accuracy"], expected_acc)
 
+    def test_evaluate_with_streaming_metric(self):
+        for eval_len in (64, 66):
+            metric = StreamingAlmostAccuracy()
+            trainer = get_regression_trainer(a=1.5, b=2.5, eval_len=eval_len, compute_metrics=metric)
+            results = trainer.evaluate()
+
+            x, y = trainer.eval_dataset.x, trainer.eval_dataset.ys[0]
+            pred = 1.5 * x + 2.5
+            expected_loss = ((pred - y) ** 2).mean()
+            self.assertAlmostEqual(results["eval_loss"], expected_loss)
+            expected_acc = AlmostAccuracy()((pred, y))["accuracy"]
+            self.assertAlmostEqual(results["eval_accuracy"], expected_acc)
+            # The metric was updated batch per batch
+            self.assertEqual(sum(metric.batch_sizes), eval_len)
+            self.assertEqual(len(metric.batch_sizes), math.ceil(eval_len / trainer.args.eval_batch_size))
+
+            # Predictions are not accumulated
+            outputs = trainer.predict(trainer.eval_dataset)
+            self.assertIsNone(outputs.predictions)
+            self.assertIsNone(outputs.label_ids)
+            self.assertAlmostEqual(outputs.metrics["test_accuracy"], expected_acc)
+
+        # Also works with the legacy prediction loop
+        trainer = get_regression_trainer(
+            a=1.5, b=2.5, eval_len=66, compute_metrics=StreamingAlmostAccuracy(), use_legacy_prediction_loop=True
+        )
+        outputs = trainer.prediction_loop(trainer.get_eval_dataloader(), description="Evaluation")
+        self.assertAlmostEqual(outputs.metrics["eval_accuracy"], expected_acc)
+
+    def test_sharded_evaluation(self):
+        for eval_len in (64, 66):
+            trainer = get_regression_trainer(
+                a=1.5, b=2.5, eval_len=eval_len, compute_metrics=StreamingAlmostAccuracy(), sharded_eval=True
+            )
+            results = trainer.evaluate()
+
+            x, y = trainer.eval_dataset.x, trainer.eval_dataset.ys[0]
+            pred = 1.5 * x + 2.5
+            expected_loss = ((pred - y) ** 2).mean()
+            self.assertAlmostEqual(results["eval_loss"], expected_loss)
+            expected_acc = AlmostAccuracy()((pred, y))["accuracy"]
+            self.assertAlmostEqual(results["eval_accuracy"], expected_acc)
+
+            outputs = trainer.predict(trainer.eval_dataset)
+            self.assertIsNone(outputs.predictions)
+            self.assertIsNone(outputs.label_ids)
+            self.assertAlmostEqual(outputs.metrics["test_accuracy"], expected_acc)
+
+            # Predictions are only gathered on demand
+            trainer.args.eval_gather_predictions = True
+            outputs = trainer.predict(trainer.eval_dataset)
+            self.assertTrue(np.allclose(outputs.predictions, pred))
+            self.assertTrue(np.allclose(outputs.label_ids, y))
+            self.assertAlmostEqual(outputs.metrics["test_accuracy"], expected_acc)
+            self.assertAlmostEqual(outputs.metrics["test_loss"], expected_loss)
+
+        # Also works with an iterable dataset
+        eval_dataset = SampleIterableDataset(length=66)
+        results = trainer.evaluate(eval_dataset)
+        x, y = eval_dataset.dataset.x, eval_dataset.dataset.ys[0]
+        pred = 1.5 * x + 2.5
+        self.assertAlmostEqual(results["eval_loss"], ((pred - y) ** 2).mean())
+        self.assertAlmostEqual(results["eval_accuracy"], AlmostAccuracy()((pred, y))["accuracy"])
+
+        # A regular `compute_metrics` needs the gathered predictions
+        trainer = get_regression_trainer(
+            a=1.5, b=2.5, eval_len=66, compute_metrics=AlmostAccuracy(), sharded_eval=True
+        )
+        with self.assertRaises(ValueError):
+            trainer.evaluate()
+        trainer.args.eval_gather_predictions = True
+        self.assertAlmostEqual(trainer.evaluate()["eval_accuracy"], expected_acc)
+
+        # A streaming metric has to define its sufficient statistics
+        class StreamingAccuracyWithoutStatistics(StreamingAlmostAccuracy):
+            sufficient_statistics = []
+
+        trainer.compute_metrics = StreamingAccuracyWithoutStatistics()
+        with self.assertRaises(NotImplementedError):
+            trainer.evaluate()
+
+    def test_sharded_evaluation_skips_extra_samples(self):
+        # Simulates the processes of a distributed sharded evaluation, the padding samples of `ShardSampler` are skipped
+        dataset = RegressionDataset(length=67)
+        trainer = get_regression_trainer(a=1.5, b=2.5, sharded_eval=True)
+        statistics = []
+        for process_index in range(3):
+            metric = StreamingAlmostAccuracy()
+            metric.reset()
+            totals = {"loss_sum": 0.0, "num_losses": 0, "num_streamed_samples": 0}
+            indices = list(ShardSampler(dataset, batch_size=4, num_processes=3, process_index=process_index))
+            with patch.object(TrainingArguments, "world_size", 3), patch.object(
+                TrainingArguments, "process_index", process_index
+            ):
+                for step in range(len(indices) // 4):
+                    batch_indices = indices[4 * step : 4 * step + 4]
+                    logits = torch.tensor(1.5 * dataset.x[batch_indices] + 2.5)
+                    labels = torch.tensor(dataset.ys[0][batch_indices])
+                    loss = torch.tensor(1.0)
+                    trainer._sharded_evaluation_step(metric, totals, step, 4, 4, loss, logits, labels, len(dataset))
+            statistics.append(metric.get_sufficient_statistics())
+            self.assertEqual(totals["num_losses"], metric.num_samples)
+            self.assertEqual(totals["num_streamed_samples"], metric.num_samples)
+
+        metric = StreamingAlmostAccuracy()
+        metric.set_sufficient_statistics({name: sum(s[name] for s in statistics) for name in statistics[0]})
+        self.assertEqual(metric.num_samples, len(dataset))
+        pred = 1.5 * dataset.x + 2.5
+        self.assertAlmostEqual(metric.compute()["accuracy"], AlmostAccuracy()((pred, dataset.ys[0]))["accuracy"])
+
+    def test_evaluate_with_preprocess_logits_for_metrics(self):
+        def preprocess_logits_for_metrics(logits, labels):
+            return logits + 1
+
+        trainer = get_regression_trainer(
+            a=1.5,
+            b=2.5,
+            eval_len=66,
+            compute_metrics=AlmostAccuracy(),
+            preprocess_logits_for_metrics=preprocess_logits_for_metrics,
+        )
+        results = trainer.evaluate()
+
+        x, y = trainer.eval_dataset.x, trainer.eval_dataset.ys[0]
+        pred = 1.5 * x + 2.5
+        expected_loss = ((pred - y) ** 2).mean()
+        self.assertAlmostEqual(results["eval_loss"], expected_loss)
+        expected_acc = AlmostAccuracy()((pred + 1, y))["accuracy"]
+        self.assertAlmostEqual(results["eval_accuracy"], expected_acc)
+
+        preds = trainer.predict(trainer.eval_dataset).predictions
+        self.assertTrue(np.allclose(preds, pred + 1))
+
     def test_predict(self):
         trainer = get_regression_trainer(a=1.5, b=2.5)
         preds = trainer.predict(trainer.eval_dataset).predictions
@@ -786,6 +1032,35 @@ class TrainerIntegrationTest(TestCasePlus, TrainerIntegrationCommon):
             trainer.train()
             self.check_saved_checkpoints(tmpdir, 5, int(self.n_epochs * 64 / self.batch_size), False)
 
+    def test_save_checkpoints_async(self):
+        for pretrained in [True, False]:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                sync_dir = os.path.join(tmpdir, "sync")
+                async_dir = os.path.join(tmpdir, "async")
+                trainer = get_regression_trainer(output_dir=sync_dir, save_steps=5, pretrained=pretrained)
+                trainer.train()
+                trainer = get_regression_trainer(
+                    output_dir=async_dir, save_steps=5, pretrained=pretrained, save_async=True
+                )
+                trainer.train()
+
+                total = int(self.n_epochs * 64 / self.batch_size)
+                self.check_saved_checkpoints(async_dir, 5, total, is_pretrained=pretrained)
+                # No temporary folder is left
+                self.assertEqual(
+                    sorted(os.listdir(async_dir)), sorted(f"checkpoint-{step}" for step in range(5, total, 5))
+                )
+                # The checkpoints are the same as the ones saved synchronously
+                for filename in [WEIGHTS_NAME, "optimizer.pt", "scheduler.pt"]:
+                    sync_state = torch.load(os.path.join(sync_dir, "checkpoint-5", filename))
+                    async_state = torch.load(os.path.join(async_dir, "checkpoint-5", filename))
+                    self.assertEqual(str(sync_state), str(async_state))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            trainer = get_regression_trainer(output_dir=tmpdir, save_steps=5, save_total_limit=2, save_async=True)
+            trainer.train()
+            self.assertEqual(sorted(os.listdir(tmpdir)), ["checkpoint-15", "checkpoint-20"])
+
     @require_torch_multi_gpu
     def test_run_seq2seq_double_train_wrap_once(self):
         # test that we don't wrap the model more than once
@@ -886,6 +1161,27 @@ class TrainerIntegrationTest(TestCasePlus, TrainerIntegrationCommon):
             trainer.train(resume_from_checkpoint=True)
         self.assertTrue("No valid checkpoint found in output directory" in str(context.exception))
 
+    @require_torch_up_to_2_gpus
+    def test_resume_training_does_not_load_seen_samples(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            kwargs = dict(output_dir=tmpdir, train_len=128, save_steps=5, learning_rate=0.1)
+            trainer = get_regression_trainer(**kwargs)
+            trainer.train()
+
+            trainer = get_regression_trainer(**kwargs)
+            loaded_indices = []
+            getitem = RegressionDataset.__getitem__
+
+            def counting_getitem(dataset, i):
+                loaded_indices.append(i)
+                return getitem(dataset, i)
+
+            with patch.object(RegressionDataset, "__getitem__", counting_getitem):
+                trainer.train(resume_from_checkpoint=os.path.join(tmpdir, "checkpoint-5"))
+            # The samples of the 5 first batches are not loaded again.
+            batch_size = trainer.args.train_batch_size
+            self.assertEqual(len(loaded_indices), trainer.args.num_train_epochs * 128 - 5 * batch_size)
+
     @require_torch_non_multi_gpu
     def test_resume_training_with_randomness(self):
         # This test will fail flakily for more than 1 GPUs since the result will be slightly more different
@@ -1164,6 +1460,12 @@ class TrainerIntegrationTest(TestCasePlus, TrainerIntegrationCommon):
         expected_acc = AlmostAccuracy()((pred, y))["accuracy"]
         self.assertAlmostEqual(results["eval_accuracy"], expected_acc)
 
+        # With a streaming metric
+        trainer = Trainer(model=model, args=args, compute_metrics=StreamingAlmostAccuracy())
+        results = trainer.evaluate(eval_dataset)
+        self.assertAlmostEqual(results["eval_loss"], expected_loss)
+        self.assertAlmostEqual(results["eval_accuracy"], expected_acc)
+
     def test_predict_iterable_dataset(self):
         config = RegressionModelConfig(a=1.5, b=2.5)
         model = RegressionPreTrainedModel(config)
@@ -1736,6 +2038,16 @@ if is_torch_available():
             transformers.optimization.AdamW,
             default_adam_kwargs,
         ),
+        (
+            OptimizerNames.ADAMW_HF_FOREACH,
+            transformers.optimization.AdamW,
+            dict(default_adam_kwargs, foreach=True),
+        ),
+        (
+            OptimizerNames.ADAMW_8BIT,
+            transformers.optimization.AdamW8bit,
+            default_adam_kwargs,
+        ),
         (
             OptimizerNames.ADAMW_TORCH,
             torch.optim.AdamW,
@@ -1750,6 +2062,16 @@ if is_torch_available():
                 "lr": TrainingArguments.learning_rate,
             },
         ),
+        (
+            OptimizerNames.ADAFACTOR_FOREACH,
+            transformers.optimization.Adafactor,
+            {
+                "scale_parameter": False,
+                "relative_step": False,
+                "lr": TrainingArguments.learning_rate,
+                "foreach": True,
+            },
+        ),
     ]
     if is_apex_available():
         import apex
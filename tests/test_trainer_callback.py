@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import shutil
 import tempfile
 import unittest
@@ -21,6 +22,7 @@ from transformers import (
     DefaultFlowCallback,
     IntervalStrategy,
     PrinterCallback,
+    ProfilerCallback,
     ProgressCallback,
     Trainer,
     TrainerCallback,
@@ -240,3 +242,31 @@ class TrainerCallbackTest(unittest.TestCase):
                 callbacks=[MyTestTrainerCallback, MyTestTrainerCallback],
             )
             assert str(MyTestTrainerCallback) in warn_mock.call_args[0][0]
+
+    def test_profiler_callback(self):
+        trainer = self.get_trainer(
+            profile=True,
+            profile_active_steps=2,
+            eval_steps=3,
+            evaluation_strategy="steps",
+            logging_steps=4,
+            logging_dataloader_wait=True,
+        )
+        self.assertIn(ProfilerCallback, [callback.__class__ for callback in trainer.callback_handler.callbacks])
+        trainer.train()
+
+        # The first step is skipped, the second one is used for warmup and the next two are recorded.
+        profile_dir = os.path.join(self.output_dir, "profiler")
+        self.assertEqual(
+            sorted(os.listdir(profile_dir)), ["summary_rank0_step4.txt", "trace_rank0_step4.pt.trace.json"]
+        )
+        with open(os.path.join(profile_dir, "summary_rank0_step4.txt")) as f:
+            summary = f.read()
+        for region in ["dataloader", "training_step", "optimizer_step", "evaluation"]:
+            self.assertIn(region, summary)
+
+        logs = [log for log in trainer.state.log_history if "loss" in log]
+        self.assertEqual(len(logs), 6)
+        for log in logs:
+            self.assertGreaterEqual(log["dataloader_wait_time"], 0)
+            self.assertTrue(0 <= log["dataloader_wait_ratio"] <= 1)
@@ -15,7 +15,9 @@
 import sys
 from typing import Dict
 
-from transformers import EvalPrediction, HfArgumentParser, TrainingArguments, is_torch_available
+import numpy as np
+
+from transformers import EvalPrediction, HfArgumentParser, StreamingMetric, TrainingArguments, is_torch_available
 from transformers.testing_utils import (
     TestCasePlus,
     execute_subprocess_async,
@@ -61,6 +63,20 @@ if is_torch_available():
             else:
                 return input_ids
 
+    class SumAndCount(StreamingMetric):
+        sufficient_statistics = ["sum", "count", "histogram"]
+
+        def reset(self):
+            self.sum, self.count, self.histogram = 0, 0, np.zeros(2, dtype=np.int64)
+
+        def update(self, eval_prediction):
+            self.sum += eval_prediction.predictions.sum()
+            self.count += len(eval_prediction.predictions)
+            self.histogram += np.bincount(eval_prediction.label_ids % 2, minlength=2)
+
+        def compute(self):
+            return {"sum": self.sum, "count": self.count, "num_even": self.histogram[0]}
+
 
 class TestTrainerDistributed(TestCasePlus):
     @require_torch_multi_gpu
@@ -141,3 +157,25 @@ if __name__ == "__main__":
             exit(1)
 
         trainer.args.eval_accumulation_steps = None
+
+        # In a sharded evaluation, only the statistics of the metric are summed across processes, without the samples
+        # added to have batches of the same size on all processes.
+        trainer.args.sharded_eval = True
+        trainer.compute_metrics = SumAndCount()
+        metrics = trainer.evaluate()
+        logger.info(metrics)
+        expected = {
+            "eval_sum": dataset_length * (dataset_length - 1) // 2,
+            "eval_count": dataset_length,
+            "eval_num_even": (dataset_length + 1) // 2,
+        }
+        if any(metrics[key] != value for key, value in expected.items()):
+            logger.error(metrics)
+            exit(1)
+
+        p = trainer.predict(dataset)
+        if p.predictions is not None:
+            logger.error("Predictions were gathered in a sharded evaluation")
+            exit(1)
+
+        trainer.args.sharded_eval = False
@@ -14,6 +14,8 @@
 # limitations under the License.
 
 import copy
+import math
+import threading
 import unittest
 
 import numpy as np
@@ -30,15 +32,22 @@ if is_torch_available():
     from transformers.modeling_outputs import SequenceClassifierOutput
     from transformers.tokenization_utils_base import BatchEncoding
     from transformers.trainer_pt_utils import (
+        BatchPrefetcher,
         DistributedLengthGroupedSampler,
         DistributedSamplerWithLoop,
         DistributedTensorGatherer,
         IterableDatasetShard,
         LabelSmoother,
         LengthGroupedSampler,
+        MaxTokensBatchSampler,
+        NestedArrayAccumulator,
+        ResumableDistributedSampler,
+        SeedableRandomSampler,
         SequentialDistributedSampler,
         ShardSampler,
         get_parameter_names,
+        nested_concat,
+        nested_truncate,
     )
 
     class TstLayer(nn.Module):
@@ -147,6 +156,67 @@ class TrainerUtilsTest(unittest.TestCase):
         for indices, seq_length in zip(actual_indices, sequence_lengths):
             self.assertTrue(np.array_equal(result[1][indices, :seq_length], predictions[indices, :seq_length]))
 
+    def test_batch_prefetcher(self):
+        dataloader = torch.utils.data.DataLoader(list(range(23)), batch_size=4)
+        prefetcher = BatchPrefetcher(dataloader, num_batches=2, prepare_fn=lambda batch: batch * 2)
+        self.assertEqual(len(prefetcher), 6)
+        self.assertEqual(prefetcher.batch_size, 4)
+        for _ in range(2):
+            batches = list(prefetcher)
+            self.assertEqual(len(batches), 6)
+            self.assertTrue(torch.equal(torch.cat(batches), torch.arange(23) * 2))
+
+        # Stopping the iteration early stops the background thread.
+        for batch in prefetcher:
+            break
+        self.assertFalse(any(thread.name == "batch-prefetcher" for thread in threading.enumerate()))
+
+        # Errors are raised in the main thread.
+        def failing_prepare_fn(batch):
+            if batch[0] == 8:
+                raise ValueError("Failed")
+            return batch
+
+        prefetcher = BatchPrefetcher(dataloader, num_batches=2, prepare_fn=failing_prepare_fn)
+        seen = []
+        with self.assertRaises(ValueError):
+            for batch in prefetcher:
+                seen.append(batch)
+        self.assertEqual(len(seen), 2)
+
+    def test_nested_array_accumulator(self):
+        # Chunks of varying sequence lengths, the last one with two extra samples added by a distributed sampler
+        num_samples = 21
+        sequence_lengths = [8, 13, 10]
+        batch_sizes = [8, 8, 7]
+        predictions = np.random.normal(size=(sum(batch_sizes), 13))
+        chunks = []
+        start = 0
+        for batch_size, seq_length in zip(batch_sizes, sequence_lengths):
+            chunk = predictions[start : start + batch_size, :seq_length]
+            chunks.append([chunk, (chunk, predictions[start : start + batch_size, 0])])
+            start += batch_size
+
+        expected = chunks[0]
+        for chunk in chunks[1:]:
+            expected = nested_concat(expected, chunk, padding_index=-100)
+
+        for accumulator_num_samples, expected_num_samples in [(None, 23), (num_samples, num_samples)]:
+            accumulator = NestedArrayAccumulator(num_samples=accumulator_num_samples, padding_index=-100)
+            for chunk in chunks:
+                accumulator.add_arrays(chunk)
+            result = accumulator.finalize()
+
+            self.assertIsInstance(result, list)
+            self.assertIsInstance(result[1], tuple)
+            expected_result = nested_truncate(expected, expected_num_samples)
+            self.assertTrue(np.array_equal(result[0], expected_result[0]))
+            self.assertTrue(np.array_equal(result[1][0], expected_result[1][0]))
+            self.assertTrue(np.array_equal(result[1][1], expected_result[1][1]))
+
+        self.assertIsNone(NestedArrayAccumulator().finalize())
+        self.assertIsNone(NestedArrayAccumulator(num_samples=num_samples).finalize())
+
     def test_label_smoothing(self):
         epsilon = 0.1
         num_labels = 12
@@ -230,6 +300,79 @@ class TrainerUtilsTest(unittest.TestCase):
         # The indices should be a permutation of range(100)
         self.assertEqual(list(sorted(indices_process_0 + indices_process_1)), list(range(100)))
 
+    def test_max_tokens_batch_sampler(self):
+        # Get some inputs of random lengths
+        lengths = torch.randint(1, 25, (100,)).tolist()
+        # Put one bigger than the others to check it ends up in first position
+        lengths[32] = 50
+
+        batches = list(MaxTokensBatchSampler(64, lengths=lengths))
+        self.assertEqual(batches[0], [32])
+        for batch in batches:
+            self.assertLessEqual(len(batch) * max(lengths[i] for i in batch), 64)
+        # The indices should be a permutation of range(100)
+        self.assertEqual(sorted(i for batch in batches for i in batch), list(range(100)))
+        # Batches are made of samples of similar lengths, so they are more than 2 per batch on average
+        self.assertLess(len(batches), 50)
+
+        # Each process gets the same number of batches, all the samples are seen
+        batches_process_0 = list(MaxTokensBatchSampler(64, lengths=lengths, num_replicas=3, rank=0))
+        batches_process_1 = list(MaxTokensBatchSampler(64, lengths=lengths, num_replicas=3, rank=1))
+        batches_process_2 = list(MaxTokensBatchSampler(64, lengths=lengths, num_replicas=3, rank=2))
+        self.assertEqual(len(batches_process_0), len(batches_process_1))
+        self.assertEqual(len(batches_process_0), len(batches_process_2))
+        self.assertEqual(len(batches_process_0), math.ceil(len(batches) / 3))
+        all_indices = [i for batch in batches_process_0 + batches_process_1 + batches_process_2 for i in batch]
+        self.assertEqual(set(all_indices), set(range(100)))
+
+        sampler = MaxTokensBatchSampler(64, lengths=lengths, num_replicas=3, rank=0, drop_last=True)
+        self.assertEqual(len(list(sampler)), len(batches) // 3)
+
+        with self.assertRaises(ValueError):
+            MaxTokensBatchSampler(32, lengths=lengths)
+
+    def test_max_tokens_batch_sampler_with_dict(self):
+        # Get some inputs of random lengths
+        data = []
+        for _ in range(6):
+            input_ids = torch.randint(0, 25, (100,)).tolist()
+            data.append({"input_ids": input_ids})
+        # Put one bigger than the others to check it ends up in first position
+        data[3]["input_ids"] = torch.randint(0, 25, (105,)).tolist()
+
+        batches = list(MaxTokensBatchSampler(209, dataset=data))
+        self.assertEqual(batches[0], [3])
+        self.assertEqual(sorted(i for batch in batches for i in batch), list(range(6)))
+        self.assertEqual(len(batches), 4)
+
+    def test_samplers_start_index(self):
+        lengths = torch.randint(0, 25, (100,)).tolist()
+        samplers = [
+            SeedableRandomSampler(lengths, seed=42),
+            LengthGroupedSampler(4, lengths=lengths, seed=42),
+            DistributedLengthGroupedSampler(4, num_replicas=2, rank=1, lengths=lengths, seed=42),
+            ResumableDistributedSampler(lengths, num_replicas=3, rank=1, seed=42),
+            DistributedSamplerWithLoop(lengths, 16, num_replicas=3, rank=1, seed=42),
+            IterableDatasetShard(lengths, batch_size=4, drop_last=False, num_processes=3, process_index=1),
+            MaxTokensBatchSampler(64, lengths=lengths, num_replicas=2, rank=1, seed=42),
+        ]
+        for sampler in samplers:
+            sampler.set_epoch(3)
+            indices = list(sampler)
+            length = len(sampler)
+            if not isinstance(sampler, IterableDatasetShard):
+                # The order only depends on the seed and the epoch
+                sampler.set_epoch(2)
+                self.assertNotEqual(list(sampler), indices)
+                sampler.set_epoch(3)
+                self.assertEqual(list(sampler), indices)
+
+            sampler.set_start_index(10)
+            self.assertEqual(list(sampler), indices[10:])
+            self.assertEqual(len(sampler), length - 10)
+            sampler.set_start_index(0)
+            self.assertEqual(list(sampler), indices)
+
     def test_get_parameter_names(self):
         model = nn.Sequential(TstLayer(128), nn.ModuleList([TstLayer(128), TstLayer(128)]))
         # fmt: off